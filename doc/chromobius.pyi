@@ -1,8 +1,10 @@
 """Chromobius (Development Version): an implementation of the mobius color code decoder."""
 # (This a stubs file describing the classes and methods in stim.)
 from __future__ import annotations
-from typing import overload, TYPE_CHECKING, Any, Iterable
+from typing import overload, TYPE_CHECKING, Any, Iterable, Optional
 if TYPE_CHECKING:
+    import asyncio
+    import concurrent.futures
     import io
     import pathlib
     import numpy as np
@@ -31,11 +33,82 @@ class CompiledDecoder:
         >>> decoder = chromobius.CompiledDecoder.from_dem(dem)
     """
     @staticmethod
+    def configure_worker_pool(
+        *,
+        num_threads: int,
+        max_queued_batches: int,
+    ) -> None:
+        """Sets up the worker threads used by `predict_future` and `predict_async`.
+
+        If this method isn't called, a pool is created when first needed with one
+        thread per CPU and room for two queued batches per thread.
+
+        Reconfiguring waits for all previously submitted batches to finish.
+
+        Args:
+            num_threads: The number of worker threads. Each worker owns its own
+                copy of the decoder's matcher and workspace.
+            max_queued_batches: The maximum number of batches that can be waiting
+                for a worker. When the queue is full, `predict_future` blocks
+                until there is room, and `predict_async` batches wait on the
+                event loop until there is room.
+
+        Example:
+            >>> import stim
+            >>> import chromobius
+            >>> import numpy as np
+
+            >>> repetition_color_code = stim.Circuit('''
+            ...     X_ERROR(0.1) 0 1 2 3 4 5 6 7
+            ...     MPP Z0*Z1*Z2 Z1*Z2*Z3 Z2*Z3*Z4 Z3*Z4*Z5 Z4*Z5*Z6 Z5*Z6*Z7
+            ...     DETECTOR(0, 0, 0, 2) rec[-6]
+            ...     DETECTOR(1, 0, 0, 0) rec[-5]
+            ...     DETECTOR(2, 0, 0, 1) rec[-4]
+            ...     DETECTOR(3, 0, 0, 2) rec[-3]
+            ...     DETECTOR(4, 0, 0, 0) rec[-2]
+            ...     DETECTOR(5, 0, 0, 1) rec[-1]
+            ...     M 0
+            ...     OBSERVABLE_INCLUDE(0) rec[-1]
+            ... ''')
+            >>> dem = repetition_color_code.detector_error_model()
+            >>> decoder = chromobius.compile_decoder_for_dem(dem)
+            >>> sampler = repetition_color_code.compile_detector_sampler()
+            >>> dets, actual_obs_flips = sampler.sample(
+            ...     shots=1024,
+            ...     separate_observables=True,
+            ...     bit_packed=True,
+            ... )
+
+            >>> decoder.configure_worker_pool(num_threads=2, max_queued_batches=4)
+            >>> futures = [
+            ...     decoder.predict_future(dets[k:k+128])
+            ...     for k in range(0, 1024, 128)
+            ... ]
+            >>> predictions = np.concatenate([f.result() for f in futures])
+            >>> predictions.shape
+            (1024, 1)
+        """
+    @staticmethod
     def from_dem(
         dem: stim.DetectorErrorModel,
+        *,
+        split_bases: bool = False,
+        decode_bases_concurrently: bool = False,
+        max_detection_events: Optional[int] = None,
+        shot_time_budget_seconds: Optional[float] = None,
+        max_mobius_error_weight: Optional[float] = None,
+        fold_pruned_mobius_errors: bool = False,
+        slim: bool = False,
+        compact: bool = False,
+        include_lifting_weight: bool = False,
+        cluster_threads: int = 0,
     ) -> chromobius.CompiledDecoder:
         """Compiles a decoder for a stim detector error model.
 
+        The dem may have any number of observables. Observables past the first
+        64 are handled by lifting each shot's matching once per group of 64
+        observables, which adds a little to the time spent decoding each shot.
+
         Args:
             dem: A stim detector error model. The detector error model must satisfy:
                 1. Basis+Color annotations. Every detector that appears in an error
@@ -63,6 +136,76 @@ class CompiledDecoder:
                     matchable code, at least one of the colors must be avoided.
                     Otherwise the matcher may be given a problem that can be solved
                     locally, but when lifting it needs to be solved non-locally.
+            split_bases: Defaults to False. When set, the X basis and Z basis
+                parts of the matching problem get separate matchers and are
+                solved independently, using smaller working sets. Requires
+                that every error decomposes into a purely X part and a purely
+                Z part (e.g. a Y error in a CSS color code).
+            decode_bases_concurrently: Defaults to False. When set (along
+                with split_bases), shots with detection events in both bases
+                decode their X part on a helper thread while the calling
+                thread decodes the Z part. This only pays for itself when
+                individual shots take a long time to decode.
+            max_detection_events: Defaults to None (no limit). Shots with
+                more detection events than this aren't decoded. They
+                predict no observable flips, and are reported as status 1
+                by `predict_obs_flips_with_status_from_dets_bit_packed`.
+            shot_time_budget_seconds: Defaults to None (no limit). The
+                matcher can't be interrupted, so the budget is enforced
+                before matching, using a running estimate of the decoding
+                time per detection event learned from earlier shots.
+                Shots estimated to take longer than this aren't decoded.
+                They predict no observable flips, and are reported as
+                status 2 by
+                `predict_obs_flips_with_status_from_dets_bit_packed`.
+                Shots that are decoded but finish late keep their
+                prediction, and are reported as status 3. The estimate
+                starts at zero, so early or unusually hard shots can still
+                overrun the budget.
+            max_mobius_error_weight: Defaults to None (no pruning). Errors
+                in the matching problem with a weight ln((1-p)/p) above
+                this are pruned, shrinking the matching graph. The number
+                of matching graph edges that were removed is reported by
+                `CompiledDecoder.num_pruned_mobius_edges`. Pruning too
+                aggressively can disconnect the matching graph, causing
+                decoding to fail.
+            fold_pruned_mobius_errors: Defaults to False. When set, the
+                probability of each pruned error is folded into the edges
+                it shares with kept errors, instead of being discarded.
+            slim: Defaults to False. When set, data that's only needed
+                while compiling the decoder is freed afterwards, reducing
+                the decoder's memory footprint without changing its
+                predictions. Useful when many decoders are kept alive at
+                once. See `CompiledDecoder.memory_usage`.
+            compact: Defaults to False. Implies `slim`. When set, the
+                lookup tables used to lift the matcher's solutions are
+                moved into sorted arrays on read-only memory pages.
+                Clones of the decoder (e.g. the worker threads used by
+                `CompiledDecoder.predict_future`) share the arrays, and so
+                do worker processes forked after compiling the decoder,
+                because the pages are never written and so are never
+                copied on write. Predictions are unchanged.
+            include_lifting_weight: Defaults to False. When set, the weights
+                returned by `predict_weighted_obs_flips_from_dets_bit_packed`
+                include the cost of lifting the matcher's solution. Lifting
+                applies rgb representative errors (errors with one symptom of
+                each color) to convert between charge colors, and each one it
+                applies adds its weight ln((1-p)/p) to the shot's weight. The
+                weights are accumulated while lifting, so reporting them
+                costs nothing extra per shot. Predictions are unchanged.
+            cluster_threads: Defaults to 0. When at least 2, each shot is
+                split into clusters of detection events that can be matched
+                independently, and the clusters are matched in parallel by
+                this many threads. The predictions have the same weight as
+                matching the whole shot at once (ties between equally likely
+                predictions may be broken differently). This lowers the
+                latency of shots from large patches with sparse detection
+                events, when there are spare cores. Shots whose clusters
+                percolate are matched whole, and the shots after them skip
+                clustering, so dense shots cost about the same as without
+                clustering. On one thread clustering is only extra work, so
+                values below 2 disable it. Can't be combined with
+                max_detection_events or shot_time_budget_seconds.
 
         Returns:
             A decoder object that can be used to predict observable flips from
@@ -85,6 +228,305 @@ class CompiledDecoder:
 
             >>> decoder = chromobius.CompiledDecoder.from_dem(dem)
         """
+    def graph_arrays(
+        self,
+    ) -> dict[str, np.ndarray]:
+        """Returns the decoder's internal graphs as numpy arrays.
+
+        The decoder refers to the detectors that aren't ignored as nodes,
+        numbered 0, 1, 2, ... in order of detector index. Node indices
+        refer to these nodes, and 2**32 - 1 refers to the boundary.
+
+        Arrays that view the decoder's memory directly (instead of copying
+        it) are read-only, and keep the decoder alive.
+
+        Colors are encoded as 1=red, 2=green, 3=blue (and charges use 0
+        for neutral). Bases are encoded as 1=X, 2=Z. Observable flips
+        cover the first 64 observables.
+
+        Returns:
+            A dictionary with these keys:
+                'node_detector': uint32 array with the detector index of
+                    each node.
+                'node_color', 'node_basis': uint8 arrays with the color
+                    and basis of each node.
+                'rgb_reps': a read-only view of the representative error
+                    of each node, with fields 'red_node', 'green_node',
+                    'blue_node', 'obs_flip', and 'charge_flip'.
+                'charge_graph': the edges of the charge graph (each edge
+                    listed once), with fields 'n1', 'n2', and 'obs_flip'.
+                    Empty for decoders compiled with `slim=True`.
+                'drag_graph': the entries of the drag graph, with fields
+                    'n1', 'c1', 'n2', 'c2' and 'obs_flip'. Each entry
+                    says which observables are flipped by moving charge
+                    c1 at node n1 to charge c2 at node n2.
+
+        Examples:
+            >>> import stim
+            >>> import chromobius
+            >>> dem = stim.Circuit('''
+            ...     X_ERROR(0.1) 0 1 2 3 4 5 6 7
+            ...     MPP Z0*Z1*Z2 Z1*Z2*Z3 Z2*Z3*Z4 Z3*Z4*Z5 Z4*Z5*Z6 Z5*Z6*Z7
+            ...     DETECTOR(0, 0, 0, 2) rec[-6]
+            ...     DETECTOR(1, 0, 0, 0) rec[-5]
+            ...     DETECTOR(2, 0, 0, 1) rec[-4]
+            ...     DETECTOR(3, 0, 0, 2) rec[-3]
+            ...     DETECTOR(4, 0, 0, 0) rec[-2]
+            ...     DETECTOR(5, 0, 0, 1) rec[-1]
+            ...     M 0
+            ...     OBSERVABLE_INCLUDE(0) rec[-1]
+            ... ''').detector_error_model()
+            >>> decoder = chromobius.compile_decoder_for_dem(dem)
+            >>> arrays = decoder.graph_arrays()
+
+            >>> arrays['node_color']
+            array([3, 1, 2, 3, 1, 2], dtype=uint8)
+            >>> int(arrays['rgb_reps'][0]['blue_node'])
+            0
+            >>> arrays['rgb_reps'].flags.writeable
+            False
+            >>> arrays['charge_graph'][:3]['n2']
+            array([         1,          3, 4294967295], dtype=uint32)
+        """
+    def memory_usage(
+        self,
+    ) -> dict[str, int]:
+        """Estimates the memory held by the parts of the decoder.
+
+        Memory held by the underlying matcher isn't included.
+
+        Returns:
+            A dictionary mapping each part of the decoder ('node_tables',
+            'atomic_errors', 'mobius_dem', 'charge_graph', 'rgb_reps',
+            'drag_graph', 'workspace') to the approximate number of bytes
+            of memory it's using, plus a 'total' entry.
+
+        Examples:
+            >>> import stim
+            >>> import chromobius
+            >>> dem = stim.Circuit('''
+            ...     X_ERROR(0.1) 0 1 2 3 4 5 6 7
+            ...     MPP Z0*Z1*Z2 Z1*Z2*Z3 Z2*Z3*Z4 Z3*Z4*Z5 Z4*Z5*Z6 Z5*Z6*Z7
+            ...     DETECTOR(0, 0, 0, 2) rec[-6]
+            ...     DETECTOR(1, 0, 0, 0) rec[-5]
+            ...     DETECTOR(2, 0, 0, 1) rec[-4]
+            ...     DETECTOR(3, 0, 0, 2) rec[-3]
+            ...     DETECTOR(4, 0, 0, 0) rec[-2]
+            ...     DETECTOR(5, 0, 0, 1) rec[-1]
+            ...     M 0
+            ...     OBSERVABLE_INCLUDE(0) rec[-1]
+            ... ''').detector_error_model()
+
+            >>> full = chromobius.compile_decoder_for_dem(dem)
+            >>> slim = chromobius.compile_decoder_for_dem(dem, slim=True)
+            >>> full.memory_usage()['atomic_errors'] > 0
+            True
+            >>> slim.memory_usage()['atomic_errors']
+            0
+            >>> slim.memory_usage()['total'] < full.memory_usage()['total']
+            True
+        """
+    def mobius_dem(
+        self,
+    ) -> stim.DetectorErrorModel:
+        """Returns the matching problem the decoder gives to its matcher.
+
+        The mobius dem has two detectors for each node of the decoder (see
+        `CompiledDecoder.graph_arrays`): detectors 2n and 2n+1 are the
+        copies of node n in the two matching subgraphs that include the
+        node's color (each subgraph leaves out one color).
+
+        Decoders compiled with `slim=True` only keep one error per edge of
+        the mobius dem. Decoders compiled with `split_bases=True` give each
+        basis's part of the mobius dem to a separate matcher.
+
+        Examples:
+            >>> import stim
+            >>> import chromobius
+            >>> dem = stim.Circuit('''
+            ...     X_ERROR(0.1) 0 1 2 3 4 5 6 7
+            ...     MPP Z0*Z1*Z2 Z1*Z2*Z3 Z2*Z3*Z4 Z3*Z4*Z5 Z4*Z5*Z6 Z5*Z6*Z7
+            ...     DETECTOR(0, 0, 0, 2) rec[-6]
+            ...     DETECTOR(1, 0, 0, 0) rec[-5]
+            ...     DETECTOR(2, 0, 0, 1) rec[-4]
+            ...     DETECTOR(3, 0, 0, 2) rec[-3]
+            ...     DETECTOR(4, 0, 0, 0) rec[-2]
+            ...     DETECTOR(5, 0, 0, 1) rec[-1]
+            ...     M 0
+            ...     OBSERVABLE_INCLUDE(0) rec[-1]
+            ... ''').detector_error_model()
+            >>> decoder = chromobius.compile_decoder_for_dem(dem)
+            >>> mobius_dem = decoder.mobius_dem()
+            >>> mobius_dem.num_detectors
+            12
+            >>> mobius_dem.num_errors > 0
+            True
+        """
+    @property
+    def num_pruned_mobius_edges(
+        self,
+    ) -> int:
+        """The number of matching graph edges removed by pruning.
+
+        Edges are pruned when they only appear in errors with a weight
+        above the `max_mobius_error_weight` the decoder was compiled with.
+
+        Examples:
+            >>> import stim
+            >>> import chromobius
+            >>> dem = stim.Circuit('''
+            ...     X_ERROR(0.1) 1 2 3 4 5 6
+            ...     X_ERROR(0.000001) 0 7
+            ...     MPP Z0*Z1*Z2 Z1*Z2*Z3 Z2*Z3*Z4 Z3*Z4*Z5 Z4*Z5*Z6 Z5*Z6*Z7
+            ...     DETECTOR(0, 0, 0, 2) rec[-6]
+            ...     DETECTOR(1, 0, 0, 0) rec[-5]
+            ...     DETECTOR(2, 0, 0, 1) rec[-4]
+            ...     DETECTOR(3, 0, 0, 2) rec[-3]
+            ...     DETECTOR(4, 0, 0, 0) rec[-2]
+            ...     DETECTOR(5, 0, 0, 1) rec[-1]
+            ...     M 0
+            ...     OBSERVABLE_INCLUDE(0) rec[-1]
+            ... ''').detector_error_model()
+
+            >>> decoder = chromobius.compile_decoder_for_dem(dem)
+            >>> decoder.num_pruned_mobius_edges
+            0
+
+            >>> decoder = chromobius.compile_decoder_for_dem(
+            ...     dem,
+            ...     max_mobius_error_weight=10,
+            ... )
+            >>> decoder.num_pruned_mobius_edges
+            2
+        """
+    @staticmethod
+    def predict_async(
+        dets: np.ndarray,
+    ) -> asyncio.Future:
+        """Predicts observable flips without blocking the running asyncio event loop.
+
+        Like `predict_future`, but returns an asyncio future belonging to the
+        running event loop. The decoding happens on the decoder's C++ worker
+        threads without holding the GIL, so the event loop keeps running while
+        the batch is decoded. Cancelling the returned future cancels the batch if
+        it hasn't started decoding yet.
+
+        This method never blocks. When the worker pool's queue is full, the batch
+        waits (without blocking the event loop) and is queued from the event loop
+        once a worker frees up space. Back-pressure comes from awaiting the
+        returned future, so producers should bound how many predictions they
+        have in flight.
+
+        Must be called while an asyncio event loop is running (e.g. from within a
+        coroutine).
+
+        Args:
+            dets: Detection event data, in the same formats accepted by
+                `predict_obs_flips_from_dets_bit_packed`.
+
+        Returns:
+            An awaitable `asyncio.Future` whose result is the bit packed array that
+            `predict_obs_flips_from_dets_bit_packed` would have returned.
+
+        Example:
+            >>> import asyncio
+            >>> import stim
+            >>> import chromobius
+            >>> import numpy as np
+
+            >>> repetition_color_code = stim.Circuit('''
+            ...     X_ERROR(0.1) 0 1 2 3 4 5 6 7
+            ...     MPP Z0*Z1*Z2 Z1*Z2*Z3 Z2*Z3*Z4 Z3*Z4*Z5 Z4*Z5*Z6 Z5*Z6*Z7
+            ...     DETECTOR(0, 0, 0, 2) rec[-6]
+            ...     DETECTOR(1, 0, 0, 0) rec[-5]
+            ...     DETECTOR(2, 0, 0, 1) rec[-4]
+            ...     DETECTOR(3, 0, 0, 2) rec[-3]
+            ...     DETECTOR(4, 0, 0, 0) rec[-2]
+            ...     DETECTOR(5, 0, 0, 1) rec[-1]
+            ...     M 0
+            ...     OBSERVABLE_INCLUDE(0) rec[-1]
+            ... ''')
+            >>> dem = repetition_color_code.detector_error_model()
+            >>> decoder = chromobius.compile_decoder_for_dem(dem)
+            >>> sampler = repetition_color_code.compile_detector_sampler()
+            >>> dets, actual_obs_flips = sampler.sample(
+            ...     shots=1024,
+            ...     separate_observables=True,
+            ...     bit_packed=True,
+            ... )
+
+            >>> async def decode_in_two_halves():
+            ...     return await asyncio.gather(
+            ...         decoder.predict_async(dets[:512]),
+            ...         decoder.predict_async(dets[512:]),
+            ...     )
+            >>> first_half, second_half = asyncio.run(decode_in_two_halves())
+            >>> np.array_equal(
+            ...     np.concatenate([first_half, second_half]),
+            ...     decoder.predict_obs_flips_from_dets_bit_packed(dets),
+            ... )
+            True
+        """
+    @staticmethod
+    def predict_future(
+        dets: np.ndarray,
+    ) -> concurrent.futures.Future:
+        """Starts predicting observable flips in the background.
+
+        The batch of shots is queued for the decoder's persistent pool of C++
+        worker threads (see `configure_worker_pool`), and decoded without holding
+        the GIL. If the queue is full, this method blocks (without holding the
+        GIL) until there is room, so producers can't get arbitrarily far ahead of
+        the workers.
+
+        Calling `cancel()` on the returned future succeeds if the batch hasn't
+        started decoding yet, in which case it is skipped.
+
+        The dets array must not be modified until the future is done.
+
+        Args:
+            dets: Detection event data, in the same formats accepted by
+                `predict_obs_flips_from_dets_bit_packed`.
+
+        Returns:
+            A `concurrent.futures.Future` whose result is the bit packed array that
+            `predict_obs_flips_from_dets_bit_packed` would have returned. If
+            decoding fails, the future's exception is set instead.
+
+        Example:
+            >>> import stim
+            >>> import chromobius
+            >>> import numpy as np
+
+            >>> repetition_color_code = stim.Circuit('''
+            ...     X_ERROR(0.1) 0 1 2 3 4 5 6 7
+            ...     MPP Z0*Z1*Z2 Z1*Z2*Z3 Z2*Z3*Z4 Z3*Z4*Z5 Z4*Z5*Z6 Z5*Z6*Z7
+            ...     DETECTOR(0, 0, 0, 2) rec[-6]
+            ...     DETECTOR(1, 0, 0, 0) rec[-5]
+            ...     DETECTOR(2, 0, 0, 1) rec[-4]
+            ...     DETECTOR(3, 0, 0, 2) rec[-3]
+            ...     DETECTOR(4, 0, 0, 0) rec[-2]
+            ...     DETECTOR(5, 0, 0, 1) rec[-1]
+            ...     M 0
+            ...     OBSERVABLE_INCLUDE(0) rec[-1]
+            ... ''')
+            >>> dem = repetition_color_code.detector_error_model()
+            >>> decoder = chromobius.compile_decoder_for_dem(dem)
+            >>> sampler = repetition_color_code.compile_detector_sampler()
+            >>> dets, actual_obs_flips = sampler.sample(
+            ...     shots=1024,
+            ...     separate_observables=True,
+            ...     bit_packed=True,
+            ... )
+
+            >>> future = decoder.predict_future(dets)
+            >>> predicted_obs_flips = future.result()
+            >>> np.array_equal(
+            ...     predicted_obs_flips,
+            ...     decoder.predict_obs_flips_from_dets_bit_packed(dets),
+            ... )
+            True
+        """
     @staticmethod
     def predict_obs_flips_from_dets_bit_packed(
         dets: np.ndarray,
@@ -97,13 +539,13 @@ class CompiledDecoder:
                 shots to decode, with the first axis being the shot axis and the second
                 axis being the detection event byte axis).
 
-                The array's dtype must be np.uint8. If you have an array of dtype
-                np.bool_, you have data that's not bit packed. You can pack it by
-                using `np.packbits(array, bitorder='little')`. But ideally you
-                should attempt to never have unpacked data in the first place,
-                since it's 8x larger which can be a large performance loss. For
-                example, stim's sampler methods all have a `bit_packed=True` argument
-                that cause them to return bit packed data.
+                The array's dtype should be np.uint8. Unpacked data (an array with
+                dtype np.bool_ whose last axis is the detector axis) is also
+                accepted, and is bit packed one shot at a time while decoding. But
+                ideally you should attempt to never have unpacked data in the first
+                place, since it's 8x larger which can be a large performance loss.
+                For example, stim's sampler methods all have a `bit_packed=True`
+                argument that cause them to return bit packed data.
 
         Returns:
             A bit packed numpy array of observable flip data. The array will have
@@ -163,13 +605,196 @@ class CompiledDecoder:
             >>> assert mistakes < shots / 5
         """
     @staticmethod
+    def predict_obs_flips_from_dets_ptb64(
+        dets: np.ndarray,
+    ) -> np.ndarray:
+        """Predicts observable flips from detection events in stim's ptb64 layout.
+
+        In the ptb64 layout shots are grouped into blocks of 64, and each 64 bit
+        word stores one detector's value for all 64 shots in the block. This is
+        the layout written by stim when using `format='ptb64'`, so data from a
+        ptb64 file can be loaded with
+        `np.fromfile(path, dtype=np.uint64).reshape(-1, num_detectors)`.
+
+        The shots are transposed in 64x64 bit blocks inside the decoder, so there
+        is no need to convert the data in python first. The GIL is released while
+        decoding.
+
+        Args:
+            dets: A numpy array with dtype np.uint64 and shape
+                (num_shots / 64, num_detectors). Bit s of dets[g, d] is the value
+                of detector d in shot g*64 + s.
+
+        Returns:
+            A numpy array of observable flip data, also in ptb64 layout:
+                shape = (num_shots / 64, num_obs)
+                dtype = np.uint64
+
+            To determine if the observable with index k was flipped in shot s, compute:
+                `bool((result[s // 64, k] >> (s % 64)) & 1)`
+
+        Example:
+            >>> import stim
+            >>> import chromobius
+            >>> import numpy as np
+
+            >>> repetition_color_code = stim.Circuit('''
+            ...     X_ERROR(0.1) 0 1 2 3 4 5 6 7
+            ...     MPP Z0*Z1*Z2 Z1*Z2*Z3 Z2*Z3*Z4 Z3*Z4*Z5 Z4*Z5*Z6 Z5*Z6*Z7
+            ...     DETECTOR(0, 0, 0, 2) rec[-6]
+            ...     DETECTOR(1, 0, 0, 0) rec[-5]
+            ...     DETECTOR(2, 0, 0, 1) rec[-4]
+            ...     DETECTOR(3, 0, 0, 2) rec[-3]
+            ...     DETECTOR(4, 0, 0, 0) rec[-2]
+            ...     DETECTOR(5, 0, 0, 1) rec[-1]
+            ...     M 0
+            ...     OBSERVABLE_INCLUDE(0) rec[-1]
+            ... ''')
+            >>> dem = repetition_color_code.detector_error_model()
+            >>> decoder = chromobius.compile_decoder_for_dem(dem)
+
+            >>> # 128 shots. Shot 3 has a detection event at D0.
+            >>> dets = np.zeros(shape=(2, 6), dtype=np.uint64)
+            >>> dets[0, 0] = 1 << 3
+            >>> obs = decoder.predict_obs_flips_from_dets_ptb64(dets)
+            >>> obs.shape
+            (2, 1)
+            >>> int(obs[0, 0]) == 1 << 3
+            True
+        """
+    @staticmethod
+    def predict_obs_flips_from_sparse_dets(
+        indices: np.ndarray,
+        offsets: np.ndarray,
+    ) -> np.ndarray:
+        """Predicts observable flips from sparse detection event data.
+
+        The detection events are given in a compressed sparse row (CSR) style
+        format: the detectors that fired in shot k are
+        `indices[offsets[k]:offsets[k+1]]`. This avoids ever materializing
+        dense detection event data, and is faster than
+        `predict_obs_flips_from_dets_bit_packed` when detection events are rare.
+
+        The GIL is released while decoding.
+
+        Args:
+            indices: A 1-dimensional array of detector indices. The detectors
+                that fired in each shot are stored contiguously, one shot after
+                another. Within a shot the order doesn't matter, but each
+                detector may appear at most once.
+            offsets: A 1-dimensional array with one more entry than there are
+                shots. Shot k's detection events are in
+                `indices[offsets[k]:offsets[k+1]]`. Must be non-decreasing.
+
+        Returns:
+            A bit packed numpy array of observable flip data with:
+                shape = (len(offsets) - 1, math.ceil(num_obs / 8))
+                dtype = np.uint8
+
+            To determine if the observable with index k was flipped in shot s, compute:
+                `bool((result[s, k // 8] >> (k % 8)) & 1)`
+
+        Example:
+            >>> import stim
+            >>> import chromobius
+            >>> import numpy as np
+
+            >>> repetition_color_code = stim.Circuit('''
+            ...     X_ERROR(0.1) 0 1 2 3 4 5 6 7
+            ...     MPP Z0*Z1*Z2 Z1*Z2*Z3 Z2*Z3*Z4 Z3*Z4*Z5 Z4*Z5*Z6 Z5*Z6*Z7
+            ...     DETECTOR(0, 0, 0, 2) rec[-6]
+            ...     DETECTOR(1, 0, 0, 0) rec[-5]
+            ...     DETECTOR(2, 0, 0, 1) rec[-4]
+            ...     DETECTOR(3, 0, 0, 2) rec[-3]
+            ...     DETECTOR(4, 0, 0, 0) rec[-2]
+            ...     DETECTOR(5, 0, 0, 1) rec[-1]
+            ...     M 0
+            ...     OBSERVABLE_INCLUDE(0) rec[-1]
+            ... ''')
+            >>> dem = repetition_color_code.detector_error_model()
+            >>> decoder = chromobius.compile_decoder_for_dem(dem)
+
+            >>> # Shot 0 has no detection events.
+            >>> # Shot 1 has a detection event at D0.
+            >>> # Shot 2 has a detection event at D5.
+            >>> indices = np.array([0, 5], dtype=np.uint64)
+            >>> offsets = np.array([0, 0, 1, 2], dtype=np.uint64)
+            >>> decoder.predict_obs_flips_from_sparse_dets(indices, offsets)
+            array([[0],
+                   [1],
+                   [0]], dtype=uint8)
+        """
+    @staticmethod
+    def predict_obs_flips_with_status_from_dets_bit_packed(
+        dets: np.ndarray,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Predicts observable flips, and whether each shot was decoded.
+
+        Shots can go undecoded when the decoder was compiled with a
+        `max_detection_events` or `shot_time_budget_seconds` limit.
+
+        Args:
+            dets: A bit packed numpy array of detection event data, in the
+                same format as for `predict_obs_flips_from_dets_bit_packed`.
+
+        Returns:
+            A tuple (obs, status).
+            Obs is a bit packed numpy array of observable flip data, in the
+            same format as for `predict_obs_flips_from_dets_bit_packed`.
+            Status is a numpy array (or scalar, for 1D dets) of np.uint8
+            with one entry per shot:
+                0 = Decoded.
+                1 = Not decoded, due to having more than
+                    `max_detection_events` detection events.
+                2 = Not decoded, due to being estimated to take longer
+                    than `shot_time_budget_seconds`.
+                3 = Decoded, but finished after `shot_time_budget_seconds`
+                    ran out. The prediction is kept.
+            Shots that weren't decoded predict no observable flips.
+
+        Example:
+            >>> import stim
+            >>> import chromobius
+            >>> import numpy as np
+
+            >>> repetition_color_code = stim.Circuit('''
+            ...     X_ERROR(0.1) 0 1 2 3 4 5 6 7
+            ...     MPP Z0*Z1*Z2 Z1*Z2*Z3 Z2*Z3*Z4 Z3*Z4*Z5 Z4*Z5*Z6 Z5*Z6*Z7
+            ...     DETECTOR(0, 0, 0, 2) rec[-6]
+            ...     DETECTOR(1, 0, 0, 0) rec[-5]
+            ...     DETECTOR(2, 0, 0, 1) rec[-4]
+            ...     DETECTOR(3, 0, 0, 2) rec[-3]
+            ...     DETECTOR(4, 0, 0, 0) rec[-2]
+            ...     DETECTOR(5, 0, 0, 1) rec[-1]
+            ...     M 0
+            ...     OBSERVABLE_INCLUDE(0) rec[-1]
+            ... ''')
+            >>> dem = repetition_color_code.detector_error_model()
+            >>> decoder = chromobius.compile_decoder_for_dem(
+            ...     dem,
+            ...     max_detection_events=3,
+            ... )
+
+            >>> dets = np.array([[0b000001], [0b111111]], dtype=np.uint8)
+            >>> predict = decoder.predict_obs_flips_with_status_from_dets_bit_packed
+            >>> obs, status = predict(dets)
+            >>> obs
+            array([[1],
+                   [0]], dtype=uint8)
+            >>> status
+            array([0, 1], dtype=uint8)
+        """
+    @staticmethod
     def predict_weighted_obs_flips_from_dets_bit_packed(
         dets: np.ndarray,
     ) -> tuple[np.ndarray, np.ndarray]:
         """Predicts observable flips and weights from detection events.
 
-        The returned weight comes directly from the underlying call to pymatching, not
-        accounting for the lifting process.
+        By default, the returned weight is the weight of the matcher's solution (as
+        reported by pymatching), not accounting for the lifting process. Decoders
+        compiled with `include_lifting_weight=True` also add the weights of the
+        errors that the lifting process inserted to convert between charge colors,
+        so the weight covers the whole predicted correction.
 
         Args:
             dets: A bit packed numpy array of detection event data. The array can either
@@ -177,13 +802,13 @@ class CompiledDecoder:
                 shots to decode, with the first axis being the shot axis and the second
                 axis being the detection event byte axis).
 
-                The array's dtype must be np.uint8. If you have an array of dtype
-                np.bool_, you have data that's not bit packed. You can pack it by
-                using `np.packbits(array, bitorder='little')`. But ideally you
-                should attempt to never have unpacked data in the first place,
-                since it's 8x larger which can be a large performance loss. For
-                example, stim's sampler methods all have a `bit_packed=True` argument
-                that cause them to return bit packed data.
+                The array's dtype should be np.uint8. Unpacked data (an array with
+                dtype np.bool_ whose last axis is the detector axis) is also
+                accepted, and is bit packed one shot at a time while decoding. But
+                ideally you should attempt to never have unpacked data in the first
+                place, since it's 8x larger which can be a large performance loss.
+                For example, stim's sampler methods all have a `bit_packed=True`
+                argument that cause them to return bit packed data.
 
         Returns:
             A tuple (obs, weights).
@@ -243,11 +868,536 @@ class CompiledDecoder:
             >>> result = decoder.predict_weighted_obs_flips_from_dets_bit_packed(dets)
             >>> pred, weights = result
         """
+    @staticmethod
+    def start_match_trace(
+        path: Union[str, pathlib.Path],
+        *,
+        sample_every: int = 1,
+    ) -> None:
+        """Starts recording what the decoder does into a binary trace file.
+
+        For each traced shot, the trace records the detection events, the
+        pairs of mobius nodes matched by the matcher, the euler cycles that
+        were lifted (with the observables flipped by each cycle), and the
+        predicted observable flips. Use `chromobius.read_match_trace` to load
+        the trace into numpy arrays.
+
+        Shots that aren't traced only pay for counting the shot, so sampling
+        a small fraction of the shots has little effect on decoding speed.
+
+        Starting a trace replaces any trace that was already being written.
+        Shots decoded by `predict_future` and `predict_async` are also traced
+        (the worker pool finishes its queued batches, and is then restarted).
+
+        Args:
+            path: Where to write the trace. The file is overwritten.
+            sample_every: Defaults to 1. Only every sample_every'th shot
+                (starting with the first) is traced.
+
+        Example:
+            >>> import pathlib
+            >>> import tempfile
+            >>> import stim
+            >>> import chromobius
+            >>> import numpy as np
+
+            >>> repetition_color_code = stim.Circuit('''
+            ...     X_ERROR(0.1) 0 1 2 3 4 5 6 7
+            ...     MPP Z0*Z1*Z2 Z1*Z2*Z3 Z2*Z3*Z4 Z3*Z4*Z5 Z4*Z5*Z6 Z5*Z6*Z7
+            ...     DETECTOR(0, 0, 0, 2) rec[-6]
+            ...     DETECTOR(1, 0, 0, 0) rec[-5]
+            ...     DETECTOR(2, 0, 0, 1) rec[-4]
+            ...     DETECTOR(3, 0, 0, 2) rec[-3]
+            ...     DETECTOR(4, 0, 0, 0) rec[-2]
+            ...     DETECTOR(5, 0, 0, 1) rec[-1]
+            ...     M 0
+            ...     OBSERVABLE_INCLUDE(0) rec[-1]
+            ... ''')
+            >>> sampler = repetition_color_code.compile_detector_sampler()
+            >>> dets, _ = sampler.sample(
+            ...     shots=100,
+            ...     separate_observables=True,
+            ...     bit_packed=True,
+            ... )
+            >>> decoder = chromobius.compile_decoder_for_dem(
+            ...     repetition_color_code.detector_error_model()
+            ... )
+
+            >>> with tempfile.TemporaryDirectory() as d:
+            ...     path = pathlib.Path(d) / 'trace.bin'
+            ...     decoder.start_match_trace(path, sample_every=10)
+            ...     obs = decoder.predict_obs_flips_from_dets_bit_packed(dets)
+            ...     decoder.stop_match_trace()
+            ...     trace = chromobius.read_match_trace(path)
+            >>> trace['shot']
+            array([ 0, 10, 20, 30, 40, 50, 60, 70, 80, 90], dtype=uint64)
+            >>> np.array_equal(trace['obs_flips'], obs[::10])
+            True
+        """
+    def stop_match_trace(
+        self,
+    ) -> None:
+        """Stops recording the decoder's trace, and closes the trace file.
+
+        Does nothing if no trace is being recorded. See `start_match_trace`.
+        """
+class DecodeServerClient:
+    """A connection to a decoder being run by `chromobius serve`.
+
+    `chromobius serve` keeps a compiled decoder loaded in a long lived process
+    and decodes requests sent to it over a unix domain socket or a localhost
+    TCP port. Requests from all connected clients are decoded concurrently by
+    the server's worker threads.
+
+    Example:
+        >>> import chromobius
+        >>> import numpy as np
+        >>> import os
+        >>> import stim
+        >>> import tempfile
+        >>> import threading
+        >>> import time
+
+        >>> dem = stim.Circuit('''
+        ...     X_ERROR(0.1) 0 1 2 3 4 5 6 7
+        ...     MPP Z0*Z1*Z2 Z1*Z2*Z3 Z2*Z3*Z4 Z3*Z4*Z5
+        ...     DETECTOR(0, 0, 0, 1) rec[-4]
+        ...     DETECTOR(1, 0, 0, 2) rec[-3]
+        ...     DETECTOR(2, 0, 0, 0) rec[-2]
+        ...     DETECTOR(3, 0, 0, 1) rec[-1]
+        ...     M 0
+        ...     OBSERVABLE_INCLUDE(0) rec[-1]
+        ... ''').detector_error_model()
+
+        >>> with tempfile.TemporaryDirectory() as d:
+        ...     dem.to_file(f'{d}/model.dem')
+        ...     server = threading.Thread(target=chromobius.main, kwargs={
+        ...         'command_line_args': [
+        ...             'serve',
+        ...             '--dem', f'{d}/model.dem',
+        ...             '--socket', f'{d}/decoder.sock',
+        ...             '--out', os.devnull,
+        ...         ],
+        ...     })
+        ...     server.start()
+        ...     while not os.path.exists(f'{d}/decoder.sock'):
+        ...         time.sleep(0.01)
+        ...     with chromobius.DecodeServerClient(
+        ...         socket_path=f'{d}/decoder.sock',
+        ...     ) as client:
+        ...         dets = np.array([[0], [1]], dtype=np.uint8)
+        ...         obs = client.predict_obs_flips_from_dets_bit_packed(dets)
+        ...         client.shutdown_server()
+        ...     server.join()
+        >>> obs
+        array([[0],
+               [1]], dtype=uint8)
+    """
+    def __enter__(
+        self,
+    ) -> chromobius.DecodeServerClient:
+        """Returns the client, so that it's closed when the with block exits.
+        """
+    def __exit__(
+        self,
+        exc_type: Any,
+        exc_val: Any,
+        exc_tb: Any,
+    ) -> None:
+        """Closes the connection to the server.
+        """
+    def __init__(
+        self,
+        *,
+        socket_path: Optional[str | pathlib.Path] = None,
+        port: Optional[int] = None,
+    ) -> None:
+        """Connects to a running `chromobius serve` process.
+
+        Args:
+            socket_path: The unix domain socket the server is listening on
+                (its `--socket` argument).
+            port: The localhost TCP port the server is listening on (its
+                `--port` argument). Exactly one of socket_path and port must
+                be specified.
+        """
+    def close(
+        self,
+    ) -> None:
+        """Closes the connection to the server.
+        """
+    @property
+    def num_detectors(
+        self,
+    ) -> int:
+        """The number of detectors in the server's detector error model.
+        """
+    @property
+    def num_observables(
+        self,
+    ) -> int:
+        """The number of observables in the server's detector error model.
+        """
+    def predict_obs_flips_from_dets_bit_packed(
+        self,
+        dets: np.ndarray,
+    ) -> np.ndarray:
+        """Sends detection events to the server and returns its predictions.
+
+        The GIL is released while waiting for the server to respond.
+
+        Args:
+            dets: A bit packed uint8 numpy array of detection event data, with
+                shape (num_shots, ceil(num_detectors / 8)) or, for a single
+                shot, shape (ceil(num_detectors / 8),).
+
+        Returns:
+            A bit packed uint8 numpy array of observable flip predictions, with
+            shape (num_shots, ceil(num_observables / 8)) or, for a single
+            shot, shape (ceil(num_observables / 8),).
+        """
+    def shutdown_server(
+        self,
+    ) -> None:
+        """Tells the server to finish outstanding requests and exit.
+        """
+    def stats(
+        self,
+    ) -> dict[str, Any]:
+        """Returns statistics about the requests the server has decoded.
+
+        Returns:
+            A dictionary with the keys 'requests', 'failed_requests', 'shots',
+            'batches', and 'latency_microseconds'. Requests that arrive while
+            the decoding threads are busy are decoded together, so 'batches'
+            counts the decoding passes that served them. The latency entry
+            is a dictionary with the keys 'count', 'mean', 'p50', 'p90',
+            'p99', and 'max', computed over recently decoded requests.
+            Latency is measured from the server receiving a request to it
+            sending the response.
+        """
+class SlidingWindowDecoder:
+    """A chromobius decoder that decodes shots in overlapping windows of time.
+
+    Detectors are ordered in time using their third coordinate. Each window
+    covers a commit region followed by a buffer region. Pieces of the
+    window's solution that only involve detection events from the commit
+    region are committed, and the rest are decoded again as part of the
+    next window. Detection events can be streamed in as they are measured,
+    so the work done per round doesn't grow with the length of the
+    experiment.
+
+    Example:
+        >>> import chromobius
+        >>> import numpy as np
+        >>> import stim
+
+        >>> circuit = stim.Circuit('''
+        ...     MPP Z0*Z1*Z2 Z1*Z2*Z3 Z2*Z3*Z4 Z3*Z4*Z5 Z4*Z5*Z6 Z5*Z6*Z7
+        ...     REPEAT 20 {
+        ...         X_ERROR(0.01) 0 1 2 3 4 5 6 7
+        ...         MPP Z0*Z1*Z2 Z1*Z2*Z3 Z2*Z3*Z4 Z3*Z4*Z5 Z4*Z5*Z6 Z5*Z6*Z7
+        ...         DETECTOR(0, 0, 0, 2) rec[-6] rec[-12]
+        ...         DETECTOR(1, 0, 0, 0) rec[-5] rec[-11]
+        ...         DETECTOR(2, 0, 0, 1) rec[-4] rec[-10]
+        ...         DETECTOR(3, 0, 0, 2) rec[-3] rec[-9]
+        ...         DETECTOR(4, 0, 0, 0) rec[-2] rec[-8]
+        ...         DETECTOR(5, 0, 0, 1) rec[-1] rec[-7]
+        ...         SHIFT_COORDS(0, 0, 1)
+        ...     }
+        ...     M 0
+        ...     OBSERVABLE_INCLUDE(0) rec[-1]
+        ... ''')
+        >>> decoder = chromobius.SlidingWindowDecoder.from_dem(
+        ...     circuit.detector_error_model(),
+        ...     commit_duration=2,
+        ...     buffer_duration=4,
+        ... )
+
+        >>> dets, obs = circuit.compile_detector_sampler().sample(
+        ...     shots=100,
+        ...     separate_observables=True,
+        ...     bit_packed=True,
+        ... )
+        >>> predictions = decoder.predict_obs_flips_from_dets_bit_packed(dets)
+        >>> assert np.count_nonzero(predictions != obs) < 10
+    """
+    def add_detection_events(
+        self,
+        detectors: np.ndarray,
+    ) -> None:
+        """Adds detection events to the shot being streamed.
+
+        Detection events can be added in any order, but must be added
+        before `advance_to_time` is called with a time after their time
+        coordinate.
+
+        Args:
+            detectors: A 1D array of the indices of detectors that fired.
+        """
+    def advance_to_time(
+        self,
+        time: float,
+    ) -> None:
+        """Decodes every window that's complete as of the given time.
+
+        Args:
+            time: All detection events with a time coordinate before this
+                time have been added.
+        """
+    @property
+    def buffer_duration(
+        self,
+    ) -> float:
+        """How much time after each commit region is decoded but not committed.
+        """
+    @property
+    def commit_duration(
+        self,
+    ) -> float:
+        """How much time (in units of the time coordinate) each window commits.
+        """
+    def finish(
+        self,
+    ) -> np.ndarray:
+        """Decodes the rest of the streamed shot and returns its prediction.
+
+        The decoder is then ready to stream the next shot.
+
+        Returns:
+            A bit packed uint8 numpy array of the predicted observable
+            flips, with shape (ceil(num_observables / 8),).
+
+        Example:
+            >>> import chromobius
+            >>> import numpy as np
+            >>> import stim
+
+            >>> dem = stim.DetectorErrorModel('''
+            ...     error(0.1) D0 L0
+            ...     error(0.1) D0 D1
+            ...     error(0.1) D1 D2
+            ...     detector(0, 0, 0, 0) D0
+            ...     detector(0, 0, 1, 0) D1
+            ...     detector(0, 0, 2, 0) D2
+            ... ''')
+            >>> decoder = chromobius.SlidingWindowDecoder.from_dem(
+            ...     dem,
+            ...     commit_duration=1,
+            ...     buffer_duration=1,
+            ... )
+            >>> decoder.add_detection_events(np.array([0], dtype=np.uint64))
+            >>> decoder.advance_to_time(1)
+            >>> decoder.finish()
+            array([1], dtype=uint8)
+        """
+    @staticmethod
+    def from_dem(
+        dem: stim.DetectorErrorModel,
+        *,
+        commit_duration: float,
+        buffer_duration: float,
+    ) -> chromobius.SlidingWindowDecoder:
+        """Compiles a sliding window decoder for a stim detector error model.
+
+        Args:
+            dem: A stim detector error model, meeting the requirements
+                described in `chromobius.compile_decoder_for_dem`. The third
+                coordinate of each detector is used as its time. Unlike
+                `chromobius.compile_decoder_for_dem`, the dem can't have more
+                than 64 observables, because committed pieces of a window's
+                solution only track the first 64 observables.
+            commit_duration: How much time (in units of the time coordinate)
+                each window commits. Must be positive.
+            buffer_duration: How much time after the commit region is
+                included in each window without being committed. Longer
+                buffers give predictions closer to decoding the whole shot
+                at once (a buffer at least as long as the code distance is
+                typical), at the cost of more work per window.
+
+        Returns:
+            The configured decoder.
+
+        Raises:
+            ValueError: The dem has more than 64 observables.
+        """
+    @property
+    def num_windows_decoded(
+        self,
+    ) -> int:
+        """The number of windows decoded for the current (or most recent) shot.
+        """
+    def predict_obs_flips_from_dets_bit_packed(
+        self,
+        dets: np.ndarray,
+    ) -> np.ndarray:
+        """Predicts observable flips by streaming whole shots through windows.
+
+        Args:
+            dets: A bit packed uint8 numpy array of detection event data, with
+                shape (num_shots, ceil(num_detectors / 8)) or, for a single
+                shot, shape (ceil(num_detectors / 8),).
+
+        Returns:
+            A bit packed uint8 numpy array of observable flip predictions, with
+            shape (num_shots, ceil(num_observables / 8)) or, for a single
+            shot, shape (ceil(num_observables / 8),).
+        """
+def collect_errors(
+    circuit: stim.Circuit,
+    *,
+    shots: int,
+    max_errors: Optional[int] = None,
+    num_threads: int = 1,
+    seed: Optional[int] = None,
+) -> dict[str, Any]:
+    """Samples a circuit and decodes the samples, counting decoding failures.
+
+    The circuit's detector sampler and the decoder are compiled once. Batches of
+    shots are then sampled and decoded by worker threads, entirely in C++ and
+    without holding the GIL. This is much faster than sampling with stim in
+    python and passing the samples into a `chromobius.CompiledDecoder`.
+
+    Args:
+        circuit: The noisy stim circuit to sample. Its detectors must have
+            basis+color annotations (see `chromobius.compile_decoder_for_dem`).
+        shots: The maximum number of shots to take.
+        max_errors: Defaults to None (unlimited). Sampling stops early once
+            this many errors have been seen. Batches that are already being
+            worked on are finished, so the final error count can slightly
+            exceed this value.
+        num_threads: Defaults to 1. The number of worker threads to use.
+        seed: Defaults to None (seed from system entropy). Makes the sampling
+            deterministic. The results also depend on num_threads when
+            max_errors causes sampling to stop early.
+
+    Returns:
+        A dictionary with the keys 'shots', 'errors', 'discards', and
+        'seconds'. The values match the meaning of the fields of
+        `sinter.AnonTaskStats`, so the result can be passed into it via
+        `sinter.AnonTaskStats(**result)`. The 'seconds' value is the total
+        thread time spent sampling and decoding.
+
+    Example:
+        >>> import stim
+        >>> import chromobius
+
+        >>> repetition_color_code = stim.Circuit('''
+        ...     X_ERROR(0.1) 0 1 2 3 4 5 6 7
+        ...     MPP Z0*Z1*Z2 Z1*Z2*Z3 Z2*Z3*Z4 Z3*Z4*Z5 Z4*Z5*Z6 Z5*Z6*Z7
+        ...     DETECTOR(0, 0, 0, 2) rec[-6]
+        ...     DETECTOR(1, 0, 0, 0) rec[-5]
+        ...     DETECTOR(2, 0, 0, 1) rec[-4]
+        ...     DETECTOR(3, 0, 0, 2) rec[-3]
+        ...     DETECTOR(4, 0, 0, 0) rec[-2]
+        ...     DETECTOR(5, 0, 0, 1) rec[-1]
+        ...     M 0
+        ...     OBSERVABLE_INCLUDE(0) rec[-1]
+        ... ''')
+
+        >>> result = chromobius.collect_errors(
+        ...     repetition_color_code,
+        ...     shots=4096,
+        ...     num_threads=2,
+        ... )
+        >>> result['shots']
+        4096
+        >>> result['errors'] < 4096 / 5
+        True
+    """
+def compile_decoder_for_circuit(
+    circuit: stim.Circuit,
+    *,
+    split_bases: bool = False,
+    decode_bases_concurrently: bool = False,
+    max_detection_events: Optional[int] = None,
+    shot_time_budget_seconds: Optional[float] = None,
+    max_mobius_error_weight: Optional[float] = None,
+    fold_pruned_mobius_errors: bool = False,
+    slim: bool = False,
+    compact: bool = False,
+    include_lifting_weight: bool = False,
+    cluster_threads: int = 0,
+) -> chromobius.CompiledDecoder:
+    """Compiles a decoder for a stim circuit.
+
+    Error analysis and decoder configuration happen in one native call,
+    without holding the GIL. Loops in the circuit are folded during error
+    analysis, and the detector error model is never converted into a
+    python object. This is much faster than calling
+    `circuit.detector_error_model()` followed by
+    `chromobius.compile_decoder_for_dem` for circuits with many rounds.
+
+    The resulting decoder is the same as the one produced by
+    `chromobius.compile_decoder_for_dem(circuit.detector_error_model(
+    approximate_disjoint_errors=True))`.
+
+    Args:
+        circuit: A stim circuit. The circuit's detectors must be
+            annotated with their basis and color, using the 4th
+            coordinate convention described in
+            `chromobius.compile_decoder_for_dem`.
+        split_bases: See `chromobius.compile_decoder_for_dem`.
+        decode_bases_concurrently: See
+            `chromobius.compile_decoder_for_dem`.
+        max_detection_events: See `chromobius.compile_decoder_for_dem`.
+        shot_time_budget_seconds: See
+            `chromobius.compile_decoder_for_dem`.
+        max_mobius_error_weight: See
+            `chromobius.compile_decoder_for_dem`.
+        fold_pruned_mobius_errors: See
+            `chromobius.compile_decoder_for_dem`.
+        slim: See `chromobius.compile_decoder_for_dem`.
+        compact: See `chromobius.compile_decoder_for_dem`.
+        include_lifting_weight: See `chromobius.compile_decoder_for_dem`.
+        cluster_threads: See `chromobius.compile_decoder_for_dem`.
+
+    Returns:
+        A decoder object that can be used to predict observable flips from
+        detection event samples.
+
+    Example:
+        >>> import numpy as np
+        >>> import stim
+        >>> import chromobius
+
+        >>> circuit = stim.Circuit('''
+        ...     X_ERROR(0.1) 0 1 2 3 4 5 6 7
+        ...     MPP Z0*Z1*Z2 Z1*Z2*Z3 Z2*Z3*Z4 Z3*Z4*Z5
+        ...     DETECTOR(0, 0, 0, 1) rec[-4]
+        ...     DETECTOR(1, 0, 0, 2) rec[-3]
+        ...     DETECTOR(2, 0, 0, 0) rec[-2]
+        ...     DETECTOR(3, 0, 0, 1) rec[-1]
+        ...     M 0
+        ...     OBSERVABLE_INCLUDE(0) rec[-1]
+        ... ''')
+
+        >>> decoder = chromobius.compile_decoder_for_circuit(circuit)
+        >>> decoder.predict_obs_flips_from_dets_bit_packed(
+        ...     np.array([[0b0001]], dtype=np.uint8),
+        ... )
+        array([[1]], dtype=uint8)
+    """
 def compile_decoder_for_dem(
     dem: stim.DetectorErrorModel,
+    *,
+    split_bases: bool = False,
+    decode_bases_concurrently: bool = False,
+    max_detection_events: Optional[int] = None,
+    shot_time_budget_seconds: Optional[float] = None,
+    max_mobius_error_weight: Optional[float] = None,
+    fold_pruned_mobius_errors: bool = False,
+    slim: bool = False,
+    compact: bool = False,
+    include_lifting_weight: bool = False,
+    cluster_threads: int = 0,
 ) -> chromobius.CompiledDecoder:
     """Compiles a decoder for a stim detector error model.
 
+    The dem may have any number of observables. Observables past the first
+    64 are handled by lifting each shot's matching once per group of 64
+    observables, which adds a little to the time spent decoding each shot.
+
     Args:
         dem: A stim detector error model. The detector error model must satisfy:
             1. Basis+Color annotations. Every detector that appears in an error
@@ -275,6 +1425,76 @@ def compile_decoder_for_dem(
                 matchable code, at least one of the colors must be avoided.
                 Otherwise the matcher may be given a problem that can be solved
                 locally, but when lifting it needs to be solved non-locally.
+        split_bases: Defaults to False. When set, the X basis and Z basis
+            parts of the matching problem get separate matchers and are
+            solved independently, using smaller working sets. Requires
+            that every error decomposes into a purely X part and a purely
+            Z part (e.g. a Y error in a CSS color code).
+        decode_bases_concurrently: Defaults to False. When set (along
+            with split_bases), shots with detection events in both bases
+            decode their X part on a helper thread while the calling
+            thread decodes the Z part. This only pays for itself when
+            individual shots take a long time to decode.
+        max_detection_events: Defaults to None (no limit). Shots with
+            more detection events than this aren't decoded. They
+            predict no observable flips, and are reported as status 1
+            by `predict_obs_flips_with_status_from_dets_bit_packed`.
+        shot_time_budget_seconds: Defaults to None (no limit). The
+            matcher can't be interrupted, so the budget is enforced
+            before matching, using a running estimate of the decoding
+            time per detection event learned from earlier shots.
+            Shots estimated to take longer than this aren't decoded.
+            They predict no observable flips, and are reported as
+            status 2 by
+            `predict_obs_flips_with_status_from_dets_bit_packed`.
+            Shots that are decoded but finish late keep their
+            prediction, and are reported as status 3. The estimate
+            starts at zero, so early or unusually hard shots can still
+            overrun the budget.
+        max_mobius_error_weight: Defaults to None (no pruning). Errors
+            in the matching problem with a weight ln((1-p)/p) above
+            this are pruned, shrinking the matching graph. The number
+            of matching graph edges that were removed is reported by
+            `CompiledDecoder.num_pruned_mobius_edges`. Pruning too
+            aggressively can disconnect the matching graph, causing
+            decoding to fail.
+        fold_pruned_mobius_errors: Defaults to False. When set, the
+            probability of each pruned error is folded into the edges
+            it shares with kept errors, instead of being discarded.
+        slim: Defaults to False. When set, data that's only needed
+            while compiling the decoder is freed afterwards, reducing
+            the decoder's memory footprint without changing its
+            predictions. Useful when many decoders are kept alive at
+            once. See `CompiledDecoder.memory_usage`.
+        compact: Defaults to False. Implies `slim`. When set, the
+            lookup tables used to lift the matcher's solutions are
+            moved into sorted arrays on read-only memory pages.
+            Clones of the decoder (e.g. the worker threads used by
+            `CompiledDecoder.predict_future`) share the arrays, and so
+            do worker processes forked after compiling the decoder,
+            because the pages are never written and so are never
+            copied on write. Predictions are unchanged.
+        include_lifting_weight: Defaults to False. When set, the weights
+            returned by `predict_weighted_obs_flips_from_dets_bit_packed`
+            include the cost of lifting the matcher's solution. Lifting
+            applies rgb representative errors (errors with one symptom of
+            each color) to convert between charge colors, and each one it
+            applies adds its weight ln((1-p)/p) to the shot's weight. The
+            weights are accumulated while lifting, so reporting them
+            costs nothing extra per shot. Predictions are unchanged.
+        cluster_threads: Defaults to 0. When at least 2, each shot is
+            split into clusters of detection events that can be matched
+            independently, and the clusters are matched in parallel by
+            this many threads. The predictions have the same weight as
+            matching the whole shot at once (ties between equally likely
+            predictions may be broken differently). This lowers the
+            latency of shots from large patches with sparse detection
+            events, when there are spare cores. Shots whose clusters
+            percolate are matched whole, and the shots after them skip
+            clustering, so dense shots cost about the same as without
+            clustering. On one thread clustering is only extra work, so
+            values below 2 disable it. Can't be combined with
+            max_detection_events or shot_time_budget_seconds.
 
     Returns:
         A decoder object that can be used to predict observable flips from
@@ -297,14 +1517,200 @@ def compile_decoder_for_dem(
 
         >>> decoder = chromobius.compile_decoder_for_dem(dem)
     """
+def main(
+    *,
+    command_line_args: list[str],
+) -> int:
+    """Runs the command line tool version of chromobius on the given arguments.
+
+    The GIL is released while the command runs, so long running commands
+    such as `serve` can be run on a background thread.
+
+    Args:
+        command_line_args: The arguments to pass to the command line tool,
+            starting with the name of the command (e.g. 'predict').
+
+    Returns:
+        An exit code (0 means success, not zero means failure).
+
+    Example:
+        >>> import chromobius
+        >>> import tempfile
+        >>> with tempfile.TemporaryDirectory() as d:
+        ...     with open(f'{d}/in.dem', 'w') as f:
+        ...         print('error(0.1) D0 L0', file=f)
+        ...         print('detector(0, 0, 0, 0) D0', file=f)
+        ...     with open(f'{d}/in.01', 'w') as f:
+        ...         print('0', file=f)
+        ...         print('1', file=f)
+        ...     return_code = chromobius.main(command_line_args=[
+        ...         'predict',
+        ...         '--dem', f'{d}/in.dem',
+        ...         '--in', f'{d}/in.01',
+        ...         '--in_format', '01',
+        ...         '--out', f'{d}/out.01',
+        ...     ])
+        ...     assert return_code == 0
+        ...     with open(f'{d}/out.01') as f:
+        ...         print(f.read(), end='')
+        0
+        1
+    """
+def profile_configuration(
+    dem: stim.DetectorErrorModel,
+    *,
+    split_bases: bool = False,
+    decode_bases_concurrently: bool = False,
+    max_detection_events: Optional[int] = None,
+    shot_time_budget_seconds: Optional[float] = None,
+    max_mobius_error_weight: Optional[float] = None,
+    fold_pruned_mobius_errors: bool = False,
+    slim: bool = False,
+    compact: bool = False,
+    include_lifting_weight: bool = False,
+    cluster_threads: int = 0,
+) -> dict[str, Any]:
+    """Measures how long each stage of configuring a decoder takes.
+
+    Configures a decoder for the given dem (with the same arguments as
+    `chromobius.compile_decoder_for_dem`), and reports the time spent in
+    each stage of configuration along with the number of objects (atomic
+    errors, mobius edges, drag graph entries, ...) that were produced.
+    The same report is printed by `chromobius describe_decoder --profile`.
+
+    Memory is reported using the process's peak resident memory, which
+    only grows when a stage uses more memory than any earlier point in
+    the process. It's 0 on platforms where it isn't available.
+
+    Returns:
+        A JSON-compatible dictionary with these keys:
+            'stages': A list of dictionaries, in the order the stages
+                ran, with the keys 'name', 'seconds', 'peak_rss_bytes',
+                and 'peak_rss_growth_bytes'.
+            'total_seconds': The total time spent in the stages.
+            'counts': A dictionary mapping names like
+                'num_atomic_errors' to object counts.
+
+    Example:
+        >>> import stim
+        >>> import chromobius
+        >>> dem = stim.Circuit('''
+        ...     X_ERROR(0.1) 0 1 2 3 4 5 6 7
+        ...     MPP Z0*Z1*Z2 Z1*Z2*Z3 Z2*Z3*Z4 Z3*Z4*Z5 Z4*Z5*Z6 Z5*Z6*Z7
+        ...     DETECTOR(0, 0, 0, 2) rec[-6]
+        ...     DETECTOR(1, 0, 0, 0) rec[-5]
+        ...     DETECTOR(2, 0, 0, 1) rec[-4]
+        ...     DETECTOR(3, 0, 0, 2) rec[-3]
+        ...     DETECTOR(4, 0, 0, 0) rec[-2]
+        ...     DETECTOR(5, 0, 0, 1) rec[-1]
+        ...     M 0
+        ...     OBSERVABLE_INCLUDE(0) rec[-1]
+        ... ''').detector_error_model()
+
+        >>> profile = chromobius.profile_configuration(dem)
+        >>> [stage['name'] for stage in profile['stages']][:3]
+        ['collect_nodes', 'collect_atomic_errors', 'decompose_composite_errors']
+        >>> profile['counts']['num_detectors']
+        6
+        >>> profile['total_seconds'] >= 0
+        True
+    """
+def read_match_trace(
+    path: Union[str, pathlib.Path],
+) -> dict[str, Any]:
+    """Loads a trace written by `chromobius.CompiledDecoder.start_match_trace`.
+
+    Mobius nodes are identified by detector: mobius node 2*d+k (for k in
+    [0, 1]) is one of the two mobius nodes of detector d.
+
+    Variable length data is concatenated across records, with offset
+    arrays marking where each record's data starts. For example, the
+    detection events of record k are
+    `trace['dets'][trace['det_offsets'][k]:trace['det_offsets'][k + 1]]`.
+
+    Args:
+        path: The trace file to read.
+
+    Returns:
+        A dictionary with these keys:
+            'num_detectors', 'num_observables': ints describing the dem
+                of the decoder that wrote the trace.
+            'shot': uint64 array with the index of each record's shot.
+            'weight': float32 array with the weight of each record's
+                matching.
+            'status': uint8 array with each record's decode status (0 =
+                decoded, 1 = too many detection events, 2 = over time
+                budget, 3 = decoded late).
+            'obs_flips': uint8 array of shape (num_records,
+                ceil(num_observables / 8)) with each record's bit
+                packed prediction.
+            'dets', 'det_offsets': the detectors that fired.
+            'edges', 'edge_offsets': int64 array of shape (num_edges, 2)
+                holding the mobius nodes matched together (-1 is the
+                boundary), and where each record's edges start.
+            'cycle_nodes', 'cycle_offsets': the mobius nodes of each
+                lifted euler cycle, and where each cycle starts.
+            'cycle_obs_flips': uint64 array with the flips of the first
+                64 observables produced by lifting each cycle.
+            'shot_cycle_offsets': where each record's cycles start.
+
+    Example:
+        >>> import pathlib
+        >>> import tempfile
+        >>> import stim
+        >>> import chromobius
+        >>> import numpy as np
+
+        >>> repetition_color_code = stim.Circuit('''
+        ...     X_ERROR(0.1) 0 1 2 3 4 5 6 7
+        ...     MPP Z0*Z1*Z2 Z1*Z2*Z3 Z2*Z3*Z4 Z3*Z4*Z5 Z4*Z5*Z6 Z5*Z6*Z7
+        ...     DETECTOR(0, 0, 0, 2) rec[-6]
+        ...     DETECTOR(1, 0, 0, 0) rec[-5]
+        ...     DETECTOR(2, 0, 0, 1) rec[-4]
+        ...     DETECTOR(3, 0, 0, 2) rec[-3]
+        ...     DETECTOR(4, 0, 0, 0) rec[-2]
+        ...     DETECTOR(5, 0, 0, 1) rec[-1]
+        ...     M 0
+        ...     OBSERVABLE_INCLUDE(0) rec[-1]
+        ... ''')
+        >>> decoder = chromobius.compile_decoder_for_dem(
+        ...     repetition_color_code.detector_error_model()
+        ... )
+
+        >>> with tempfile.TemporaryDirectory() as d:
+        ...     path = pathlib.Path(d) / 'trace.bin'
+        ...     decoder.start_match_trace(path)
+        ...     _ = decoder.predict_obs_flips_from_dets_bit_packed(
+        ...         np.array([[0b101000]], dtype=np.uint8)
+        ...     )
+        ...     decoder.stop_match_trace()
+        ...     trace = chromobius.read_match_trace(path)
+        >>> trace['dets']
+        array([3, 5], dtype=uint32)
+        >>> len(trace['edges']) > 0
+        True
+        >>> int(trace['cycle_obs_flips'][0])
+        0
+    """
 def sinter_decoders() -> dict[str, sinter.Decoder]:
     """A dictionary describing chromobius to sinter.
 
     Giving the result of this function to the `custom_decoders` argument of
-    `sinter.collect` will tell sinter about the decoder 'chromobius'. On the
-    command line, the equivalent argument is
+    `sinter.collect` will tell sinter about the decoder 'chromobius' and its
+    variants. On the command line, the equivalent argument is
     `--custom_decoders 'chromobius:sinter_decoders'`.
 
+    The variants are:
+        'chromobius': The default configuration.
+        'chromobius-mt': Each sinter worker splits its batches of shots
+            across one thread per core. Useful when there are fewer
+            sinter tasks than cores, which would otherwise leave cores
+            idle.
+
+    Custom variants can be made by creating instances of
+    `chromobius._ChromobiusSinterDecoder` with the desired options.
+
     Returns:
-        The dict `{'chromobius': <an object compatible with sinter.Decoder>}`.
+        A dict mapping decoder names to objects compatible with
+        sinter.Decoder.
     """
@@ -7,15 +7,23 @@
 #include "chromobius/commands/main_benchmark.h"
 #include "chromobius/commands/main_describe_decoder.h"
 #include "chromobius/commands/main_predict.h"
+#include "chromobius/commands/main_serve.h"
+#include "chromobius/commands/serve_protocol.h"
 #include "chromobius/datatypes/atomic_error.h"
 #include "chromobius/datatypes/color_basis.h"
 #include "chromobius/datatypes/conf.h"
 #include "chromobius/datatypes/rgb_edge.h"
 #include "chromobius/datatypes/stim_integration.h"
 #include "chromobius/datatypes/xor_vec.h"
+#include "chromobius/decode/cluster_decoder.h"
+#include "chromobius/decode/collect_errors.h"
+#include "chromobius/decode/configuration_profile.h"
 #include "chromobius/decode/decoder.h"
+#include "chromobius/decode/decoder_pool.h"
+#include "chromobius/decode/match_trace.h"
 #include "chromobius/decode/matcher_interface.h"
 #include "chromobius/decode/pymatcher.h"
+#include "chromobius/decode/sliding_window_decoder.h"
 #include "chromobius/graph/charge_graph.h"
 #include "chromobius/graph/choose_rgb_reps.h"
 #include "chromobius/graph/collect_atomic_errors.h"
@@ -23,4 +31,6 @@
 #include "chromobius/graph/collect_nodes.h"
 #include "chromobius/graph/drag_graph.h"
 #include "chromobius/graph/euler_tours.h"
+#include "chromobius/graph/flip_sources.h"
+#include "chromobius/graph/split_mobius_dem.h"
 #endif
@@ -21,6 +21,7 @@
 #include "chromobius/commands/main_benchmark.h"
 #include "chromobius/commands/main_describe_decoder.h"
 #include "chromobius/commands/main_predict.h"
+#include "chromobius/commands/main_serve.h"
 
 using namespace chromobius;
 
@@ -39,15 +40,20 @@ Available chromobius commands:
     # Predict observable flips from detection event data.
     chromobius predict \
         [--dem FILEPATH] \                     # where to read detector error model from
+        [--circuit FILEPATH] \                 # where to read a circuit to analyze from (instead of --dem)
         [--in] \                               # where to read detection event data (defaults to stdin)
-        [--in_format 01|b8|...] \              # format of input detection event data
+        [--in_format 01|b8|ptb64|...] \        # format of input detection event data
         [--in_includes_appended_observables] \ # if set, input data includes observables as extra detectors to ignore
         [--out FILEPATH] \                     # where to write predictions to (defaults to stdout)
-        [--out_format 01|b8|...]               # format to use when writing predictions
+        [--out_format 01|b8|ptb64|...] \       # format to use when writing predictions
+        [--match_trace_out FILEPATH] \         # where to write a binary trace of the matcher's solutions
+        [--match_trace_sample_every N] \       # only trace every Nth shot (defaults to 1)
+        [--cluster_threads N]                  # if at least 2, match clusters of each shot on N threads
 
     # Print accuracy and timing statistics collected while decoding.
     chromobius benchmark
         [--dem FILEPATH] \                     # where to read detector error model from
+        [--circuit FILEPATH] \                 # where to read a circuit to analyze from (instead of --dem)
         [--in] \                               # where to read detection event data (defaults to stdin)
         [--in_format 01|b8|...] \              # format of input detection event data
         [--in_includes_appended_observables] \ # if set, observables are extra detectors in detection event data
@@ -59,7 +65,17 @@ Available chromobius commands:
     chromobius describe_decoder \
         [--in] \           # where to read a detector error model from (defaults to stdin)
         [--circuit] \      # where to read a circuit from (overrides --in)
-        [--out FILEPATH]   # where to write output (defaults to stdout)
+        [--out FILEPATH] \ # where to write output (defaults to stdout)
+        [--profile]        # instead of describing the decoder, print JSON timing each configuration stage
+
+    # Keep a decoder loaded and decode requests sent over a local socket (not available on Windows).
+    chromobius serve \
+        --dem FILEPATH \              # where to read detector error model from
+        [--socket FILEPATH] \         # unix domain socket to listen on
+        [--port INT] \                # localhost TCP port to listen on (instead of --socket)
+        [--num_threads INT] \         # number of decoding threads (defaults to the number of cores)
+        [--max_queued_requests INT] \ # requests buffered before readers wait (defaults to 2*num_threads)
+        [--out FILEPATH]              # where to write request statistics when exiting (defaults to stdout)
 )HELP";
 
     if (strcmp(command, "describe_decoder") == 0) {
@@ -71,6 +87,9 @@ Available chromobius commands:
     if (strcmp(command, "benchmark") == 0) {
         return main_benchmark(argc, argv);
     }
+    if (strcmp(command, "serve") == 0) {
+        return main_serve(argc, argv);
+    }
     if (strcmp(command, "help") == 0 || strcmp(command, "--help") == 0 || strcmp(command, "-help") == 0 ||
         strcmp(command, "-h") == 0) {
         std::cout << help;
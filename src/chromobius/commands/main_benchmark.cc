@@ -16,6 +16,7 @@
 
 #include <chrono>
 
+#include "chromobius/datatypes/stim_integration.h"
 #include "chromobius/decode/decoder.h"
 
 using namespace chromobius;
@@ -32,6 +33,7 @@ int chromobius::main_benchmark(int argc, const char **argv) {
             "--obs_in_format",
             "--out",
             "--dem",
+            "--circuit",
         },
         {},
         "benchmark",
@@ -44,7 +46,6 @@ int chromobius::main_benchmark(int argc, const char **argv) {
         obs_in = stim::find_open_file_argument("--obs_in", nullptr, "rb", argc, argv);
     }
     FILE *stats_out = stim::find_open_file_argument("--out", stdout, "wb", argc, argv);
-    FILE *dem_file = stim::find_open_file_argument("--dem", nullptr, "rb", argc, argv);
     stim::FileFormatData shots_in_format =
         stim::find_enum_argument("--in_format", "01", stim::format_name_to_enum_map(), argc, argv);
     stim::FileFormatData obs_in_format =
@@ -54,8 +55,20 @@ int chromobius::main_benchmark(int argc, const char **argv) {
         throw std::invalid_argument("Must specify --in_includes_appended_observables or --obs_in.");
     }
 
-    stim::DetectorErrorModel dem = stim::DetectorErrorModel::from_file(dem_file);
-    fclose(dem_file);
+    stim::DetectorErrorModel dem;
+    if (stim::find_argument("--circuit", argc, argv) != nullptr) {
+        if (stim::find_argument("--dem", argc, argv) != nullptr) {
+            throw std::invalid_argument("Specified both --dem and --circuit.");
+        }
+        FILE *circuit_file = stim::find_open_file_argument("--circuit", nullptr, "rb", argc, argv);
+        auto circuit = stim::Circuit::from_file(circuit_file);
+        fclose(circuit_file);
+        dem = circuit_to_decoding_dem(circuit);
+    } else {
+        FILE *dem_file = stim::find_open_file_argument("--dem", nullptr, "rb", argc, argv);
+        dem = stim::DetectorErrorModel::from_file(dem_file);
+        fclose(dem_file);
+    }
     auto num_obs = dem.count_observables();
     auto num_dets = dem.count_detectors();
 
@@ -87,9 +100,11 @@ int chromobius::main_benchmark(int argc, const char **argv) {
         num_detection_events += buf_dets.popcnt();
         auto prediction =
             decoder.decode_detection_events({buf_dets.u8, buf_dets.u8 + buf_dets.num_u8_padded()});
-        if (buf_obs.u64[0] != prediction) {
-            num_mistakes++;
+        bool mistake = buf_obs.u64[0] != prediction;
+        for (size_t c = 0; c < decoder.extra_obs_flips.size(); c++) {
+            mistake |= buf_obs.u64[c + 1] != decoder.extra_obs_flips[c];
         }
+        num_mistakes += mistake;
         num_shots++;
     }
 
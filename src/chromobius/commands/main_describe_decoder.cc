@@ -14,6 +14,7 @@
 
 #include "chromobius/commands/main_describe_decoder.h"
 
+#include "chromobius/datatypes/stim_integration.h"
 #include "chromobius/decode/decoder.h"
 #include "stim.h"
 
@@ -25,6 +26,7 @@ int chromobius::main_describe_decoder(int argc, const char **argv) {
             "--in",
             "--out",
             "--circuit",
+            "--profile",
         },
         {},
         "describe_decoder",
@@ -40,13 +42,20 @@ int chromobius::main_describe_decoder(int argc, const char **argv) {
         FILE *circuit_in = stim::find_open_file_argument("--circuit", nullptr, "rb", argc, argv);
         auto circuit = stim::Circuit::from_file(circuit_in);
         fclose(circuit_in);
-        dem = stim::ErrorAnalyzer::circuit_to_detector_error_model(circuit, false, true, false, true, false, false);
+        dem = circuit_to_decoding_dem(circuit);
     } else {
         FILE *dem_in = stim::find_open_file_argument("--in", stdin, "rb", argc, argv);
         dem = stim::DetectorErrorModel::from_file(dem_in);
         fclose(dem_in);
     }
 
+    if (stim::find_bool_argument("--profile", argc, argv)) {
+        ConfigurationProfile profile;
+        Decoder::from_dem(dem, DecoderConfigOptions{.profile = &profile});
+        out << profile.to_json() << "\n";
+        return EXIT_SUCCESS;
+    }
+
     auto decoder = Decoder::from_dem(dem, DecoderConfigOptions{.include_coords_in_mobius_dem=true});
     out << decoder;
     out << "\n";
@@ -71,3 +71,29 @@ error(0.01000000000000000194) D2 D3
 }
 )stdout");
 }
+
+TEST(main_describe_decoder, profile) {
+    auto result = result_of_running_main(
+        {"describe_decoder", "--profile"},
+        R"stdin(
+        error(0.1) D0 L0
+        error(0.1) D0 D1 L1
+        error(0.1) D1 L2
+        detector(0, 0, 0, 0) D0
+        detector(0, 0, 0, 1) D1
+      )stdin");
+    for (const char *expected : {
+             "\"name\": \"collect_nodes\"",
+             "\"name\": \"decompose_composite_errors\"",
+             "\"name\": \"drag_graph\"",
+             "\"name\": \"matcher\"",
+             "\"total_seconds\": ",
+             "\"num_detectors\": 2,",
+             "\"num_atomic_errors\": 3,",
+             "\"num_mobius_edges\": 4,",
+             "\"num_charge_graph_edges\": 5,",
+             "\"num_drag_graph_entries\": 14\n",
+         }) {
+        ASSERT_NE(result.find(expected), std::string::npos) << expected << "\n" << result;
+    }
+}
@@ -14,6 +14,7 @@
 
 #include "chromobius/commands/main_predict.h"
 
+#include "chromobius/datatypes/stim_integration.h"
 #include "chromobius/decode/decoder.h"
 #include "stim.h"
 
@@ -28,6 +29,10 @@ int chromobius::main_predict(int argc, const char **argv) {
             "--out",
             "--out_format",
             "--dem",
+            "--circuit",
+            "--match_trace_out",
+            "--match_trace_sample_every",
+            "--cluster_threads",
         },
         {},
         "predict",
@@ -36,38 +41,89 @@ int chromobius::main_predict(int argc, const char **argv) {
 
     FILE *shots_in = stim::find_open_file_argument("--in", stdin, "rb", argc, argv);
     FILE *predictions_out = stim::find_open_file_argument("--out", stdout, "wb", argc, argv);
-    FILE *dem_file = stim::find_open_file_argument("--dem", nullptr, "rb", argc, argv);
     stim::FileFormatData shots_in_format =
         stim::find_enum_argument("--in_format", "b8", stim::format_name_to_enum_map(), argc, argv);
     stim::FileFormatData predictions_out_format =
         stim::find_enum_argument("--out_format", "01", stim::format_name_to_enum_map(), argc, argv);
     bool append_obs = stim::find_bool_argument("--in_includes_appended_observables", argc, argv);
 
-    stim::DetectorErrorModel dem = stim::DetectorErrorModel::from_file(dem_file);
-    fclose(dem_file);
-    auto decoder = Decoder::from_dem(dem, DecoderConfigOptions{});
+    stim::DetectorErrorModel dem;
+    if (stim::find_argument("--circuit", argc, argv) != nullptr) {
+        if (stim::find_argument("--dem", argc, argv) != nullptr) {
+            throw std::invalid_argument("Specified both --dem and --circuit.");
+        }
+        FILE *circuit_file = stim::find_open_file_argument("--circuit", nullptr, "rb", argc, argv);
+        auto circuit = stim::Circuit::from_file(circuit_file);
+        fclose(circuit_file);
+        dem = circuit_to_decoding_dem(circuit);
+    } else {
+        FILE *dem_file = stim::find_open_file_argument("--dem", nullptr, "rb", argc, argv);
+        dem = stim::DetectorErrorModel::from_file(dem_file);
+        fclose(dem_file);
+    }
+    size_t cluster_threads = (size_t)stim::find_int64_argument("--cluster_threads", 0, 0, 1 << 16, argc, argv);
+    auto decoder = Decoder::from_dem(dem, DecoderConfigOptions{.cluster_threads = cluster_threads});
 
     size_t num_dets = dem.count_detectors();
     size_t num_obs = dem.count_observables();
+    if (stim::find_argument("--match_trace_out", argc, argv) != nullptr) {
+        FILE *match_trace_out = stim::find_open_file_argument("--match_trace_out", nullptr, "wb", argc, argv);
+        uint64_t sample_every = stim::find_int64_argument("--match_trace_sample_every", 1, 1, INT64_MAX, argc, argv);
+        decoder.match_trace =
+            std::make_shared<MatchTraceWriter>(match_trace_out, true, num_dets, num_obs, sample_every);
+    }
     auto reader = stim::MeasureRecordReader<stim::MAX_BITWORD_WIDTH>::make(
         shots_in, shots_in_format.id, 0, dem.count_detectors(), append_obs * num_obs);
-    auto writer = stim::MeasureRecordWriter::make(predictions_out, predictions_out_format.id);
-    writer->begin_result_type('L');
 
-    stim::simd_bits<stim::MAX_BITWORD_WIDTH> buf_dets(reader->bits_per_record());
-    while (reader->start_and_read_entire_record(buf_dets)) {
+    // Shots are processed in batches. Reading into a shot-major table lets formats like ptb64 be
+    // transposed in blocks, and writing from an observable-major table does the same for the output.
+    constexpr size_t BATCH_SIZE = 1024;
+    stim::simd_bit_table<stim::MAX_BITWORD_WIDTH> batch_dets(BATCH_SIZE, reader->bits_per_record());
+    stim::simd_bit_table<stim::MAX_BITWORD_WIDTH> batch_obs(num_obs, BATCH_SIZE);
+    stim::simd_bits<stim::MAX_BITWORD_WIDTH> no_ref_sample(0);
+    std::vector<obsmask_int> predictions(BATCH_SIZE);
+    while (true) {
+        batch_dets.clear();
+        size_t num_shots = reader->read_into_table_with_major_shot_index(batch_dets, BATCH_SIZE);
+        if (num_shots == 0) {
+            break;
+        }
+        batch_obs.clear();
         if (append_obs) {
-            for (size_t k = 0; k < num_obs; k++) {
-                buf_dets[num_dets + k] = 0;
+            for (size_t shot = 0; shot < num_shots; shot++) {
+                auto buf_dets = batch_dets[shot];
+                for (size_t k = 0; k < num_obs; k++) {
+                    buf_dets[num_dets + k] = 0;
+                }
+            }
+        }
+        if (decoder.extra_observable_chunks.empty()) {
+            decoder.decode_detection_events_batch(
+                {batch_dets.data.u8, batch_dets.data.u8 + batch_dets.data.num_u8_padded()},
+                batch_dets.num_minor_u8_padded(),
+                {predictions.data(), num_shots});
+            for (size_t shot = 0; shot < num_shots; shot++) {
+                for (size_t k = 0; k < num_obs; k++) {
+                    batch_obs[k][shot] = (predictions[shot] >> k) & 1;
+                }
+            }
+        } else {
+            // Observables past the first 64 are predicted into the decoder's extra_obs_flips, one shot at a time.
+            for (size_t shot = 0; shot < num_shots; shot++) {
+                auto buf_dets = batch_dets[shot];
+                obsmask_int prediction =
+                    decoder.decode_detection_events({buf_dets.u8, buf_dets.u8 + buf_dets.num_u8_padded()});
+                for (size_t k = 0; k < num_obs; k++) {
+                    obsmask_int mask = k < 64 ? prediction : decoder.extra_obs_flips[k / 64 - 1];
+                    batch_obs[k][shot] = (mask >> (k % 64)) & 1;
+                }
             }
         }
-        auto prediction =
-            decoder.decode_detection_events({buf_dets.u8, buf_dets.u8 + buf_dets.num_u8_padded()});
-        for (size_t k = 0; k < num_obs; k++) {
-            writer->write_bit((prediction >> k) & 1);
+        stim::write_table_data(
+            predictions_out, num_shots, num_obs, no_ref_sample, batch_obs, predictions_out_format.id, 'L', 'L', 0);
+        if (num_shots < BATCH_SIZE) {
+            break;
         }
-        writer->write_end();
-        buf_dets.clear();
     }
 
     if (predictions_out != stdout) {
@@ -42,3 +42,134 @@ shot L2
 shot L1
 )stdout");
 }
+
+TEST(main_predict, cluster_threads) {
+    RaiiTempNamedFile dem;
+    FILE *f = fopen(dem.path.c_str(), "w");
+    fprintf(f, "%s", R"DEM(
+        error(0.1) D0 L0
+        error(0.1) D0 D1 L1
+        error(0.1) D1 L2
+        error(0.1) D2 L3
+        detector(0, 0, 0, 0) D0
+        detector(0, 0, 0, 1) D1
+        detector(5, 0, 0, 0) D2
+    )DEM");
+    fclose(f);
+    auto stdout_content = result_of_running_main(
+        {"predict", "--dem", dem.path, "--in_format", "dets", "--out_format", "dets", "--cluster_threads", "2"},
+        R"stdin(shot
+shot D0
+shot D1 D2
+shot D0 D1 D2)stdin");
+    ASSERT_EQ(stdout_content, R"stdout(shot
+shot L0
+shot L2 L3
+shot L1 L3
+)stdout");
+}
+
+TEST(main_predict, circuit) {
+    RaiiTempNamedFile circuit;
+    FILE *f = fopen(circuit.path.c_str(), "w");
+    fprintf(f, "%s", R"CIRCUIT(
+        X_ERROR(0.1) 0 1 2
+        M 0 1 2
+        DETECTOR(0, 0, 0, 0) rec[-3] rec[-2]
+        DETECTOR(0, 0, 0, 1) rec[-2] rec[-1]
+        OBSERVABLE_INCLUDE(0) rec[-3]
+        OBSERVABLE_INCLUDE(1) rec[-2]
+        OBSERVABLE_INCLUDE(2) rec[-1]
+    )CIRCUIT");
+    fclose(f);
+    auto stdout_content = result_of_running_main(
+        {"predict", "--circuit", circuit.path, "--in_format", "dets", "--out_format", "dets"},
+        R"stdin(shot
+shot D0
+shot D1
+shot D0 D1)stdin");
+    ASSERT_EQ(stdout_content, R"stdout(shot
+shot L0
+shot L2
+shot L1
+)stdout");
+
+    ASSERT_THROW(
+        {
+            result_of_running_main(
+                {"predict", "--circuit", circuit.path, "--dem", circuit.path, "--in_format", "dets"}, "shot");
+        },
+        std::invalid_argument);
+}
+
+TEST(main_predict, ptb64) {
+    RaiiTempNamedFile dem;
+    FILE *f = fopen(dem.path.c_str(), "w");
+    fprintf(f, "%s", R"DEM(
+        error(0.1) D0 L0
+        error(0.1) D0 D1 L1
+        error(0.1) D1 L2
+        detector(0, 0, 0, 0) D0
+        detector(0, 0, 0, 1) D1
+    )DEM");
+    fclose(f);
+
+    // 128 shots. Shot 1 fires D0, shot 2 fires D1, shot 3 fires both, shot 64+5 fires D1.
+    uint64_t dets[4]{0b1010, 0b1100, 0, 1 << 5};
+    std::string stdin_content((const char *)dets, sizeof(dets));
+    auto stdout_content = result_of_running_main(
+        {"predict", "--dem", dem.path, "--in_format", "ptb64", "--out_format", "ptb64"}, stdin_content);
+    ASSERT_EQ(stdout_content.size(), 6 * sizeof(uint64_t));
+    uint64_t obs[6];
+    memcpy(obs, stdout_content.data(), sizeof(obs));
+    ASSERT_EQ(obs[0], 0b0010);
+    ASSERT_EQ(obs[1], 0b1000);
+    ASSERT_EQ(obs[2], 0b0100);
+    ASSERT_EQ(obs[3], 0);
+    ASSERT_EQ(obs[4], 0);
+    ASSERT_EQ(obs[5], 1 << 5);
+
+    stdout_content = result_of_running_main(
+        {"predict", "--dem", dem.path, "--in_format", "ptb64", "--out_format", "dets"}, stdin_content);
+    std::string expected;
+    for (size_t k = 0; k < 128; k++) {
+        if (k == 1) {
+            expected += "shot L0\n";
+        } else if (k == 2 || k == 64 + 5) {
+            expected += "shot L2\n";
+        } else if (k == 3) {
+            expected += "shot L1\n";
+        } else {
+            expected += "shot\n";
+        }
+    }
+    ASSERT_EQ(stdout_content, expected);
+}
+
+TEST(main_predict, multiple_batches) {
+    RaiiTempNamedFile dem;
+    FILE *f = fopen(dem.path.c_str(), "w");
+    fprintf(f, "%s", R"DEM(
+        error(0.1) D0 L0
+        error(0.1) D0 D1 L1
+        error(0.1) D1 L2
+        detector(0, 0, 0, 0) D0
+        detector(0, 0, 0, 1) D1
+    )DEM");
+    fclose(f);
+
+    std::string stdin_content;
+    std::string expected;
+    for (size_t k = 0; k < 2500; k++) {
+        stdin_content += "00\n10\n01\n11\n"[(k % 4) * 3];
+        stdin_content += "00\n10\n01\n11\n"[(k % 4) * 3 + 1];
+        stdin_content += "\n";
+        expected += "000\n100\n001\n010\n"[(k % 4) * 4];
+        expected += "000\n100\n001\n010\n"[(k % 4) * 4 + 1];
+        expected += "000\n100\n001\n010\n"[(k % 4) * 4 + 2];
+        expected += "\n";
+    }
+    auto stdout_content = result_of_running_main(
+        {"predict", "--dem", dem.path, "--in_format", "01", "--out_format", "01"}, stdin_content);
+    ASSERT_EQ(stdout_content, expected);
+}
@@ -0,0 +1,470 @@
+// Copyright 2023 Google LLC
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "chromobius/commands/main_serve.h"
+
+#include <algorithm>
+#include <atomic>
+#include <chrono>
+
+#include "chromobius/commands/serve_protocol.h"
+#include "chromobius/decode/decoder_pool.h"
+#include "stim.h"
+
+#ifndef _WIN32
+#include <arpa/inet.h>
+#include <netinet/in.h>
+#include <poll.h>
+#include <sys/socket.h>
+#include <sys/stat.h>
+#include <sys/un.h>
+#include <unistd.h>
+#endif
+
+using namespace chromobius;
+
+#ifdef _WIN32
+
+int chromobius::main_serve(int argc, const char **argv) {
+    throw std::invalid_argument("chromobius serve isn't supported on Windows.");
+}
+
+#else
+
+/// Requests larger than this are rejected (and their connection closed) instead of being buffered.
+constexpr uint32_t MAX_REQUEST_PAYLOAD_BYTES = 1 << 28;
+/// The number of recent request latencies kept for computing percentiles.
+constexpr size_t LATENCY_WINDOW = 1 << 16;
+
+struct ServeStats {
+    std::mutex mut;
+    uint64_t num_requests = 0;
+    uint64_t num_failed_requests = 0;
+    uint64_t num_shots = 0;
+    uint64_t num_batches = 0;
+    std::vector<double> recent_latencies_us;
+    size_t next_latency_index = 0;
+
+    void record_batch() {
+        std::lock_guard<std::mutex> lock(mut);
+        num_batches++;
+    }
+
+    void record(bool failed, size_t shots, std::chrono::steady_clock::time_point start) {
+        double latency_us =
+            (double)std::chrono::duration_cast<std::chrono::nanoseconds>(std::chrono::steady_clock::now() - start)
+                .count() /
+            1000.0;
+        std::lock_guard<std::mutex> lock(mut);
+        num_requests++;
+        num_failed_requests += failed;
+        num_shots += shots;
+        if (recent_latencies_us.size() < LATENCY_WINDOW) {
+            recent_latencies_us.push_back(latency_us);
+        } else {
+            recent_latencies_us[next_latency_index] = latency_us;
+            next_latency_index = (next_latency_index + 1) % LATENCY_WINDOW;
+        }
+    }
+
+    std::string to_json() {
+        std::vector<double> latencies;
+        std::stringstream ss;
+        {
+            std::lock_guard<std::mutex> lock(mut);
+            latencies = recent_latencies_us;
+            ss << "{\"requests\": " << num_requests;
+            ss << ", \"failed_requests\": " << num_failed_requests;
+            ss << ", \"shots\": " << num_shots;
+            ss << ", \"batches\": " << num_batches;
+        }
+        std::sort(latencies.begin(), latencies.end());
+        auto percentile = [&](double p) {
+            if (latencies.empty()) {
+                return 0.0;
+            }
+            return latencies[std::min(latencies.size() - 1, (size_t)(p * latencies.size()))];
+        };
+        double total = 0;
+        for (double e : latencies) {
+            total += e;
+        }
+        ss << ", \"latency_microseconds\": {";
+        ss << "\"count\": " << latencies.size();
+        ss << ", \"mean\": " << (latencies.empty() ? 0 : total / latencies.size());
+        ss << ", \"p50\": " << percentile(0.5);
+        ss << ", \"p90\": " << percentile(0.9);
+        ss << ", \"p99\": " << percentile(0.99);
+        ss << ", \"max\": " << (latencies.empty() ? 0 : latencies.back());
+        ss << "}}";
+        return ss.str();
+    }
+};
+
+struct ServeConnection {
+    int fd;
+    std::mutex write_mutex;
+    std::atomic<bool> reader_done{false};
+
+    explicit ServeConnection(int fd) : fd(fd) {
+    }
+    ~ServeConnection() {
+        close(fd);
+    }
+
+    void respond(ServeResponseStatus status, uint64_t request_id, std::span<const uint8_t> payload) {
+        uint8_t header[SERVE_HEADER_BYTES];
+        ServeFrameHeader{.kind_or_status = status, .payload_bytes = (uint32_t)payload.size(), .request_id = request_id}
+            .write_to(header);
+        std::lock_guard<std::mutex> lock(write_mutex);
+        serve_write_all(fd, header);
+        serve_write_all(fd, payload);
+    }
+
+    void respond_error(uint64_t request_id, const std::string &message) {
+        respond(SERVE_RESPONSE_ERROR, request_id, {(const uint8_t *)message.data(), message.size()});
+    }
+};
+
+/// A decode request that has been read, but not yet picked up by a worker.
+struct PendingDecode {
+    std::shared_ptr<ServeConnection> conn;
+    uint64_t request_id;
+    std::vector<uint8_t> payload;
+    std::chrono::steady_clock::time_point start;
+};
+
+struct ServeState {
+    size_t num_detectors;
+    size_t num_observables;
+    DecoderPool pool;
+    ServeStats stats;
+    std::atomic<bool> stopping{false};
+
+    /// Requests from every connection, waiting to be decoded together.
+    std::mutex pending_mut;
+    std::vector<PendingDecode> pending;
+};
+
+static void respond_ignoring_broken_connection(
+    ServeConnection &conn, uint64_t request_id, std::span<const uint8_t> payload) {
+    try {
+        conn.respond(SERVE_RESPONSE_OK, request_id, payload);
+    } catch (const std::exception &) {
+        // The connection is gone; there's nobody to tell.
+    }
+}
+
+static void respond_error_ignoring_broken_connection(ServeConnection &conn, uint64_t request_id, const char *message) {
+    try {
+        conn.respond_error(request_id, message);
+    } catch (const std::exception &) {
+        // The connection is gone; there's nobody to tell.
+    }
+}
+
+/// Decodes the shots of some requests in one batch, and returns each request's bit packed predictions.
+static std::vector<std::vector<uint8_t>> decode_requests(
+    ServeState &state, Decoder &decoder, std::span<const PendingDecode> requests) {
+    size_t det_bytes = (state.num_detectors + 7) / 8;
+    size_t obs_bytes = (state.num_observables + 7) / 8;
+    uint8_t padding_mask = state.num_detectors % 8 == 0 ? 0xFF : (uint8_t)((1 << (state.num_detectors % 8)) - 1);
+    std::vector<size_t> shot_offsets{0};
+    for (const auto &request : requests) {
+        shot_offsets.push_back(shot_offsets.back() + (det_bytes == 0 ? 0 : request.payload.size() / det_bytes));
+    }
+    size_t num_shots = shot_offsets.back();
+
+    std::vector<uint8_t> dets;
+    dets.reserve(num_shots * det_bytes);
+    for (const auto &request : requests) {
+        dets.insert(dets.end(), request.payload.begin(), request.payload.end());
+    }
+    for (size_t shot = 0; shot < num_shots; shot++) {
+        // Bits past the last detector would otherwise be misread as detection events.
+        dets[shot * det_bytes + det_bytes - 1] &= padding_mask;
+    }
+
+    std::vector<std::vector<uint8_t>> responses(requests.size());
+    if (!decoder.extra_observable_chunks.empty()) {
+        // Batches only return the first 64 observables of each shot, so shots with more are decoded one at a time.
+        for (size_t k = 0; k < requests.size(); k++) {
+            auto &response = responses[k];
+            response.resize((shot_offsets[k + 1] - shot_offsets[k]) * obs_bytes);
+            for (size_t shot = shot_offsets[k]; shot < shot_offsets[k + 1]; shot++) {
+                obsmask_int prediction = decoder.decode_detection_events({dets.data() + shot * det_bytes, det_bytes});
+                decoder.write_obs_flips_bit_packed(
+                    prediction, {response.data() + (shot - shot_offsets[k]) * obs_bytes, obs_bytes});
+            }
+        }
+        return responses;
+    }
+
+    std::vector<obsmask_int> predictions(num_shots);
+    decoder.decode_detection_events_batch(dets, det_bytes, predictions);
+
+    for (size_t k = 0; k < requests.size(); k++) {
+        auto &response = responses[k];
+        response.assign((shot_offsets[k + 1] - shot_offsets[k]) * obs_bytes, 0);
+        for (size_t shot = shot_offsets[k]; shot < shot_offsets[k + 1]; shot++) {
+            obsmask_int prediction = predictions[shot];
+            for (size_t b = 0; b < obs_bytes; b++) {
+                response[(shot - shot_offsets[k]) * obs_bytes + b] = (uint8_t)(prediction >> (8 * b));
+            }
+        }
+    }
+    return responses;
+}
+
+/// Decodes every request that's pending (from any connection) as one batch.
+///
+/// Readers add a request to the pending list and then submit a call to this
+/// method, so each worker wake-up drains whatever has accumulated since the
+/// previous one. Under load this merges many small requests into a single
+/// decode_detection_events_batch call; calls that find the list already
+/// drained by an earlier wake-up return immediately.
+///
+/// When decoding the merged batch fails (e.g. because a shot has no
+/// solution), each request is decoded again on its own, so that only the
+/// requests with bad shots get an error response.
+static void decode_pending_on_worker(ServeState &state, Decoder &decoder) {
+    std::vector<PendingDecode> batch;
+    {
+        std::lock_guard<std::mutex> lock(state.pending_mut);
+        batch.swap(state.pending);
+    }
+    if (batch.empty()) {
+        return;
+    }
+
+    size_t det_bytes = (state.num_detectors + 7) / 8;
+    auto respond = [&](const PendingDecode &request, std::span<const uint8_t> response) {
+        // Recorded before responding, so that a client never sees a response that isn't counted yet.
+        size_t num_shots = det_bytes == 0 ? 0 : request.payload.size() / det_bytes;
+        state.stats.record(false, num_shots, request.start);
+        respond_ignoring_broken_connection(*request.conn, request.request_id, response);
+    };
+
+    std::vector<std::vector<uint8_t>> responses;
+    try {
+        responses = decode_requests(state, decoder, batch);
+    } catch (const std::exception &) {
+        for (const auto &request : batch) {
+            try {
+                responses = decode_requests(state, decoder, {&request, 1});
+            } catch (const std::exception &ex) {
+                state.stats.record(true, 0, request.start);
+                respond_error_ignoring_broken_connection(*request.conn, request.request_id, ex.what());
+                continue;
+            }
+            state.stats.record_batch();
+            respond(request, responses[0]);
+        }
+        return;
+    }
+    state.stats.record_batch();
+    for (size_t k = 0; k < batch.size(); k++) {
+        respond(batch[k], responses[k]);
+    }
+}
+
+static void serve_connection(ServeState &state, std::shared_ptr<ServeConnection> conn) {
+    try {
+        uint8_t hello[SERVE_HELLO_BYTES];
+        memcpy(hello, SERVE_MAGIC, sizeof(SERVE_MAGIC));
+        for (size_t k = 0; k < 4; k++) {
+            hello[8 + k] = (uint8_t)(state.num_detectors >> (8 * k));
+            hello[12 + k] = (uint8_t)(state.num_observables >> (8 * k));
+        }
+        {
+            std::lock_guard<std::mutex> lock(conn->write_mutex);
+            serve_write_all(conn->fd, hello);
+        }
+
+        size_t det_bytes = (state.num_detectors + 7) / 8;
+        uint8_t header_bytes[SERVE_HEADER_BYTES];
+        while (!state.stopping && serve_read_exact(conn->fd, header_bytes)) {
+            auto start = std::chrono::steady_clock::now();
+            auto header = ServeFrameHeader::read_from(header_bytes);
+            if (header.payload_bytes > MAX_REQUEST_PAYLOAD_BYTES) {
+                conn->respond_error(header.request_id, "Request payload is too large.");
+                break;
+            }
+            std::vector<uint8_t> payload(header.payload_bytes);
+            if (!serve_read_exact(conn->fd, payload) && !payload.empty()) {
+                break;
+            }
+
+            if (header.kind_or_status == SERVE_REQUEST_DECODE) {
+                if (det_bytes == 0 ? !payload.empty() : payload.size() % det_bytes != 0) {
+                    std::stringstream ss;
+                    ss << "The payload size (" << payload.size() << ") isn't a multiple of the bytes per shot ("
+                       << det_bytes << ").";
+                    state.stats.record(true, 0, start);
+                    conn->respond_error(header.request_id, ss.str());
+                    continue;
+                }
+                {
+                    std::lock_guard<std::mutex> lock(state.pending_mut);
+                    state.pending.push_back({conn, header.request_id, std::move(payload), start});
+                }
+                // Every pending request has a wake-up submitted after it, so none is left waiting. The pool's queue
+                // is bounded, which blocks this reader while the workers are behind.
+                state.pool.submit([&state](Decoder &decoder) { decode_pending_on_worker(state, decoder); });
+            } else if (header.kind_or_status == SERVE_REQUEST_STATS) {
+                auto json = state.stats.to_json();
+                conn->respond(SERVE_RESPONSE_OK, header.request_id, {(const uint8_t *)json.data(), json.size()});
+            } else if (header.kind_or_status == SERVE_REQUEST_SHUTDOWN) {
+                state.stopping = true;
+                conn->respond(SERVE_RESPONSE_OK, header.request_id, {});
+                break;
+            } else {
+                conn->respond_error(header.request_id, "Unrecognized request kind " + std::to_string(header.kind_or_status) + ".");
+            }
+        }
+    } catch (const std::exception &) {
+        // The connection broke. Drop it.
+    }
+    conn->reader_done = true;
+}
+
+static int open_listening_socket(const char *socket_path, int64_t port) {
+    int fd;
+    if (socket_path != nullptr) {
+        sockaddr_un addr{};
+        addr.sun_family = AF_UNIX;
+        if (strlen(socket_path) >= sizeof(addr.sun_path)) {
+            throw std::invalid_argument("--socket path is too long.");
+        }
+        struct stat st;
+        if (stat(socket_path, &st) == 0) {
+            throw std::invalid_argument(
+                "--socket path '" + std::string(socket_path) + "' already exists. Delete it if it's stale.");
+        }
+        strncpy(addr.sun_path, socket_path, sizeof(addr.sun_path) - 1);
+        fd = socket(AF_UNIX, SOCK_STREAM, 0);
+        if (fd < 0 || bind(fd, (sockaddr *)&addr, sizeof(addr)) != 0) {
+            throw std::invalid_argument("Failed to bind unix socket '" + std::string(socket_path) + "'.");
+        }
+    } else {
+        sockaddr_in addr{};
+        addr.sin_family = AF_INET;
+        addr.sin_port = htons((uint16_t)port);
+        addr.sin_addr.s_addr = htonl(INADDR_LOOPBACK);
+        fd = socket(AF_INET, SOCK_STREAM, 0);
+        int one = 1;
+        if (fd < 0 || setsockopt(fd, SOL_SOCKET, SO_REUSEADDR, &one, sizeof(one)) != 0 ||
+            bind(fd, (sockaddr *)&addr, sizeof(addr)) != 0) {
+            throw std::invalid_argument("Failed to bind localhost port " + std::to_string(port) + ".");
+        }
+    }
+    if (listen(fd, 64) != 0) {
+        throw std::invalid_argument("Failed to listen for connections.");
+    }
+    return fd;
+}
+
+int chromobius::main_serve(int argc, const char **argv) {
+    stim::check_for_unknown_arguments(
+        {
+            "--dem",
+            "--socket",
+            "--port",
+            "--num_threads",
+            "--max_queued_requests",
+            "--out",
+        },
+        {},
+        "serve",
+        argc,
+        argv);
+
+    const char *socket_path = stim::find_argument("--socket", argc, argv);
+    int64_t port = stim::find_int64_argument("--port", -1, -1, 65535, argc, argv);
+    if ((socket_path == nullptr) == (port == -1)) {
+        throw std::invalid_argument("Must specify exactly one of --socket or --port.");
+    }
+    int64_t default_threads = std::max(1u, std::thread::hardware_concurrency());
+    int64_t num_threads = stim::find_int64_argument("--num_threads", default_threads, 1, 1 << 16, argc, argv);
+    int64_t max_queued =
+        stim::find_int64_argument("--max_queued_requests", num_threads * 2, 1, INT64_MAX, argc, argv);
+    FILE *stats_out = stim::find_open_file_argument("--out", stdout, "wb", argc, argv);
+    FILE *dem_file = stim::find_open_file_argument("--dem", nullptr, "rb", argc, argv);
+    stim::DetectorErrorModel dem = stim::DetectorErrorModel::from_file(dem_file);
+    fclose(dem_file);
+
+    auto decoder = Decoder::from_dem(dem, DecoderConfigOptions{});
+    ServeState state{
+        .num_detectors = dem.count_detectors(),
+        .num_observables = dem.count_observables(),
+        .pool = DecoderPool(decoder, num_threads, max_queued),
+    };
+
+    int listen_fd = open_listening_socket(socket_path, port);
+    if (socket_path != nullptr) {
+        std::cerr << "chromobius serve: listening on unix socket " << socket_path << "\n";
+    } else {
+        sockaddr_in bound{};
+        socklen_t len = sizeof(bound);
+        getsockname(listen_fd, (sockaddr *)&bound, &len);
+        std::cerr << "chromobius serve: listening on localhost port " << ntohs(bound.sin_port) << "\n";
+    }
+
+    std::vector<std::pair<std::thread, std::shared_ptr<ServeConnection>>> connections;
+    while (!state.stopping) {
+        pollfd p{.fd = listen_fd, .events = POLLIN, .revents = 0};
+        if (poll(&p, 1, 50) <= 0 || !(p.revents & POLLIN)) {
+            continue;
+        }
+        int conn_fd = accept(listen_fd, nullptr, nullptr);
+        if (conn_fd < 0) {
+            continue;
+        }
+        // Otherwise a client disconnecting before its response is written would kill the server.
+        serve_disable_sigpipe(conn_fd);
+
+        // Forget connections that have finished.
+        for (size_t k = 0; k < connections.size();) {
+            if (connections[k].second->reader_done) {
+                connections[k].first.join();
+                std::swap(connections[k], connections.back());
+                connections.pop_back();
+            } else {
+                k++;
+            }
+        }
+
+        auto conn = std::make_shared<ServeConnection>(conn_fd);
+        connections.emplace_back(std::thread(serve_connection, std::ref(state), conn), conn);
+    }
+
+    close(listen_fd);
+    if (socket_path != nullptr) {
+        unlink(socket_path);
+    }
+    for (auto &[thread, conn] : connections) {
+        shutdown(conn->fd, SHUT_RD);
+        thread.join();
+    }
+    state.pool.wait_until_idle();
+    connections.clear();
+
+    fprintf(stats_out, "%s\n", state.stats.to_json().c_str());
+    if (stats_out != stdout) {
+        fclose(stats_out);
+    }
+    return EXIT_SUCCESS;
+}
+
+#endif
@@ -0,0 +1,340 @@
+// Copyright 2023 Google LLC
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "chromobius/commands/main_serve.h"
+
+#include <thread>
+
+#include "gtest/gtest.h"
+
+#include "chromobius/commands/main_all.h"
+#include "chromobius/commands/serve_protocol.h"
+#include "chromobius/decode/decoder.h"
+#include "chromobius/test_util.test.h"
+
+using namespace chromobius;
+
+#ifndef _WIN32
+
+static ServeClient connect_with_retries(const std::string &socket_path) {
+    for (size_t attempt = 0;; attempt++) {
+        try {
+            return ServeClient::connect_unix(socket_path);
+        } catch (const std::invalid_argument &) {
+            if (attempt > 200) {
+                throw;
+            }
+            std::this_thread::sleep_for(std::chrono::milliseconds(25));
+        }
+    }
+}
+
+TEST(main_serve, loopback) {
+    FILE *f = open_test_data_file("midout_color_code_d5_r10_p1000.stim");
+    stim::Circuit circuit = stim::Circuit::from_file(f);
+    fclose(f);
+    auto dem = stim::ErrorAnalyzer::circuit_to_detector_error_model(circuit, false, true, false, 0, false, false);
+    Decoder decoder = Decoder::from_dem(dem, DecoderConfigOptions{});
+
+    RaiiTempNamedFile dem_file(dem.str());
+    RaiiTempNamedFile stats_file;
+    std::string socket_path = stats_file.path + ".sock";
+
+    int exit_code = -1;
+    std::thread server([&]() {
+        std::vector<const char *> argv{
+            "TEST_PROCESS",
+            "serve",
+            "--dem",
+            dem_file.path.c_str(),
+            "--socket",
+            socket_path.c_str(),
+            "--num_threads",
+            "2",
+            "--out",
+            stats_file.path.c_str(),
+        };
+        exit_code = chromobius::main((int)argv.size(), argv.data());
+    });
+
+    {
+        auto client = connect_with_retries(socket_path);
+        auto client2 = connect_with_retries(socket_path);
+        EXPECT_EQ(client.num_detectors, dem.count_detectors());
+        EXPECT_EQ(client.num_observables, dem.count_observables());
+
+        size_t det_bytes = (dem.count_detectors() + 7) / 8;
+        std::mt19937_64 rng{0};
+        auto [dets, obs] = stim::sample_batch_detection_events<64>(circuit, 100, rng);
+        dets = dets.transposed();
+        std::vector<uint8_t> packed;
+        std::vector<uint8_t> expected;
+        for (size_t k = 0; k < 100; k++) {
+            packed.insert(packed.end(), dets[k].u8, dets[k].u8 + det_bytes);
+            expected.push_back(
+                (uint8_t)decoder.decode_detection_events({dets[k].u8, dets[k].u8 + dets.num_minor_u8_padded()}));
+        }
+
+        EXPECT_EQ(client.predict_obs_flips_from_dets_bit_packed(packed), expected);
+        EXPECT_EQ(
+            client2.predict_obs_flips_from_dets_bit_packed({packed.data(), det_bytes * 3}),
+            std::vector<uint8_t>(expected.begin(), expected.begin() + 3));
+        EXPECT_THROW(
+            { client.predict_obs_flips_from_dets_bit_packed({packed.data(), det_bytes + 1}); }, std::invalid_argument);
+
+        auto stats = client2.stats();
+        EXPECT_NE(stats.find("\"requests\": 2"), std::string::npos) << stats;
+        EXPECT_NE(stats.find("\"shots\": 103"), std::string::npos) << stats;
+        EXPECT_NE(stats.find("\"p99\": "), std::string::npos) << stats;
+
+        client.shutdown_server();
+    }
+    server.join();
+    ASSERT_EQ(exit_code, EXIT_SUCCESS);
+    ASSERT_NE(stats_file.read_contents().find("\"shots\": 103"), std::string::npos);
+    ASSERT_EQ(fopen(socket_path.c_str(), "r"), nullptr);
+}
+
+TEST(main_serve, concurrent_clients_share_batches) {
+    FILE *f = open_test_data_file("midout_color_code_d5_r10_p1000.stim");
+    stim::Circuit circuit = stim::Circuit::from_file(f);
+    fclose(f);
+    auto dem = stim::ErrorAnalyzer::circuit_to_detector_error_model(circuit, false, true, false, 0, false, false);
+    Decoder decoder = Decoder::from_dem(dem, DecoderConfigOptions{});
+
+    RaiiTempNamedFile dem_file(dem.str());
+    RaiiTempNamedFile stats_file;
+    std::string socket_path = stats_file.path + ".sock";
+
+    int exit_code = -1;
+    std::thread server([&]() {
+        std::vector<const char *> argv{
+            "TEST_PROCESS",
+            "serve",
+            "--dem",
+            dem_file.path.c_str(),
+            "--socket",
+            socket_path.c_str(),
+            "--num_threads",
+            "1",
+            "--out",
+            stats_file.path.c_str(),
+        };
+        exit_code = chromobius::main((int)argv.size(), argv.data());
+    });
+
+    size_t det_bytes = (dem.count_detectors() + 7) / 8;
+    std::mt19937_64 rng{0};
+    auto [dets, obs] = stim::sample_batch_detection_events<64>(circuit, 64, rng);
+    dets = dets.transposed();
+    std::vector<uint8_t> packed;
+    std::vector<uint8_t> expected;
+    for (size_t k = 0; k < 64; k++) {
+        packed.insert(packed.end(), dets[k].u8, dets[k].u8 + det_bytes);
+        expected.push_back(
+            (uint8_t)decoder.decode_detection_events({dets[k].u8, dets[k].u8 + dets.num_minor_u8_padded()}));
+    }
+
+    // Each client sends a different slice of the shots, so a mixed up batch would give wrong predictions.
+    constexpr size_t num_clients = 4;
+    constexpr size_t num_requests_per_client = 25;
+    std::vector<size_t> num_mismatches(num_clients, 0);
+    std::vector<std::thread> clients;
+    for (size_t c = 0; c < num_clients; c++) {
+        clients.emplace_back([&, c]() {
+            auto client = connect_with_retries(socket_path);
+            for (size_t r = 0; r < num_requests_per_client; r++) {
+                size_t offset = (c * 7 + r) % 48;
+                size_t num_shots = 1 + (c + r) % 16;
+                auto got = client.predict_obs_flips_from_dets_bit_packed(
+                    {packed.data() + offset * det_bytes, num_shots * det_bytes});
+                num_mismatches[c] +=
+                    got != std::vector<uint8_t>(expected.begin() + offset, expected.begin() + offset + num_shots);
+            }
+        });
+    }
+    for (auto &t : clients) {
+        t.join();
+    }
+    EXPECT_EQ(num_mismatches, std::vector<size_t>(num_clients, 0));
+
+    {
+        auto client = connect_with_retries(socket_path);
+        auto stats = client.stats();
+        EXPECT_NE(stats.find("\"requests\": 100"), std::string::npos) << stats;
+        EXPECT_NE(stats.find("\"batches\": "), std::string::npos) << stats;
+        client.shutdown_server();
+    }
+    server.join();
+    ASSERT_EQ(exit_code, EXIT_SUCCESS);
+}
+
+TEST(main_serve, undecodable_request_does_not_fail_batched_requests) {
+    FILE *f = open_test_data_file("toric_superdense_color_code_epr_d12_r5_p1000.stim");
+    stim::Circuit circuit = stim::Circuit::from_file(f);
+    fclose(f);
+    auto dem = stim::ErrorAnalyzer::circuit_to_detector_error_model(circuit, false, true, false, 0, false, false);
+    Decoder decoder = Decoder::from_dem(dem, DecoderConfigOptions{});
+    size_t det_bytes = (dem.count_detectors() + 7) / 8;
+
+    // A sampled shot can be decoded, but random detection events usually can't be matched.
+    std::mt19937_64 rng{0};
+    auto [dets, obs] = stim::sample_batch_detection_events<64>(circuit, 1, rng);
+    dets = dets.transposed();
+    ASSERT_EQ(dem.count_detectors() % 8, 0);
+    std::vector<uint8_t> good_shot(dets[0].u8, dets[0].u8 + det_bytes);
+    uint8_t good_prediction = (uint8_t)decoder.decode_detection_events(std::vector<uint8_t>(good_shot));
+    std::vector<uint8_t> bad_shot(det_bytes);
+    while (true) {
+        for (auto &b : bad_shot) {
+            b = (uint8_t)rng();
+        }
+        try {
+            decoder.decode_detection_events(std::vector<uint8_t>(bad_shot));
+        } catch (const std::invalid_argument &) {
+            break;
+        }
+    }
+
+    RaiiTempNamedFile dem_file(dem.str());
+    RaiiTempNamedFile stats_file;
+    std::string socket_path = stats_file.path + ".sock";
+    int exit_code = -1;
+    std::thread server([&]() {
+        std::vector<const char *> argv{
+            "TEST_PROCESS",
+            "serve",
+            "--dem",
+            dem_file.path.c_str(),
+            "--socket",
+            socket_path.c_str(),
+            "--num_threads",
+            "1",
+            "--out",
+            stats_file.path.c_str(),
+        };
+        exit_code = chromobius::main((int)argv.size(), argv.data());
+    });
+
+    {
+        auto client = connect_with_retries(socket_path);
+        for (uint64_t round = 0; round < 20; round++) {
+            // Send both requests in one write, so that the server usually decodes them in the same batch.
+            std::vector<uint8_t> frames;
+            for (uint64_t k = 0; k < 2; k++) {
+                const auto &shot = k == 0 ? bad_shot : good_shot;
+                uint8_t header[SERVE_HEADER_BYTES];
+                ServeFrameHeader{
+                    .kind_or_status = SERVE_REQUEST_DECODE,
+                    .payload_bytes = (uint32_t)det_bytes,
+                    .request_id = 2 * round + k}
+                    .write_to(header);
+                frames.insert(frames.end(), header, header + SERVE_HEADER_BYTES);
+                frames.insert(frames.end(), shot.begin(), shot.end());
+            }
+            serve_write_all(client.fd, frames);
+
+            for (size_t k = 0; k < 2; k++) {
+                uint8_t header_bytes[SERVE_HEADER_BYTES];
+                ASSERT_TRUE(serve_read_exact(client.fd, header_bytes));
+                auto header = ServeFrameHeader::read_from(header_bytes);
+                std::vector<uint8_t> payload(header.payload_bytes);
+                serve_read_exact(client.fd, payload);
+                if (header.request_id == 2 * round) {
+                    EXPECT_EQ(header.kind_or_status, SERVE_RESPONSE_ERROR) << round;
+                } else {
+                    ASSERT_EQ(header.request_id, 2 * round + 1);
+                    EXPECT_EQ(header.kind_or_status, SERVE_RESPONSE_OK) << round;
+                    EXPECT_EQ(payload, std::vector<uint8_t>{good_prediction}) << round;
+                }
+            }
+        }
+
+        auto stats = client.stats();
+        EXPECT_NE(stats.find("\"requests\": 40"), std::string::npos) << stats;
+        EXPECT_NE(stats.find("\"failed_requests\": 20"), std::string::npos) << stats;
+        client.shutdown_server();
+    }
+    server.join();
+    ASSERT_EQ(exit_code, EXIT_SUCCESS);
+}
+
+TEST(main_serve, more_than_64_observables) {
+    FILE *f = open_test_data_file("midout_color_code_d5_r10_p1000.stim");
+    stim::Circuit circuit = stim::Circuit::from_file(f);
+    fclose(f);
+    auto narrow_dem =
+        stim::ErrorAnalyzer::circuit_to_detector_error_model(circuit, false, true, false, 0, false, false);
+    std::string dem_text = narrow_dem.flattened().str();
+    for (size_t k = dem_text.find(" L0"); k != std::string::npos; k = dem_text.find(" L0", k + 1)) {
+        dem_text.insert(k + 3, " L70 L129");
+    }
+    stim::DetectorErrorModel dem(dem_text.c_str());
+    ASSERT_EQ(dem.count_observables(), 130);
+    Decoder decoder = Decoder::from_dem(dem, DecoderConfigOptions{});
+
+    RaiiTempNamedFile dem_file(dem.str());
+    RaiiTempNamedFile stats_file;
+    std::string socket_path = stats_file.path + ".sock";
+    int exit_code = -1;
+    std::thread server([&]() {
+        std::vector<const char *> argv{
+            "TEST_PROCESS",
+            "serve",
+            "--dem",
+            dem_file.path.c_str(),
+            "--socket",
+            socket_path.c_str(),
+            "--num_threads",
+            "1",
+            "--out",
+            stats_file.path.c_str(),
+        };
+        exit_code = chromobius::main((int)argv.size(), argv.data());
+    });
+
+    {
+        auto client = connect_with_retries(socket_path);
+        EXPECT_EQ(client.num_observables, 130);
+
+        size_t det_bytes = (dem.count_detectors() + 7) / 8;
+        std::mt19937_64 rng{0};
+        auto [dets, obs] = stim::sample_batch_detection_events<64>(circuit, 100, rng);
+        dets = dets.transposed();
+        std::vector<uint8_t> packed;
+        std::vector<uint8_t> expected(100 * 17);
+        for (size_t k = 0; k < 100; k++) {
+            packed.insert(packed.end(), dets[k].u8, dets[k].u8 + det_bytes);
+            auto prediction =
+                decoder.decode_detection_events({dets[k].u8, dets[k].u8 + dets.num_minor_u8_padded()});
+            decoder.write_obs_flips_bit_packed(prediction, {expected.data() + k * 17, 17});
+        }
+        ASSERT_NE(expected, std::vector<uint8_t>(100 * 17, 0));
+        EXPECT_EQ(client.predict_obs_flips_from_dets_bit_packed(packed), expected);
+        client.shutdown_server();
+    }
+    server.join();
+    ASSERT_EQ(exit_code, EXIT_SUCCESS);
+}
+
+TEST(main_serve, bad_arguments) {
+    RaiiTempNamedFile dem_file("error(0.1) D0 L0\ndetector(0, 0, 0, 0) D0\n");
+    std::vector<const char *> argv{"TEST_PROCESS", "serve", "--dem", dem_file.path.c_str()};
+    ASSERT_THROW({ chromobius::main((int)argv.size(), argv.data()); }, std::invalid_argument);
+    argv.push_back("--socket");
+    argv.push_back(dem_file.path.c_str());
+    ASSERT_THROW({ chromobius::main((int)argv.size(), argv.data()); }, std::invalid_argument);
+}
+
+#endif
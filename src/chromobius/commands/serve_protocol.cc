@@ -0,0 +1,271 @@
+// Copyright 2023 Google LLC
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "chromobius/commands/serve_protocol.h"
+
+#include <cerrno>
+#include <cstring>
+#include <sstream>
+#include <stdexcept>
+
+#ifndef _WIN32
+#include <arpa/inet.h>
+#include <netinet/in.h>
+#include <sys/socket.h>
+#include <sys/un.h>
+#include <unistd.h>
+#endif
+
+using namespace chromobius;
+
+static void write_u32_le(uint8_t *out, uint32_t value) {
+    for (size_t k = 0; k < 4; k++) {
+        out[k] = (uint8_t)(value >> (8 * k));
+    }
+}
+
+static void write_u64_le(uint8_t *out, uint64_t value) {
+    for (size_t k = 0; k < 8; k++) {
+        out[k] = (uint8_t)(value >> (8 * k));
+    }
+}
+
+static uint32_t read_u32_le(const uint8_t *data) {
+    uint32_t result = 0;
+    for (size_t k = 0; k < 4; k++) {
+        result |= (uint32_t)data[k] << (8 * k);
+    }
+    return result;
+}
+
+static uint64_t read_u64_le(const uint8_t *data) {
+    uint64_t result = 0;
+    for (size_t k = 0; k < 8; k++) {
+        result |= (uint64_t)data[k] << (8 * k);
+    }
+    return result;
+}
+
+void ServeFrameHeader::write_to(uint8_t *out) const {
+    write_u32_le(out, kind_or_status);
+    write_u32_le(out + 4, payload_bytes);
+    write_u64_le(out + 8, request_id);
+}
+
+ServeFrameHeader ServeFrameHeader::read_from(const uint8_t *data) {
+    return ServeFrameHeader{
+        .kind_or_status = read_u32_le(data),
+        .payload_bytes = read_u32_le(data + 4),
+        .request_id = read_u64_le(data + 8),
+    };
+}
+
+#ifdef _WIN32
+
+bool chromobius::serve_read_exact(int fd, std::span<uint8_t> out) {
+    throw std::invalid_argument("chromobius serve isn't supported on Windows.");
+}
+
+void chromobius::serve_write_all(int fd, std::span<const uint8_t> data) {
+    throw std::invalid_argument("chromobius serve isn't supported on Windows.");
+}
+
+void chromobius::serve_disable_sigpipe(int fd) {
+}
+
+ServeClient ServeClient::connect_unix(const std::string &socket_path) {
+    throw std::invalid_argument("chromobius serve isn't supported on Windows.");
+}
+
+ServeClient ServeClient::connect_tcp(uint16_t port) {
+    throw std::invalid_argument("chromobius serve isn't supported on Windows.");
+}
+
+void ServeClient::close() {
+}
+
+#else
+
+bool chromobius::serve_read_exact(int fd, std::span<uint8_t> out) {
+    size_t done = 0;
+    while (done < out.size()) {
+        ssize_t n = recv(fd, out.data() + done, out.size() - done, 0);
+        if (n < 0 && errno == EINTR) {
+            continue;
+        }
+        if (n == 0 && done == 0) {
+            return false;
+        }
+        if (n <= 0) {
+            throw std::invalid_argument("Connection closed in the middle of a frame.");
+        }
+        done += (size_t)n;
+    }
+    return true;
+}
+
+void chromobius::serve_write_all(int fd, std::span<const uint8_t> data) {
+    int flags = 0;
+#ifdef MSG_NOSIGNAL
+    flags |= MSG_NOSIGNAL;
+#endif
+    size_t done = 0;
+    while (done < data.size()) {
+        ssize_t n = send(fd, data.data() + done, data.size() - done, flags);
+        if (n < 0 && errno == EINTR) {
+            continue;
+        }
+        if (n <= 0) {
+            throw std::invalid_argument("Failed to write to connection.");
+        }
+        done += (size_t)n;
+    }
+}
+
+void chromobius::serve_disable_sigpipe(int fd) {
+#if !defined(MSG_NOSIGNAL) && defined(SO_NOSIGPIPE)
+    int one = 1;
+    setsockopt(fd, SOL_SOCKET, SO_NOSIGPIPE, &one, sizeof(one));
+#else
+    (void)fd;
+#endif
+}
+
+static ServeClient finish_connecting(int fd) {
+    uint8_t hello[SERVE_HELLO_BYTES];
+    if (!serve_read_exact(fd, hello) || memcmp(hello, SERVE_MAGIC, sizeof(SERVE_MAGIC)) != 0) {
+        ::close(fd);
+        throw std::invalid_argument("The server didn't respond with a chromobius serve hello.");
+    }
+    return ServeClient::from_connected_socket(fd, read_u32_le(hello + 8), read_u32_le(hello + 12));
+}
+
+ServeClient ServeClient::connect_unix(const std::string &socket_path) {
+    sockaddr_un addr{};
+    addr.sun_family = AF_UNIX;
+    if (socket_path.size() >= sizeof(addr.sun_path)) {
+        throw std::invalid_argument("Socket path is too long: " + socket_path);
+    }
+    strncpy(addr.sun_path, socket_path.c_str(), sizeof(addr.sun_path) - 1);
+    int fd = socket(AF_UNIX, SOCK_STREAM, 0);
+    if (fd < 0) {
+        throw std::invalid_argument("Failed to create a socket.");
+    }
+    if (connect(fd, (sockaddr *)&addr, sizeof(addr)) != 0) {
+        ::close(fd);
+        throw std::invalid_argument("Failed to connect to " + socket_path);
+    }
+    return finish_connecting(fd);
+}
+
+ServeClient ServeClient::connect_tcp(uint16_t port) {
+    sockaddr_in addr{};
+    addr.sin_family = AF_INET;
+    addr.sin_port = htons(port);
+    addr.sin_addr.s_addr = htonl(INADDR_LOOPBACK);
+    int fd = socket(AF_INET, SOCK_STREAM, 0);
+    if (fd < 0) {
+        throw std::invalid_argument("Failed to create a socket.");
+    }
+    if (connect(fd, (sockaddr *)&addr, sizeof(addr)) != 0) {
+        ::close(fd);
+        throw std::invalid_argument("Failed to connect to localhost port " + std::to_string(port));
+    }
+    return finish_connecting(fd);
+}
+
+void ServeClient::close() {
+    if (fd >= 0) {
+        ::close(fd);
+        fd = -1;
+    }
+}
+
+#endif
+
+ServeClient ServeClient::from_connected_socket(int fd, uint32_t num_detectors, uint32_t num_observables) {
+    serve_disable_sigpipe(fd);
+    ServeClient result;
+    result.fd = fd;
+    result.num_detectors = num_detectors;
+    result.num_observables = num_observables;
+    result.next_request_id = 0;
+    return result;
+}
+
+ServeClient::ServeClient() : fd(-1), num_detectors(0), num_observables(0), next_request_id(0) {
+}
+
+ServeClient::ServeClient(ServeClient &&other) noexcept
+    : fd(other.fd),
+      num_detectors(other.num_detectors),
+      num_observables(other.num_observables),
+      next_request_id(other.next_request_id) {
+    other.fd = -1;
+}
+
+ServeClient::~ServeClient() {
+    close();
+}
+
+std::vector<uint8_t> ServeClient::request(ServeRequestKind kind, std::span<const uint8_t> payload) {
+    if (fd < 0) {
+        throw std::invalid_argument("The client is closed.");
+    }
+    if (payload.size() > UINT32_MAX) {
+        throw std::invalid_argument("Request payload is too large for one frame.");
+    }
+    uint64_t request_id = next_request_id++;
+    uint8_t header_bytes[SERVE_HEADER_BYTES];
+    ServeFrameHeader{.kind_or_status = kind, .payload_bytes = (uint32_t)payload.size(), .request_id = request_id}
+        .write_to(header_bytes);
+    serve_write_all(fd, header_bytes);
+    serve_write_all(fd, payload);
+
+    if (!serve_read_exact(fd, header_bytes)) {
+        throw std::invalid_argument("The server closed the connection.");
+    }
+    auto header = ServeFrameHeader::read_from(header_bytes);
+    std::vector<uint8_t> response(header.payload_bytes);
+    if (!serve_read_exact(fd, response) && !response.empty()) {
+        throw std::invalid_argument("The server closed the connection.");
+    }
+    if (header.request_id != request_id) {
+        throw std::invalid_argument("The server responded to a different request.");
+    }
+    if (header.kind_or_status != SERVE_RESPONSE_OK) {
+        throw std::invalid_argument("The server failed to handle the request: " + std::string(response.begin(), response.end()));
+    }
+    return response;
+}
+
+std::vector<uint8_t> ServeClient::predict_obs_flips_from_dets_bit_packed(std::span<const uint8_t> bit_packed_shots) {
+    size_t det_bytes = (num_detectors + 7) / 8;
+    if (det_bytes == 0 ? !bit_packed_shots.empty() : bit_packed_shots.size() % det_bytes != 0) {
+        std::stringstream ss;
+        ss << "The number of bytes (" << bit_packed_shots.size() << ") isn't a multiple of the number of bytes per shot ("
+           << det_bytes << ").";
+        throw std::invalid_argument(ss.str());
+    }
+    return request(SERVE_REQUEST_DECODE, bit_packed_shots);
+}
+
+std::string ServeClient::stats() {
+    auto result = request(SERVE_REQUEST_STATS, {});
+    return std::string(result.begin(), result.end());
+}
+
+void ServeClient::shutdown_server() {
+    request(SERVE_REQUEST_SHUTDOWN, {});
+}
@@ -0,0 +1,148 @@
+/*
+ * Copyright 2023 Google LLC
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+
+#ifndef _CHROMOBIUS_COMMANDS_SERVE_PROTOCOL_H
+#define _CHROMOBIUS_COMMANDS_SERVE_PROTOCOL_H
+
+#include <cstdint>
+#include <span>
+#include <string>
+#include <vector>
+
+namespace chromobius {
+
+/// The wire protocol spoken by `chromobius serve`.
+///
+/// All integers are little endian.
+///
+/// When a client connects, the server sends a 16 byte hello:
+///     8 bytes: the magic value "CHROMOB1".
+///     uint32: the number of detectors the decoder expects.
+///     uint32: the number of observables the decoder predicts.
+///
+/// After that, the client sends request frames and the server replies to each
+/// of them with a response frame carrying the same request id. Responses to
+/// pipelined requests can arrive out of order.
+///
+/// A request frame is a 16 byte header followed by a payload:
+///     uint32: the kind of request (a ServeRequestKind).
+///     uint32: the number of payload bytes.
+///     uint64: a request id chosen by the client.
+///
+/// A response frame is a 16 byte header followed by a payload:
+///     uint32: the status (a ServeResponseStatus).
+///     uint32: the number of payload bytes.
+///     uint64: the id of the request being responded to.
+///
+/// For a DECODE request, the payload is bit packed detection event data for
+/// one or more shots, with each shot taking ceil(num_detectors / 8) bytes. The
+/// payload of a successful response is the bit packed observable predictions,
+/// with each shot taking ceil(num_observables / 8) bytes.
+///
+/// For a STATS request the payload is empty, and the response payload is a
+/// JSON object describing the requests served so far.
+///
+/// For a SHUTDOWN request the payload is empty. The server replies, stops
+/// accepting connections, finishes outstanding requests, and exits.
+///
+/// When a request fails, the response has status ERROR and its payload is a
+/// message describing the problem.
+constexpr char SERVE_MAGIC[8] = {'C', 'H', 'R', 'O', 'M', 'O', 'B', '1'};
+constexpr size_t SERVE_HELLO_BYTES = 16;
+constexpr size_t SERVE_HEADER_BYTES = 16;
+
+enum ServeRequestKind : uint32_t {
+    SERVE_REQUEST_DECODE = 0,
+    SERVE_REQUEST_STATS = 1,
+    SERVE_REQUEST_SHUTDOWN = 2,
+};
+
+enum ServeResponseStatus : uint32_t {
+    SERVE_RESPONSE_OK = 0,
+    SERVE_RESPONSE_ERROR = 1,
+};
+
+struct ServeFrameHeader {
+    uint32_t kind_or_status;
+    uint32_t payload_bytes;
+    uint64_t request_id;
+
+    void write_to(uint8_t *out) const;
+    static ServeFrameHeader read_from(const uint8_t *data);
+};
+
+/// Reads exactly out.size() bytes from a socket.
+///
+/// Returns:
+///     False if the connection was closed before any bytes were read.
+///     True if all the bytes were read.
+///
+/// Raises:
+///     std::invalid_argument: The connection failed or closed partway through.
+bool serve_read_exact(int fd, std::span<uint8_t> out);
+
+/// Writes all the given bytes to a socket.
+///
+/// Raises:
+///     std::invalid_argument: The connection failed.
+void serve_write_all(int fd, std::span<const uint8_t> data);
+
+/// Makes writing to a socket whose peer has disconnected fail with an error,
+/// instead of raising SIGPIPE (which would kill the process).
+///
+/// Only needed on platforms without MSG_NOSIGNAL (e.g. macOS), where
+/// serve_write_all can't suppress the signal per write. Call it on every
+/// socket that serve_write_all will write to.
+void serve_disable_sigpipe(int fd);
+
+/// A client for talking to a `chromobius serve` process.
+///
+/// The client is synchronous: each method sends one request and waits for its
+/// response.
+struct ServeClient {
+    int fd;
+    uint32_t num_detectors;
+    uint32_t num_observables;
+    uint64_t next_request_id;
+
+    /// Connects to a server listening on a unix domain socket.
+    static ServeClient connect_unix(const std::string &socket_path);
+    /// Connects to a server listening on a TCP port of localhost.
+    static ServeClient connect_tcp(uint16_t port);
+    /// Wraps a socket that has already received the server's hello.
+    static ServeClient from_connected_socket(int fd, uint32_t num_detectors, uint32_t num_observables);
+
+    ServeClient(ServeClient &&other) noexcept;
+    ServeClient(const ServeClient &) = delete;
+    ServeClient &operator=(const ServeClient &) = delete;
+    ~ServeClient();
+
+    /// Decodes bit packed shots on the server, returning bit packed predictions.
+    std::vector<uint8_t> predict_obs_flips_from_dets_bit_packed(std::span<const uint8_t> bit_packed_shots);
+    /// Returns the server's JSON statistics about requests served so far.
+    std::string stats();
+    /// Asks the server to exit.
+    void shutdown_server();
+    void close();
+
+   private:
+    ServeClient();
+    std::vector<uint8_t> request(ServeRequestKind kind, std::span<const uint8_t> payload);
+};
+
+}  // namespace chromobius
+
+#endif
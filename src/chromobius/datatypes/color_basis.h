@@ -62,14 +62,16 @@ enum Basis : uint8_t {
     Z = 2,
 };
 
+/// The color and basis of a detector, packed into a single byte.
 struct ColorBasis {
-    Charge color;
-    Basis basis;
-    bool ignored = false;
+    Charge color : 2;
+    Basis basis : 2;
+    bool ignored : 1 = false;
     bool operator==(const ColorBasis &other) const;
     bool operator!=(const ColorBasis &other) const;
     std::string str() const;
 };
+static_assert(sizeof(ColorBasis) == 1);
 std::ostream &operator<<(std::ostream &out, const ColorBasis &val);
 std::ostream &operator<<(std::ostream &out, const Charge &val);
 std::ostream &operator<<(std::ostream &out, const SubGraphCoord &val);
@@ -25,6 +25,8 @@ namespace chromobius {
 typedef uint64_t obsmask_int;
 typedef uint32_t node_offset_int;
 constexpr node_offset_int BOUNDARY_NODE = (node_offset_int)-1;
+/// The node index given to detectors that were dropped because they're ignored.
+constexpr node_offset_int IGNORED_NODE = (node_offset_int)-2;
 
 }  // namespace chromobius
 
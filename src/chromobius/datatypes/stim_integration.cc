@@ -18,6 +18,10 @@
 
 using namespace chromobius;
 
+stim::DetectorErrorModel chromobius::circuit_to_decoding_dem(const stim::Circuit &circuit) {
+    return stim::ErrorAnalyzer::circuit_to_detector_error_model(circuit, false, true, false, true, false, false);
+}
+
 ColorBasis chromobius::detector_instruction_to_color_basis(
     const stim::DemInstruction &instruction, std::span<const double> coord_offsets) {
     assert(instruction.type == stim::DemInstructionType::DEM_DETECTOR);
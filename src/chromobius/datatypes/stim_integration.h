@@ -29,6 +29,15 @@ namespace chromobius {
 ColorBasis detector_instruction_to_color_basis(
     const stim::DemInstruction &instruction, std::span<const double> coord_offsets);
 
+/// Runs error analysis on a circuit, producing the detector error model that
+/// decoders for the circuit are configured from.
+///
+/// Loops are folded, so circuits with many rounds are analyzed in time
+/// proportional to their loop bodies instead of their unrolled length.
+/// Disjoint error channels (like PAULI_CHANNEL_1) are approximated, and
+/// errors aren't decomposed (chromobius does its own decomposition).
+stim::DetectorErrorModel circuit_to_decoding_dem(const stim::Circuit &circuit);
+
 }  // namespace chromobius
 
 #endif
@@ -0,0 +1,380 @@
+// Copyright 2023 Google LLC
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "chromobius/decode/cluster_decoder.h"
+
+#include <algorithm>
+#include <cmath>
+#include <map>
+#include <numeric>
+
+using namespace chromobius;
+
+/// Combines the weights of two parallel edges corresponding to independent errors.
+///
+/// Computes log((1-p)/p) where p is the probability that exactly one of the errors
+/// occurs, in a form that doesn't overflow for large weights.
+static double merge_independent_weights(double a, double b) {
+    double sign = std::copysign(1, a) * std::copysign(1, b);
+    double signed_min = sign * std::min(std::abs(a), std::abs(b));
+    return signed_min + std::log(1 + std::exp(-std::abs(a + b))) - std::log(1 + std::exp(-std::abs(a - b)));
+}
+
+MobiusWeightGraph MobiusWeightGraph::from_mobius_dem(
+    const stim::DetectorErrorModel &mobius_dem, size_t num_mobius_nodes) {
+    std::map<std::pair<uint64_t, uint64_t>, double> edge_weights;
+    mobius_dem.iter_flatten_error_instructions([&](const stim::DemInstruction &instruction) {
+        double p = instruction.arg_data[0];
+        if (p == 0) {
+            return;
+        }
+        double w = std::log((1 - p) / p);
+        for (size_t k = 0; k + 1 < instruction.target_data.size(); k += 3) {
+            uint64_t a = instruction.target_data[k].raw_id();
+            uint64_t b = instruction.target_data[k + 1].raw_id();
+            if (a == b) {
+                continue;
+            }
+            auto key = std::pair<uint64_t, uint64_t>{std::min(a, b), std::max(a, b)};
+            auto [it, inserted] = edge_weights.emplace(key, w);
+            if (!inserted) {
+                it->second = merge_independent_weights(it->second, w);
+            }
+        }
+    });
+
+    MobiusWeightGraph result;
+    result.max_weight = 0;
+    result.min_weight = INFINITY;
+    result.all_weights_positive = true;
+    result.offsets.resize(num_mobius_nodes + 1, 0);
+    for (const auto &[key, w] : edge_weights) {
+        result.offsets[key.first + 1]++;
+        result.offsets[key.second + 1]++;
+        result.max_weight = std::max(result.max_weight, w);
+        result.min_weight = std::min(result.min_weight, w);
+        result.all_weights_positive &= w > 0;
+    }
+    for (size_t k = 0; k < num_mobius_nodes; k++) {
+        result.offsets[k + 1] += result.offsets[k];
+    }
+    result.neighbors.resize(result.offsets.back());
+    result.weights.resize(result.offsets.back());
+    std::vector<size_t> fill(result.offsets.begin(), result.offsets.end() - 1);
+    for (const auto &[key, w] : edge_weights) {
+        result.neighbors[fill[key.first]] = key.second;
+        result.weights[fill[key.first]++] = w;
+        result.neighbors[fill[key.second]] = key.first;
+        result.weights[fill[key.second]++] = w;
+    }
+    return result;
+}
+
+ClusterDecoder::ClusterDecoder(const Decoder &decoder, size_t num_threads)
+    : ClusterDecoder(
+          decoder,
+          num_threads,
+          MobiusWeightGraph::from_mobius_dem(decoder.mobius_dem, decoder.node_colors.size() * 2)) {
+}
+
+ClusterDecoder::ClusterDecoder(const Decoder &decoder, size_t num_threads, MobiusWeightGraph graph)
+    : decoder(decoder.clone()), graph(std::move(graph)), num_threads(num_threads) {
+    if (num_threads == 0) {
+        throw std::invalid_argument("num_threads == 0");
+    }
+    if (decoder.cluster_decoder != nullptr) {
+        throw std::invalid_argument("The decoder given to a cluster decoder can't itself have a cluster decoder.");
+    }
+    if (!decoder.extra_observable_chunks.empty()) {
+        throw std::invalid_argument("The cluster decoder is limited to 64 observables.");
+    }
+    if (num_threads > 1) {
+        pool = std::make_unique<DecoderPool>(this->decoder, num_threads, num_threads * 4);
+    }
+}
+
+std::shared_ptr<ClusterDecoder> ClusterDecoder::clone() const {
+    return std::make_shared<ClusterDecoder>(decoder, num_threads, graph);
+}
+
+void ClusterDecoder::decode_cluster(Decoder &cluster_decoder, Cluster &cluster) {
+    try {
+        cluster.obs_flip = cluster_decoder.decode_sparse_detection_events(cluster.detectors, &cluster.weight);
+        cluster.failure = nullptr;
+    } catch (...) {
+        cluster.obs_flip = 0;
+        cluster.weight = 0;
+        cluster.failure = std::current_exception();
+    }
+}
+
+size_t ClusterDecoder::find_root(size_t cluster_index) {
+    while (cluster_parents[cluster_index] != cluster_index) {
+        cluster_parents[cluster_index] = cluster_parents[cluster_parents[cluster_index]];
+        cluster_index = cluster_parents[cluster_index];
+    }
+    return cluster_index;
+}
+
+void ClusterDecoder::decode_pending_clusters() {
+    pending.clear();
+    for (size_t k = 0; k < clusters.size(); k++) {
+        if (clusters[k].needs_decoding) {
+            pending.push_back(k);
+        }
+    }
+
+    if (pool == nullptr || pending.size() == 1) {
+        for (size_t k : pending) {
+            decode_cluster(decoder, clusters[k]);
+        }
+    } else {
+        // Interleave the clusters over the tasks, so that large merged clusters are spread out.
+        size_t num_tasks = std::min(pending.size(), pool->num_threads() * 4);
+        for (size_t t = 0; t < num_tasks; t++) {
+            pool->submit([this, t, num_tasks](Decoder &worker_decoder) {
+                for (size_t k = t; k < pending.size(); k += num_tasks) {
+                    decode_cluster(worker_decoder, clusters[pending[k]]);
+                }
+            });
+        }
+        pool->wait_until_idle();
+    }
+
+    for (size_t k : pending) {
+        clusters[k].needs_decoding = false;
+    }
+}
+
+bool ClusterDecoder::merge_touching_clusters(BallRadius radius_kind) {
+    size_t num_nodes = graph.offsets.size() - 1;
+    if (node_ball_tags.size() != num_nodes) {
+        node_distances.assign(num_nodes, 0);
+        node_distance_stamps.assign(num_nodes, 0);
+        node_ball_tags.assign(num_nodes, 0);
+        distance_stamp = 0;
+        ball_round = 0;
+    }
+    if (++ball_round == 0) {
+        std::fill(node_ball_tags.begin(), node_ball_tags.end(), 0);
+        ball_round = 1;
+    }
+    cluster_parents.resize(clusters.size());
+    std::iota(cluster_parents.begin(), cluster_parents.end(), 0);
+    auto touch = [&](size_t c, uint64_t node) {
+        uint64_t tag = node_ball_tags[node];
+        if ((tag >> 32) == ball_round && (tag & 0xFFFFFFFF) != c) {
+            cluster_parents[find_root(tag & 0xFFFFFFFF)] = find_root(c);
+            return true;
+        }
+        return false;
+    };
+
+    // Grow a ball of radius W/2 around each cluster, noting clusters whose balls overlap or are adjacent.
+    for (size_t c = 0; c < clusters.size(); c++) {
+        if (++distance_stamp == 0) {
+            std::fill(node_distance_stamps.begin(), node_distance_stamps.end(), 0);
+            distance_stamp = 1;
+        }
+        double radius;
+        if (radius_kind == BallRadius::ZERO) {
+            radius = 0;
+        } else if (radius_kind == BallRadius::LOWER_BOUND) {
+            // A cluster with k detection events has 2k mobius detection events. Each matched path covers at most two
+            // of them and weighs at least min_weight, so the cluster's matching weighs at least k*min_weight.
+            radius = clusters[c].detectors.size() * graph.min_weight / 2;
+        } else if (clusters[c].failure != nullptr) {
+            radius = INFINITY;
+        } else {
+            // Pymatching rounds weights to integers, so leave some slack for rounding errors.
+            radius = clusters[c].weight / 2 + 1e-3 * (clusters[c].weight + graph.max_weight);
+        }
+        heap.clear();
+        for (uint64_t d : clusters[c].detectors) {
+            uint64_t n = decoder.detector_node(d);
+            for (uint64_t m : {n * 2, n * 2 + 1}) {
+                node_distances[m] = 0;
+                node_distance_stamps[m] = distance_stamp;
+                heap.push_back({0, m});
+            }
+        }
+        std::make_heap(heap.begin(), heap.end(), std::greater<>());
+        while (!heap.empty()) {
+            std::pop_heap(heap.begin(), heap.end(), std::greater<>());
+            auto [dist, node] = heap.back();
+            heap.pop_back();
+            if (dist > node_distances[node]) {
+                continue;
+            }
+            if (ball_visit_budget == 0) {
+                // The balls of this shot have covered the graph, so the clusters are percolating. Growing the balls
+                // is already costing about as much as decoding everything together would.
+                merge_all_clusters();
+                return true;
+            }
+            ball_visit_budget--;
+            if (!touch(c, node)) {
+                node_ball_tags[node] = ((uint64_t)ball_round << 32) | c;
+            }
+            for (size_t k = graph.offsets[node]; k < graph.offsets[node + 1]; k++) {
+                uint64_t neighbor = graph.neighbors[k];
+                touch(c, neighbor);
+                double next_dist = dist + graph.weights[k];
+                if (next_dist <= radius &&
+                    (node_distance_stamps[neighbor] != distance_stamp || next_dist < node_distances[neighbor])) {
+                    node_distances[neighbor] = next_dist;
+                    node_distance_stamps[neighbor] = distance_stamp;
+                    heap.push_back({next_dist, neighbor});
+                    std::push_heap(heap.begin(), heap.end(), std::greater<>());
+                }
+            }
+        }
+    }
+
+    bool any_merged = false;
+    for (size_t c = 0; c < clusters.size(); c++) {
+        any_merged |= find_root(c) != c;
+    }
+    if (!any_merged) {
+        return false;
+    }
+
+    // Combine touching clusters into new clusters that need to be decoded.
+    merged_clusters.clear();
+    cluster_to_merged.assign(clusters.size(), SIZE_MAX);
+    for (size_t c = 0; c < clusters.size(); c++) {
+        size_t root = find_root(c);
+        if (cluster_to_merged[root] == SIZE_MAX) {
+            cluster_to_merged[root] = merged_clusters.size();
+            merged_clusters.push_back(Cluster{
+                .detectors = {},
+                .obs_flip = clusters[c].obs_flip,
+                .weight = clusters[c].weight,
+                .needs_decoding = clusters[c].needs_decoding,
+                .failure = clusters[c].failure,
+            });
+        } else {
+            merged_clusters[cluster_to_merged[root]].needs_decoding = true;
+        }
+        auto &m = merged_clusters[cluster_to_merged[root]];
+        m.detectors.insert(m.detectors.end(), clusters[c].detectors.begin(), clusters[c].detectors.end());
+    }
+    std::swap(clusters, merged_clusters);
+    return true;
+}
+
+void ClusterDecoder::merge_all_clusters() {
+    if (clusters.size() <= 1) {
+        return;
+    }
+    auto &c0 = clusters[0];
+    for (size_t c = 1; c < clusters.size(); c++) {
+        c0.detectors.insert(c0.detectors.end(), clusters[c].detectors.begin(), clusters[c].detectors.end());
+    }
+    c0.needs_decoding = true;
+    c0.failure = nullptr;
+    clusters.resize(1);
+}
+
+obsmask_int ClusterDecoder::decode_detection_events(
+    std::span<const uint8_t> bit_packed_detection_events, float *weight_out) {
+    if (num_shots_to_skip > 0) {
+        num_shots_to_skip--;
+        last_num_clusters = 1;
+        last_num_rounds = 0;
+        return decoder.decode_detection_events(bit_packed_detection_events, weight_out);
+    }
+
+    clusters.clear();
+    for (size_t k = 0; k < bit_packed_detection_events.size(); k++) {
+        for (uint8_t b = bit_packed_detection_events[k], k2 = 0; b; b >>= 1, k2++) {
+            if (b & 1) {
+                uint64_t d = k * 8 + k2;
+                if (d >= decoder.num_detectors) {
+                    throw std::invalid_argument(
+                        "Detection event data has a detection event past the last detector: D" + std::to_string(d));
+                }
+                if (decoder.detector_node(d) == IGNORED_NODE) {
+                    continue;
+                }
+                clusters.push_back(Cluster{
+                    .detectors = {d},
+                    .obs_flip = 0,
+                    .weight = 0,
+                    .needs_decoding = true,
+                    .failure = nullptr,
+                });
+            }
+        }
+    }
+    size_t num_detection_events = clusters.size();
+    ball_visit_budget = graph.offsets.size() - 1;
+    auto merge_all_if_percolating = [&]() {
+        size_t largest = 0;
+        for (const auto &c : clusters) {
+            largest = std::max(largest, c.detectors.size());
+        }
+        if (largest * 2 > num_detection_events) {
+            // The clusters are percolating. Decoding the rest of them separately won't save any work.
+            merge_all_clusters();
+        }
+    };
+
+    if (!graph.all_weights_positive) {
+        // Without positive weights there's no locality bound, so everything goes into one cluster.
+        merge_all_clusters();
+    } else if (clusters.size() > 1) {
+        // Lone detection events are often expensive to explain on their own, giving them huge balls. So start from
+        // clusters of adjacent detection events, which are usually explained by local errors.
+        merge_touching_clusters(BallRadius::ZERO);
+        // Clusters whose balls would touch even at the smallest radius their matchings allow are going to be merged
+        // anyway. Merging them before decoding anything means a shot that percolates is decoded once, instead of
+        // after a round of decoding clusters that were never going to stay separate.
+        while (clusters.size() > 1 && merge_touching_clusters(BallRadius::LOWER_BOUND)) {
+            merge_all_if_percolating();
+        }
+    }
+    last_num_rounds = 0;
+    while (true) {
+        decode_pending_clusters();
+        last_num_rounds++;
+        if (clusters.size() <= 1 || !merge_touching_clusters(BallRadius::MATCHING_WEIGHT)) {
+            break;
+        }
+        merge_all_if_percolating();
+    }
+    last_num_clusters = clusters.size();
+    if (num_detection_events > 1) {
+        if (last_num_clusters == 1) {
+            num_shots_to_skip = next_skip_length;
+            next_skip_length = std::min(next_skip_length * 2, MAX_SKIPPED_SHOTS);
+        } else {
+            next_skip_length = 1;
+        }
+    }
+
+    obsmask_int result = 0;
+    float total_weight = 0;
+    for (const auto &c : clusters) {
+        if (c.failure != nullptr) {
+            std::rethrow_exception(c.failure);
+        }
+        result ^= c.obs_flip;
+        total_weight += c.weight;
+    }
+    if (weight_out != nullptr) {
+        *weight_out = total_weight;
+    }
+    return result;
+}
@@ -0,0 +1,176 @@
+/*
+ * Copyright 2023 Google LLC
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+
+#ifndef _CHROMOBIUS_DECODE_CLUSTER_DECODER_H
+#define _CHROMOBIUS_DECODE_CLUSTER_DECODER_H
+
+#include <exception>
+
+#include "chromobius/decode/decoder.h"
+#include "chromobius/decode/decoder_pool.h"
+
+namespace chromobius {
+
+/// The weighted mobius matching graph, in compressed sparse row form.
+///
+/// Edge weights are log((1-p)/p), with parallel edges combined as independent
+/// errors. This matches the weights a minimum weight perfect matcher such as
+/// pymatching uses for the mobius dem, so distances in this graph are the
+/// distances the matcher is minimizing.
+struct MobiusWeightGraph {
+    /// neighbors[offsets[n]:offsets[n+1]] are the neighbors of mobius node n.
+    std::vector<size_t> offsets;
+    std::vector<uint64_t> neighbors;
+    std::vector<double> weights;
+    /// The largest edge weight in the graph.
+    double max_weight;
+    /// The smallest edge weight in the graph.
+    double min_weight;
+    /// False if some edge has a non-positive weight (an error probability of
+    /// at least 50%), which breaks the locality argument used for clustering.
+    bool all_weights_positive;
+
+    static MobiusWeightGraph from_mobius_dem(const stim::DetectorErrorModel &mobius_dem, size_t num_mobius_nodes);
+};
+
+/// Decodes each shot by splitting its detection events into clusters that are
+/// provably safe to match independently, and matching those clusters in
+/// parallel.
+///
+/// Detection events start out grouped into clusters of adjacent detection
+/// events. Each cluster is decoded on its own, giving a matching of weight W.
+/// Two clusters A and B are then merged if the balls of radius W_A/2 and
+/// W_B/2 around them (in the MobiusWeightGraph) touch, and merged clusters are
+/// decoded again, until no balls touch. At that point every pair of clusters
+/// is at least (W_A + W_B)/2 apart, which guarantees that no matching pairing
+/// detection events from different clusters is lighter than the union of the
+/// cluster matchings. So the result has the same weight as decoding the whole
+/// shot at once (the predicted observables can differ when there are ties).
+///
+/// When the clusters percolate (one cluster holds most of the detection
+/// events, or the balls cover the graph), the remaining clusters are merged
+/// into one and decoded together.
+///
+/// Before any cluster is decoded, clusters are merged using a lower bound on
+/// their matching weights (which needs no decoding), so a shot that is going to
+/// percolate is usually found out before paying for decoding its clusters.
+/// Growing the balls is also limited to covering the graph once per shot.
+///
+/// This mode is aimed at large patches with sparse detection events, where one
+/// shot is the unit of work: it lowers the latency of each shot, at the cost
+/// of doing more total work. Dense shots percolate, and then the following
+/// shots are decoded directly without trying to cluster them (for a number of
+/// shots that doubles each time clustering fails again, up to
+/// MAX_SKIPPED_SHOTS), so a workload where clustering never wins costs about
+/// the same as decoding directly.
+struct ClusterDecoder {
+    /// The most shots decoded directly, after a shot percolates, before trying
+    /// to cluster shots again.
+    static constexpr size_t MAX_SKIPPED_SHOTS = 64;
+
+    Decoder decoder;
+    MobiusWeightGraph graph;
+    size_t num_threads;
+    /// Decodes clusters in parallel. Null when using a single thread, in
+    /// which case clusters are decoded by `decoder`.
+    std::unique_ptr<DecoderPool> pool;
+
+    /// The number of clusters the most recently decoded shot was split into.
+    size_t last_num_clusters = 0;
+    /// The number of times clusters were decoded and checked for the most
+    /// recently decoded shot. Zero when the shot was decoded directly, without
+    /// trying to cluster it.
+    size_t last_num_rounds = 0;
+    /// How many upcoming shots are decoded directly, because recent shots
+    /// percolated.
+    size_t num_shots_to_skip = 0;
+    /// How many shots will be skipped the next time a shot percolates.
+    size_t next_skip_length = 1;
+
+    /// Prepares to decode using the given decoder's configuration.
+    ///
+    /// Args:
+    ///     decoder: The decoder to use for decoding each cluster. Must not
+    ///         itself have a cluster decoder.
+    ///     num_threads: How many threads to decode clusters with. When 1,
+    ///         clusters are decoded on the calling thread.
+    ClusterDecoder(const Decoder &decoder, size_t num_threads);
+    ClusterDecoder(const Decoder &decoder, size_t num_threads, MobiusWeightGraph graph);
+    ClusterDecoder(const ClusterDecoder &) = delete;
+    ClusterDecoder &operator=(const ClusterDecoder &) = delete;
+
+    /// Creates an independent copy, with its own decoder and threads.
+    std::shared_ptr<ClusterDecoder> clone() const;
+
+    /// Predicts the observables flipped by errors producing the given detection
+    /// events. See Decoder::decode_detection_events.
+    ///
+    /// Skips clustering (and decodes the shot directly) when recent shots
+    /// percolated.
+    obsmask_int decode_detection_events(
+        std::span<const uint8_t> bit_packed_detection_events, float *weight_out = nullptr);
+
+   private:
+    struct Cluster {
+        std::vector<uint64_t> detectors;
+        obsmask_int obs_flip;
+        float weight;
+        bool needs_decoding;
+        /// Set when the cluster couldn't be decoded on its own (e.g. because it
+        /// contains an unpaired detection event). Failed clusters are merged
+        /// with every cluster they can reach.
+        std::exception_ptr failure;
+    };
+
+    /// How far to grow the ball around each cluster when looking for clusters
+    /// to merge.
+    enum class BallRadius {
+        /// Only merge clusters that are adjacent.
+        ZERO,
+        /// Half of a lower bound on the cluster's matching weight, which
+        /// doesn't require decoding the cluster.
+        LOWER_BOUND,
+        /// Half of the cluster's matching weight (requires the cluster to have
+        /// been decoded).
+        MATCHING_WEIGHT,
+    };
+
+    static void decode_cluster(Decoder &cluster_decoder, Cluster &cluster);
+    void decode_pending_clusters();
+    bool merge_touching_clusters(BallRadius radius_kind);
+    void merge_all_clusters();
+    size_t find_root(size_t cluster_index);
+
+    /// Ephemeral workspaces.
+    std::vector<Cluster> clusters;
+    std::vector<Cluster> merged_clusters;
+    std::vector<size_t> cluster_parents;
+    std::vector<size_t> cluster_to_merged;
+    std::vector<size_t> pending;
+    std::vector<double> node_distances;
+    std::vector<uint32_t> node_distance_stamps;
+    std::vector<uint64_t> node_ball_tags;
+    uint32_t distance_stamp = 0;
+    uint32_t ball_round = 0;
+    /// How many more nodes the balls grown for the current shot may visit
+    /// before the shot is treated as percolating.
+    size_t ball_visit_budget = 0;
+    std::vector<std::pair<double, uint64_t>> heap;
+};
+
+}  // namespace chromobius
+
+#endif
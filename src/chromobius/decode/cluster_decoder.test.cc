@@ -0,0 +1,193 @@
+// Copyright 2023 Google LLC
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+
+#include "chromobius/decode/cluster_decoder.h"
+
+#include "gtest/gtest.h"
+
+#include "chromobius/test_util.test.h"
+
+using namespace chromobius;
+
+TEST(cluster_decoder, mobius_weight_graph) {
+    stim::DetectorErrorModel mobius_dem(R"DEM(
+        error(0.1) D0 D1
+        error(0.1) D1 D0
+        error(0.2) D1 D2 ^ D3 D4
+        error(0.6) D4 D3
+    )DEM");
+    auto graph = MobiusWeightGraph::from_mobius_dem(mobius_dem, 6);
+    ASSERT_EQ(graph.offsets, (std::vector<size_t>{0, 1, 3, 4, 5, 6, 6}));
+    ASSERT_EQ(graph.neighbors, (std::vector<uint64_t>{1, 0, 2, 1, 4, 3}));
+    double p01 = 0.1 * 0.9 * 2;
+    double p34 = 0.2 * 0.4 + 0.8 * 0.6;
+    ASSERT_NEAR(graph.weights[0], std::log((1 - p01) / p01), 1e-6);
+    ASSERT_NEAR(graph.weights[1], std::log((1 - p01) / p01), 1e-6);
+    ASSERT_NEAR(graph.weights[2], std::log(0.8 / 0.2), 1e-6);
+    ASSERT_NEAR(graph.weights[4], std::log((1 - p34) / p34), 1e-6);
+    ASSERT_NEAR(graph.max_weight, std::log((1 - p01) / p01), 1e-6);
+    ASSERT_FALSE(graph.all_weights_positive);
+
+    graph = MobiusWeightGraph::from_mobius_dem(stim::DetectorErrorModel("error(0.25) D0 D1"), 2);
+    ASSERT_TRUE(graph.all_weights_positive);
+}
+
+static void expect_cluster_decoding_matches_full_decoding(
+    const char *circuit_path, size_t num_shots, size_t num_threads) {
+    FILE *f = open_test_data_file(circuit_path);
+    stim::Circuit circuit = stim::Circuit::from_file(f);
+    fclose(f);
+    auto dem = stim::ErrorAnalyzer::circuit_to_detector_error_model(circuit, false, true, false, 0, false, false);
+    Decoder decoder = Decoder::from_dem(dem, DecoderConfigOptions{});
+    ClusterDecoder cluster_decoder(decoder, num_threads);
+
+    std::mt19937_64 rng{0};
+    auto [dets, obs] = stim::sample_batch_detection_events<64>(circuit, num_shots, rng);
+    dets = dets.transposed();
+    size_t num_mismatches = 0;
+    size_t num_split_shots = 0;
+    for (size_t k = 0; k < num_shots; k++) {
+        std::span<const uint8_t> shot{dets[k].u8, dets[k].u8 + dets.num_minor_u8_padded()};
+        float expected_weight;
+        float actual_weight;
+        // Cluster every shot, instead of skipping shots after one percolates.
+        cluster_decoder.num_shots_to_skip = 0;
+        obsmask_int expected = decoder.decode_detection_events(shot, &expected_weight);
+        obsmask_int actual = cluster_decoder.decode_detection_events(shot, &actual_weight);
+        ASSERT_GT(cluster_decoder.last_num_rounds, 0);
+        bool same_weight = std::abs(actual_weight - expected_weight) <= 1e-3 * (1 + expected_weight);
+        EXPECT_TRUE(same_weight) << circuit_path << " shot " << k << ": " << actual_weight << " vs "
+                                 << expected_weight;
+        // Different clusterings can break ties between equal weight matchings differently, so only predictions
+        // from matchings with different weights count as mismatches.
+        num_mismatches += actual != expected && !same_weight;
+        num_split_shots += cluster_decoder.last_num_clusters > 1;
+    }
+
+    EXPECT_EQ(num_mismatches, 0) << circuit_path;
+    EXPECT_GT(num_split_shots, 0) << circuit_path;
+}
+
+TEST(cluster_decoder, matches_full_decoding) {
+    expect_cluster_decoding_matches_full_decoding("midout_color_code_d5_r10_p1000.stim", 256, 1);
+    expect_cluster_decoding_matches_full_decoding("midout_color_code_d9_r36_p1000.stim", 64, 1);
+    expect_cluster_decoding_matches_full_decoding("midout_color_code_d9_r36_p1000.stim", 64, 3);
+    expect_cluster_decoding_matches_full_decoding("superdense_color_code_d5_r20_p1000.stim", 128, 3);
+    expect_cluster_decoding_matches_full_decoding("phenom_color_code_d5_r5_p1000_with_ignored.stim", 128, 2);
+}
+
+TEST(cluster_decoder, small_cases) {
+    Decoder decoder = Decoder::from_dem(
+        stim::DetectorErrorModel(R"DEM(
+            error(0.1) D0 D1 L0
+            error(0.1) D0 D2
+            error(0.1) D1 D2
+            detector(0, 0, 0, 0) D0
+            detector(0, 0, 0, 1) D1
+            detector(0, 0, 0, 2) D2
+        )DEM"),
+        DecoderConfigOptions{});
+    ClusterDecoder cluster_decoder(decoder, 2);
+    std::vector<uint8_t> shot{0};
+    float weight = -1;
+    ASSERT_EQ(cluster_decoder.decode_detection_events(shot, &weight), 0);
+    ASSERT_EQ(weight, 0);
+    ASSERT_EQ(cluster_decoder.last_num_clusters, 0);
+    shot[0] = 3;
+    ASSERT_EQ(cluster_decoder.decode_detection_events(shot), decoder.decode_detection_events(shot));
+    ASSERT_EQ(cluster_decoder.last_num_clusters, 1);
+    shot[0] = 1;
+    ASSERT_THROW({ cluster_decoder.decode_detection_events(shot); }, std::invalid_argument);
+    shot[0] = 8;
+    ASSERT_THROW({ cluster_decoder.decode_detection_events(shot); }, std::invalid_argument);
+    ASSERT_THROW({ ClusterDecoder(decoder, 0); }, std::invalid_argument);
+}
+
+TEST(cluster_decoder, skips_shots_after_percolating) {
+    FILE *f = open_test_data_file("midout_color_code_d9_r36_p1000.stim");
+    stim::Circuit circuit = stim::Circuit::from_file(f);
+    fclose(f);
+    auto dem = stim::ErrorAnalyzer::circuit_to_detector_error_model(circuit, false, true, false, 0, false, false);
+    Decoder decoder = Decoder::from_dem(dem, DecoderConfigOptions{});
+    ClusterDecoder cluster_decoder(decoder, 1);
+
+    std::mt19937_64 rng{0};
+    auto [dets, obs] = stim::sample_batch_detection_events<64>(circuit, 256, rng);
+    dets = dets.transposed();
+    size_t num_skipped = 0;
+    size_t expected_skip_length = 1;
+    for (size_t k = 0; k < 256; k++) {
+        std::span<const uint8_t> shot{dets[k].u8, dets[k].u8 + dets.num_minor_u8_padded()};
+        bool expect_skip = cluster_decoder.num_shots_to_skip > 0;
+        size_t num_dets = dets[k].popcnt();
+        float expected_weight;
+        float actual_weight;
+        decoder.decode_detection_events(shot, &expected_weight);
+        cluster_decoder.decode_detection_events(shot, &actual_weight);
+        ASSERT_NEAR(actual_weight, expected_weight, 1e-3 * (1 + expected_weight)) << k;
+        ASSERT_EQ(cluster_decoder.last_num_rounds == 0, expect_skip) << k;
+        num_skipped += expect_skip;
+        if (!expect_skip && num_dets > 1) {
+            if (cluster_decoder.last_num_clusters == 1) {
+                ASSERT_EQ(cluster_decoder.num_shots_to_skip, expected_skip_length);
+                expected_skip_length = std::min(expected_skip_length * 2, ClusterDecoder::MAX_SKIPPED_SHOTS);
+            } else {
+                expected_skip_length = 1;
+            }
+            ASSERT_EQ(cluster_decoder.next_skip_length, expected_skip_length);
+        }
+    }
+    ASSERT_GT(num_skipped, 0);
+    ASSERT_LT(num_skipped, 256);
+}
+
+TEST(cluster_decoder, configured_through_decoder_options) {
+    FILE *f = open_test_data_file("midout_color_code_d9_r36_p1000.stim");
+    stim::Circuit circuit = stim::Circuit::from_file(f);
+    fclose(f);
+    auto dem = stim::ErrorAnalyzer::circuit_to_detector_error_model(circuit, false, true, false, 0, false, false);
+    Decoder decoder = Decoder::from_dem(dem, DecoderConfigOptions{});
+    ASSERT_EQ(Decoder::from_dem(dem, DecoderConfigOptions{.cluster_threads = 1}).cluster_decoder, nullptr);
+    Decoder clustering = Decoder::from_dem(dem, DecoderConfigOptions{.cluster_threads = 2});
+    ASSERT_NE(clustering.cluster_decoder, nullptr);
+    ASSERT_EQ(clustering.cluster_decoder->num_threads, 2);
+    Decoder copy = clustering.clone();
+    ASSERT_NE(copy.cluster_decoder, nullptr);
+    ASSERT_NE(copy.cluster_decoder, clustering.cluster_decoder);
+
+    std::mt19937_64 rng{0};
+    auto [dets, obs] = stim::sample_batch_detection_events<64>(circuit, 64, rng);
+    dets = dets.transposed();
+    std::vector<obsmask_int> batch_predictions(64);
+    copy.decode_detection_events_batch(
+        {dets.data.u8, dets.data.u8 + dets.data.num_u8_padded()}, dets.num_minor_u8_padded(), batch_predictions);
+    for (size_t k = 0; k < 64; k++) {
+        std::span<const uint8_t> shot{dets[k].u8, dets[k].u8 + dets.num_minor_u8_padded()};
+        float expected_weight;
+        float actual_weight;
+        decoder.decode_detection_events(shot, &expected_weight);
+        obsmask_int actual = clustering.decode_detection_events(shot, &actual_weight);
+        ASSERT_NEAR(actual_weight, expected_weight, 1e-3 * (1 + expected_weight)) << k;
+        // The clone saw the same shots in the same order, so it clustered them the same way.
+        ASSERT_EQ(batch_predictions[k], actual) << k;
+    }
+
+    ASSERT_THROW(
+        { Decoder::from_dem(dem, DecoderConfigOptions{.max_detection_events = 5, .cluster_threads = 2}); },
+        std::invalid_argument);
+    ASSERT_THROW(
+        { Decoder::from_dem(dem, DecoderConfigOptions{.shot_time_budget_seconds = 1, .cluster_threads = 2}); },
+        std::invalid_argument);
+}
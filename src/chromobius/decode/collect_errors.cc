@@ -0,0 +1,145 @@
+// Copyright 2023 Google LLC
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "chromobius/decode/collect_errors.h"
+
+#include <atomic>
+#include <chrono>
+#include <thread>
+
+using namespace chromobius;
+
+struct CollectErrorsSharedState {
+    const stim::Circuit &circuit;
+    stim::CircuitStats circuit_stats;
+    uint64_t max_shots;
+    uint64_t max_errors;
+    uint64_t seed;
+    size_t batch_size;
+
+    std::atomic<uint64_t> next_batch_index;
+    std::atomic<uint64_t> shots;
+    std::atomic<uint64_t> errors;
+    std::atomic<uint64_t> nanoseconds;
+    std::atomic<bool> failed;
+};
+
+static void collect_errors_worker_loop(CollectErrorsSharedState &state, Decoder &decoder) {
+    auto t0 = std::chrono::steady_clock::now();
+    stim::FrameSimulator<stim::MAX_BITWORD_WIDTH> sim(
+        state.circuit_stats,
+        stim::FrameSimulatorMode::STORE_DETECTIONS_TO_MEMORY,
+        state.batch_size,
+        std::mt19937_64{0});
+    size_t num_obs_words = (state.circuit_stats.num_observables + 63) / 64;
+
+    while (state.errors.load() < state.max_errors && !state.failed.load()) {
+        uint64_t batch_index = state.next_batch_index.fetch_add(1);
+        uint64_t batch_start = batch_index * state.batch_size;
+        if (batch_start >= state.max_shots) {
+            break;
+        }
+        size_t num_shots = (size_t)std::min<uint64_t>(state.batch_size, state.max_shots - batch_start);
+
+        std::seed_seq seq{(uint32_t)state.seed, (uint32_t)(state.seed >> 32), (uint32_t)batch_index, (uint32_t)(batch_index >> 32)};
+        sim.rng = std::mt19937_64(seq);
+        sim.reset_all();
+        sim.do_circuit(state.circuit);
+        auto dets = sim.det_record.storage.transposed();
+        auto obs_actual = sim.obs_record.transposed();
+
+        uint64_t batch_errors = 0;
+        for (size_t k = 0; k < num_shots; k++) {
+            std::span<const uint8_t> det_data{dets[k].u8, dets[k].u8 + dets.num_minor_u8_padded()};
+            obsmask_int prediction = decoder.decode_detection_events(det_data);
+            bool failed = obs_actual[k].u64[0] != prediction;
+            for (size_t w = 1; w < num_obs_words; w++) {
+                // Observables past the first 64 are predicted in chunks of 64 (see Decoder::extra_obs_flips).
+                obsmask_int extra = w <= decoder.extra_obs_flips.size() ? decoder.extra_obs_flips[w - 1] : 0;
+                failed |= obs_actual[k].u64[w] != extra;
+            }
+            batch_errors += failed;
+        }
+        state.shots += num_shots;
+        state.errors += batch_errors;
+    }
+
+    auto t1 = std::chrono::steady_clock::now();
+    state.nanoseconds += (uint64_t)std::chrono::duration_cast<std::chrono::nanoseconds>(t1 - t0).count();
+}
+
+static void collect_errors_worker(CollectErrorsSharedState &state, Decoder &decoder, std::exception_ptr &out_failure) {
+    try {
+        collect_errors_worker_loop(state, decoder);
+    } catch (...) {
+        out_failure = std::current_exception();
+        state.failed = true;
+    }
+}
+
+CollectedErrorStats chromobius::collect_errors(
+    const stim::Circuit &circuit,
+    const Decoder &decoder,
+    uint64_t max_shots,
+    uint64_t max_errors,
+    size_t num_threads,
+    uint64_t seed,
+    size_t batch_size) {
+    if (num_threads == 0) {
+        throw std::invalid_argument("num_threads == 0");
+    }
+    if (batch_size == 0) {
+        throw std::invalid_argument("batch_size == 0");
+    }
+    auto stats = circuit.compute_stats();
+
+    CollectErrorsSharedState state{
+        .circuit = circuit,
+        .circuit_stats = stats,
+        .max_shots = max_shots,
+        .max_errors = max_errors,
+        .seed = seed,
+        .batch_size = batch_size,
+        .next_batch_index = 0,
+        .shots = 0,
+        .errors = 0,
+        .nanoseconds = 0,
+        .failed = false,
+    };
+
+    std::vector<Decoder> decoders;
+    for (size_t k = 0; k < num_threads; k++) {
+        decoders.push_back(decoder.clone());
+    }
+    std::vector<std::exception_ptr> failures(num_threads);
+    std::vector<std::thread> threads;
+    for (size_t k = 1; k < num_threads; k++) {
+        threads.emplace_back(collect_errors_worker, std::ref(state), std::ref(decoders[k]), std::ref(failures[k]));
+    }
+    collect_errors_worker(state, decoders[0], failures[0]);
+    for (auto &t : threads) {
+        t.join();
+    }
+    for (const auto &failure : failures) {
+        if (failure) {
+            std::rethrow_exception(failure);
+        }
+    }
+
+    return CollectedErrorStats{
+        .shots = state.shots.load(),
+        .errors = state.errors.load(),
+        .seconds = (double)state.nanoseconds.load() / 1e9,
+    };
+}
@@ -0,0 +1,71 @@
+/*
+ * Copyright 2023 Google LLC
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+
+#ifndef _CHROMOBIUS_DECODE_COLLECT_ERRORS_H
+#define _CHROMOBIUS_DECODE_COLLECT_ERRORS_H
+
+#include <cstdint>
+
+#include "chromobius/decode/decoder.h"
+#include "stim.h"
+
+namespace chromobius {
+
+/// Counts accumulated while sampling and decoding a circuit.
+///
+/// Mirrors the fields of sinter's AnonTaskStats.
+struct CollectedErrorStats {
+    uint64_t shots;
+    uint64_t errors;
+    /// Total thread time spent sampling and decoding (summed over workers).
+    double seconds;
+};
+
+/// Samples a circuit and decodes the samples, counting how often the decoder is wrong.
+///
+/// Sampling and decoding both happen in C++. The work is split into batches
+/// that are handed out to worker threads. Each worker owns a frame simulator
+/// and a clone of the given decoder.
+///
+/// Args:
+///     circuit: The noisy circuit to sample.
+///     decoder: A decoder configured for the circuit's detector error model.
+///         Workers use clones of this decoder, so it isn't mutated.
+///     max_shots: The maximum number of shots to take.
+///     max_errors: Sampling stops early once this many errors have been seen.
+///         Batches already in progress are finished, so the final error count
+///         can exceed this value.
+///     num_threads: The number of worker threads to use.
+///     seed: Seeds the sampling. Each batch is seeded using this value and the
+///         batch's index.
+///     batch_size: The number of shots sampled by one worker at a time.
+///
+/// Returns:
+///     The number of shots taken, the number of shots where the decoder's
+///     prediction differed from the actual observable flips (of any of the
+///     circuit's observables), and the time spent.
+CollectedErrorStats collect_errors(
+    const stim::Circuit &circuit,
+    const Decoder &decoder,
+    uint64_t max_shots,
+    uint64_t max_errors,
+    size_t num_threads,
+    uint64_t seed,
+    size_t batch_size = 1024);
+
+}  // namespace chromobius
+
+#endif
@@ -0,0 +1,120 @@
+// Copyright 2023 Google LLC
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "chromobius/decode/collect_errors.h"
+
+#include "gtest/gtest.h"
+
+#include "chromobius/test_util.test.h"
+
+using namespace chromobius;
+
+static stim::Circuit load_test_circuit(const char *name) {
+    FILE *f = open_test_data_file(name);
+    stim::Circuit circuit = stim::Circuit::from_file(f);
+    fclose(f);
+    return circuit;
+}
+
+TEST(collect_errors, matches_direct_decoding) {
+    auto circuit = load_test_circuit("midout_color_code_d5_r10_p1000.stim");
+    auto dem = stim::ErrorAnalyzer::circuit_to_detector_error_model(circuit, false, true, false, 0, false, false);
+    auto decoder = Decoder::from_dem(dem, DecoderConfigOptions{});
+
+    auto stats = collect_errors(circuit, decoder, 2048, UINT64_MAX, 1, 5, 512);
+    ASSERT_EQ(stats.shots, 2048);
+    ASSERT_GT(stats.seconds, 0);
+
+    // Redo the sampling and decoding by hand, batch by batch.
+    uint64_t expected_errors = 0;
+    for (uint64_t batch_index = 0; batch_index < 4; batch_index++) {
+        std::seed_seq seq{(uint32_t)5, (uint32_t)0, (uint32_t)batch_index, (uint32_t)0};
+        std::mt19937_64 rng(seq);
+        auto [dets, obs] = stim::sample_batch_detection_events<stim::MAX_BITWORD_WIDTH>(circuit, 512, rng);
+        dets = dets.transposed();
+        obs = obs.transposed();
+        for (size_t k = 0; k < 512; k++) {
+            std::span<const uint8_t> det_data{dets[k].u8, dets[k].u8 + dets.num_minor_u8_padded()};
+            expected_errors += obs[k].u64[0] != decoder.decode_detection_events(det_data);
+        }
+    }
+    ASSERT_EQ(stats.errors, expected_errors);
+}
+
+TEST(collect_errors, multiple_threads) {
+    auto circuit = load_test_circuit("midout_color_code_d5_r10_p1000.stim");
+    auto dem = stim::ErrorAnalyzer::circuit_to_detector_error_model(circuit, false, true, false, 0, false, false);
+    auto decoder = Decoder::from_dem(dem, DecoderConfigOptions{});
+
+    auto single = collect_errors(circuit, decoder, 3000, UINT64_MAX, 1, 7, 256);
+    auto multi = collect_errors(circuit, decoder, 3000, UINT64_MAX, 4, 7, 256);
+    ASSERT_EQ(single.shots, 3000);
+    ASSERT_EQ(multi.shots, 3000);
+    ASSERT_EQ(single.errors, multi.errors);
+}
+
+TEST(collect_errors, stops_early_at_max_errors) {
+    auto circuit = stim::Circuit(R"CIRCUIT(
+        X_ERROR(0.25) 0 1 2 3 4 5 6 7 8
+        M 0 1 2 3 4 5 6 7 8
+        DETECTOR(0, 0, 0, 0) rec[-9] rec[-8] rec[-7]
+        DETECTOR(1, 0, 0, 1) rec[-8] rec[-7] rec[-6]
+        DETECTOR(2, 0, 0, 2) rec[-7] rec[-6] rec[-5]
+        DETECTOR(3, 0, 0, 0) rec[-6] rec[-5] rec[-4]
+        DETECTOR(4, 0, 0, 1) rec[-5] rec[-4] rec[-3]
+        DETECTOR(5, 0, 0, 2) rec[-4] rec[-3] rec[-2]
+        DETECTOR(6, 0, 0, 0) rec[-3] rec[-2] rec[-1]
+        DETECTOR(7, 0, 0, 1) rec[-2] rec[-1]
+        OBSERVABLE_INCLUDE(0) rec[-1]
+    )CIRCUIT");
+    auto dem = stim::ErrorAnalyzer::circuit_to_detector_error_model(circuit, false, true, false, 0, false, false);
+    auto decoder = Decoder::from_dem(dem, DecoderConfigOptions{});
+
+    auto stats = collect_errors(circuit, decoder, 1000000, 10, 2, 0, 64);
+    ASSERT_GE(stats.errors, 10);
+    ASSERT_LT(stats.shots, 1000000);
+
+    ASSERT_THROW({ collect_errors(circuit, decoder, 10, 10, 0, 0, 64); }, std::invalid_argument);
+}
+
+TEST(collect_errors, more_than_64_observables) {
+    std::string body = R"CIRCUIT(
+        X_ERROR(0.25) 0 1 2 3 4 5 6 7 8
+        M 0 1 2 3 4 5 6 7 8
+        DETECTOR(0, 0, 0, 0) rec[-9] rec[-8] rec[-7]
+        DETECTOR(1, 0, 0, 1) rec[-8] rec[-7] rec[-6]
+        DETECTOR(2, 0, 0, 2) rec[-7] rec[-6] rec[-5]
+        DETECTOR(3, 0, 0, 0) rec[-6] rec[-5] rec[-4]
+        DETECTOR(4, 0, 0, 1) rec[-5] rec[-4] rec[-3]
+        DETECTOR(5, 0, 0, 2) rec[-4] rec[-3] rec[-2]
+        DETECTOR(6, 0, 0, 0) rec[-3] rec[-2] rec[-1]
+        DETECTOR(7, 0, 0, 1) rec[-2] rec[-1]
+    )CIRCUIT";
+    auto narrow_circuit = stim::Circuit((body + "OBSERVABLE_INCLUDE(0) rec[-1]").c_str());
+    // The same circuit, but with its observable moved past the first 64 observables.
+    auto wide_circuit = stim::Circuit((body + "OBSERVABLE_INCLUDE(129) rec[-1]").c_str());
+    ASSERT_EQ(wide_circuit.count_observables(), 130);
+
+    auto narrow_decoder = Decoder::from_dem(
+        stim::ErrorAnalyzer::circuit_to_detector_error_model(narrow_circuit, false, true, false, 0, false, false),
+        DecoderConfigOptions{});
+    auto wide_decoder = Decoder::from_dem(
+        stim::ErrorAnalyzer::circuit_to_detector_error_model(wide_circuit, false, true, false, 0, false, false),
+        DecoderConfigOptions{});
+    auto narrow = collect_errors(narrow_circuit, narrow_decoder, 2048, UINT64_MAX, 2, 3, 256);
+    auto wide = collect_errors(wide_circuit, wide_decoder, 2048, UINT64_MAX, 2, 3, 256);
+    ASSERT_GT(narrow.errors, 0);
+    ASSERT_EQ(wide.shots, 2048);
+    ASSERT_EQ(wide.errors, narrow.errors);
+}
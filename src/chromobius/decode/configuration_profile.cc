@@ -0,0 +1,96 @@
+// Copyright 2023 Google LLC
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "chromobius/decode/configuration_profile.h"
+
+#include <iomanip>
+#include <sstream>
+
+#if defined(__linux__) || defined(__APPLE__)
+#include <sys/resource.h>
+#endif
+
+using namespace chromobius;
+
+uint64_t chromobius::process_peak_rss_bytes() {
+#if defined(__linux__) || defined(__APPLE__)
+    rusage usage;
+    if (getrusage(RUSAGE_SELF, &usage) != 0) {
+        return 0;
+    }
+#if defined(__APPLE__)
+    return (uint64_t)usage.ru_maxrss;
+#else
+    return (uint64_t)usage.ru_maxrss * 1024;
+#endif
+#else
+    return 0;
+#endif
+}
+
+void ConfigurationProfile::start() {
+    stage_start = std::chrono::steady_clock::now();
+    stage_start_peak_rss = process_peak_rss_bytes();
+}
+
+void ConfigurationProfile::finish_stage(std::string name) {
+    auto now = std::chrono::steady_clock::now();
+    uint64_t peak = process_peak_rss_bytes();
+    stages.push_back(Stage{
+        .name = std::move(name),
+        .seconds = std::chrono::duration<double>(now - stage_start).count(),
+        .peak_rss_bytes = peak,
+        .peak_rss_growth_bytes = peak - std::min(peak, stage_start_peak_rss),
+    });
+    stage_start = now;
+    stage_start_peak_rss = peak;
+}
+
+void ConfigurationProfile::add_count(std::string name, uint64_t count) {
+    counts.push_back({std::move(name), count});
+}
+
+double ConfigurationProfile::total_seconds() const {
+    double total = 0;
+    for (const auto &stage : stages) {
+        total += stage.seconds;
+    }
+    return total;
+}
+
+std::string ConfigurationProfile::to_json() const {
+    std::stringstream ss;
+    // Print times at full precision, so that the total matches the sum of the stages.
+    ss << std::setprecision(17);
+    ss << "{\n";
+    ss << "    \"stages\": [\n";
+    for (size_t k = 0; k < stages.size(); k++) {
+        const auto &stage = stages[k];
+        ss << "        {\"name\": \"" << stage.name << "\"";
+        ss << ", \"seconds\": " << stage.seconds;
+        ss << ", \"peak_rss_bytes\": " << stage.peak_rss_bytes;
+        ss << ", \"peak_rss_growth_bytes\": " << stage.peak_rss_growth_bytes;
+        ss << "}" << (k + 1 < stages.size() ? "," : "") << "\n";
+    }
+    ss << "    ],\n";
+    ss << "    \"total_seconds\": " << total_seconds() << ",\n";
+    ss << "    \"counts\": {\n";
+    for (size_t k = 0; k < counts.size(); k++) {
+        ss << "        \"" << counts[k].first << "\": " << counts[k].second;
+        ss << (k + 1 < counts.size() ? "," : "") << "\n";
+    }
+    ss << "    }\n";
+    ss << "}";
+    return ss.str();
+}
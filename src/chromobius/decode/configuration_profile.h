@@ -0,0 +1,72 @@
+/*
+ * Copyright 2023 Google LLC
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+
+#ifndef _CHROMOBIUS_DECODE_CONFIGURATION_PROFILE_H
+#define _CHROMOBIUS_DECODE_CONFIGURATION_PROFILE_H
+
+#include <chrono>
+#include <cstdint>
+#include <string>
+#include <utility>
+#include <vector>
+
+namespace chromobius {
+
+/// Returns the most resident memory the process has used so far, in bytes.
+///
+/// Returns 0 on platforms where this isn't available.
+uint64_t process_peak_rss_bytes();
+
+/// Records how long each stage of configuring a decoder took, and how many
+/// objects of each kind were produced.
+///
+/// Used by giving a pointer to it in DecoderConfigOptions::profile.
+struct ConfigurationProfile {
+    struct Stage {
+        std::string name;
+        double seconds;
+        /// The process's peak resident memory when the stage finished.
+        uint64_t peak_rss_bytes;
+        /// How much the process's peak resident memory grew during the stage.
+        /// Stages that don't exceed the memory used by earlier stages show no
+        /// growth, even if they allocate a lot.
+        uint64_t peak_rss_growth_bytes;
+    };
+
+    std::vector<Stage> stages;
+    /// Named object counts, in the order they were recorded.
+    std::vector<std::pair<std::string, uint64_t>> counts;
+
+    /// Starts timing the first stage.
+    void start();
+    /// Ends the current stage (recording it under the given name) and starts
+    /// the next one.
+    void finish_stage(std::string name);
+    void add_count(std::string name, uint64_t count);
+
+    double total_seconds() const;
+    /// Returns the profile as a JSON object with "stages", "total_seconds",
+    /// and "counts" entries.
+    std::string to_json() const;
+
+   private:
+    std::chrono::steady_clock::time_point stage_start;
+    uint64_t stage_start_peak_rss = 0;
+};
+
+}  // namespace chromobius
+
+#endif
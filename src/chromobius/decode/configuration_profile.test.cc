@@ -0,0 +1,89 @@
+// Copyright 2023 Google LLC
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "chromobius/decode/configuration_profile.h"
+
+#include "gtest/gtest.h"
+
+#include "chromobius/decode/decoder.h"
+#include "chromobius/test_util.test.h"
+
+using namespace chromobius;
+
+TEST(configuration_profile, to_json) {
+    ConfigurationProfile profile;
+    profile.stages.push_back({.name = "a", .seconds = 0.5, .peak_rss_bytes = 100, .peak_rss_growth_bytes = 10});
+    profile.stages.push_back({.name = "b", .seconds = 0.25, .peak_rss_bytes = 100, .peak_rss_growth_bytes = 0});
+    profile.add_count("x", 5);
+    profile.add_count("y", 7);
+    ASSERT_EQ(profile.total_seconds(), 0.75);
+    ASSERT_EQ(profile.to_json(), R"JSON({
+    "stages": [
+        {"name": "a", "seconds": 0.5, "peak_rss_bytes": 100, "peak_rss_growth_bytes": 10},
+        {"name": "b", "seconds": 0.25, "peak_rss_bytes": 100, "peak_rss_growth_bytes": 0}
+    ],
+    "total_seconds": 0.75,
+    "counts": {
+        "x": 5,
+        "y": 7
+    }
+})JSON");
+}
+
+TEST(configuration_profile, decoder_from_dem) {
+    FILE *f = open_test_data_file("phenom_color_code_d5_r5_p1000_with_ignored.stim");
+    stim::Circuit circuit = stim::Circuit::from_file(f);
+    fclose(f);
+    auto dem = stim::ErrorAnalyzer::circuit_to_detector_error_model(circuit, false, true, false, 0, false, false);
+
+    ConfigurationProfile profile;
+    Decoder decoder = Decoder::from_dem(dem, DecoderConfigOptions{.profile = &profile});
+
+    std::vector<std::string> stage_names;
+    for (const auto &stage : profile.stages) {
+        stage_names.push_back(stage.name);
+        ASSERT_GE(stage.seconds, 0);
+        ASSERT_LE(stage.peak_rss_growth_bytes, stage.peak_rss_bytes);
+    }
+    ASSERT_EQ(
+        stage_names,
+        (std::vector<std::string>{
+            "collect_nodes",
+            "collect_atomic_errors",
+            "decompose_composite_errors",
+            "choose_rgb_reps",
+            "charge_graph",
+            "drag_graph",
+            "extra_observable_chunks",
+            "slim",
+            "matcher",
+        }));
+
+    std::map<std::string, uint64_t> counts(profile.counts.begin(), profile.counts.end());
+    ASSERT_EQ(counts.size(), profile.counts.size());
+    ASSERT_EQ(counts["num_detectors"], dem.count_detectors());
+    ASSERT_EQ(counts["num_nodes"], decoder.node_colors.size());
+    ASSERT_LT(counts["num_nodes"], counts["num_detectors"]);
+    ASSERT_EQ(counts["num_dem_errors"], dem.count_errors());
+    ASSERT_EQ(counts["num_atomic_errors"] + counts["num_remnant_errors"], decoder.atomic_errors.size());
+    ASSERT_EQ(counts["num_mobius_errors"], decoder.mobius_dem.count_errors());
+    ASSERT_GT(counts["num_mobius_edges"], 0);
+    ASSERT_LE(counts["num_mobius_edges"], 3 * counts["num_mobius_errors"]);
+    ASSERT_EQ(counts["num_drag_graph_entries"], decoder.drag_graph.mmm.size());
+
+    // Profiling doesn't change the decoder.
+    Decoder unprofiled = Decoder::from_dem(dem, DecoderConfigOptions{});
+    ASSERT_EQ(decoder.mobius_dem, unprofiled.mobius_dem);
+    ASSERT_EQ(decoder.drag_graph, unprofiled.drag_graph);
+}
@@ -14,34 +14,207 @@
 
 #include "chromobius/decode/decoder.h"
 
+#include <future>
+#include <unordered_map>
+#include <unordered_set>
+
+#include "chromobius/datatypes/stim_integration.h"
+#include "chromobius/decode/cluster_decoder.h"
 #include "chromobius/decode/pymatcher.h"
 #include "chromobius/graph/choose_rgb_reps.h"
 #include "chromobius/graph/collect_composite_errors.h"
 #include "chromobius/graph/collect_nodes.h"
+#include "chromobius/graph/flip_sources.h"
+#include "chromobius/graph/split_mobius_dem.h"
 
 using namespace chromobius;
 
+/// Returns an equivalent mobius dem with one error per edge.
+///
+/// The matcher splits each mobius error into its edges and combines parallel edges as independent errors, so merging
+/// the errors that share an edge ahead of time gives it the same matching graph using much less memory.
+static stim::DetectorErrorModel mobius_dem_with_one_error_per_edge(
+    const stim::DetectorErrorModel &mobius_dem, size_t num_mobius_nodes) {
+    std::vector<std::pair<uint64_t, double>> edges;
+    std::unordered_map<uint64_t, size_t> edge_indices;
+    mobius_dem.iter_flatten_error_instructions([&](const stim::DemInstruction &instruction) {
+        double p = instruction.arg_data[0];
+        for (size_t k = 0; k + 1 < instruction.target_data.size(); k += 3) {
+            uint64_t d1 = instruction.target_data[k].raw_id();
+            uint64_t d2 = instruction.target_data[k + 1].raw_id();
+            uint64_t key = (std::min(d1, d2) << 32) | std::max(d1, d2);
+            auto [it, inserted] = edge_indices.try_emplace(key, edges.size());
+            if (inserted) {
+                edges.push_back({key, p});
+            } else {
+                double &q = edges[it->second].second;
+                q = q * (1 - p) + p * (1 - q);
+            }
+        }
+    });
+
+    stim::DetectorErrorModel result;
+    for (const auto &[key, p] : edges) {
+        std::array<stim::DemTarget, 2> targets{
+            stim::DemTarget::relative_detector_id(key >> 32),
+            stim::DemTarget::relative_detector_id(key & 0xFFFFFFFF),
+        };
+        result.append_error_instruction(p, targets, "");
+    }
+    if (result.count_detectors() < num_mobius_nodes) {
+        result.append_detector_instruction({}, stim::DemTarget::relative_detector_id(num_mobius_nodes - 1), "");
+    }
+    return result;
+}
+
+/// Returns the errors of a dem, keeping only the observables in [first_observable, first_observable + 64).
+///
+/// The kept observables are renumbered to start from L0. Separators are dropped, since the decoder decomposes errors
+/// without looking at them.
+static stim::DetectorErrorModel dem_errors_with_observable_chunk(
+    const stim::DetectorErrorModel &dem, uint64_t first_observable) {
+    constexpr uint64_t CHUNK_SIZE = sizeof(obsmask_int) * 8;
+    stim::DetectorErrorModel result;
+    std::vector<stim::DemTarget> targets;
+    dem.iter_flatten_error_instructions([&](const stim::DemInstruction &instruction) {
+        targets.clear();
+        for (const auto &t : instruction.target_data) {
+            if (t.is_relative_detector_id()) {
+                targets.push_back(t);
+            } else if (t.is_observable_id() && t.raw_id() >= first_observable &&
+                       t.raw_id() - first_observable < CHUNK_SIZE) {
+                targets.push_back(stim::DemTarget::observable_id(t.raw_id() - first_observable));
+            }
+        }
+        result.append_error_instruction(instruction.arg_data[0], targets, instruction.tag);
+    });
+    return result;
+}
+
+/// Returns the atomic errors of a dem (including remnants), labelled with the observables in
+/// [first_observable, first_observable + 64).
+///
+/// The atomic errors have the same keys as the ones collected for the decoder's first 64 observables. Only their
+/// observable flips are read from the dem, while the remnants are relabelled using their recorded sources.
+static std::map<AtomicErrorKey, obsmask_int> relabelled_atomic_errors(
+    const stim::DetectorErrorModel &dem,
+    uint64_t first_observable,
+    std::span<const ColorBasis> node_colors,
+    const FlipSources &sources) {
+    constexpr uint64_t CHUNK_SIZE = sizeof(obsmask_int) * 8;
+    std::map<AtomicErrorKey, obsmask_int> result;
+    std::vector<obsmask_int> error_obs_flips;
+    stim::SparseXorVec<node_offset_int> dets;
+    dem.iter_flatten_error_instructions([&](const stim::DemInstruction &instruction) {
+        dets.clear();
+        obsmask_int obs_flip = 0;
+        for (const auto &t : instruction.target_data) {
+            if (t.is_relative_detector_id()) {
+                dets.xor_item((node_offset_int)t.raw_id());
+            } else if (t.is_observable_id() && t.raw_id() >= first_observable &&
+                       t.raw_id() - first_observable < CHUNK_SIZE) {
+                obs_flip ^= obsmask_int{1} << (t.raw_id() - first_observable);
+            }
+        }
+        extract_atomic_errors_from_dem_error_instruction_dets(dets.sorted_items, obs_flip, node_colors, &result);
+        error_obs_flips.push_back(obs_flip);
+    });
+    sources.add_relabelled_remnants(error_obs_flips, &result);
+    return result;
+}
+
+/// Returns the number of distinct edges in a mobius dem.
+static size_t count_mobius_edges(const stim::DetectorErrorModel &mobius_dem) {
+    std::unordered_set<uint64_t> edges;
+    mobius_dem.iter_flatten_error_instructions([&](const stim::DemInstruction &instruction) {
+        for (size_t k = 0; k + 1 < instruction.target_data.size(); k += 3) {
+            uint64_t d1 = instruction.target_data[k].raw_id();
+            uint64_t d2 = instruction.target_data[k + 1].raw_id();
+            edges.insert((std::min(d1, d2) << 32) | std::max(d1, d2));
+        }
+    });
+    return edges.size();
+}
+
+Decoder Decoder::from_circuit(const stim::Circuit &circuit, DecoderConfigOptions options) {
+    if (options.profile != nullptr) {
+        options.profile->start();
+    }
+    stim::DetectorErrorModel dem = circuit_to_decoding_dem(circuit);
+    if (options.profile != nullptr) {
+        options.profile->finish_stage("error_analysis");
+    }
+    return from_dem(dem, options);
+}
+
 Decoder Decoder::from_dem(const stim::DetectorErrorModel &dem, DecoderConfigOptions options) {
     Decoder result;
+    ConfigurationProfile *profile = options.profile;
+    auto finish_stage = [&](const char *name) {
+        if (profile != nullptr) {
+            profile->finish_stage(name);
+        }
+    };
+    if (profile != nullptr) {
+        profile->start();
+    }
 
     // Find color of each detector, while optionally adding coordinate data to the mobius dem.
     result.node_colors = collect_nodes_from_dem(dem, options.include_coords_in_mobius_dem ? &result.mobius_dem : nullptr);
+    result.num_detectors = result.node_colors.size();
+
+    // Drop ignored detectors, so they don't take up space in the matching graph or in the lifting data.
+    stim::DetectorErrorModel node_dem;
+    bool has_ignored_detectors = std::any_of(result.node_colors.begin(), result.node_colors.end(), [](ColorBasis cb) {
+        return cb.ignored;
+    });
+    if (has_ignored_detectors) {
+        node_dem = remove_ignored_detectors_from_dem(
+            dem, result.node_colors, &result.detector_to_node, &result.node_to_detector);
+        result.mobius_dem.clear();
+        result.node_colors =
+            collect_nodes_from_dem(node_dem, options.include_coords_in_mobius_dem ? &result.mobius_dem : nullptr);
+        // Trailing detectors that appear in no instructions aren't counted by the renumbered dem.
+        result.node_colors.resize(result.node_to_detector.size());
+    }
+    const stim::DetectorErrorModel &dem_for_nodes = has_ignored_detectors ? node_dem : dem;
+
+    // Observables past the first 64 are lifted separately, so the main configuration only sees the first 64.
+    constexpr size_t OBS_CHUNK_SIZE = sizeof(obsmask_int) * 8;
+    result.num_observables = dem.count_observables();
+    stim::DetectorErrorModel first_chunk_dem;
+    if (result.num_observables > OBS_CHUNK_SIZE) {
+        first_chunk_dem = dem_errors_with_observable_chunk(dem_for_nodes, 0);
+    }
+    const stim::DetectorErrorModel &dem_for_errors =
+        result.num_observables > OBS_CHUNK_SIZE ? first_chunk_dem : dem_for_nodes;
+    // The further observables are lifted by relabelling the observable flips computed for the first 64, using the
+    // atomic errors each flip was made of.
+    FlipSources flip_sources;
+    FlipSources *recorded_flip_sources = result.num_observables > OBS_CHUNK_SIZE ? &flip_sources : nullptr;
+    finish_stage("collect_nodes");
 
     // Find the basic building-block errors that errors will be decomposed into.
-    result.atomic_errors = collect_atomic_errors(dem, result.node_colors);
+    result.atomic_errors = collect_atomic_errors(dem_for_errors, result.node_colors);
+    size_t num_atomic_errors = result.atomic_errors.size();
+    finish_stage("collect_atomic_errors");
 
     // Decompose all errors into the building-block errors, adding them into the mobius dem.
     // To make the decomposition more robust, a composite error can split into a known building block and a remnant.
     // The remnants are accumulated so they can be added to the building blocks before continuing.
     std::map<AtomicErrorKey, obsmask_int> remnant_edges;
     collect_composite_errors_and_remnants_into_mobius_dem(
-        dem,
+        dem_for_errors,
         result.node_colors,
         result.atomic_errors,
         options.drop_mobius_errors_involving_remnant_errors,
         options.ignore_decomposition_failures,
+        options.max_mobius_error_weight,
+        options.fold_pruned_mobius_errors,
         &result.mobius_dem,
-        &remnant_edges);
+        &remnant_edges,
+        &result.num_pruned_mobius_edges,
+        recorded_flip_sources);
     for (const auto &e : remnant_edges) {
         result.atomic_errors.emplace(std::move(e));
     }
@@ -50,24 +223,234 @@ Decoder Decoder::from_dem(const stim::DetectorErrorModel &dem, DecoderConfigOpti
         result.mobius_dem.append_detector_instruction(
             {}, stim::DemTarget::relative_detector_id(result.node_colors.size() * 2 - 1), "");
     }
+    finish_stage("decompose_composite_errors");
 
     // For each node, pick nearby RGB representatives for holding charge near that node.
-    result.rgb_reps = choose_rgb_reps_from_atomic_errors(result.atomic_errors, result.node_colors);
+    result.rgb_reps =
+        choose_rgb_reps_from_atomic_errors(result.atomic_errors, result.node_colors, recorded_flip_sources);
+    if (options.include_lifting_weight) {
+        result.rgb_rep_weights =
+            choose_rgb_rep_weights(result.rgb_reps, collect_atomic_error_weights(dem_for_errors, result.node_colors));
+    }
+    finish_stage("choose_rgb_reps");
 
     // Find the basic ways for moving charge around the graph, by combining pairs of errors to get simpler errors.
-    result.charge_graph = ChargeGraph::from_atomic_errors(result.atomic_errors, result.node_colors.size());
+    result.charge_graph =
+        ChargeGraph::from_atomic_errors(result.atomic_errors, result.node_colors.size(), recorded_flip_sources);
+    finish_stage("charge_graph");
 
     // Solve for how to drag charge around the graph while travelling from node to node.
     result.drag_graph = DragGraph::from_charge_graph_paths_for_sub_edges_of_atomic_errors(
-        result.charge_graph, result.atomic_errors, result.rgb_reps, result.node_colors);
+        result.charge_graph,
+        result.atomic_errors,
+        result.rgb_reps,
+        result.node_colors,
+        result.rgb_rep_weights,
+        recorded_flip_sources);
+    finish_stage("drag_graph");
+
+    // Derive separate lifting data for each further group of 64 observables.
+    for (size_t first = OBS_CHUNK_SIZE; first < result.num_observables; first += OBS_CHUNK_SIZE) {
+        auto chunk_atomic_errors = relabelled_atomic_errors(dem_for_nodes, first, result.node_colors, flip_sources);
+        auto &chunk = result.extra_observable_chunks.emplace_back();
+        chunk.rgb_reps = flip_sources.relabelled_rgb_reps(result.rgb_reps, chunk_atomic_errors);
+        chunk.drag_graph = flip_sources.relabelled_drag_graph(chunk_atomic_errors);
+    }
+    result.extra_obs_flips.resize(result.extra_observable_chunks.size());
+    finish_stage("extra_observable_chunks");
+
+    if (profile != nullptr) {
+        size_t num_charge_graph_edges = 0;
+        for (size_t n = 0; n < result.charge_graph.nodes.size(); n++) {
+            // Edges are stored at both of their nodes (except boundary edges and self loops).
+            for (const auto &[other, obs_flip] : result.charge_graph.nodes[n].neighbors) {
+                num_charge_graph_edges += n <= other;
+            }
+        }
+        profile->add_count("num_detectors", result.num_detectors);
+        profile->add_count("num_nodes", result.node_colors.size());
+        profile->add_count("num_observables", result.num_observables);
+        profile->add_count("num_dem_errors", dem.count_errors());
+        profile->add_count("num_atomic_errors", num_atomic_errors);
+        profile->add_count("num_remnant_errors", remnant_edges.size());
+        profile->add_count("num_mobius_errors", result.mobius_dem.count_errors());
+        profile->add_count("num_mobius_edges", count_mobius_edges(result.mobius_dem));
+        profile->add_count("num_pruned_mobius_edges", result.num_pruned_mobius_edges);
+        profile->add_count("num_charge_graph_edges", num_charge_graph_edges);
+        profile->add_count("num_drag_graph_entries", result.drag_graph.size());
+        // Counting shouldn't be charged to the next stage.
+        profile->start();
+    }
 
-    // Prepare the matcher.
-    result.matcher = options.matcher_for(result.mobius_dem);
-    result.euler_tour_solver = EulerTourGraph(result.node_colors.size() * 2);
+    if (options.slim || options.compact) {
+        // Decoding doesn't use these. Assigning empty values releases their memory.
+        result.atomic_errors = {};
+        result.charge_graph = {};
+        result.mobius_dem = mobius_dem_with_one_error_per_edge(result.mobius_dem, result.node_colors.size() * 2);
+    }
+    if (options.compact) {
+        result.drag_graph.freeze();
+        for (auto &chunk : result.extra_observable_chunks) {
+            chunk.drag_graph.freeze();
+        }
+    }
+    finish_stage("slim");
+
+    // Prepare the matcher, or a matcher for each basis.
+    if (options.split_bases) {
+        std::array<std::vector<node_offset_int>, 2> local_to_detector;
+        std::array<stim::DetectorErrorModel, 2> basis_mobius_dems;
+        split_mobius_dem_by_basis(
+            result.mobius_dem,
+            result.node_colors,
+            &result.detector_to_subproblem_node,
+            &local_to_detector,
+            &basis_mobius_dems);
+        for (size_t b = 0; b < 2; b++) {
+            auto &subproblem = result.basis_subproblems.emplace_back();
+            subproblem.mobius_dem = std::move(basis_mobius_dems[b]);
+            subproblem.local_to_detector = std::move(local_to_detector[b]);
+            subproblem.matcher = options.matcher_for(subproblem.mobius_dem);
+            subproblem.euler_tour_solver = EulerTourGraph(subproblem.local_to_detector.size() * 2);
+            subproblem.extra_obs_flips.resize(result.extra_observable_chunks.size());
+        }
+        result.decode_bases_concurrently = options.decode_bases_concurrently;
+    } else {
+        result.matcher = options.matcher_for(result.mobius_dem);
+        result.euler_tour_solver = EulerTourGraph(result.node_colors.size() * 2);
+    }
+    finish_stage("matcher");
+    result.max_detection_events = options.max_detection_events;
+    result.shot_time_budget_seconds = options.shot_time_budget_seconds;
+
+    if (options.cluster_threads >= 2) {
+        if (options.max_detection_events != SIZE_MAX || options.shot_time_budget_seconds < INFINITY) {
+            throw std::invalid_argument(
+                "cluster_threads can't be combined with max_detection_events or shot_time_budget_seconds, because "
+                "the limits would apply to each cluster instead of to each shot.");
+        }
+        result.cluster_decoder = std::make_shared<ClusterDecoder>(result, options.cluster_threads);
+    }
 
     return result;
 }
 
+Decoder Decoder::clone() const {
+    Decoder result;
+    result.node_colors = node_colors;
+    result.num_detectors = num_detectors;
+    result.detector_to_node = detector_to_node;
+    result.node_to_detector = node_to_detector;
+    result.atomic_errors = atomic_errors;
+    result.mobius_dem = mobius_dem;
+    result.num_pruned_mobius_edges = num_pruned_mobius_edges;
+    result.charge_graph = charge_graph;
+    result.rgb_reps = rgb_reps;
+    result.rgb_rep_weights = rgb_rep_weights;
+    result.drag_graph = drag_graph;
+    result.write_mobius_match_to_std_err = write_mobius_match_to_std_err;
+    result.num_observables = num_observables;
+    result.match_trace = match_trace;
+    result.extra_observable_chunks = extra_observable_chunks;
+    result.extra_obs_flips.resize(extra_obs_flips.size());
+    if (matcher != nullptr) {
+        result.matcher = matcher->configured_for_mobius_dem(mobius_dem);
+    }
+    result.euler_tour_solver = EulerTourGraph(euler_tour_solver.nodes.size());
+    for (const auto &subproblem : basis_subproblems) {
+        auto &copy = result.basis_subproblems.emplace_back();
+        copy.mobius_dem = subproblem.mobius_dem;
+        copy.local_to_detector = subproblem.local_to_detector;
+        copy.matcher = subproblem.matcher->configured_for_mobius_dem(subproblem.mobius_dem);
+        copy.euler_tour_solver = EulerTourGraph(subproblem.euler_tour_solver.nodes.size());
+        copy.extra_obs_flips.resize(subproblem.extra_obs_flips.size());
+    }
+    result.detector_to_subproblem_node = detector_to_subproblem_node;
+    result.decode_bases_concurrently = decode_bases_concurrently;
+    result.max_detection_events = max_detection_events;
+    result.shot_time_budget_seconds = shot_time_budget_seconds;
+    if (cluster_decoder != nullptr) {
+        result.cluster_decoder = cluster_decoder->clone();
+    }
+    return result;
+}
+
+template <typename K, typename V>
+static size_t map_memory_usage(const std::map<K, V> &m) {
+    // Each tree node holds its color, three pointers, and the key/value pair.
+    return m.size() * (4 * sizeof(void *) + sizeof(std::pair<const K, V>));
+}
+
+template <typename K, typename V>
+static size_t map_memory_usage(const std::unordered_map<K, V> &m) {
+    // Each hash node holds a next pointer and the key/value pair, and each bucket holds a pointer.
+    return m.size() * (sizeof(void *) + sizeof(std::pair<const K, V>)) + m.bucket_count() * sizeof(void *);
+}
+
+template <typename T>
+static size_t vector_memory_usage(const std::vector<T> &v) {
+    return v.capacity() * sizeof(T);
+}
+
+static size_t dem_memory_usage(const stim::DetectorErrorModel &dem) {
+    size_t result = dem.arg_buf.total_allocated() * sizeof(double);
+    result += dem.target_buf.total_allocated() * sizeof(stim::DemTarget);
+    result += dem.tag_buf.total_allocated();
+    result += vector_memory_usage(dem.instructions);
+    for (const auto &block : dem.blocks) {
+        result += sizeof(block) + dem_memory_usage(block);
+    }
+    return result;
+}
+
+static size_t drag_graph_memory_usage(const DragGraph &graph) {
+    // Frozen entries are counted in full, even when they're shared with clones of the decoder.
+    return map_memory_usage(graph.mmm) + map_memory_usage(graph.lifting_weights) + graph.frozen_entries.size_bytes();
+}
+
+static size_t euler_tour_graph_memory_usage(const EulerTourGraph &graph) {
+    return vector_memory_usage(graph.nodes) + vector_memory_usage(graph.neighbors) +
+           vector_memory_usage(graph.touched_nodes) + vector_memory_usage(graph.cycle_buf) +
+           vector_memory_usage(graph.cycle_buf2);
+}
+
+size_t DecoderMemoryUsage::total() const {
+    return node_tables + atomic_errors + mobius_dem + charge_graph + rgb_reps + drag_graph + workspace;
+}
+
+DecoderMemoryUsage Decoder::memory_usage() const {
+    DecoderMemoryUsage result;
+    result.node_tables = vector_memory_usage(node_colors) + vector_memory_usage(detector_to_node) +
+                         vector_memory_usage(node_to_detector) + vector_memory_usage(detector_to_subproblem_node);
+    result.atomic_errors = map_memory_usage(atomic_errors);
+    result.mobius_dem = dem_memory_usage(mobius_dem);
+    result.charge_graph = vector_memory_usage(charge_graph.nodes);
+    for (const auto &node : charge_graph.nodes) {
+        result.charge_graph += map_memory_usage(node.neighbors);
+    }
+    result.rgb_reps = vector_memory_usage(rgb_reps) + vector_memory_usage(rgb_rep_weights);
+    result.drag_graph = drag_graph_memory_usage(drag_graph);
+    for (const auto &chunk : extra_observable_chunks) {
+        result.rgb_reps += vector_memory_usage(chunk.rgb_reps);
+        result.drag_graph += drag_graph_memory_usage(chunk.drag_graph);
+    }
+    result.workspace = vector_memory_usage(sparse_det_buffer) + vector_memory_usage(matcher_edge_buf) +
+                       euler_tour_graph_memory_usage(euler_tour_solver) +
+                       vector_memory_usage(resolved_detection_event_buffer) + vector_memory_usage(dense_det_buffer) +
+                       vector_memory_usage(node_det_buffer) + vector_memory_usage(batch_det_offsets) +
+                       vector_memory_usage(batch_edge_offsets);
+    for (const auto &subproblem : basis_subproblems) {
+        result.node_tables += vector_memory_usage(subproblem.local_to_detector);
+        result.mobius_dem += dem_memory_usage(subproblem.mobius_dem);
+        result.workspace += vector_memory_usage(subproblem.sparse_det_buffer) +
+                            vector_memory_usage(subproblem.matcher_edge_buf) +
+                            euler_tour_graph_memory_usage(subproblem.euler_tour_solver) +
+                            vector_memory_usage(subproblem.resolved_detection_event_buffer) +
+                            vector_memory_usage(subproblem.cycle_buf);
+    }
+    return result;
+}
+
 std::unique_ptr<MatcherInterface> DecoderConfigOptions::matcher_for(const stim::DetectorErrorModel &mobius_dem) const {
     if (matcher) {
         return matcher->configured_for_mobius_dem(mobius_dem);
@@ -77,17 +460,26 @@ std::unique_ptr<MatcherInterface> DecoderConfigOptions::matcher_for(const stim::
     return result;
 }
 
+/// Lifts a cycle starting (and ending) with the given charge, if possible.
+///
+/// When TRACK_WEIGHTS is set, the weight of the rgb representative errors applied to reach each charge state is tracked
+/// alongside its observable flip, and the weight of the returned state is added into *lifting_weight_out. Otherwise
+/// rgb_rep_weights and lifting_weight_out are unused.
+template <bool TRACK_WEIGHTS>
 static std::optional<obsmask_int> discharge_cycle_helper_single_start_charge_many_cur_charge(
     std::span<const ColorBasis> node_colors,
     std::span<const RgbEdge> rgb_reps,
+    std::span<const float> rgb_rep_weights,
     const DragGraph &drag_graph,
     std::span<const uint8_t> packed_bit_packed_detection_events,
     std::span<const node_offset_int> cycle,
     Charge start_charge,
-    std::vector<uint64_t> *used_buf) {
+    std::vector<uint64_t> *used_buf,
+    float *lifting_weight_out) {
 
     used_buf->clear();
     std::array<std::optional<obsmask_int>, 4> cur_states;
+    std::array<float, 4> cur_weights{0, 0, 0, 0};
     cur_states[start_charge] = {0};
     node_offset_int cur_loc = cycle.back() >> 1;
 
@@ -100,60 +492,92 @@ static std::optional<obsmask_int> discharge_cycle_helper_single_start_charge_man
             used_buf->push_back(cur_loc);
             Charge det_charge = node_colors[cur_loc].color;
             std::array<std::optional<obsmask_int>, 4> states_after_det;
+            std::array<float, 4> weights_after_det{0, 0, 0, 0};
             states_after_det[det_charge] = cur_states[Charge::NEUTRAL];
             states_after_det[Charge::NEUTRAL] = cur_states[det_charge];
+            weights_after_det[det_charge] = cur_weights[Charge::NEUTRAL];
+            weights_after_det[Charge::NEUTRAL] = cur_weights[det_charge];
             auto r = rgb_reps[cur_loc];
             if (r.weight() == 3) {
                 auto c1 = next_non_neutral_charge(det_charge);
                 auto c2 = next_non_neutral_charge(c1);
                 if (cur_states[c1].has_value()) {
                     states_after_det[c2] = *cur_states[c1] ^ r.obs_flip;
+                    if constexpr (TRACK_WEIGHTS) {
+                        weights_after_det[c2] = cur_weights[c1] + rgb_rep_weights[cur_loc];
+                    }
                 }
                 if (cur_states[c2].has_value()) {
                     states_after_det[c1] = *cur_states[c2] ^ r.obs_flip;
+                    if constexpr (TRACK_WEIGHTS) {
+                        weights_after_det[c1] = cur_weights[c2] + rgb_rep_weights[cur_loc];
+                    }
                 }
             }
             cur_states = states_after_det;
+            cur_weights = weights_after_det;
         } else {
             // Drag the current charge to near the new location, potentially switching the charge type.
             std::array<std::optional<obsmask_int>, 4> states_after_drag;
+            std::array<float, 4> weights_after_drag{0, 0, 0, 0};
             for (size_t cur_charge = 0; cur_charge < 4; cur_charge++) {
                 const auto &cur_obs_flip = cur_states[cur_charge];
                 if (cur_obs_flip.has_value()) {
                     for (size_t next_charge = 0; next_charge < 4; next_charge++) {
-                        auto f = drag_graph.mmm.find(ChargedEdge{
-                            .n1 = cur_loc, .n2 = next_loc, .c1 = (Charge)cur_charge, .c2 = (Charge)next_charge});
-                        if (f != drag_graph.mmm.end()) {
-                            states_after_drag[next_charge] = *cur_obs_flip ^ f->second;
+                        ChargedEdge edge{
+                            .n1 = cur_loc, .n2 = next_loc, .c1 = (Charge)cur_charge, .c2 = (Charge)next_charge};
+                        if constexpr (TRACK_WEIGHTS) {
+                            float w = cur_weights[cur_charge];
+                            const obsmask_int *f = drag_graph.find(edge, &w);
+                            if (f != nullptr) {
+                                states_after_drag[next_charge] = *cur_obs_flip ^ *f;
+                                weights_after_drag[next_charge] = w;
+                            }
+                        } else {
+                            const obsmask_int *f = drag_graph.find(edge);
+                            if (f != nullptr) {
+                                states_after_drag[next_charge] = *cur_obs_flip ^ *f;
+                            }
                         }
                     }
                 }
             }
             cur_states = states_after_drag;
+            cur_weights = weights_after_drag;
         }
         cur_loc = next_loc;
     }
 
+    if constexpr (TRACK_WEIGHTS) {
+        if (cur_states[start_charge].has_value()) {
+            *lifting_weight_out += cur_weights[start_charge];
+        }
+    }
     return cur_states[start_charge];
 }
 
+template <bool TRACK_WEIGHTS>
 static std::optional<obsmask_int> discharge_cycle_helper_any_start_charge_many_cur_charge(
     std::span<const ColorBasis> node_colors,
     std::span<const RgbEdge> rgb_reps,
+    std::span<const float> rgb_rep_weights,
     const DragGraph &drag_graph,
     std::span<const uint8_t> packed_bit_packed_detection_events,
     std::span<const node_offset_int> cycle,
-    std::vector<uint64_t> *used_buf) {
+    std::vector<uint64_t> *used_buf,
+    float *lifting_weight_out) {
 
     for (size_t c = 0; c < 4; c++) {
-        auto v = discharge_cycle_helper_single_start_charge_many_cur_charge(
+        auto v = discharge_cycle_helper_single_start_charge_many_cur_charge<TRACK_WEIGHTS>(
             node_colors,
             rgb_reps,
+            rgb_rep_weights,
             drag_graph,
             packed_bit_packed_detection_events,
             cycle,
             (Charge)c,
-            used_buf);
+            used_buf,
+            lifting_weight_out);
         if (v.has_value()) {
             return v;
         }
@@ -161,14 +585,25 @@ static std::optional<obsmask_int> discharge_cycle_helper_any_start_charge_many_c
     return {};
 }
 obsmask_int Decoder::discharge_cycle(
-    std::span<const uint8_t> packed_bit_packed_detection_events, std::span<const node_offset_int> cycle) {
-    auto result = discharge_cycle_helper_any_start_charge_many_cur_charge(
-        node_colors,
-        rgb_reps,
-        drag_graph,
-        packed_bit_packed_detection_events,
-        cycle,
-        &resolved_detection_event_buffer);
+    std::span<const uint8_t> packed_bit_packed_detection_events,
+    std::span<const node_offset_int> cycle,
+    std::vector<uint64_t> *used_buf,
+    float *lifting_weight_out) const {
+    std::optional<obsmask_int> result;
+    if (lifting_weight_out != nullptr && !rgb_rep_weights.empty()) {
+        result = discharge_cycle_helper_any_start_charge_many_cur_charge<true>(
+            node_colors,
+            rgb_reps,
+            rgb_rep_weights,
+            drag_graph,
+            packed_bit_packed_detection_events,
+            cycle,
+            used_buf,
+            lifting_weight_out);
+    } else {
+        result = discharge_cycle_helper_any_start_charge_many_cur_charge<false>(
+            node_colors, rgb_reps, {}, drag_graph, packed_bit_packed_detection_events, cycle, used_buf, nullptr);
+    }
     if (result.has_value()) {
         return *result;
     }
@@ -202,6 +637,40 @@ obsmask_int Decoder::discharge_cycle(
     throw std::invalid_argument(ss.str());
 }
 
+void Decoder::discharge_cycle_extra_observables(
+    std::span<const uint8_t> packed_bit_packed_detection_events,
+    std::span<const node_offset_int> cycle,
+    std::vector<uint64_t> *used_buf,
+    std::span<obsmask_int> out_extra_obs_flips) const {
+    for (size_t c = 0; c < extra_observable_chunks.size(); c++) {
+        const auto &chunk = extra_observable_chunks[c];
+        auto result = discharge_cycle_helper_any_start_charge_many_cur_charge<false>(
+            node_colors,
+            chunk.rgb_reps,
+            {},
+            chunk.drag_graph,
+            packed_bit_packed_detection_events,
+            cycle,
+            used_buf,
+            nullptr);
+        if (!result.has_value()) {
+            // The chunks have the same structure as the decoder's own lifting data, which already lifted the cycle.
+            throw std::invalid_argument(
+                "Failed to lift a cycle for observables past the first 64, after lifting it for the first 64.");
+        }
+        out_extra_obs_flips[c] ^= *result;
+    }
+}
+
+void Decoder::write_obs_flips_bit_packed(obsmask_int obs_flip, std::span<uint8_t> out) const {
+    constexpr size_t CHUNK_BYTES = sizeof(obsmask_int);
+    for (size_t k = 0; k < out.size(); k++) {
+        size_t c = k / CHUNK_BYTES;
+        obsmask_int mask = c == 0 ? obs_flip : c <= extra_obs_flips.size() ? extra_obs_flips[c - 1] : 0;
+        out[k] = (mask >> (8 * (k % CHUNK_BYTES))) & 0xFF;
+    }
+}
+
 static void check_mobius_dem_errors_are_edge_like(const Decoder &decoder) {
     for (const auto &instruction : decoder.mobius_dem.instructions) {
         bool instruction_valid = true;
@@ -228,54 +697,454 @@ void Decoder::check_invariants() const {
     check_mobius_dem_errors_are_edge_like(*this);
 }
 
+/// Derives the mobius matching problem from bit packed detection events.
+///
+/// When detectors have been renumbered (detector_to_node isn't empty), the detection events are also bit packed by
+/// node index into out_bit_packed_nodes (which must start cleared).
 static void detection_events_to_mobius_detection_events(
     std::span<const uint8_t> bit_packed_detection_events,
     std::vector<uint64_t> *out_mobius_detection_events,
-    std::span<const ColorBasis> node_colors) {
-    // Derive the mobius matching problem.
+    std::span<const node_offset_int> detector_to_node,
+    std::span<uint8_t> out_bit_packed_nodes) {
     for (size_t k = 0; k < bit_packed_detection_events.size(); k++) {
         for (uint8_t b = bit_packed_detection_events[k], k2 = 0; b; b >>= 1, k2++) {
             if (b & 1) {
-                auto d = k * 8 + k2;
-                if (!node_colors[d].ignored) {
-                    out_mobius_detection_events->push_back(d * 2 + 0);
-                    out_mobius_detection_events->push_back(d * 2 + 1);
+                uint64_t n = k * 8 + k2;
+                if (!detector_to_node.empty()) {
+                    n = n < detector_to_node.size() ? detector_to_node[n] : IGNORED_NODE;
+                    if (n == IGNORED_NODE) {
+                        continue;
+                    }
+                    out_bit_packed_nodes[n >> 3] |= 1 << (n & 7);
                 }
+                out_mobius_detection_events->push_back(n * 2 + 0);
+                out_mobius_detection_events->push_back(n * 2 + 1);
             }
         }
     }
 }
 
 obsmask_int Decoder::decode_detection_events(std::span<const uint8_t> bit_packed_detection_events, float *weight_out) {
-    // Derive and decode the mobius matching problem.
+    if (cluster_decoder != nullptr && match_trace == nullptr) {
+        last_decode_status = DecodeStatus::DECODED;
+        return cluster_decoder->decode_detection_events(bit_packed_detection_events, weight_out);
+    }
+    sparse_det_buffer.clear();
+    if (detector_to_node.empty()) {
+        detection_events_to_mobius_detection_events(bit_packed_detection_events, &sparse_det_buffer, {}, {});
+        return decode_mobius_detection_events(bit_packed_detection_events, weight_out);
+    }
+
+    // The lifting step indexes detection events by node, so they're bit packed by node into a workspace.
+    node_det_buffer.assign((node_colors.size() + 7) >> 3, 0);
+    detection_events_to_mobius_detection_events(
+        bit_packed_detection_events, &sparse_det_buffer, detector_to_node, node_det_buffer);
+    return decode_mobius_detection_events(node_det_buffer, weight_out);
+}
+
+void Decoder::decode_detection_events_batch(
+    std::span<const uint8_t> bit_packed_detection_events,
+    size_t shot_stride,
+    std::span<obsmask_int> out_obs_flips,
+    float *out_weights,
+    DecodeStatus *out_statuses) {
+    size_t num_shots = out_obs_flips.size();
+    size_t num_detector_bytes = (num_detectors + 7) >> 3;
+    if ((num_shots > 1 && shot_stride < num_detector_bytes) ||
+        (num_shots > 0 && bit_packed_detection_events.size() < (num_shots - 1) * shot_stride + num_detector_bytes)) {
+        std::stringstream ss;
+        ss << "Not enough detection event data for " << num_shots << " shots with a stride of " << shot_stride
+           << " bytes. The decoder has " << num_detectors << " detectors, so each shot needs "
+           << num_detector_bytes << " bytes, but there were " << bit_packed_detection_events.size()
+           << " bytes in total.";
+        throw std::invalid_argument(ss.str());
+    }
+    auto shot_data = [&](size_t shot) {
+        return bit_packed_detection_events.subspan(shot * shot_stride, num_detector_bytes);
+    };
+
+    if (!basis_subproblems.empty() || shot_time_budget_seconds < INFINITY || !extra_observable_chunks.empty() ||
+        match_trace != nullptr || cluster_decoder != nullptr) {
+        for (size_t shot = 0; shot < num_shots; shot++) {
+            out_obs_flips[shot] =
+                decode_detection_events(shot_data(shot), out_weights == nullptr ? nullptr : out_weights + shot);
+            if (out_statuses != nullptr) {
+                out_statuses[shot] = last_decode_status;
+            }
+        }
+        return;
+    }
+
+    // When detectors have been renumbered, the lifting step needs each shot's detection events bit packed by node.
+    size_t num_node_bytes = (node_colors.size() + 7) >> 3;
+    if (!detector_to_node.empty()) {
+        node_det_buffer.assign(num_node_bytes * num_shots, 0);
+    }
+    auto shot_node_data = [&](size_t shot) -> std::span<uint8_t> {
+        if (detector_to_node.empty()) {
+            return {};
+        }
+        return std::span<uint8_t>(node_det_buffer).subspan(shot * num_node_bytes, num_node_bytes);
+    };
+
+    // Derive every shot's mobius matching problem. Shots over the detection event limit get an empty problem.
+    sparse_det_buffer.clear();
+    batch_det_offsets.clear();
+    batch_det_offsets.push_back(0);
+    for (size_t shot = 0; shot < num_shots; shot++) {
+        size_t start = sparse_det_buffer.size();
+        detection_events_to_mobius_detection_events(
+            shot_data(shot), &sparse_det_buffer, detector_to_node, shot_node_data(shot));
+        last_decode_status = DecodeStatus::DECODED;
+        if ((sparse_det_buffer.size() - start) / 2 > max_detection_events) {
+            sparse_det_buffer.resize(start);
+            last_decode_status = DecodeStatus::TOO_MANY_DETECTION_EVENTS;
+        }
+        if (out_statuses != nullptr) {
+            out_statuses[shot] = last_decode_status;
+        }
+        batch_det_offsets.push_back(sparse_det_buffer.size());
+    }
+
+    // Decode all the mobius matching problems, then lift each shot's solution.
+    matcher->match_edges_batch(sparse_det_buffer, batch_det_offsets, &matcher_edge_buf, &batch_edge_offsets, out_weights);
+    std::span<const uint64_t> all_dets = sparse_det_buffer;
+    std::span<const int64_t> all_edges = matcher_edge_buf;
+    for (size_t shot = 0; shot < num_shots; shot++) {
+        out_obs_flips[shot] = lift_matched_edges(
+            detector_to_node.empty() ? shot_data(shot) : shot_node_data(shot),
+            all_edges.subspan(batch_edge_offsets[shot], batch_edge_offsets[shot + 1] - batch_edge_offsets[shot]),
+            all_dets.subspan(batch_det_offsets[shot], batch_det_offsets[shot + 1] - batch_det_offsets[shot]),
+            out_weights == nullptr ? nullptr : out_weights + shot);
+    }
+}
+
+obsmask_int Decoder::decode_sparse_detection_events(std::span<const uint64_t> detector_indices, float *weight_out) {
+    // The lifting step needs random access to the detection events, so they are also bit packed into a workspace.
+    // When detectors have been renumbered, the lifting step indexes them by node, so they're also bit packed by node.
+    dense_det_buffer.resize((num_detectors + 7) >> 3);
+    if (!detector_to_node.empty()) {
+        node_det_buffer.assign((node_colors.size() + 7) >> 3, 0);
+    }
     sparse_det_buffer.clear();
+    auto clear_dense_det_buffer = [&]() {
+        for (uint64_t d : detector_indices) {
+            if (d < num_detectors) {
+                dense_det_buffer[d >> 3] = 0;
+            }
+        }
+    };
+    for (uint64_t d : detector_indices) {
+        if (d >= num_detectors || (dense_det_buffer[d >> 3] & (1 << (d & 7)))) {
+            clear_dense_det_buffer();
+            std::stringstream ss;
+            if (d >= num_detectors) {
+                ss << "Detector index " << d << " is out of range (the decoder has " << num_detectors << " detectors).";
+            } else {
+                ss << "Detector index " << d << " appeared more than once in the same shot.";
+            }
+            throw std::invalid_argument(ss.str());
+        }
+        dense_det_buffer[d >> 3] |= 1 << (d & 7);
+        uint64_t n = detector_node(d);
+        if (n != IGNORED_NODE) {
+            sparse_det_buffer.push_back(n * 2 + 0);
+            sparse_det_buffer.push_back(n * 2 + 1);
+            if (!detector_to_node.empty()) {
+                node_det_buffer[n >> 3] |= 1 << (n & 7);
+            }
+        }
+    }
+    if (!std::is_sorted(sparse_det_buffer.begin(), sparse_det_buffer.end())) {
+        // Match the order used by the bit packed path, so that ties are broken the same way.
+        std::sort(sparse_det_buffer.begin(), sparse_det_buffer.end());
+    }
+
+    obsmask_int result;
+    try {
+        result =
+            decode_mobius_detection_events(detector_to_node.empty() ? dense_det_buffer : node_det_buffer, weight_out);
+    } catch (...) {
+        clear_dense_det_buffer();
+        throw;
+    }
+    clear_dense_det_buffer();
+    return result;
+}
+
+obsmask_int Decoder::decode_sparse_detection_events_by_cycle(
+    std::span<const uint64_t> detector_indices, const CycleCallback &on_cycle, float *weight_out) {
+    cycle_callback = &on_cycle;
+    obsmask_int result;
+    try {
+        result = decode_sparse_detection_events(detector_indices, weight_out);
+    } catch (...) {
+        cycle_callback = nullptr;
+        throw;
+    }
+    cycle_callback = nullptr;
+    return result;
+}
+
+void Decoder::write_mobius_match(std::span<const int64_t> edges) const {
+    std::cerr << "matched ";
+    for (size_t k = 0; k < edges.size(); k += 2) {
+        auto [n1, c1, g1] = mobius_node_to_detector(edges[k], node_colors);
+        auto [n2, c2, g2] = mobius_node_to_detector(edges[k + 1], node_colors);
+        std::cerr << " [" << node_detector(n1) << "," << c1 << "," << g1 << "]:[" << node_detector(n2) << "," << c2
+                  << "," << g2 << "]";
+    }
+    std::cerr << "\n";
+}
+
+void Decoder::report_cycle(std::span<const node_offset_int> cycle, obsmask_int obs_flip) const {
+    if (node_to_detector.empty()) {
+        (*cycle_callback)(cycle, obs_flip);
+        return;
+    }
+    std::vector<node_offset_int> detector_cycle;
+    for (auto n : cycle) {
+        detector_cycle.push_back((node_to_detector[n >> 1] << 1) | (n & 1));
+    }
+    (*cycle_callback)(detector_cycle, obs_flip);
+}
+
+void Decoder::trace_matched_edges(std::span<const int64_t> edges) const {
+    for (int64_t n : edges) {
+        traced_shot->edges.push_back(
+            n < 0 ? MATCH_TRACE_BOUNDARY : (uint32_t)((node_detector((uint64_t)n >> 1) << 1) | (n & 1)));
+    }
+}
+
+void Decoder::trace_cycle(std::span<const node_offset_int> cycle, obsmask_int obs_flip) const {
+    traced_shot->cycle_lengths.push_back(cycle.size());
+    for (auto n : cycle) {
+        traced_shot->cycle_nodes.push_back((node_detector(n >> 1) << 1) | (n & 1));
+    }
+    traced_shot->cycle_obs_flips.push_back(obs_flip);
+}
+
+obsmask_int Decoder::decode_mobius_detection_events(std::span<const uint8_t> bit_packed_detection_events, float *weight_out) {
+    uint64_t shot;
+    if (match_trace == nullptr || !match_trace->take_shot(&shot)) {
+        return match_and_lift_mobius_detection_events(bit_packed_detection_events, weight_out);
+    }
+
+    match_trace_record.clear();
+    match_trace_record.shot = shot;
+    for (size_t k = 0; k < sparse_det_buffer.size(); k += 2) {
+        match_trace_record.dets.push_back(node_detector(sparse_det_buffer[k] >> 1));
+    }
+    traced_shot = &match_trace_record;
+    obsmask_int result;
+    try {
+        result = match_and_lift_mobius_detection_events(bit_packed_detection_events, &match_trace_record.weight);
+    } catch (...) {
+        traced_shot = nullptr;
+        throw;
+    }
+    traced_shot = nullptr;
+
+    match_trace_record.status = (uint8_t)last_decode_status;
+    match_trace_record.obs_flips.resize((num_observables + 7) >> 3);
+    write_obs_flips_bit_packed(result, match_trace_record.obs_flips);
+    match_trace->write(match_trace_record);
+    if (weight_out != nullptr) {
+        *weight_out = match_trace_record.weight;
+    }
+    return result;
+}
+
+obsmask_int Decoder::match_and_lift_mobius_detection_events(
+    std::span<const uint8_t> bit_packed_detection_events, float *weight_out) {
+    last_decode_status = DecodeStatus::DECODED;
+    std::fill(extra_obs_flips.begin(), extra_obs_flips.end(), 0);
+    if (sparse_det_buffer.size() / 2 > max_detection_events) {
+        last_decode_status = DecodeStatus::TOO_MANY_DETECTION_EVENTS;
+        if (weight_out != nullptr) {
+            *weight_out = 0;
+        }
+        return 0;
+    }
+    // The matcher can't be stopped once it starts, so shots that are expected to run over the time budget are
+    // skipped before matching instead of being abandoned after paying for it.
+    bool timed = shot_time_budget_seconds < INFINITY && !sparse_det_buffer.empty();
+    std::chrono::steady_clock::time_point start;
+    if (timed) {
+        if (sparse_det_buffer.size() * seconds_per_mobius_detection_event > shot_time_budget_seconds) {
+            last_decode_status = DecodeStatus::OVER_TIME_BUDGET;
+            if (weight_out != nullptr) {
+                *weight_out = 0;
+            }
+            return 0;
+        }
+        start = std::chrono::steady_clock::now();
+    }
+
+    obsmask_int solution;
+    if (!basis_subproblems.empty()) {
+        solution = decode_basis_subproblems(bit_packed_detection_events, weight_out);
+    } else {
+        solution = decode_single_problem(bit_packed_detection_events, weight_out);
+    }
+
+    if (timed) {
+        double elapsed = std::chrono::duration<double>(std::chrono::steady_clock::now() - start).count();
+        // An exponential moving average, so the estimate follows shots getting harder or easier.
+        seconds_per_mobius_detection_event +=
+            (elapsed / sparse_det_buffer.size() - seconds_per_mobius_detection_event) / 8;
+        if (elapsed > shot_time_budget_seconds) {
+            last_decode_status = DecodeStatus::DECODED_LATE;
+        }
+    }
+    return solution;
+}
+
+obsmask_int Decoder::decode_single_problem(std::span<const uint8_t> bit_packed_detection_events, float *weight_out) {
+
+    // Decode the mobius matching problem.
     matcher_edge_buf.clear();
-    detection_events_to_mobius_detection_events(bit_packed_detection_events, &sparse_det_buffer, node_colors);
     matcher->match_edges(sparse_det_buffer, &matcher_edge_buf, weight_out);
 
+    return lift_matched_edges(bit_packed_detection_events, matcher_edge_buf, sparse_det_buffer, weight_out);
+}
+
+obsmask_int Decoder::lift_matched_edges(
+    std::span<const uint8_t> bit_packed_detection_events,
+    std::span<const int64_t> matched_edges,
+    std::span<const uint64_t> mobius_detection_events,
+    float *weight_out) {
     // Write solution to stderr if requested.
     if (write_mobius_match_to_std_err) {
-        std::cerr << "matched ";
-        for (size_t k = 0; k < matcher_edge_buf.size(); k += 2) {
-            auto [n1, c1, g1] = mobius_node_to_detector(matcher_edge_buf[k], node_colors);
-            auto [n2, c2, g2] = mobius_node_to_detector(matcher_edge_buf[k + 1], node_colors);
-            std::cerr << " [" << n1 << "," << c1 << "," << g1 << "]:[" << n2 << "," << c2 << "," << g2 << "]";
-        }
-        std::cerr << "\n";
+        write_mobius_match(matched_edges);
+    }
+    if (traced_shot != nullptr) {
+        trace_matched_edges(matched_edges);
     }
 
     // Lift the solution by decomposing into disjoint Euler cycles and solving each cycle.
     obsmask_int solution = 0;
+    float *lifting_weight_out = rgb_rep_weights.empty() ? nullptr : weight_out;
     euler_tour_solver.iter_euler_tours_of_interleaved_edge_list(
-        matcher_edge_buf,
-        sparse_det_buffer,
+        matched_edges,
+        mobius_detection_events,
         [&](std::span<const node_offset_int> cycle) {
-            solution ^= discharge_cycle(bit_packed_detection_events, cycle);
+            obsmask_int cycle_obs_flip = discharge_cycle(
+                bit_packed_detection_events, cycle, &resolved_detection_event_buffer, lifting_weight_out);
+            if (!extra_observable_chunks.empty()) {
+                discharge_cycle_extra_observables(
+                    bit_packed_detection_events, cycle, &resolved_detection_event_buffer, extra_obs_flips);
+            }
+            if (traced_shot != nullptr) {
+                trace_cycle(cycle, cycle_obs_flip);
+            }
+            if (cycle_callback != nullptr) {
+                report_cycle(cycle, cycle_obs_flip);
+            }
+            solution ^= cycle_obs_flip;
         });
 
     return solution;
 }
 
+obsmask_int Decoder::decode_subproblem(
+    MobiusSubproblem &subproblem, std::span<const uint8_t> bit_packed_detection_events, float *weight_out) const {
+    subproblem.matcher_edge_buf.clear();
+    std::fill(subproblem.extra_obs_flips.begin(), subproblem.extra_obs_flips.end(), 0);
+    if (subproblem.sparse_det_buffer.empty()) {
+        if (weight_out != nullptr) {
+            *weight_out = 0;
+        }
+        return 0;
+    }
+    subproblem.matcher->match_edges(subproblem.sparse_det_buffer, &subproblem.matcher_edge_buf, weight_out);
+
+    // Lift in the local indexing, translating each cycle back into mobius nodes of the full problem.
+    obsmask_int solution = 0;
+    float *lifting_weight_out = rgb_rep_weights.empty() ? nullptr : weight_out;
+    subproblem.euler_tour_solver.iter_euler_tours_of_interleaved_edge_list(
+        subproblem.matcher_edge_buf,
+        subproblem.sparse_det_buffer,
+        [&](std::span<const node_offset_int> cycle) {
+            subproblem.cycle_buf.clear();
+            for (auto n : cycle) {
+                subproblem.cycle_buf.push_back((subproblem.local_to_detector[n >> 1] << 1) | (n & 1));
+            }
+            obsmask_int cycle_obs_flip = discharge_cycle(
+                bit_packed_detection_events,
+                subproblem.cycle_buf,
+                &subproblem.resolved_detection_event_buffer,
+                lifting_weight_out);
+            if (!extra_observable_chunks.empty()) {
+                discharge_cycle_extra_observables(
+                    bit_packed_detection_events,
+                    subproblem.cycle_buf,
+                    &subproblem.resolved_detection_event_buffer,
+                    subproblem.extra_obs_flips);
+            }
+            if (traced_shot != nullptr) {
+                trace_cycle(subproblem.cycle_buf, cycle_obs_flip);
+            }
+            if (cycle_callback != nullptr) {
+                report_cycle(subproblem.cycle_buf, cycle_obs_flip);
+            }
+            solution ^= cycle_obs_flip;
+        });
+    return solution;
+}
+
+obsmask_int Decoder::decode_basis_subproblems(std::span<const uint8_t> bit_packed_detection_events, float *weight_out) {
+    auto &x_part = basis_subproblems[0];
+    auto &z_part = basis_subproblems[1];
+    x_part.sparse_det_buffer.clear();
+    z_part.sparse_det_buffer.clear();
+    for (uint64_t m : sparse_det_buffer) {
+        auto d = m >> 1;
+        auto &subproblem = node_colors[d].basis == Basis::Z ? z_part : x_part;
+        subproblem.sparse_det_buffer.push_back(((uint64_t)detector_to_subproblem_node[d] << 1) | (m & 1));
+    }
+
+    std::array<float, 2> weights{0, 0};
+    obsmask_int solution;
+    // Cycle callbacks aren't required to be thread safe, so they (and tracing) force the parts to be decoded one at a
+    // time.
+    if (decode_bases_concurrently && cycle_callback == nullptr && traced_shot == nullptr &&
+        !x_part.sparse_det_buffer.empty() && !z_part.sparse_det_buffer.empty()) {
+        auto x_solution = std::async(std::launch::async, [&]() {
+            return decode_subproblem(x_part, bit_packed_detection_events, &weights[0]);
+        });
+        solution = decode_subproblem(z_part, bit_packed_detection_events, &weights[1]);
+        solution ^= x_solution.get();
+    } else {
+        solution = decode_subproblem(x_part, bit_packed_detection_events, &weights[0]);
+        solution ^= decode_subproblem(z_part, bit_packed_detection_events, &weights[1]);
+    }
+    if (weight_out != nullptr) {
+        *weight_out = weights[0] + weights[1];
+    }
+    for (size_t c = 0; c < extra_obs_flips.size(); c++) {
+        extra_obs_flips[c] = x_part.extra_obs_flips[c] ^ z_part.extra_obs_flips[c];
+    }
+
+    // Write solution to stderr, or into the trace, if requested.
+    if (write_mobius_match_to_std_err || traced_shot != nullptr) {
+        matcher_edge_buf.clear();
+        for (const auto &subproblem : basis_subproblems) {
+            for (auto n : subproblem.matcher_edge_buf) {
+                matcher_edge_buf.push_back((subproblem.local_to_detector[n >> 1] << 1) | (n & 1));
+            }
+        }
+        if (write_mobius_match_to_std_err) {
+            write_mobius_match(matcher_edge_buf);
+        }
+        if (traced_shot != nullptr) {
+            trace_matched_edges(matcher_edge_buf);
+        }
+    }
+
+    return solution;
+}
+
 std::ostream &chromobius::operator<<(std::ostream &out, const Decoder &val) {
     out << "chromobius::Decoder{\n\n";
     out << ".charge_graph=" << val.charge_graph << "\n\n";
@@ -17,6 +17,10 @@
 #ifndef _CHROMOBIUS_DECODER_H
 #define _CHROMOBIUS_DECODER_H
 
+#include <chrono>
+#include <cmath>
+#include <functional>
+
 #include "chromobius/datatypes/rgb_edge.h"
 #include "chromobius/graph/charge_graph.h"
 #include "chromobius/graph/collect_atomic_errors.h"
@@ -24,10 +28,14 @@
 #include "chromobius/graph/collect_nodes.h"
 #include "chromobius/graph/drag_graph.h"
 #include "chromobius/graph/euler_tours.h"
+#include "chromobius/decode/configuration_profile.h"
+#include "chromobius/decode/match_trace.h"
 #include "chromobius/decode/matcher_interface.h"
 
 namespace chromobius {
 
+struct ClusterDecoder;
+
 /// Invariant: drain_cycle_index_1 <= drain_cycle_index_2
 struct ChargeDrain {
     size_t drain_cycle_index_1;
@@ -58,22 +66,226 @@ struct DecoderConfigOptions {
     /// default to using PyMatching.
     std::shared_ptr<MatcherInterface> matcher;
 
+    /// When set, the X basis and Z basis parts of the mobius dem are given to
+    /// separate matchers, and each part is matched and lifted on its own with
+    /// its own (smaller) workspace. This requires that no mobius error connects
+    /// detectors from different bases, which is true when errors affecting
+    /// both bases (e.g. Y errors in a CSS color code) decompose into an X part
+    /// and a Z part.
+    bool split_bases = false;
+
+    /// When set (along with split_bases), a shot with detection events in both
+    /// bases has its X part decoded on a helper thread while the calling thread
+    /// decodes its Z part. Starting the helper thread has a cost, so this is
+    /// only worthwhile when each shot takes a long time to decode.
+    bool decode_bases_concurrently = false;
+
+    /// Shots with more detection events than this aren't decoded. Instead they
+    /// predict that no observables flipped, and are flagged with the status
+    /// DecodeStatus::TOO_MANY_DETECTION_EVENTS.
+    size_t max_detection_events = SIZE_MAX;
+
+    /// How many seconds a shot may spend being decoded.
+    ///
+    /// The matcher can't be interrupted once it starts, and matching is most of
+    /// the work, so the budget is enforced before matching. The decoder keeps
+    /// a running estimate of its decoding time per detection event, learned
+    /// from the shots it decodes. A shot whose estimated time exceeds the
+    /// budget isn't decoded: it predicts that no observables flipped, and is
+    /// flagged with the status DecodeStatus::OVER_TIME_BUDGET. A shot that is
+    /// decoded but finishes after the budget ran out keeps its prediction, and
+    /// is flagged with the status DecodeStatus::DECODED_LATE.
+    ///
+    /// Limitations: the estimate starts at zero and is linear in the number of
+    /// detection events. So a decoder's first shots, and shots that are much
+    /// harder than their detection event count suggests, can still take longer
+    /// than the budget. The budget bounds latency only approximately.
+    double shot_time_budget_seconds = INFINITY;
+
+    /// Mobius errors with a weight ln((1-p)/p) above this are pruned from the
+    /// mobius dem (after errors with identical edges have been merged). Large
+    /// noise models contain many very unlikely errors, which add edges to the
+    /// matching graph without meaningfully affecting its solutions. Pruning too
+    /// aggressively can disconnect parts of the matching graph, causing
+    /// matching to fail.
+    double max_mobius_error_weight = INFINITY;
+
+    /// When set (along with max_mobius_error_weight), the probability of each
+    /// pruned mobius error is folded into the edges it shares with the errors
+    /// that were kept, instead of being discarded. The matching graph only
+    /// loses edges that appeared exclusively in pruned errors, and the
+    /// remaining edges keep their weights.
+    bool fold_pruned_mobius_errors = false;
+
+    /// When set, state that's only needed while configuring the decoder is
+    /// freed once the decoder is configured. The atomic errors and the charge
+    /// graph are discarded, and the mobius dem is replaced by an equivalent
+    /// one containing one error per matching graph edge (and no coordinate
+    /// data). This doesn't change how shots are decoded, but it makes the
+    /// decoder much less informative when printed (e.g. by describe_decoder).
+    bool slim = false;
+
+    /// When set, the decoder is slimmed (see slim) and its drag graphs are
+    /// frozen (see DragGraph::freeze), moving their entries out of node based
+    /// maps and into sorted arrays on read-only pages. Clones of the decoder
+    /// share the frozen arrays, and so do processes forked after the decoder
+    /// is configured (because the pages are never written, they're never
+    /// copied on write). Lookups into the drag graphs become binary searches.
+    bool compact = false;
+
+    /// When set, the weights reported for decoded shots include the cost of
+    /// lifting the matcher's solution, not just the weight of the matcher's
+    /// solution. Lifting converts charge between colors (and dumps charge into
+    /// boundaries) by applying rgb representative errors, which don't appear
+    /// in the matcher's solution. Each representative error applied adds its
+    /// weight ln((1-p)/p) to the shot's weight. The representative errors are
+    /// chosen during lifting, so this adds no extra pass over the solution.
+    bool include_lifting_weight = false;
+
+    /// When at least 2, shots given to decode_detection_events (and
+    /// decode_detection_events_batch) are split into clusters of detection
+    /// events that can be matched independently, and the clusters are decoded
+    /// in parallel by this many threads (see ClusterDecoder). The predicted
+    /// observables have the same weight as decoding the whole shot at once.
+    ///
+    /// Clustering only pays off for large patches with sparse detection
+    /// events, and only when there are spare cores. On one thread it's strictly
+    /// more work than decoding the shot at once, so smaller values disable it.
+    /// Shots whose clusters percolate are decoded as a whole, and after a shot
+    /// percolates the next few shots skip clustering, so dense workloads pay
+    /// little for it. Each clone of the decoder starts its own threads. Can't be
+    /// combined with max_detection_events, shot_time_budget_seconds, or more
+    /// than 64 observables. While a match trace is being written, shots are
+    /// decoded without clustering.
+    size_t cluster_threads = 0;
+
+    /// When set, the time spent in each stage of configuring the decoder and
+    /// the number of objects produced by the stages are recorded into this
+    /// profile.
+    ConfigurationProfile *profile = nullptr;
+
     std::unique_ptr<MatcherInterface> matcher_for(const stim::DetectorErrorModel &mobius_dem) const;
 };
 
+/// How the decoding of a shot went.
+enum class DecodeStatus : uint8_t {
+    /// The shot was decoded normally.
+    DECODED = 0,
+    /// The shot had more detection events than the configured maximum, so it
+    /// wasn't decoded and its prediction is that no observables flipped.
+    TOO_MANY_DETECTION_EVENTS = 1,
+    /// The shot was estimated to take longer than the time budget to decode,
+    /// so it wasn't decoded and its prediction is that no observables flipped.
+    OVER_TIME_BUDGET = 2,
+    /// The shot was decoded, but decoding finished after the time budget ran
+    /// out. Its prediction is kept.
+    DECODED_LATE = 3,
+};
+
+/// The approximate number of bytes of heap memory held by parts of a decoder.
+///
+/// Memory held by the matcher isn't included.
+struct DecoderMemoryUsage {
+    /// Node colors, and the tables translating between detectors and nodes.
+    size_t node_tables = 0;
+    size_t atomic_errors = 0;
+    /// The mobius dem (including the mobius dems of basis subproblems).
+    size_t mobius_dem = 0;
+    size_t charge_graph = 0;
+    size_t rgb_reps = 0;
+    size_t drag_graph = 0;
+    /// Ephemeral workspaces used while decoding.
+    size_t workspace = 0;
+
+    size_t total() const;
+};
+
+/// The lifting data for a group of 64 observables, used by decoders configured
+/// from a dem with more than 64 observables.
+///
+/// None of the decisions made while configuring the decoder or lifting a
+/// matcher's solution depend on which observables are flipped, so each group of
+/// 64 observables can be lifted separately using the same matched edges. The
+/// first 64 observables use the decoder's own rgb_reps and drag_graph.
+struct ObservableChunk {
+    /// The RGB representatives of each node, with observable flips restricted
+    /// to the chunk's observables.
+    std::vector<RgbEdge> rgb_reps;
+    /// The drag graph, with observable flips restricted to the chunk's
+    /// observables.
+    DragGraph drag_graph;
+};
+
+/// A part of the mobius matching problem that is matched and lifted
+/// independently of the other parts, using its own matcher and workspace.
+struct MobiusSubproblem {
+    /// The part of the mobius dem covered by this subproblem, with its own
+    /// contiguous detector indexing.
+    stim::DetectorErrorModel mobius_dem;
+    /// The detector (in the original dem) of each local detector.
+    std::vector<node_offset_int> local_to_detector;
+    /// The matcher configured for this subproblem's mobius dem.
+    std::unique_ptr<MatcherInterface> matcher;
+
+    /// Ephemeral workspace for the local mobius detection events of a shot.
+    std::vector<uint64_t> sparse_det_buffer;
+    /// Ephemeral workspace for the matcher to save its results into.
+    std::vector<int64_t> matcher_edge_buf;
+    /// Ephemeral workspace for decomposing results from the matcher into separately solvable pieces.
+    EulerTourGraph euler_tour_solver{0};
+    /// Ephemeral workspace for tracking which detection events have been processed (within one euler cycle).
+    std::vector<uint64_t> resolved_detection_event_buffer;
+    /// Ephemeral workspace for translating euler cycles back into the original mobius node indices.
+    std::vector<node_offset_int> cycle_buf;
+    /// Ephemeral workspace for the subproblem's flips of observables beyond the first 64.
+    std::vector<obsmask_int> extra_obs_flips;
+};
+
 struct Decoder {
     /// The color and basis of each node in the graph.
+    ///
+    /// Ignored detectors are dropped while configuring the decoder, and the
+    /// remaining detectors are renumbered into a dense range of nodes. The
+    /// decoder translates detector indices into node indices when it's given
+    /// detection events.
     std::vector<ColorBasis> node_colors;
+    /// The number of detectors in the dem the decoder was configured from,
+    /// including ignored detectors.
+    size_t num_detectors = 0;
+    /// The node index of each detector (IGNORED_NODE for ignored detectors).
+    /// Empty when no detectors are ignored, in which case each detector's node
+    /// index is its detector index.
+    std::vector<node_offset_int> detector_to_node;
+    /// The detector index of each node. Empty when no detectors are ignored.
+    std::vector<node_offset_int> node_to_detector;
     /// The basic errors that more complex errors are decomposed into.
     std::map<AtomicErrorKey, obsmask_int> atomic_errors;
     /// The doubled detector error model given to the matcher.
     stim::DetectorErrorModel mobius_dem;
+    /// The number of distinct mobius edges that were left out of the mobius dem
+    /// due to DecoderConfigOptions::max_mobius_error_weight.
+    size_t num_pruned_mobius_edges = 0;
 
     ChargeGraph charge_graph;
     std::vector<RgbEdge> rgb_reps;
+    /// The weight of each node's rgb representative error (see
+    /// choose_rgb_rep_weights). Empty unless the decoder was configured with
+    /// DecoderConfigOptions::include_lifting_weight, in which case the weights
+    /// of the representative errors applied while lifting are added into the
+    /// weights reported for decoded shots.
+    std::vector<float> rgb_rep_weights;
     DragGraph drag_graph;
     bool write_mobius_match_to_std_err = false;
 
+    /// The number of observables in the dem the decoder was configured from.
+    size_t num_observables = 0;
+    /// When there are more than 64 observables, chunk k holds the lifting data
+    /// for observables 64(k+1) through 64(k+1)+63. Otherwise it's empty.
+    std::vector<ObservableChunk> extra_observable_chunks;
+    /// The flips of observables beyond the first 64 predicted for the most
+    /// recently decoded shot (one mask per extra observable chunk).
+    std::vector<obsmask_int> extra_obs_flips;
+
     /// The configured matcher (e.g. from pymatching) used to decode the mobius problem.
     std::unique_ptr<MatcherInterface> matcher;
 
@@ -85,6 +297,37 @@ struct Decoder {
     EulerTourGraph euler_tour_solver{0};
     /// Ephemeral workspace for tracking which detection events have been processed (within one euler cycle).
     std::vector<uint64_t> resolved_detection_event_buffer;
+    /// Ephemeral workspace for bit packing sparse detection event data (used when lifting the matcher's solution).
+    std::vector<uint8_t> dense_det_buffer;
+    /// Ephemeral workspace for bit packing detection events by node index, when detectors have been renumbered.
+    std::vector<uint8_t> node_det_buffer;
+    /// Ephemeral workspace for where each shot's detection events start, when decoding a batch of shots.
+    std::vector<size_t> batch_det_offsets;
+    /// Ephemeral workspace for where each shot's matched edges start, when decoding a batch of shots.
+    std::vector<size_t> batch_edge_offsets;
+
+    /// When DecoderConfigOptions::split_bases is set, this holds the X basis
+    /// subproblem followed by the Z basis subproblem (and `matcher` is not
+    /// used). Otherwise it's empty.
+    std::vector<MobiusSubproblem> basis_subproblems;
+    /// The index of each detector within its basis subproblem.
+    std::vector<node_offset_int> detector_to_subproblem_node;
+    /// Whether the basis subproblems of a shot are decoded at the same time.
+    bool decode_bases_concurrently = false;
+    /// See DecoderConfigOptions::max_detection_events.
+    size_t max_detection_events = SIZE_MAX;
+    /// See DecoderConfigOptions::shot_time_budget_seconds.
+    double shot_time_budget_seconds = INFINITY;
+    /// The status of the most recently decoded shot.
+    DecodeStatus last_decode_status = DecodeStatus::DECODED;
+    /// When set, a sample of the shots decoded by the decoder are recorded into
+    /// this trace. Clones of the decoder share the trace. Batches of shots are
+    /// decoded one shot at a time while a trace is being written.
+    std::shared_ptr<MatchTraceWriter> match_trace;
+    /// Splits shots into clusters decoded in parallel, when the decoder was
+    /// configured with DecoderConfigOptions::cluster_threads. Otherwise null.
+    /// Each clone of the decoder gets its own.
+    std::shared_ptr<ClusterDecoder> cluster_decoder;
 
     /// Creates a decoder for a DEM with annotated detector colors and bases.
     ///
@@ -110,15 +353,211 @@ struct Decoder {
         const stim::DetectorErrorModel &dem,
         DecoderConfigOptions options);
 
+    /// Creates a decoder for a circuit with annotated detector colors and bases.
+    ///
+    /// Equivalent to calling from_dem on the result of circuit_to_decoding_dem,
+    /// except that the error analysis is recorded as the "error_analysis"
+    /// stage when profiling.
+    ///
+    /// Args:
+    ///     circuit: The circuit to configure the decoder for. Its detectors
+    ///         must be annotated with colors and bases, using the same 4th
+    ///         coordinate convention as from_dem.
+    ///     options: Configuration options. See the DecoderConfigOptions class
+    ///         for details.
+    ///
+    /// Returns:
+    ///     The configured decoder, ready to perform decoding.
+    static Decoder from_circuit(
+        const stim::Circuit &circuit,
+        DecoderConfigOptions options);
+
     void check_invariants() const;
 
+    /// Returns the node index of a detector, or IGNORED_NODE if it's ignored.
+    inline node_offset_int detector_node(uint64_t detector) const {
+        return detector_to_node.empty() ? (node_offset_int)detector : detector_to_node[detector];
+    }
+
+    /// Returns the detector index of a node.
+    inline uint64_t node_detector(node_offset_int node) const {
+        return node_to_detector.empty() ? node : node_to_detector[node];
+    }
+
+    /// Creates an independent copy of the decoder.
+    ///
+    /// The copy has its own matcher and its own ephemeral workspace, so it can
+    /// be used at the same time as the original (e.g. from another thread).
+    Decoder clone() const;
+
+    /// Estimates how much heap memory is held by each part of the decoder.
+    DecoderMemoryUsage memory_usage() const;
+
     /// Predicts the observables flipped by errors producing the given detection
     /// events.
     ///
+    /// The result covers the first 64 observables. For decoders with more than
+    /// 64 observables, the flips of the remaining observables are written into
+    /// extra_obs_flips (see write_obs_flips_bit_packed).
+    ///
     /// As part of running, this method clears the detection event data back to 0.
     obsmask_int decode_detection_events(std::span<const uint8_t> bit_packed_detection_events, float *weight_out = nullptr);
 
+    /// Predicts the observables flipped in each of a batch of shots.
+    ///
+    /// Gives the matching problems of all the shots to the matcher in one call
+    /// (see MatcherInterface::match_edges_batch), and then lifts each shot's
+    /// solution. The results are the same as calling decode_detection_events
+    /// on each shot. Decoders with split bases, a shot time budget, or
+    /// cluster threads decode the shots one at a time, because their matching
+    /// is done per subproblem, timed per shot, or split into clusters.
+    /// Decoders with more than 64 observables also decode the shots one at a
+    /// time, leaving extra_obs_flips holding the last shot's flips of
+    /// observables beyond the first 64.
+    ///
+    /// Args:
+    ///     bit_packed_detection_events: The detection event data of the shots.
+    ///         Shot k's bit packed detection events start at byte k*shot_stride.
+    ///     shot_stride: The number of bytes from the start of one shot's data
+    ///         to the start of the next shot's data. When there's more than
+    ///         one shot, this must be at least the number of bytes needed to
+    ///         bit pack one shot's detection events.
+    ///     out_obs_flips: Where to write the predicted observable flips of each
+    ///         shot. Its size determines the number of shots.
+    ///     out_weights: Optional. Where to write the weight of each shot's
+    ///         matching (plus its lifting weight, when configured with
+    ///         include_lifting_weight).
+    ///     out_statuses: Optional. Where to write the status of each shot.
+    void decode_detection_events_batch(
+        std::span<const uint8_t> bit_packed_detection_events,
+        size_t shot_stride,
+        std::span<obsmask_int> out_obs_flips,
+        float *out_weights = nullptr,
+        DecodeStatus *out_statuses = nullptr);
+
+    /// Predicts the observables flipped by errors producing the given detection
+    /// events, where the detection events are specified sparsely.
+    ///
+    /// This is equivalent to decode_detection_events, but skips scanning over
+    /// every detector. This makes it faster when detection events are rare.
+    ///
+    /// Args:
+    ///     detector_indices: The indices of the detectors that fired. The
+    ///         order doesn't matter, but the indices must be distinct and less
+    ///         than the number of detectors.
+    ///     weight_out: Optional. Where to write the weight of the matcher's
+    ///         solution (plus its lifting weight, when configured with
+    ///         include_lifting_weight).
+    ///
+    /// Returns:
+    ///     A bit mask of the predicted observable flips.
+    obsmask_int decode_sparse_detection_events(
+        std::span<const uint64_t> detector_indices, float *weight_out = nullptr);
+
+    /// Called by decode_sparse_detection_events_by_cycle for each piece of the
+    /// solution. The cycle is made up of mobius nodes (mobius node 2d+k belongs
+    /// to detector d) and covers the detection events explained by the piece.
+    using CycleCallback = std::function<void(std::span<const node_offset_int> cycle, obsmask_int obs_flip)>;
+
+    /// Predicts observable flips like decode_sparse_detection_events, while
+    /// also reporting the separately lifted pieces of the solution.
+    ///
+    /// The matcher's solution is split into euler cycles, and each cycle is
+    /// lifted into observable flips on its own. Each cycle is charge neutral,
+    /// so the detection events it covers are fully explained by it. The XOR of
+    /// the reported flips is the returned prediction.
+    ///
+    /// Args:
+    ///     detector_indices: The indices of the detectors that fired. The
+    ///         order doesn't matter, but the indices must be distinct and less
+    ///         than the number of detectors.
+    ///     on_cycle: Called with each cycle and the observables it flips.
+    ///     weight_out: Optional. Where to write the weight of the matcher's
+    ///         solution (plus its lifting weight, when configured with
+    ///         include_lifting_weight).
+    ///
+    /// Returns:
+    ///     A bit mask of the predicted observable flips.
+    obsmask_int decode_sparse_detection_events_by_cycle(
+        std::span<const uint64_t> detector_indices, const CycleCallback &on_cycle, float *weight_out = nullptr);
+
+    /// Bit packs the predicted observable flips of the most recently decoded
+    /// shot.
+    ///
+    /// Args:
+    ///     obs_flip: The prediction returned when the shot was decoded. This
+    ///         covers the first 64 observables, and extra_obs_flips covers the
+    ///         rest.
+    ///     out: Where to write the flips. Bit k of the buffer is set when
+    ///         observable k is predicted to flip. Bytes past the decoder's
+    ///         observables are set to 0.
+    void write_obs_flips_bit_packed(obsmask_int obs_flip, std::span<uint8_t> out) const;
+
    private:
+    /// Set while decode_sparse_detection_events_by_cycle is running.
+    const CycleCallback *cycle_callback = nullptr;
+    /// Points at match_trace_record while the shot being decoded is being traced.
+    MatchTraceRecord *traced_shot = nullptr;
+    /// Ephemeral workspace for recording a traced shot.
+    MatchTraceRecord match_trace_record;
+    /// The running estimate of how long decoding takes per mobius detection
+    /// event, used to skip shots that would exceed the time budget.
+    double seconds_per_mobius_detection_event = 0;
+
+    /// Passes a lifted cycle to cycle_callback, with its mobius nodes translated back to detector indices.
+    void report_cycle(std::span<const node_offset_int> cycle, obsmask_int obs_flip) const;
+
+    /// Matches the mobius detection events in sparse_det_buffer and lifts the
+    /// result into observable flips, tracing the shot if it's sampled by
+    /// match_trace.
+    obsmask_int decode_mobius_detection_events(
+        std::span<const uint8_t> bit_packed_detection_events, float *weight_out);
+
+    /// Matches the mobius detection events in sparse_det_buffer and lifts the
+    /// result into observable flips, enforcing the detection event limit and
+    /// the time budget.
+    obsmask_int match_and_lift_mobius_detection_events(
+        std::span<const uint8_t> bit_packed_detection_events, float *weight_out);
+
+    /// Records matched edges into the traced shot, translating them to detector indexing.
+    void trace_matched_edges(std::span<const int64_t> edges) const;
+
+    /// Records a lifted cycle into the traced shot, translating it to detector indexing.
+    void trace_cycle(std::span<const node_offset_int> cycle, obsmask_int obs_flip) const;
+
+    /// Matches and lifts the mobius detection events in sparse_det_buffer using
+    /// the decoder's single matcher.
+    obsmask_int decode_single_problem(std::span<const uint8_t> bit_packed_detection_events, float *weight_out);
+
+    /// Lifts the matcher's solution for one shot into observable flips.
+    ///
+    /// When the decoder has rgb_rep_weights and weight_out isn't null, the
+    /// lifting weight is added into *weight_out.
+    obsmask_int lift_matched_edges(
+        std::span<const uint8_t> bit_packed_detection_events,
+        std::span<const int64_t> matched_edges,
+        std::span<const uint64_t> mobius_detection_events,
+        float *weight_out);
+
+    /// Routes the mobius detection events in sparse_det_buffer to the basis
+    /// subproblems, then matches and lifts each subproblem.
+    obsmask_int decode_basis_subproblems(std::span<const uint8_t> bit_packed_detection_events, float *weight_out);
+
+    /// Matches and lifts the detection events in a subproblem's sparse_det_buffer.
+    obsmask_int decode_subproblem(
+        MobiusSubproblem &subproblem, std::span<const uint8_t> bit_packed_detection_events, float *weight_out) const;
+
+    /// Lifts a cycle into the flips of observables beyond the first 64, xoring
+    /// the flips of each extra observable chunk into out_extra_obs_flips.
+    void discharge_cycle_extra_observables(
+        std::span<const uint8_t> packed_detection_event_data_to_clear,
+        std::span<const node_offset_int> cycle,
+        std::vector<uint64_t> *used_buf,
+        std::span<obsmask_int> out_extra_obs_flips) const;
+
+    /// Writes the matcher's solution to stderr (for write_mobius_match_to_std_err).
+    void write_mobius_match(std::span<const int64_t> edges) const;
+
     /// Handles getting rid of excitation events within a cycle found by the
     /// matcher.
     ///
@@ -135,12 +574,20 @@ struct Decoder {
     ///         between node indices and the charge change to the next node. So,
     ///         for example, the cycle might be [5, NEUTRAL, 8, NEUTRAL, 9, RED,
     ///         10, NEUTRAL].
+    ///     used_buf: Workspace for tracking the detection events that have
+    ///         been picked up.
+    ///     lifting_weight_out: Optional. When not null, the weights of the rgb
+    ///         representative errors inserted to clear out the detection
+    ///         events (see rgb_rep_weights) are added into this value.
     ///
     /// Returns:
     ///     The observables that were flipped by the errors inserted to clear out
     ///     the detection events.
     obsmask_int discharge_cycle(
-        std::span<const uint8_t> packed_detection_event_data_to_clear, std::span<const node_offset_int> cycle);
+        std::span<const uint8_t> packed_detection_event_data_to_clear,
+        std::span<const node_offset_int> cycle,
+        std::vector<uint64_t> *used_buf,
+        float *lifting_weight_out = nullptr) const;
 };
 std::ostream &operator<<(std::ostream &out, const Decoder &val);
 
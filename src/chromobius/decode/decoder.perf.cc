@@ -16,6 +16,8 @@
 
 #include <span>
 
+#include "chromobius/decode/cluster_decoder.h"
+#include "chromobius/decode/sliding_window_decoder.h"
 #include "chromobius/util.perf.h"
 
 using namespace chromobius;
@@ -96,6 +98,47 @@ BENCHMARK(configure_midout_color_code_d5_r10_p1000) {
     }
 }
 
+BENCHMARK(configure_130_observables_midout_color_code_d9_r36_p1000) {
+    FILE *f = open_test_data_file("midout_color_code_d9_r36_p1000.stim");
+    stim::Circuit src_circuit = stim::Circuit::from_file(f);
+    fclose(f);
+    auto narrow_dem =
+        stim::ErrorAnalyzer::circuit_to_detector_error_model(src_circuit, false, true, false, 0, false, false);
+
+    // Spread the errors over 130 observables, so that the decoder has to lift three groups of observables.
+    stim::DetectorErrorModel src_dem;
+    std::vector<stim::DemTarget> targets;
+    for (const auto &instruction : narrow_dem.flattened().instructions) {
+        if (instruction.type != stim::DemInstructionType::DEM_ERROR) {
+            src_dem.append_dem_instruction(instruction);
+            continue;
+        }
+        targets.clear();
+        for (const auto &t : instruction.target_data) {
+            if (!t.is_observable_id()) {
+                targets.push_back(t);
+            }
+        }
+        uint64_t d = instruction.target_data[0].raw_id();
+        for (uint64_t obs : {d % 64, 64 + d % 64, 128 + d % 2}) {
+            targets.push_back(stim::DemTarget::observable_id(obs));
+        }
+        src_dem.append_error_instruction(instruction.arg_data[0], targets, "");
+    }
+
+    size_t k = 0;
+    benchmark_go([&]() {
+        Decoder d = Decoder::from_dem(src_dem, DecoderConfigOptions{});
+        k += d.mobius_dem.instructions.size();
+        k += d.atomic_errors.size();
+        k += d.drag_graph.mmm.size();
+        k += d.extra_observable_chunks.back().drag_graph.mmm.size();
+    }).goal_millis(110);
+    if (k == 1) {
+        std::cerr << "data dependence";
+    }
+}
+
 BENCHMARK(decode_midout_color_code_d5_r10_p1000) {
     FILE *f = open_test_data_file("midout_color_code_d5_r10_p1000.stim");
     stim::Circuit src_circuit = stim::Circuit::from_file(f);
@@ -132,6 +175,42 @@ BENCHMARK(decode_midout_color_code_d5_r10_p1000) {
     }
 }
 
+BENCHMARK(decode_phenom_color_code_d5_r5_p1000_with_ignored) {
+    FILE *f = open_test_data_file("phenom_color_code_d5_r5_p1000_with_ignored.stim");
+    stim::Circuit src_circuit = stim::Circuit::from_file(f);
+    fclose(f);
+    auto src_dem =
+        stim::ErrorAnalyzer::circuit_to_detector_error_model(src_circuit, false, true, false, 0, false, false);
+    Decoder decoder = Decoder::from_dem(src_dem, DecoderConfigOptions{});
+
+    size_t num_shots = 1024;
+    std::mt19937_64 rng{0};
+    auto sample = stim::sample_batch_detection_events<64>(src_circuit, num_shots, rng);
+    auto &dets = sample.first;
+    auto &obs_actual = sample.second;
+    dets = dets.transposed();
+    obs_actual = obs_actual.transposed();
+    size_t num_dets = 0;
+    for (size_t k = 0; k < num_shots; k++) {
+        num_dets += dets[k].popcnt();
+    }
+
+    size_t mistakes = 0;
+    benchmark_go([&]() {
+        for (size_t k = 0; k < num_shots; k++) {
+            std::span<uint8_t> det_data{dets[k].u8, dets[k].u8 + dets.num_minor_u8_padded()};
+            auto obs_predicted = decoder.decode_detection_events(det_data);
+            mistakes += obs_actual[k].u64[0] != obs_predicted;
+        }
+    })
+        .goal_millis(1.0)
+        .show_rate("shots", num_shots)
+        .show_rate("dets", num_dets);
+    if (mistakes == 1) {
+        std::cerr << "data dependence";
+    }
+}
+
 BENCHMARK(decode_midout_color_code_d9_r36_p1000) {
     FILE *f = open_test_data_file("midout_color_code_d9_r36_p1000.stim");
     stim::Circuit src_circuit = stim::Circuit::from_file(f);
@@ -168,6 +247,114 @@ BENCHMARK(decode_midout_color_code_d9_r36_p1000) {
     }
 }
 
+BENCHMARK(decode_compact_midout_color_code_d9_r36_p1000) {
+    FILE *f = open_test_data_file("midout_color_code_d9_r36_p1000.stim");
+    stim::Circuit src_circuit = stim::Circuit::from_file(f);
+    fclose(f);
+    auto src_dem =
+        stim::ErrorAnalyzer::circuit_to_detector_error_model(src_circuit, false, true, false, 0, false, false);
+    Decoder decoder = Decoder::from_dem(src_dem, DecoderConfigOptions{.compact = true});
+
+    size_t num_shots = 1024;
+    std::mt19937_64 rng{0};
+    auto sample = stim::sample_batch_detection_events<64>(src_circuit, num_shots, rng);
+    auto &dets = sample.first;
+    auto &obs_actual = sample.second;
+    dets = dets.transposed();
+    obs_actual = obs_actual.transposed();
+    size_t num_dets = 0;
+    for (size_t k = 0; k < num_shots; k++) {
+        num_dets += dets[k].popcnt();
+    }
+
+    size_t mistakes = 0;
+    benchmark_go([&]() {
+        for (size_t k = 0; k < num_shots; k++) {
+            std::span<uint8_t> det_data{dets[k].u8, dets[k].u8 + dets.num_minor_u8_padded()};
+            auto obs_predicted = decoder.decode_detection_events(det_data);
+            mistakes += obs_actual[k].u64[0] != obs_predicted;
+        }
+    })
+        .goal_millis(90)
+        .show_rate("shots", num_shots)
+        .show_rate("dets", num_dets);
+    if (mistakes == 1) {
+        std::cerr << "data dependence";
+    }
+}
+
+BENCHMARK(decode_split_bases_midout_color_code_d9_r36_p1000) {
+    FILE *f = open_test_data_file("midout_color_code_d9_r36_p1000.stim");
+    stim::Circuit src_circuit = stim::Circuit::from_file(f);
+    fclose(f);
+    auto src_dem =
+        stim::ErrorAnalyzer::circuit_to_detector_error_model(src_circuit, false, true, false, 0, false, false);
+    Decoder decoder = Decoder::from_dem(src_dem, DecoderConfigOptions{.split_bases = true});
+
+    size_t num_shots = 1024;
+    std::mt19937_64 rng{0};
+    auto sample = stim::sample_batch_detection_events<64>(src_circuit, num_shots, rng);
+    auto &dets = sample.first;
+    auto &obs_actual = sample.second;
+    dets = dets.transposed();
+    obs_actual = obs_actual.transposed();
+    size_t num_dets = 0;
+    for (size_t k = 0; k < num_shots; k++) {
+        num_dets += dets[k].popcnt();
+    }
+
+    size_t mistakes = 0;
+    benchmark_go([&]() {
+        for (size_t k = 0; k < num_shots; k++) {
+            std::span<uint8_t> det_data{dets[k].u8, dets[k].u8 + dets.num_minor_u8_padded()};
+            auto obs_predicted = decoder.decode_detection_events(det_data);
+            mistakes += obs_actual[k].u64[0] != obs_predicted;
+        }
+    })
+        .goal_millis(90)
+        .show_rate("shots", num_shots)
+        .show_rate("dets", num_dets);
+    if (mistakes == 1) {
+        std::cerr << "data dependence";
+    }
+}
+
+BENCHMARK(decode_split_bases_concurrently_midout_color_code_d9_r36_p1000) {
+    FILE *f = open_test_data_file("midout_color_code_d9_r36_p1000.stim");
+    stim::Circuit src_circuit = stim::Circuit::from_file(f);
+    fclose(f);
+    auto src_dem =
+        stim::ErrorAnalyzer::circuit_to_detector_error_model(src_circuit, false, true, false, 0, false, false);
+    Decoder decoder = Decoder::from_dem(src_dem, DecoderConfigOptions{.split_bases = true, .decode_bases_concurrently = true});
+
+    size_t num_shots = 1024;
+    std::mt19937_64 rng{0};
+    auto sample = stim::sample_batch_detection_events<64>(src_circuit, num_shots, rng);
+    auto &dets = sample.first;
+    auto &obs_actual = sample.second;
+    dets = dets.transposed();
+    obs_actual = obs_actual.transposed();
+    size_t num_dets = 0;
+    for (size_t k = 0; k < num_shots; k++) {
+        num_dets += dets[k].popcnt();
+    }
+
+    size_t mistakes = 0;
+    benchmark_go([&]() {
+        for (size_t k = 0; k < num_shots; k++) {
+            std::span<uint8_t> det_data{dets[k].u8, dets[k].u8 + dets.num_minor_u8_padded()};
+            auto obs_predicted = decoder.decode_detection_events(det_data);
+            mistakes += obs_actual[k].u64[0] != obs_predicted;
+        }
+    })
+        .goal_millis(90)
+        .show_rate("shots", num_shots)
+        .show_rate("dets", num_dets);
+    if (mistakes == 1) {
+        std::cerr << "data dependence";
+    }
+}
+
 BENCHMARK(decode_midout_color_code_d25_r100_p1000) {
     FILE *f = open_test_data_file("midout_color_code_d25_r100_p1000.stim");
     stim::Circuit src_circuit = stim::Circuit::from_file(f);
@@ -203,3 +390,154 @@ BENCHMARK(decode_midout_color_code_d25_r100_p1000) {
         std::cerr << "data dependence";
     }
 }
+
+BENCHMARK(decode_clusters_1_thread_midout_color_code_d25_r100_p1000) {
+    FILE *f = open_test_data_file("midout_color_code_d25_r100_p1000.stim");
+    stim::Circuit src_circuit = stim::Circuit::from_file(f);
+    fclose(f);
+    auto src_dem =
+        stim::ErrorAnalyzer::circuit_to_detector_error_model(src_circuit, false, true, false, 0, false, false);
+    Decoder decoder = Decoder::from_dem(src_dem, DecoderConfigOptions{});
+    ClusterDecoder cluster_decoder(decoder, 1);
+    size_t num_shots = 128;
+
+    std::mt19937_64 rng{0};
+    auto sample = stim::sample_batch_detection_events<64>(src_circuit, num_shots, rng);
+    auto &dets = sample.first;
+    auto &obs_actual = sample.second;
+    dets = dets.transposed();
+    obs_actual = obs_actual.transposed();
+    size_t num_dets = 0;
+    for (size_t k = 0; k < num_shots; k++) {
+        num_dets += dets[k].popcnt();
+    }
+
+    size_t mistakes = 0;
+    benchmark_go([&]() {
+        for (size_t k = 0; k < num_shots; k++) {
+            std::span<uint8_t> det_data{dets[k].u8, dets[k].u8 + dets.num_minor_u8_padded()};
+            auto obs_predicted = cluster_decoder.decode_detection_events(det_data);
+            mistakes += obs_actual[k].u64[0] != obs_predicted;
+        }
+    })
+        .goal_millis(6000)
+        .show_rate("shots", num_shots)
+        .show_rate("dets", num_dets);
+    if (mistakes == 1) {
+        std::cerr << "data dependence";
+    }
+}
+
+BENCHMARK(decode_clusters_4_threads_midout_color_code_d25_r100_p1000) {
+    FILE *f = open_test_data_file("midout_color_code_d25_r100_p1000.stim");
+    stim::Circuit src_circuit = stim::Circuit::from_file(f);
+    fclose(f);
+    auto src_dem =
+        stim::ErrorAnalyzer::circuit_to_detector_error_model(src_circuit, false, true, false, 0, false, false);
+    Decoder decoder = Decoder::from_dem(src_dem, DecoderConfigOptions{});
+    ClusterDecoder cluster_decoder(decoder, 4);
+    size_t num_shots = 128;
+
+    std::mt19937_64 rng{0};
+    auto sample = stim::sample_batch_detection_events<64>(src_circuit, num_shots, rng);
+    auto &dets = sample.first;
+    auto &obs_actual = sample.second;
+    dets = dets.transposed();
+    obs_actual = obs_actual.transposed();
+    size_t num_dets = 0;
+    for (size_t k = 0; k < num_shots; k++) {
+        num_dets += dets[k].popcnt();
+    }
+
+    size_t mistakes = 0;
+    benchmark_go([&]() {
+        for (size_t k = 0; k < num_shots; k++) {
+            std::span<uint8_t> det_data{dets[k].u8, dets[k].u8 + dets.num_minor_u8_padded()};
+            auto obs_predicted = cluster_decoder.decode_detection_events(det_data);
+            mistakes += obs_actual[k].u64[0] != obs_predicted;
+        }
+    })
+        .goal_millis(6000)
+        .show_rate("shots", num_shots)
+        .show_rate("dets", num_dets);
+    if (mistakes == 1) {
+        std::cerr << "data dependence";
+    }
+}
+
+BENCHMARK(decode_sliding_window_midout_color_code_d25_r100_p1000) {
+    FILE *f = open_test_data_file("midout_color_code_d25_r100_p1000.stim");
+    stim::Circuit src_circuit = stim::Circuit::from_file(f);
+    fclose(f);
+    auto src_dem =
+        stim::ErrorAnalyzer::circuit_to_detector_error_model(src_circuit, false, true, false, 0, false, false);
+    // Each round advances the time coordinate by 2. Commit 5 rounds at a time, with a buffer of 25 rounds.
+    auto decoder = SlidingWindowDecoder::from_dem(src_dem, DecoderConfigOptions{}, 10, 50);
+    size_t num_shots = 128;
+
+    std::mt19937_64 rng{0};
+    auto sample = stim::sample_batch_detection_events<64>(src_circuit, num_shots, rng);
+    auto &dets = sample.first;
+    auto &obs_actual = sample.second;
+    dets = dets.transposed();
+    obs_actual = obs_actual.transposed();
+    size_t num_dets = 0;
+    for (size_t k = 0; k < num_shots; k++) {
+        num_dets += dets[k].popcnt();
+    }
+
+    size_t mistakes = 0;
+    benchmark_go([&]() {
+        for (size_t k = 0; k < num_shots; k++) {
+            std::span<uint8_t> det_data{dets[k].u8, dets[k].u8 + dets.num_minor_u8_padded()};
+            auto obs_predicted = decoder.decode_detection_events(det_data);
+            mistakes += obs_actual[k].u64[0] != obs_predicted;
+        }
+    })
+        .goal_millis(1200)
+        .show_rate("shots", num_shots)
+        .show_rate("rounds", num_shots * 100)
+        .show_rate("dets", num_dets);
+    if (mistakes == 1) {
+        std::cerr << "data dependence";
+    }
+}
+
+BENCHMARK(decode_sparse_midout_color_code_d9_r36_p1000) {
+    FILE *f = open_test_data_file("midout_color_code_d9_r36_p1000.stim");
+    stim::Circuit src_circuit = stim::Circuit::from_file(f);
+    fclose(f);
+    auto src_dem =
+        stim::ErrorAnalyzer::circuit_to_detector_error_model(src_circuit, false, true, false, 0, false, false);
+    Decoder decoder = Decoder::from_dem(src_dem, DecoderConfigOptions{});
+
+    size_t num_shots = 1024;
+    std::mt19937_64 rng{0};
+    auto sample = stim::sample_batch_detection_events<64>(src_circuit, num_shots, rng);
+    auto &dets = sample.first;
+    auto &obs_actual = sample.second;
+    dets = dets.transposed();
+    obs_actual = obs_actual.transposed();
+    std::vector<std::vector<uint64_t>> sparse_dets(num_shots);
+    size_t num_dets = 0;
+    for (size_t k = 0; k < num_shots; k++) {
+        dets[k].for_each_set_bit([&](size_t d) {
+            sparse_dets[k].push_back(d);
+        });
+        num_dets += sparse_dets[k].size();
+    }
+
+    size_t mistakes = 0;
+    benchmark_go([&]() {
+        for (size_t k = 0; k < num_shots; k++) {
+            auto obs_predicted = decoder.decode_sparse_detection_events(sparse_dets[k]);
+            mistakes += obs_actual[k].u64[0] != obs_predicted;
+        }
+    })
+        .goal_millis(90)
+        .show_rate("shots", num_shots)
+        .show_rate("dets", num_dets);
+    if (mistakes == 1) {
+        std::cerr << "data dependence";
+    }
+}
@@ -16,6 +16,7 @@
 
 #include "gtest/gtest.h"
 
+#include "chromobius/datatypes/stim_integration.h"
 #include "chromobius/test_util.test.h"
 
 using namespace chromobius;
@@ -139,6 +140,75 @@ TEST(decoder, mobius_dem) {
     ASSERT_TRUE(decoder.mobius_dem.approx_equals(expected, 1e-5));
 }
 
+TEST(decoder, mobius_dem_merges_errors_with_identical_edges) {
+    stim::DetectorErrorModel dem(R"DEM(
+        error(0.125) D0 D1 D2
+        error(0.25) D2 D1 D0
+        error(0.0625) D3 D4 D5
+        detector(0, 0, 0, 0) D0
+        detector(0, 0, 0, 1) D1
+        detector(0, 0, 0, 2) D2
+        detector(0, 0, 0, 3) D3
+        detector(0, 0, 0, 4) D4
+        detector(0, 0, 0, 5) D5
+    )DEM");
+
+    Decoder decoder = Decoder::from_dem(dem, DecoderConfigOptions{});
+    stim::DetectorErrorModel expected(R"DEM(
+        error(0.3125) D1 D3 ^ D2 D4 ^ D0 D5
+        error(0.0625) D7 D9 ^ D8 D10 ^ D6 D11
+    )DEM");
+    ASSERT_TRUE(decoder.mobius_dem.approx_equals(expected, 1e-5)) << decoder.mobius_dem;
+}
+
+TEST(decoder, max_mobius_error_weight) {
+    stim::DetectorErrorModel dem(R"DEM(
+        error(0.125) D0 D1 D2
+        error(0.0625) D3 D4 D5
+        error(0.000001) D0 D1 D2 D3 D4 D5
+        error(0.000001) D0 L1
+        detector(0, 0, 0, 0) D0
+        detector(0, 0, 0, 1) D1
+        detector(0, 0, 0, 2) D2
+        detector(0, 0, 0, 3) D3
+        detector(0, 0, 0, 4) D4
+        detector(0, 0, 0, 5) D5
+    )DEM");
+
+    Decoder decoder = Decoder::from_dem(dem, DecoderConfigOptions{});
+    ASSERT_EQ(decoder.mobius_dem.count_errors(), 4);
+    ASSERT_EQ(decoder.num_pruned_mobius_edges, 0);
+
+    decoder = Decoder::from_dem(dem, DecoderConfigOptions{.max_mobius_error_weight = 10});
+    ASSERT_TRUE(decoder.mobius_dem.approx_equals(
+        stim::DetectorErrorModel(R"DEM(
+            error(0.125) D1 D3 ^ D2 D4 ^ D0 D5
+            error(0.0625) D7 D9 ^ D8 D10 ^ D6 D11
+        )DEM"),
+        1e-9)) << decoder.mobius_dem;
+    ASSERT_EQ(decoder.num_pruned_mobius_edges, 1);
+
+    decoder = Decoder::from_dem(
+        dem, DecoderConfigOptions{.max_mobius_error_weight = 10, .fold_pruned_mobius_errors = true});
+    ASSERT_TRUE(decoder.mobius_dem.approx_equals(
+        stim::DetectorErrorModel(R"DEM(
+            error(0.125) D1 D3 ^ D2 D4 ^ D0 D5
+            error(0.0625) D7 D9 ^ D8 D10 ^ D6 D11
+            error(0.000001) D0 D5
+            error(0.000001) D1 D3
+            error(0.000001) D2 D4
+            error(0.000001) D6 D11
+            error(0.000001) D7 D9
+            error(0.000001) D8 D10
+        )DEM"),
+        1e-9)) << decoder.mobius_dem;
+    ASSERT_EQ(decoder.num_pruned_mobius_edges, 1);
+
+    // Pruned decoders still decode the errors that were kept.
+    std::vector<uint8_t> dets{0b111};
+    ASSERT_EQ(decoder.decode_detection_events(dets), 0);
+}
+
 TEST(decoder, ignores_detectors_annotated_with_minus_1) {
     stim::DetectorErrorModel dem(R"DEM(
         error(0.125) D0 D1 D2
@@ -178,7 +248,413 @@ TEST(decoder, ignores_detectors_annotated_with_minus_1) {
         error(0.0625) D7 D9 ^ D8 D10 ^ D6 D11
         error(0.0625) D1 D3 ^ D2 D4 ^ D0 D5 ^ D7 D9 ^ D8 D10 ^ D6 D11
         error(0.0625) D0 D1
-        detector D47
+        detector D39
     )DEM");
-    ASSERT_TRUE(decoder.mobius_dem.approx_equals(expected, 1e-5));
+    ASSERT_TRUE(decoder.mobius_dem.approx_equals(expected, 1e-5)) << decoder.mobius_dem;
+
+    // The ignored detectors D20-D23 are dropped, and the later detectors are renumbered.
+    ASSERT_EQ(decoder.num_detectors, 24);
+    ASSERT_EQ(decoder.node_colors.size(), 20);
+    ASSERT_EQ(decoder.detector_node(5), 5);
+    ASSERT_EQ(decoder.detector_node(20), IGNORED_NODE);
+    ASSERT_EQ(decoder.node_detector(5), 5);
+    ASSERT_EQ(decoder.detector_to_node.size(), 24);
+    ASSERT_EQ(decoder.node_to_detector.size(), 20);
+    ASSERT_EQ(decoder.decode_sparse_detection_events(std::vector<uint64_t>{0, 20, 21}), 2);
+    ASSERT_THROW({ decoder.decode_sparse_detection_events(std::vector<uint64_t>{20, 20}); }, std::invalid_argument);
+    ASSERT_THROW({ decoder.decode_sparse_detection_events(std::vector<uint64_t>{24}); }, std::invalid_argument);
+}
+
+TEST(decoder, decode_sparse_detection_events) {
+    FILE *f = open_test_data_file("midout_color_code_d5_r10_p1000.stim");
+    stim::Circuit circuit = stim::Circuit::from_file(f);
+    fclose(f);
+    auto dem = stim::ErrorAnalyzer::circuit_to_detector_error_model(circuit, false, true, false, 0, false, false);
+    Decoder decoder = Decoder::from_dem(dem, DecoderConfigOptions{});
+
+    std::mt19937_64 rng{0};
+    auto [dets, obs] = stim::sample_batch_detection_events<64>(circuit, 256, rng);
+    dets = dets.transposed();
+    std::vector<uint64_t> sparse;
+    for (size_t k = 0; k < 256; k++) {
+        std::span<const uint8_t> det_data{dets[k].u8, dets[k].u8 + dets.num_minor_u8_padded()};
+        sparse.clear();
+        dets[k].for_each_set_bit([&](size_t d) {
+            sparse.push_back(d);
+        });
+        float w1;
+        float w2;
+        auto expected = decoder.decode_detection_events(det_data, &w1);
+        ASSERT_EQ(decoder.decode_sparse_detection_events(sparse, &w2), expected);
+        ASSERT_EQ(w1, w2);
+        std::reverse(sparse.begin(), sparse.end());
+        ASSERT_EQ(decoder.decode_sparse_detection_events(sparse), expected);
+    }
+
+    ASSERT_THROW({ decoder.decode_sparse_detection_events(std::vector<uint64_t>{3, 100000}); }, std::invalid_argument);
+    ASSERT_THROW({ decoder.decode_sparse_detection_events(std::vector<uint64_t>{3, 5, 3}); }, std::invalid_argument);
+    ASSERT_EQ(decoder.decode_sparse_detection_events(std::vector<uint64_t>{}), 0);
+}
+
+TEST(decoder, split_bases) {
+    for (const char *name : {
+             "midout_color_code_d5_r10_p1000.stim",
+             "superdense_color_code_d5_r20_p1000.stim",
+             "phenom_color_code_d5_r5_p1000_with_ignored.stim",
+             "surface_code_d5_r5_p1000.stim",
+         }) {
+        FILE *f = open_test_data_file(name);
+        stim::Circuit circuit = stim::Circuit::from_file(f);
+        fclose(f);
+        auto dem = stim::ErrorAnalyzer::circuit_to_detector_error_model(circuit, false, true, false, 0, false, false);
+        Decoder decoder = Decoder::from_dem(dem, DecoderConfigOptions{});
+        Decoder split_decoder = Decoder::from_dem(dem, DecoderConfigOptions{.split_bases = true});
+        Decoder concurrent_decoder =
+            Decoder::from_dem(dem, DecoderConfigOptions{.split_bases = true, .decode_bases_concurrently = true})
+                .clone();
+        ASSERT_EQ(split_decoder.matcher, nullptr);
+        ASSERT_EQ(split_decoder.basis_subproblems.size(), 2);
+        ASSERT_EQ(concurrent_decoder.basis_subproblems.size(), 2);
+
+        std::mt19937_64 rng{0};
+        auto [dets, obs] = stim::sample_batch_detection_events<64>(circuit, 256, rng);
+        dets = dets.transposed();
+        for (size_t k = 0; k < 256; k++) {
+            std::span<const uint8_t> det_data{dets[k].u8, dets[k].u8 + dets.num_minor_u8_padded()};
+            float w1;
+            float w2;
+            auto expected = decoder.decode_detection_events(det_data, &w1);
+            ASSERT_EQ(split_decoder.decode_detection_events(det_data, &w2), expected) << name << " shot " << k;
+            ASSERT_NEAR(w1, w2, 1e-3 * (1 + std::abs(w1)));
+            ASSERT_EQ(concurrent_decoder.decode_detection_events(det_data), expected) << name << " shot " << k;
+        }
+    }
+}
+
+TEST(decoder, bounded_latency) {
+    FILE *f = open_test_data_file("midout_color_code_d5_r10_p1000.stim");
+    stim::Circuit circuit = stim::Circuit::from_file(f);
+    fclose(f);
+    auto dem = stim::ErrorAnalyzer::circuit_to_detector_error_model(circuit, false, true, false, 0, false, false);
+    Decoder decoder = Decoder::from_dem(dem, DecoderConfigOptions{});
+    Decoder capped_decoder = Decoder::from_dem(dem, DecoderConfigOptions{.max_detection_events = 6});
+    Decoder rushed_decoder = Decoder::from_dem(dem, DecoderConfigOptions{.shot_time_budget_seconds = 1e-12}).clone();
+    ASSERT_EQ(capped_decoder.max_detection_events, 6);
+    ASSERT_EQ(rushed_decoder.shot_time_budget_seconds, 1e-12);
+
+    std::mt19937_64 rng{0};
+    auto [dets, obs] = stim::sample_batch_detection_events<64>(circuit, 256, rng);
+    dets = dets.transposed();
+    size_t num_capped = 0;
+    size_t num_late = 0;
+    size_t num_rushed = 0;
+    for (size_t k = 0; k < 256; k++) {
+        std::span<const uint8_t> det_data{dets[k].u8, dets[k].u8 + dets.num_minor_u8_padded()};
+        size_t num_dets = dets[k].popcnt();
+        float weight = -1;
+        auto expected = decoder.decode_detection_events(det_data);
+        ASSERT_EQ(decoder.last_decode_status, DecodeStatus::DECODED);
+
+        auto capped = capped_decoder.decode_detection_events(det_data, &weight);
+        if (num_dets > 6) {
+            ASSERT_EQ(capped_decoder.last_decode_status, DecodeStatus::TOO_MANY_DETECTION_EVENTS);
+            ASSERT_EQ(capped, 0);
+            ASSERT_EQ(weight, 0);
+            num_capped++;
+        } else {
+            ASSERT_EQ(capped_decoder.last_decode_status, DecodeStatus::DECODED);
+            ASSERT_EQ(capped, expected);
+        }
+
+        auto rushed = rushed_decoder.decode_detection_events(det_data);
+        if (num_dets > 0 && num_late == 0) {
+            // With no estimate of the decoding cost yet, the first shot is decoded and kept despite running late.
+            ASSERT_EQ(rushed_decoder.last_decode_status, DecodeStatus::DECODED_LATE);
+            ASSERT_EQ(rushed, expected);
+            num_late++;
+        } else if (num_dets > 0) {
+            ASSERT_EQ(rushed_decoder.last_decode_status, DecodeStatus::OVER_TIME_BUDGET);
+            ASSERT_EQ(rushed, 0);
+            num_rushed++;
+        } else {
+            ASSERT_EQ(rushed_decoder.last_decode_status, DecodeStatus::DECODED);
+        }
+    }
+    ASSERT_GT(num_capped, 0);
+    ASSERT_LT(num_capped, 256);
+    ASSERT_EQ(num_late, 1);
+    ASSERT_GT(num_rushed, 0);
+}
+
+TEST(decoder, decode_detection_events_batch) {
+    for (const char *name : {
+             "midout_color_code_d5_r10_p1000.stim",
+             "phenom_color_code_d5_r5_p1000_with_ignored.stim",
+         }) {
+        FILE *f = open_test_data_file(name);
+        stim::Circuit circuit = stim::Circuit::from_file(f);
+        fclose(f);
+        auto dem = stim::ErrorAnalyzer::circuit_to_detector_error_model(circuit, false, true, false, 0, false, false);
+        std::mt19937_64 rng{0};
+        auto [dets, obs] = stim::sample_batch_detection_events<64>(circuit, 256, rng);
+        dets = dets.transposed();
+        std::span<const uint8_t> all_data{dets.data.u8, dets.data.u8 + dets.data.num_u8_padded()};
+
+        for (auto options : {
+                 DecoderConfigOptions{},
+                 DecoderConfigOptions{.split_bases = true},
+                 DecoderConfigOptions{.max_detection_events = 6},
+             }) {
+            Decoder decoder = Decoder::from_dem(dem, options);
+            std::vector<obsmask_int> expected_flips;
+            std::vector<float> expected_weights;
+            std::vector<DecodeStatus> expected_statuses;
+            for (size_t k = 0; k < 256; k++) {
+                float w;
+                expected_flips.push_back(
+                    decoder.decode_detection_events({dets[k].u8, dets[k].u8 + dets.num_minor_u8_padded()}, &w));
+                expected_weights.push_back(w);
+                expected_statuses.push_back(decoder.last_decode_status);
+            }
+
+            std::vector<obsmask_int> flips(256);
+            std::vector<float> weights(256);
+            std::vector<DecodeStatus> statuses(256);
+            decoder.decode_detection_events_batch(
+                all_data, dets.num_minor_u8_padded(), flips, weights.data(), statuses.data());
+            ASSERT_EQ(flips, expected_flips) << name;
+            ASSERT_EQ(weights, expected_weights) << name;
+            ASSERT_EQ(statuses, expected_statuses) << name;
+
+            decoder.decode_detection_events_batch(all_data, dets.num_minor_u8_padded(), flips);
+            ASSERT_EQ(flips, expected_flips) << name;
+        }
+    }
+}
+
+TEST(decoder, slim) {
+    for (const char *name : {
+             "midout_color_code_d5_r10_p1000.stim",
+             "phenom_color_code_d5_r5_p1000_with_ignored.stim",
+         }) {
+        FILE *f = open_test_data_file(name);
+        stim::Circuit circuit = stim::Circuit::from_file(f);
+        fclose(f);
+        auto dem = stim::ErrorAnalyzer::circuit_to_detector_error_model(circuit, false, true, false, 0, false, false);
+
+        for (bool split_bases : {false, true}) {
+            Decoder full = Decoder::from_dem(dem, DecoderConfigOptions{.split_bases = split_bases});
+            Decoder slim = Decoder::from_dem(dem, DecoderConfigOptions{.split_bases = split_bases, .slim = true});
+            ASSERT_TRUE(slim.atomic_errors.empty());
+            ASSERT_TRUE(slim.charge_graph.nodes.empty());
+            ASSERT_EQ(slim.mobius_dem.count_detectors(), full.mobius_dem.count_detectors());
+            slim.check_invariants();
+
+            auto full_usage = full.memory_usage();
+            auto slim_usage = slim.memory_usage();
+            ASSERT_GT(full_usage.atomic_errors, 0);
+            ASSERT_GT(full_usage.charge_graph, 0);
+            ASSERT_EQ(slim_usage.atomic_errors, 0);
+            ASSERT_EQ(slim_usage.charge_graph, 0);
+            ASSERT_LT(slim_usage.mobius_dem, full_usage.mobius_dem);
+            ASSERT_EQ(slim_usage.drag_graph, full_usage.drag_graph);
+            ASSERT_LT(slim_usage.total(), full_usage.total());
+
+            Decoder slim_clone = slim.clone();
+            SCOPED_TRACE(name);
+            ASSERT_NO_FATAL_FAILURE(assert_decoders_agree_on_sampled_shots(circuit, full, {&slim, &slim_clone}));
+        }
+    }
+}
+
+TEST(decoder, compact) {
+    FILE *f = open_test_data_file("midout_color_code_d5_r10_p1000.stim");
+    stim::Circuit circuit = stim::Circuit::from_file(f);
+    fclose(f);
+    auto dem = circuit_to_decoding_dem(circuit);
+
+    for (bool split_bases : {false, true}) {
+        Decoder full = Decoder::from_dem(dem, DecoderConfigOptions{.split_bases = split_bases});
+        Decoder compact = Decoder::from_dem(dem, DecoderConfigOptions{.split_bases = split_bases, .compact = true});
+        ASSERT_TRUE(compact.atomic_errors.empty());
+        ASSERT_TRUE(compact.drag_graph.is_frozen());
+        ASSERT_EQ(compact.drag_graph, full.drag_graph);
+        ASSERT_LT(compact.memory_usage().drag_graph, full.memory_usage().drag_graph);
+        compact.check_invariants();
+
+        Decoder clone = compact.clone();
+        ASSERT_EQ(clone.drag_graph.frozen_entries.data(), compact.drag_graph.frozen_entries.data());
+        ASSERT_NO_FATAL_FAILURE(assert_decoders_agree_on_sampled_shots(circuit, full, {&compact, &clone}));
+    }
+}
+
+TEST(decoder, include_lifting_weight) {
+    FILE *f = open_test_data_file("midout_color_code_d5_r10_p1000.stim");
+    stim::Circuit circuit = stim::Circuit::from_file(f);
+    fclose(f);
+    auto dem = circuit_to_decoding_dem(circuit);
+    std::mt19937_64 rng{0};
+    auto [dets, obs] = stim::sample_batch_detection_events<64>(circuit, 256, rng);
+    dets = dets.transposed();
+    std::span<const uint8_t> all_data{dets.data.u8, dets.data.u8 + dets.data.num_u8_padded()};
+
+    for (bool split_bases : {false, true}) {
+        Decoder plain = Decoder::from_dem(dem, DecoderConfigOptions{.split_bases = split_bases});
+        Decoder weighted =
+            Decoder::from_dem(dem, DecoderConfigOptions{.split_bases = split_bases, .include_lifting_weight = true});
+        Decoder compact = Decoder::from_dem(
+            dem, DecoderConfigOptions{.split_bases = split_bases, .compact = true, .include_lifting_weight = true});
+        ASSERT_TRUE(plain.rgb_rep_weights.empty());
+        ASSERT_EQ(weighted.rgb_rep_weights.size(), weighted.node_colors.size());
+        ASSERT_FALSE(weighted.drag_graph.lifting_weights.empty());
+        ASSERT_EQ(compact.drag_graph, weighted.drag_graph);
+
+        size_t num_shots_with_lifting_weight = 0;
+        std::vector<float> expected_weights;
+        ASSERT_NO_FATAL_FAILURE(assert_decoders_agree_on_sampled_shots(
+            circuit,
+            weighted,
+            {&compact},
+            true,
+            [&](size_t k, std::span<const uint8_t> shot, obsmask_int expected, float weighted_weight) {
+                float plain_weight = -1;
+                ASSERT_EQ(plain.decode_detection_events(shot, &plain_weight), expected) << k;
+                ASSERT_GE(weighted_weight, plain_weight) << k;
+                num_shots_with_lifting_weight += weighted_weight > plain_weight;
+                expected_weights.push_back(weighted_weight);
+            }));
+        ASSERT_GT(num_shots_with_lifting_weight, 0);
+
+        std::vector<obsmask_int> flips(256);
+        std::vector<float> weights(256);
+        weighted.decode_detection_events_batch(all_data, dets.num_minor_u8_padded(), flips, weights.data());
+        ASSERT_EQ(weights, expected_weights);
+    }
+}
+
+/// Spreads the observable flips of a dem over 130 observables, keeping the observables in [first, first + width).
+///
+/// Each error flips L5, L70, and L129 where it used to flip L0, and also flips an observable picked by its first
+/// detector, so that the observables aren't all copies of each other.
+static stim::DetectorErrorModel spread_observables(
+    const stim::DetectorErrorModel &dem, uint64_t first = 0, uint64_t width = 130) {
+    stim::DetectorErrorModel result;
+    std::vector<stim::DemTarget> targets;
+    for (const auto &instruction : dem.flattened().instructions) {
+        if (instruction.type != stim::DemInstructionType::DEM_ERROR) {
+            result.append_dem_instruction(instruction);
+            continue;
+        }
+        std::vector<uint64_t> obs;
+        targets.clear();
+        for (const auto &t : instruction.target_data) {
+            if (t.is_relative_detector_id()) {
+                if (targets.empty()) {
+                    obs.push_back(t.raw_id() * 7 % 130);
+                }
+                targets.push_back(t);
+            } else if (t.is_observable_id()) {
+                obs.insert(obs.end(), {5, 70, 129});
+            }
+        }
+        std::sort(obs.begin(), obs.end());
+        for (size_t k = 0; k < obs.size(); k++) {
+            bool cancelled = k + 1 < obs.size() && obs[k] == obs[k + 1];
+            if (cancelled) {
+                k++;
+            } else if (obs[k] >= first && obs[k] < first + width) {
+                targets.push_back(stim::DemTarget::observable_id(obs[k] - first));
+            }
+        }
+        result.append_error_instruction(instruction.arg_data[0], targets, "");
+    }
+    return result;
+}
+
+TEST(decoder, more_than_64_observables) {
+    FILE *f = open_test_data_file("midout_color_code_d5_r10_p1000.stim");
+    stim::Circuit circuit = stim::Circuit::from_file(f);
+    fclose(f);
+    auto dem = stim::ErrorAnalyzer::circuit_to_detector_error_model(circuit, false, true, false, 0, false, false);
+    auto wide_dem = spread_observables(dem);
+    ASSERT_EQ(wide_dem.count_observables(), 130);
+
+    // Each group of 64 observables should be predicted the same way as by a decoder that only has those observables.
+    std::vector<Decoder> narrow_decoders;
+    for (uint64_t first = 0; first < 130; first += 64) {
+        narrow_decoders.push_back(Decoder::from_dem(spread_observables(dem, first, 64), DecoderConfigOptions{}));
+        ASSERT_TRUE(narrow_decoders.back().extra_observable_chunks.empty());
+    }
+    for (bool split_bases : {false, true}) {
+        Decoder decoder = Decoder::from_dem(wide_dem, DecoderConfigOptions{.split_bases = split_bases});
+        ASSERT_EQ(decoder.num_observables, 130);
+        ASSERT_EQ(decoder.extra_observable_chunks.size(), 2);
+        Decoder clone = decoder.clone();
+        size_t num_shots_with_flips_past_64 = 0;
+        ASSERT_NO_FATAL_FAILURE(assert_decoders_agree_on_sampled_shots(
+            circuit,
+            narrow_decoders[0],
+            {&decoder, &clone},
+            false,
+            [&](size_t k, std::span<const uint8_t> shot, obsmask_int prediction, float) {
+                for (size_t c = 0; c < 2; c++) {
+                    ASSERT_EQ(decoder.extra_obs_flips[c], narrow_decoders[c + 1].decode_detection_events(shot)) << k;
+                }
+                ASSERT_EQ(clone.extra_obs_flips, decoder.extra_obs_flips) << k;
+                num_shots_with_flips_past_64 += decoder.extra_obs_flips[0] != 0;
+
+                std::array<uint8_t, 17> packed;
+                decoder.write_obs_flips_bit_packed(prediction, packed);
+                for (size_t b = 0; b < 17 * 8; b++) {
+                    obsmask_int mask = b < 64 ? prediction : b < 130 ? decoder.extra_obs_flips[b / 64 - 1] : 0;
+                    ASSERT_EQ((packed[b >> 3] >> (b & 7)) & 1, (mask >> (b & 63)) & 1) << k;
+                }
+            }));
+        ASSERT_GT(num_shots_with_flips_past_64, 0);
+    }
+}
+
+TEST(decoder, decode_detection_events_batch_bad_sizes) {
+    Decoder decoder = Decoder::from_dem(
+        stim::DetectorErrorModel(R"DEM(
+            error(0.1) D0 D1
+            error(0.1) D1 D2 L0
+            error(0.1) D2 D0
+            detector(0, 0, 0, 0) D0
+            detector(1, 0, 0, 1) D1
+            detector(2, 0, 0, 2) D2
+        )DEM"),
+        DecoderConfigOptions{});
+    std::vector<uint8_t> data{0b011, 0b101, 0b110};
+    std::vector<obsmask_int> flips(3);
+    decoder.decode_detection_events_batch(data, 1, flips);
+    ASSERT_EQ(flips, (std::vector<obsmask_int>{0, 0, 1}));
+    decoder.decode_detection_events_batch({data.data(), 1}, 0, {flips.data(), 1});
+    ASSERT_EQ(flips[0], 0);
+    decoder.decode_detection_events_batch({}, 0, {flips.data(), 0});
+
+    ASSERT_THROW({ decoder.decode_detection_events_batch({data.data(), 2}, 1, flips); }, std::invalid_argument);
+    ASSERT_THROW({ decoder.decode_detection_events_batch(data, 0, flips); }, std::invalid_argument);
+}
+
+TEST(decoder, from_circuit) {
+    FILE *f = open_test_data_file("midout_color_code_d5_r10_p1000.stim");
+    stim::Circuit circuit = stim::Circuit::from_file(f);
+    fclose(f);
+    Decoder expected = Decoder::from_dem(circuit_to_decoding_dem(circuit), DecoderConfigOptions{});
+
+    ConfigurationProfile profile;
+    Decoder decoder = Decoder::from_circuit(circuit, DecoderConfigOptions{.profile = &profile});
+    ASSERT_EQ(decoder.mobius_dem, expected.mobius_dem);
+    ASSERT_EQ(decoder.node_colors, expected.node_colors);
+    ASSERT_EQ(profile.stages[0].name, "error_analysis");
+    ASSERT_EQ(profile.stages[1].name, "collect_nodes");
+
+    std::mt19937_64 rng{0};
+    auto [dets, obs] = stim::sample_batch_detection_events<64>(circuit, 64, rng);
+    dets = dets.transposed();
+    for (size_t k = 0; k < 64; k++) {
+        std::span<const uint8_t> det_data{dets[k].u8, dets[k].u8 + dets.num_minor_u8_padded()};
+        ASSERT_EQ(decoder.decode_detection_events(det_data), expected.decode_detection_events(det_data)) << k;
+    }
 }
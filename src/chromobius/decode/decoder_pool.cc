@@ -0,0 +1,138 @@
+// Copyright 2023 Google LLC
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "chromobius/decode/decoder_pool.h"
+
+using namespace chromobius;
+
+DecoderPool::DecoderPool(const Decoder &decoder, size_t num_threads, size_t max_queued_tasks)
+    : queue_limit(max_queued_tasks), num_running_tasks(0), stopping(false) {
+    if (num_threads == 0) {
+        throw std::invalid_argument("num_threads == 0");
+    }
+    if (max_queued_tasks == 0) {
+        throw std::invalid_argument("max_queued_tasks == 0");
+    }
+    decoders.reserve(num_threads);
+    for (size_t k = 0; k < num_threads; k++) {
+        decoders.push_back(decoder.clone());
+    }
+    for (size_t k = 0; k < num_threads; k++) {
+        threads.emplace_back(&DecoderPool::worker_loop, this, std::ref(decoders[k]));
+    }
+}
+
+DecoderPool::~DecoderPool() {
+    {
+        std::unique_lock<std::mutex> lock(mut);
+        stopping = true;
+    }
+    cond_task_available.notify_all();
+    for (auto &t : threads) {
+        t.join();
+    }
+    // Waiters are notified whenever a task leaves the queue, and they only wait while the queue is full, so none
+    // should remain. Notifying them anyway ensures no producer is left waiting forever.
+    for (auto &waiter : space_waiters) {
+        waiter();
+    }
+}
+
+void DecoderPool::worker_loop(Decoder &decoder) {
+    while (true) {
+        Task task;
+        std::vector<std::function<void()>> waiters;
+        {
+            std::unique_lock<std::mutex> lock(mut);
+            cond_task_available.wait(lock, [&]() {
+                return stopping || !queue.empty();
+            });
+            if (queue.empty()) {
+                // Only reachable when stopping, after the queue has been drained.
+                return;
+            }
+            task = std::move(queue.front());
+            queue.pop_front();
+            num_running_tasks++;
+            std::swap(waiters, space_waiters);
+        }
+        cond_space_available.notify_one();
+        for (auto &waiter : waiters) {
+            waiter();
+        }
+        waiters.clear();
+
+        task(decoder);
+        task = nullptr;
+
+        {
+            std::unique_lock<std::mutex> lock(mut);
+            num_running_tasks--;
+            if (num_running_tasks == 0 && queue.empty()) {
+                cond_idle.notify_all();
+            }
+        }
+    }
+}
+
+void DecoderPool::submit(Task task) {
+    {
+        std::unique_lock<std::mutex> lock(mut);
+        cond_space_available.wait(lock, [&]() {
+            return queue.size() < queue_limit;
+        });
+        queue.push_back(std::move(task));
+    }
+    cond_task_available.notify_one();
+}
+
+bool DecoderPool::try_submit(Task &task) {
+    {
+        std::unique_lock<std::mutex> lock(mut);
+        if (queue.size() >= queue_limit) {
+            return false;
+        }
+        queue.push_back(std::move(task));
+    }
+    cond_task_available.notify_one();
+    return true;
+}
+
+bool DecoderPool::try_submit(Task &task, std::function<void()> on_space_available) {
+    {
+        std::unique_lock<std::mutex> lock(mut);
+        if (queue.size() >= queue_limit) {
+            space_waiters.push_back(std::move(on_space_available));
+            return false;
+        }
+        queue.push_back(std::move(task));
+    }
+    cond_task_available.notify_one();
+    return true;
+}
+
+void DecoderPool::wait_until_idle() {
+    std::unique_lock<std::mutex> lock(mut);
+    cond_idle.wait(lock, [&]() {
+        return num_running_tasks == 0 && queue.empty();
+    });
+}
+
+size_t DecoderPool::num_threads() const {
+    return threads.size();
+}
+
+size_t DecoderPool::max_queued_tasks() const {
+    return queue_limit;
+}
@@ -0,0 +1,110 @@
+/*
+ * Copyright 2023 Google LLC
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+
+#ifndef _CHROMOBIUS_DECODE_DECODER_POOL_H
+#define _CHROMOBIUS_DECODE_DECODER_POOL_H
+
+#include <condition_variable>
+#include <deque>
+#include <functional>
+#include <mutex>
+#include <thread>
+
+#include "chromobius/decode/decoder.h"
+
+namespace chromobius {
+
+/// A persistent set of worker threads, each owning a copy of a decoder.
+///
+/// Work is submitted as tasks, which are run by whichever worker is free and
+/// are given that worker's decoder. The queue of tasks waiting for a worker is
+/// bounded, so producers that outpace the workers are slowed down instead of
+/// buffering unbounded amounts of work.
+struct DecoderPool {
+    typedef std::function<void(Decoder &)> Task;
+
+    /// Starts the worker threads.
+    ///
+    /// Args:
+    ///     decoder: The decoder to give copies of to the workers.
+    ///     num_threads: The number of worker threads to start.
+    ///     max_queued_tasks: The maximum number of tasks that can be waiting
+    ///         for a worker. Submitting more blocks until a worker takes one.
+    DecoderPool(const Decoder &decoder, size_t num_threads, size_t max_queued_tasks);
+    DecoderPool(const DecoderPool &) = delete;
+    DecoderPool &operator=(const DecoderPool &) = delete;
+
+    /// Finishes all submitted tasks, then stops the worker threads.
+    ~DecoderPool();
+
+    /// Adds a task to the queue, blocking while the queue is full.
+    ///
+    /// Tasks run on worker threads, so they are responsible for reporting
+    /// their own failures. A task must not let an exception escape.
+    void submit(Task task);
+
+    /// Adds a task to the queue, unless the queue is full.
+    ///
+    /// Returns:
+    ///     True if the task was added, false if the queue was full.
+    bool try_submit(Task &task);
+
+    /// Adds a task to the queue or, if the queue is full, arranges to be told
+    /// when there's space.
+    ///
+    /// Lets producers that mustn't block (e.g. ones running on an event loop)
+    /// wait for space asynchronously. Checking for space and registering the
+    /// callback happen atomically, so the notification can't be missed.
+    ///
+    /// Args:
+    ///     task: The task to add. Only moved from when it's added.
+    ///     on_space_available: Used only when the queue is full. Called once,
+    ///         from a worker thread (without the pool's lock held), after a
+    ///         worker next takes a task from the queue. There may be other
+    ///         producers competing for the freed space, so the callback should
+    ///         try submitting again (and again be ready for the queue to be
+    ///         full).
+    ///
+    /// Returns:
+    ///     True if the task was added, false if the queue was full.
+    bool try_submit(Task &task, std::function<void()> on_space_available);
+
+    /// Blocks until every submitted task has finished running.
+    void wait_until_idle();
+
+    size_t num_threads() const;
+    size_t max_queued_tasks() const;
+
+   private:
+    void worker_loop(Decoder &decoder);
+
+    std::vector<Decoder> decoders;
+    std::vector<std::thread> threads;
+    size_t queue_limit;
+
+    std::mutex mut;
+    std::condition_variable cond_task_available;
+    std::condition_variable cond_space_available;
+    std::condition_variable cond_idle;
+    std::deque<Task> queue;
+    std::vector<std::function<void()>> space_waiters;
+    size_t num_running_tasks;
+    bool stopping;
+};
+
+}  // namespace chromobius
+
+#endif
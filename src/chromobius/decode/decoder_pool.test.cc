@@ -0,0 +1,105 @@
+// Copyright 2023 Google LLC
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "chromobius/decode/decoder_pool.h"
+
+#include "gtest/gtest.h"
+
+#include "chromobius/test_util.test.h"
+
+using namespace chromobius;
+
+TEST(decoder_pool, decodes_same_as_decoder) {
+    FILE *f = open_test_data_file("midout_color_code_d5_r10_p1000.stim");
+    stim::Circuit circuit = stim::Circuit::from_file(f);
+    fclose(f);
+    auto dem = stim::ErrorAnalyzer::circuit_to_detector_error_model(circuit, false, true, false, 0, false, false);
+    Decoder decoder = Decoder::from_dem(dem, DecoderConfigOptions{});
+
+    std::mt19937_64 rng{0};
+    auto [dets, obs] = stim::sample_batch_detection_events<64>(circuit, 512, rng);
+    dets = dets.transposed();
+    std::vector<obsmask_int> expected;
+    for (size_t k = 0; k < 512; k++) {
+        expected.push_back(decoder.decode_detection_events({dets[k].u8, dets[k].u8 + dets.num_minor_u8_padded()}));
+    }
+
+    std::vector<obsmask_int> actual(512);
+    {
+        DecoderPool pool(decoder, 3, 2);
+        ASSERT_EQ(pool.num_threads(), 3);
+        ASSERT_EQ(pool.max_queued_tasks(), 2);
+        for (size_t start = 0; start < 512; start += 32) {
+            pool.submit([&, start](Decoder &worker_decoder) {
+                for (size_t k = start; k < start + 32; k++) {
+                    actual[k] = worker_decoder.decode_detection_events(
+                        {dets[k].u8, dets[k].u8 + dets.num_minor_u8_padded()});
+                }
+            });
+        }
+        pool.wait_until_idle();
+        ASSERT_EQ(actual, expected);
+    }
+}
+
+TEST(decoder_pool, back_pressure) {
+    stim::DetectorErrorModel dem(R"DEM(
+        error(0.1) D0 L0
+        detector(0, 0, 0, 0) D0
+    )DEM");
+    Decoder decoder = Decoder::from_dem(dem, DecoderConfigOptions{});
+
+    std::mutex gate;
+    std::atomic<size_t> started{0};
+    std::atomic<size_t> finished{0};
+    gate.lock();
+    {
+        DecoderPool pool(decoder, 1, 2);
+        DecoderPool::Task blocked_task = [&](Decoder &) {
+            started++;
+            std::lock_guard<std::mutex> lock(gate);
+            finished++;
+        };
+
+        // One task occupies the worker, two more fill the queue.
+        pool.submit(blocked_task);
+        while (started == 0) {
+            std::this_thread::yield();
+        }
+        pool.submit(blocked_task);
+        DecoderPool::Task t = blocked_task;
+        ASSERT_TRUE(pool.try_submit(t));
+        t = blocked_task;
+        ASSERT_FALSE(pool.try_submit(t));
+        std::atomic<size_t> notified{0};
+        ASSERT_FALSE(pool.try_submit(t, [&]() {
+            notified++;
+        }));
+        ASSERT_TRUE(t != nullptr);
+        ASSERT_EQ(finished, 0);
+        ASSERT_EQ(notified, 0);
+
+        gate.unlock();
+        pool.wait_until_idle();
+        ASSERT_EQ(finished, 3);
+        ASSERT_EQ(notified, 1);
+        ASSERT_TRUE(pool.try_submit(t, [&]() {
+            notified++;
+        }));
+    }
+    ASSERT_EQ(finished, 4);
+
+    ASSERT_THROW({ DecoderPool(decoder, 0, 1); }, std::invalid_argument);
+    ASSERT_THROW({ DecoderPool(decoder, 1, 0); }, std::invalid_argument);
+}
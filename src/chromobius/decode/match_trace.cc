@@ -0,0 +1,189 @@
+// Copyright 2023 Google LLC
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "chromobius/decode/match_trace.h"
+
+#include <cstring>
+#include <span>
+#include <sstream>
+#include <stdexcept>
+
+using namespace chromobius;
+
+static constexpr char MATCH_TRACE_MAGIC[8] = {'C', 'H', 'R', 'M', 'T', 'R', 'C', '1'};
+
+void MatchTraceRecord::clear() {
+    shot = 0;
+    weight = 0;
+    status = 0;
+    dets.clear();
+    edges.clear();
+    cycle_lengths.clear();
+    cycle_nodes.clear();
+    cycle_obs_flips.clear();
+    obs_flips.clear();
+}
+
+template <typename T>
+static void write_values(FILE *out, std::span<const T> values) {
+    if (!values.empty() && fwrite(values.data(), sizeof(T), values.size(), out) != values.size()) {
+        throw std::invalid_argument("Failed to write to the match trace file.");
+    }
+}
+
+template <typename T>
+static void write_value(FILE *out, T value) {
+    write_values<T>(out, {&value, 1});
+}
+
+MatchTraceWriter::MatchTraceWriter(
+    FILE *out, bool owns_file, uint64_t num_detectors, uint64_t num_observables, uint64_t sample_every)
+    : out(out), owns_file(owns_file), num_observables(num_observables), sample_every(sample_every) {
+    if (sample_every == 0) {
+        if (owns_file) {
+            fclose(out);
+        }
+        throw std::invalid_argument("sample_every must be positive.");
+    }
+    write_values<char>(out, MATCH_TRACE_MAGIC);
+    write_value<uint64_t>(out, num_detectors);
+    write_value<uint64_t>(out, num_observables);
+}
+
+MatchTraceWriter::~MatchTraceWriter() {
+    if (owns_file) {
+        fclose(out);
+    } else {
+        fflush(out);
+    }
+}
+
+std::shared_ptr<MatchTraceWriter> MatchTraceWriter::open(
+    const std::string &path, uint64_t num_detectors, uint64_t num_observables, uint64_t sample_every) {
+    FILE *f = fopen(path.c_str(), "wb");
+    if (f == nullptr) {
+        throw std::invalid_argument("Failed to open '" + path + "' for writing a match trace.");
+    }
+    return std::make_shared<MatchTraceWriter>(f, true, num_detectors, num_observables, sample_every);
+}
+
+bool MatchTraceWriter::take_shot(uint64_t *out_shot) {
+    *out_shot = next_shot.fetch_add(1, std::memory_order_relaxed);
+    return *out_shot % sample_every == 0;
+}
+
+void MatchTraceWriter::write(const MatchTraceRecord &record) {
+    std::lock_guard<std::mutex> lock(write_mutex);
+    write_value<uint64_t>(out, record.shot);
+    write_value<float>(out, record.weight);
+    write_value<uint8_t>(out, record.status);
+    write_value<uint32_t>(out, record.dets.size());
+    write_value<uint32_t>(out, record.edges.size() / 2);
+    write_value<uint32_t>(out, record.cycle_lengths.size());
+    write_value<uint32_t>(out, record.cycle_nodes.size());
+    write_values<uint32_t>(out, record.dets);
+    write_values<uint32_t>(out, record.edges);
+    write_values<uint32_t>(out, record.cycle_lengths);
+    write_values<uint32_t>(out, record.cycle_nodes);
+    write_values<uint64_t>(out, record.cycle_obs_flips);
+    if (record.obs_flips.size() != (num_observables + 7) / 8) {
+        throw std::invalid_argument("The match trace record has the wrong number of observable flip bytes.");
+    }
+    write_values<uint8_t>(out, record.obs_flips);
+}
+
+void MatchTraceWriter::flush() {
+    std::lock_guard<std::mutex> lock(write_mutex);
+    fflush(out);
+}
+
+size_t MatchTrace::num_records() const {
+    return shots.size();
+}
+
+/// Reads values from the trace, returning false if the data ended before any were read.
+template <typename T>
+static bool read_values(FILE *in, std::span<T> out, bool at_record_start = false) {
+    size_t n = out.empty() ? 0 : fread(out.data(), sizeof(T), out.size(), in);
+    if (n == out.size()) {
+        return true;
+    }
+    if (n == 0 && at_record_start && feof(in)) {
+        return false;
+    }
+    throw std::invalid_argument("The match trace data ended in the middle of a record.");
+}
+
+template <typename T>
+static void read_appended_values(FILE *in, std::vector<T> &out, size_t count) {
+    size_t start = out.size();
+    out.resize(start + count);
+    read_values<T>(in, std::span<T>(out).subspan(start));
+}
+
+MatchTrace chromobius::read_match_trace(FILE *in) {
+    MatchTrace result;
+    char magic[8];
+    if (fread(magic, 1, 8, in) != 8 || memcmp(magic, MATCH_TRACE_MAGIC, 8) != 0) {
+        throw std::invalid_argument("The data doesn't start with the match trace header.");
+    }
+    read_values<uint64_t>(in, {&result.num_detectors, 1});
+    read_values<uint64_t>(in, {&result.num_observables, 1});
+    size_t num_observable_bytes = (result.num_observables + 7) / 8;
+
+    std::vector<uint32_t> edge_buf;
+    std::vector<uint32_t> cycle_lengths;
+    while (true) {
+        uint64_t shot;
+        if (!read_values<uint64_t>(in, {&shot, 1}, true)) {
+            break;
+        }
+        float weight;
+        uint8_t status;
+        uint32_t sizes[4];
+        read_values<float>(in, {&weight, 1});
+        read_values<uint8_t>(in, {&status, 1});
+        read_values<uint32_t>(in, sizes);
+        result.shots.push_back(shot);
+        result.weights.push_back(weight);
+        result.statuses.push_back(status);
+
+        read_appended_values(in, result.dets, sizes[0]);
+        result.det_offsets.push_back(result.dets.size());
+
+        edge_buf.clear();
+        read_appended_values(in, edge_buf, (size_t)sizes[1] * 2);
+        for (uint32_t n : edge_buf) {
+            result.edges.push_back(n == MATCH_TRACE_BOUNDARY ? -1 : (int64_t)n);
+        }
+        result.edge_offsets.push_back(result.edges.size() / 2);
+
+        cycle_lengths.clear();
+        read_appended_values(in, cycle_lengths, sizes[2]);
+        uint64_t total = 0;
+        for (uint32_t n : cycle_lengths) {
+            total += n;
+            result.cycle_offsets.push_back(result.cycle_nodes.size() + total);
+        }
+        if (total != sizes[3]) {
+            throw std::invalid_argument("A match trace record's cycle lengths don't add up to its cycle nodes.");
+        }
+        read_appended_values(in, result.cycle_nodes, sizes[3]);
+        read_appended_values(in, result.cycle_obs_flips, sizes[2]);
+        result.shot_cycle_offsets.push_back(result.cycle_obs_flips.size());
+
+        read_appended_values(in, result.obs_flips, num_observable_bytes);
+    }
+    return result;
+}
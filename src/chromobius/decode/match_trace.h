@@ -0,0 +1,168 @@
+/*
+ * Copyright 2023 Google LLC
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+
+#ifndef _CHROMOBIUS_DECODE_MATCH_TRACE_H
+#define _CHROMOBIUS_DECODE_MATCH_TRACE_H
+
+#include <atomic>
+#include <cstdint>
+#include <cstdio>
+#include <memory>
+#include <mutex>
+#include <string>
+#include <vector>
+
+namespace chromobius {
+
+/// Marks the boundary in the matched edges of a match trace record.
+constexpr uint32_t MATCH_TRACE_BOUNDARY = UINT32_MAX;
+
+/// What happened while decoding one traced shot.
+///
+/// Mobius nodes are identified by detector (mobius node 2d+k belongs to
+/// detector d of the dem the decoder was configured from), even when the
+/// decoder renumbered its detectors internally.
+struct MatchTraceRecord {
+    /// The index of the shot among the shots given to the decoders writing the
+    /// trace (counting shots that weren't sampled).
+    uint64_t shot = 0;
+    /// The weight of the matcher's solution.
+    float weight = 0;
+    /// The DecodeStatus of the shot.
+    uint8_t status = 0;
+    /// The detectors that fired (excluding ignored detectors), in increasing
+    /// order.
+    std::vector<uint32_t> dets;
+    /// Pairs of mobius nodes matched together by the matcher. The second node
+    /// of a pair is MATCH_TRACE_BOUNDARY for nodes matched to the boundary.
+    std::vector<uint32_t> edges;
+    /// The number of mobius nodes in each euler cycle that was lifted.
+    std::vector<uint32_t> cycle_lengths;
+    /// The mobius nodes of the lifted euler cycles, one cycle after another.
+    std::vector<uint32_t> cycle_nodes;
+    /// The flips of the first 64 observables produced by lifting each cycle.
+    std::vector<uint64_t> cycle_obs_flips;
+    /// The predicted observable flips of the shot, bit packed.
+    std::vector<uint8_t> obs_flips;
+
+    void clear();
+};
+
+/// Records what a decoder did for a sample of the shots it decoded into a
+/// binary file.
+///
+/// The file starts with the 8 byte magic string "CHRMTRC1", followed by the
+/// number of detectors and the number of observables (as uint64 values). Then
+/// each traced shot appends a record made up of:
+///
+///     uint64 shot
+///     float32 weight
+///     uint8 status
+///     uint32 num_dets, num_edges, num_cycles, num_cycle_nodes
+///     uint32 dets[num_dets]
+///     uint32 edges[2 * num_edges]
+///     uint32 cycle_lengths[num_cycles]
+///     uint32 cycle_nodes[num_cycle_nodes]
+///     uint64 cycle_obs_flips[num_cycles]
+///     uint8 obs_flips[ceil(num_observables / 8)]
+///
+/// Values are written in the machine's byte order. A writer can be shared by
+/// several decoders (e.g. by cloning a decoder that has one), in which case
+/// records from different decoders are interleaved and the shot counter is
+/// shared.
+struct MatchTraceWriter {
+    FILE *out;
+    bool owns_file;
+    uint64_t num_observables;
+    /// Every sample_every'th shot is traced, starting with the first shot.
+    uint64_t sample_every;
+    /// The index of the next shot to be decoded.
+    std::atomic<uint64_t> next_shot{0};
+    /// Guards writing to the file.
+    std::mutex write_mutex;
+
+    /// Writes the file header.
+    ///
+    /// Args:
+    ///     out: Where to write the trace.
+    ///     owns_file: Whether the writer should close `out` when it's destroyed.
+    ///     num_detectors: The number of detectors in the decoder's dem.
+    ///     num_observables: The number of observables in the decoder's dem.
+    ///     sample_every: Trace every sample_every'th shot. Must be positive.
+    MatchTraceWriter(FILE *out, bool owns_file, uint64_t num_detectors, uint64_t num_observables, uint64_t sample_every);
+    MatchTraceWriter(const MatchTraceWriter &) = delete;
+    MatchTraceWriter &operator=(const MatchTraceWriter &) = delete;
+    ~MatchTraceWriter();
+
+    /// Opens a file and starts writing a trace into it.
+    static std::shared_ptr<MatchTraceWriter> open(
+        const std::string &path, uint64_t num_detectors, uint64_t num_observables, uint64_t sample_every);
+
+    /// Counts a shot that's about to be decoded.
+    ///
+    /// Args:
+    ///     out_shot: Set to the index of the shot.
+    ///
+    /// Returns:
+    ///     Whether or not the shot should be traced.
+    bool take_shot(uint64_t *out_shot);
+
+    /// Appends a record to the trace.
+    void write(const MatchTraceRecord &record);
+
+    /// Writes buffered records out to the file.
+    void flush();
+};
+
+/// The contents of a match trace file, with the records' variable length
+/// fields concatenated into flat arrays.
+///
+/// For example, the detection events of record k are
+/// dets[det_offsets[k]:det_offsets[k+1]] and the lifted cycles of record k are
+/// cycles shot_cycle_offsets[k] through shot_cycle_offsets[k+1]-1.
+struct MatchTrace {
+    uint64_t num_detectors = 0;
+    uint64_t num_observables = 0;
+
+    std::vector<uint64_t> shots;
+    std::vector<float> weights;
+    std::vector<uint8_t> statuses;
+    /// Each record's bit packed observable flips, ceil(num_observables / 8)
+    /// bytes per record.
+    std::vector<uint8_t> obs_flips;
+    std::vector<uint32_t> dets;
+    std::vector<uint64_t> det_offsets{0};
+    /// Matched pairs of mobius nodes, with -1 marking the boundary.
+    std::vector<int64_t> edges;
+    /// Offsets into edges, counted in pairs of nodes.
+    std::vector<uint64_t> edge_offsets{0};
+    std::vector<uint32_t> cycle_nodes;
+    std::vector<uint64_t> cycle_offsets{0};
+    std::vector<uint64_t> cycle_obs_flips;
+    std::vector<uint64_t> shot_cycle_offsets{0};
+
+    size_t num_records() const;
+};
+
+/// Reads a file written by MatchTraceWriter.
+///
+/// Raises:
+///     std::invalid_argument: The data isn't a match trace, or it's truncated.
+MatchTrace read_match_trace(FILE *in);
+
+}  // namespace chromobius
+
+#endif
@@ -0,0 +1,103 @@
+// Copyright 2023 Google LLC
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "chromobius/decode/match_trace.h"
+
+#include "gtest/gtest.h"
+
+#include "chromobius/decode/decoder.h"
+#include "chromobius/test_util.test.h"
+
+using namespace chromobius;
+
+TEST(match_trace, decoder_writes_sampled_shots) {
+    FILE *f = open_test_data_file("midout_color_code_d5_r10_p1000.stim");
+    stim::Circuit circuit = stim::Circuit::from_file(f);
+    fclose(f);
+    auto dem = stim::ErrorAnalyzer::circuit_to_detector_error_model(circuit, false, true, false, 0, false, false);
+
+    std::mt19937_64 rng{0};
+    auto [dets, obs] = stim::sample_batch_detection_events<64>(circuit, 100, rng);
+    dets = dets.transposed();
+
+    for (bool split_bases : {false, true}) {
+        Decoder decoder = Decoder::from_dem(dem, DecoderConfigOptions{.split_bases = split_bases});
+        FILE *tmp = tmpfile();
+        decoder.match_trace =
+            std::make_shared<MatchTraceWriter>(tmp, false, dem.count_detectors(), dem.count_observables(), 3);
+        std::vector<obsmask_int> predictions;
+        for (size_t k = 0; k < 100; k++) {
+            predictions.push_back(
+                decoder.decode_detection_events({dets[k].u8, dets[k].u8 + dets.num_minor_u8_padded()}));
+        }
+        decoder.match_trace.reset();
+
+        rewind(tmp);
+        MatchTrace trace = read_match_trace(tmp);
+        ASSERT_EQ(trace.num_detectors, dem.count_detectors());
+        ASSERT_EQ(trace.num_observables, dem.count_observables());
+        ASSERT_EQ(trace.num_records(), 34);
+        size_t num_shots_with_cycles = 0;
+        for (size_t r = 0; r < trace.num_records(); r++) {
+            size_t shot = r * 3;
+            ASSERT_EQ(trace.shots[r], shot);
+            ASSERT_EQ(trace.statuses[r], (uint8_t)DecodeStatus::DECODED);
+
+            std::vector<uint32_t> expected_dets;
+            for (size_t d = 0; d < dem.count_detectors(); d++) {
+                if (dets[shot][d]) {
+                    expected_dets.push_back(d);
+                }
+            }
+            std::vector<uint32_t> actual_dets(
+                trace.dets.begin() + trace.det_offsets[r], trace.dets.begin() + trace.det_offsets[r + 1]);
+            ASSERT_EQ(actual_dets, expected_dets) << shot;
+            ASSERT_EQ(trace.obs_flips[r], (uint8_t)predictions[shot]) << shot;
+            ASSERT_EQ(trace.edge_offsets[r + 1] == trace.edge_offsets[r], expected_dets.empty()) << shot;
+
+            obsmask_int cycle_total = 0;
+            for (size_t c = trace.shot_cycle_offsets[r]; c < trace.shot_cycle_offsets[r + 1]; c++) {
+                cycle_total ^= trace.cycle_obs_flips[c];
+            }
+            ASSERT_EQ(cycle_total, predictions[shot]) << shot;
+            num_shots_with_cycles += trace.shot_cycle_offsets[r + 1] > trace.shot_cycle_offsets[r];
+        }
+        ASSERT_GT(num_shots_with_cycles, 0);
+        ASSERT_EQ(trace.cycle_offsets.size(), trace.cycle_obs_flips.size() + 1);
+        ASSERT_EQ(trace.cycle_offsets.back(), trace.cycle_nodes.size());
+
+        // Cutting off the end of the data should be detected.
+        fseek(tmp, -1, SEEK_END);
+        long truncated_size = ftell(tmp);
+        rewind(tmp);
+        std::vector<char> data(truncated_size);
+        ASSERT_EQ(fread(data.data(), 1, data.size(), tmp), data.size());
+        fclose(tmp);
+        FILE *truncated = tmpfile();
+        fwrite(data.data(), 1, data.size(), truncated);
+        rewind(truncated);
+        ASSERT_THROW({ read_match_trace(truncated); }, std::invalid_argument);
+        fclose(truncated);
+    }
+}
+
+TEST(match_trace, rejects_bad_data) {
+    FILE *tmp = tmpfile();
+    fwrite("NOTTRACE", 1, 8, tmp);
+    rewind(tmp);
+    ASSERT_THROW({ read_match_trace(tmp); }, std::invalid_argument);
+    fclose(tmp);
+
+    ASSERT_THROW({ MatchTraceWriter(tmpfile(), true, 5, 1, 0); }, std::invalid_argument);
+}
@@ -0,0 +1,43 @@
+// Copyright 2023 Google LLC
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+
+#include "chromobius/decode/matcher_interface.h"
+
+using namespace chromobius;
+
+void MatcherInterface::match_edges_batch(
+    std::span<const uint64_t> mobius_detection_event_indices,
+    std::span<const size_t> shot_offsets,
+    std::vector<int64_t> *out_edge_buffer,
+    std::vector<size_t> *out_edge_offsets,
+    float *out_weights) {
+    out_edge_buffer->clear();
+    out_edge_offsets->clear();
+    out_edge_offsets->push_back(0);
+
+    std::vector<uint64_t> shot_dets;
+    std::vector<int64_t> shot_edges;
+    for (size_t k = 0; k + 1 < shot_offsets.size(); k++) {
+        shot_dets.clear();
+        shot_dets.insert(
+            shot_dets.end(),
+            mobius_detection_event_indices.begin() + shot_offsets[k],
+            mobius_detection_event_indices.begin() + shot_offsets[k + 1]);
+        shot_edges.clear();
+        match_edges(shot_dets, &shot_edges, out_weights == nullptr ? nullptr : out_weights + k);
+        out_edge_buffer->insert(out_edge_buffer->end(), shot_edges.begin(), shot_edges.end());
+        out_edge_offsets->push_back(out_edge_buffer->size());
+    }
+}
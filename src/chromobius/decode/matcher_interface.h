@@ -18,8 +18,9 @@
 #define _CHROMOBIUS_DECODE_MATCHER_INTERFACE_H
 
 #include <cstdint>
-#include <vector>
 #include <memory>
+#include <span>
+#include <vector>
 
 #include "stim.h"
 
@@ -42,6 +43,28 @@ struct MatcherInterface {
     ///         dem is guaranteed to not contain any boundary edges.
     virtual void match_edges(
         const std::vector<uint64_t> &mobius_detection_event_indices, std::vector<int64_t> *out_edge_buffer, float *out_weight = nullptr) = 0;
+
+    /// Performs matching on the mobius dem detection events of several shots.
+    ///
+    /// Matchers that can amortize work across shots should override this method.
+    /// The default implementation calls match_edges once per shot.
+    ///
+    /// Args:
+    ///     mobius_detection_event_indices: The detection events of all the shots, concatenated.
+    ///     shot_offsets: Where each shot's detection events start. Shot k's detection events are
+    ///         mobius_detection_event_indices[shot_offsets[k]:shot_offsets[k+1]], so there is one
+    ///         more offset than there are shots.
+    ///     out_edge_buffer: Overwritten with the edges of all the shots, concatenated. Each shot's
+    ///         edges are in the interleaved format produced by match_edges.
+    ///     out_edge_offsets: Overwritten with where each shot's edges start. Shot k's edges are
+    ///         out_edge_buffer[out_edge_offsets[k]:out_edge_offsets[k+1]].
+    ///     out_weights: If not null, out_weights[k] is set to the weight of shot k's matching.
+    virtual void match_edges_batch(
+        std::span<const uint64_t> mobius_detection_event_indices,
+        std::span<const size_t> shot_offsets,
+        std::vector<int64_t> *out_edge_buffer,
+        std::vector<size_t> *out_edge_offsets,
+        float *out_weights = nullptr);
 };
 
 }  // namespace chromobius
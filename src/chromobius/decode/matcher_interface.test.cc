@@ -0,0 +1,75 @@
+// Copyright 2023 Google LLC
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+
+#include "chromobius/decode/matcher_interface.h"
+
+#include "gtest/gtest.h"
+
+#include "chromobius/decode/pymatcher.h"
+
+using namespace chromobius;
+
+/// Forwards single shots to pymatching, so the default batch method gets used.
+struct SingleShotMatcher : MatcherInterface {
+    PymatchingMatcher inner;
+    size_t num_calls = 0;
+
+    SingleShotMatcher(const stim::DetectorErrorModel &dem) : inner(dem) {
+    }
+
+    virtual std::unique_ptr<MatcherInterface> configured_for_mobius_dem(const stim::DetectorErrorModel &dem) override {
+        return std::make_unique<SingleShotMatcher>(dem);
+    }
+
+    virtual void match_edges(
+        const std::vector<uint64_t> &mobius_detection_event_indices,
+        std::vector<int64_t> *out_edge_buffer,
+        float *out_weight = nullptr) override {
+        num_calls++;
+        inner.match_edges(mobius_detection_event_indices, out_edge_buffer, out_weight);
+    }
+};
+
+TEST(matcher_interface, match_edges_batch) {
+    stim::DetectorErrorModel dem(R"DEM(
+        error(0.1) D0 D1
+        error(0.2) D1 D2
+        error(0.1) D2 D3
+        error(0.1) D3 D0
+    )DEM");
+    PymatchingMatcher pymatcher(dem);
+    SingleShotMatcher single(dem);
+
+    std::vector<uint64_t> dets{0, 1, 1, 2, 0, 2};
+    std::vector<size_t> offsets{0, 2, 4, 4, 6};
+    std::vector<int64_t> expected_edges{99};
+    std::vector<size_t> expected_offsets{99};
+    std::vector<float> expected_weights(4);
+    single.match_edges_batch(dets, offsets, &expected_edges, &expected_offsets, expected_weights.data());
+    ASSERT_EQ(single.num_calls, 4);
+    ASSERT_EQ(expected_edges, (std::vector<int64_t>{0, 1, 1, 2, 1, 2, 1, 0}));
+    ASSERT_EQ(expected_offsets, (std::vector<size_t>{0, 2, 4, 4, 8}));
+    ASSERT_EQ(expected_weights[2], 0);
+    ASSERT_NEAR(expected_weights[0], log(9), 1e-2);
+    ASSERT_NEAR(expected_weights[1], log(4), 1e-2);
+
+    std::vector<int64_t> edges;
+    std::vector<size_t> edge_offsets;
+    std::vector<float> weights(4);
+    pymatcher.match_edges_batch(dets, offsets, &edges, &edge_offsets, weights.data());
+    ASSERT_EQ(edges, expected_edges);
+    ASSERT_EQ(edge_offsets, expected_offsets);
+    ASSERT_EQ(weights, expected_weights);
+}
@@ -30,15 +30,52 @@ void PymatchingMatcher::match_edges(
     float *out_weight) {
     pm::decode_detection_events_to_edges(pymatching_matcher, mobius_detection_event_indices, *out_edge_buffer);
     if (out_weight != nullptr) {
-        pm::total_weight_int w = 0;
-        auto &e = *out_edge_buffer;
-        for (size_t k = 0; k < e.size(); k += 2) {
-            auto &d1 = pymatching_matcher.search_flooder.graph.nodes[e[k]];
-            auto &d2 = pymatching_matcher.search_flooder.graph.nodes[e[k + 1]];
-            w += d2.neighbor_weights[d2.index_of_neighbor(&d1)];
+        *out_weight = weight_of_edges(*out_edge_buffer);
+    }
+}
+
+void PymatchingMatcher::match_edges_batch(
+    std::span<const uint64_t> mobius_detection_event_indices,
+    std::span<const size_t> shot_offsets,
+    std::vector<int64_t> *out_edge_buffer,
+    std::vector<size_t> *out_edge_offsets,
+    float *out_weights) {
+    out_edge_buffer->clear();
+    out_edge_offsets->clear();
+    out_edge_offsets->push_back(0);
+    for (size_t k = 0; k + 1 < shot_offsets.size(); k++) {
+        size_t start = shot_offsets[k];
+        size_t end = shot_offsets[k + 1];
+        if (start == end) {
+            // Nothing to match, so skip the matcher's per-shot setup.
+            if (out_weights != nullptr) {
+                out_weights[k] = 0;
+            }
+            out_edge_offsets->push_back(out_edge_buffer->size());
+            continue;
         }
-        *out_weight = (float)(w / weight_scaling_constant);
+
+        // The sparse blossom driver compacts its whole output vector, so each shot gets a fresh one.
+        batch_det_buf.assign(mobius_detection_event_indices.begin() + start, mobius_detection_event_indices.begin() + end);
+        batch_edge_buf.clear();
+        pm::decode_detection_events_to_edges(pymatching_matcher, batch_det_buf, batch_edge_buf);
+        if (out_weights != nullptr) {
+            out_weights[k] = weight_of_edges(batch_edge_buf);
+        }
+        out_edge_buffer->insert(out_edge_buffer->end(), batch_edge_buf.begin(), batch_edge_buf.end());
+        out_edge_offsets->push_back(out_edge_buffer->size());
+    }
+}
+
+float PymatchingMatcher::weight_of_edges(std::span<const int64_t> interleaved_edges) {
+    pm::total_weight_int w = 0;
+    auto &e = interleaved_edges;
+    for (size_t k = 0; k < e.size(); k += 2) {
+        auto &d1 = pymatching_matcher.search_flooder.graph.nodes[e[k]];
+        auto &d2 = pymatching_matcher.search_flooder.graph.nodes[e[k + 1]];
+        w += d2.neighbor_weights[d2.index_of_neighbor(&d1)];
     }
+    return (float)(w / weight_scaling_constant);
 }
 
 std::unique_ptr<MatcherInterface> PymatchingMatcher::configured_for_mobius_dem(const stim::DetectorErrorModel &dem) {
@@ -26,6 +26,9 @@ namespace chromobius {
 struct PymatchingMatcher : MatcherInterface {
     pm::Mwpm pymatching_matcher;
     double weight_scaling_constant;
+    /// Workspaces used by match_edges_batch.
+    std::vector<uint64_t> batch_det_buf;
+    std::vector<int64_t> batch_edge_buf;
 
     PymatchingMatcher();
     PymatchingMatcher(const stim::DetectorErrorModel &dem);
@@ -35,6 +38,21 @@ struct PymatchingMatcher : MatcherInterface {
 
     virtual void match_edges(
         const std::vector<uint64_t> &mobius_detection_event_indices, std::vector<int64_t> *out_edge_buffer, float *out_weight = nullptr) override;
+
+    virtual void match_edges_batch(
+        std::span<const uint64_t> mobius_detection_event_indices,
+        std::span<const size_t> shot_offsets,
+        std::vector<int64_t> *out_edge_buffer,
+        std::vector<size_t> *out_edge_offsets,
+        float *out_weights = nullptr) override;
+
+    /// Returns the total weight of the given matched edges.
+    ///
+    /// pymatching's edge decoding (pm::decode_detection_events_to_edges) doesn't
+    /// accumulate a total weight, and its weight reporting decoding methods
+    /// shatter the blossoms that the edges are extracted from, so the weight is
+    /// summed from the matched edges afterwards.
+    float weight_of_edges(std::span<const int64_t> interleaved_edges);
 };
 
 }  // namespace chromobius
@@ -0,0 +1,209 @@
+// Copyright 2023 Google LLC
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+
+#include "chromobius/decode/sliding_window_decoder.h"
+
+#include <algorithm>
+#include <sstream>
+
+using namespace chromobius;
+
+SlidingWindowDecoder SlidingWindowDecoder::from_dem(
+    const stim::DetectorErrorModel &dem,
+    DecoderConfigOptions options,
+    double commit_duration,
+    double buffer_duration) {
+    if (!(commit_duration > 0)) {
+        throw std::invalid_argument("commit_duration must be positive.");
+    }
+    if (!(buffer_duration >= 0)) {
+        throw std::invalid_argument("buffer_duration must not be negative.");
+    }
+
+    std::vector<double> detector_times;
+    collect_nodes_from_dem(dem, nullptr, &detector_times);
+    double min_time = 0;
+    double max_time = 0;
+    if (!detector_times.empty()) {
+        min_time = *std::min_element(detector_times.begin(), detector_times.end());
+        max_time = *std::max_element(detector_times.begin(), detector_times.end());
+    }
+
+    SlidingWindowDecoder result;
+    result.decoder = Decoder::from_dem(dem, std::move(options));
+    if (!result.decoder.extra_observable_chunks.empty()) {
+        // Committing a piece of a window's solution needs its flips of every observable, but pieces are only
+        // reported with their flips of the first 64 observables.
+        throw std::invalid_argument(
+            "The sliding window decoder is limited to 64 observables, but the dem has " +
+            std::to_string(result.decoder.num_observables) + " observables.");
+    }
+    result.detector_times = std::move(detector_times);
+    result.commit_duration = commit_duration;
+    result.buffer_duration = buffer_duration;
+    result.min_time = min_time;
+    result.max_time = max_time;
+    result.reset();
+    result.detector_cycles.resize(result.detector_times.size(), SIZE_MAX);
+    return result;
+}
+
+void SlidingWindowDecoder::reset() {
+    window_start = min_time;
+    pending_detectors.clear();
+    committed_obs_flip = 0;
+    num_windows_decoded = 0;
+}
+
+void SlidingWindowDecoder::add_detection_events(std::span<const uint64_t> detector_indices) {
+    for (uint64_t d : detector_indices) {
+        if (d >= detector_times.size()) {
+            std::stringstream ss;
+            ss << "Detector index " << d << " is out of range (the decoder has " << detector_times.size()
+               << " detectors).";
+            throw std::invalid_argument(ss.str());
+        }
+        if (decoder.detector_node(d) != IGNORED_NODE) {
+            pending_detectors.push_back(d);
+        }
+    }
+}
+
+void SlidingWindowDecoder::advance_to_time(double time) {
+    while (window_start <= max_time && window_start + commit_duration + buffer_duration <= time) {
+        decode_window(window_start + commit_duration, window_start + commit_duration + buffer_duration);
+        window_start += commit_duration;
+    }
+}
+
+void SlidingWindowDecoder::decode_window(double commit_end, double window_end) {
+    bool any_committable = false;
+    window_detectors.clear();
+    for (uint64_t d : pending_detectors) {
+        if (detector_times[d] < window_end) {
+            window_detectors.push_back(d);
+            any_committable |= detector_times[d] < commit_end;
+        }
+    }
+    if (!any_committable) {
+        return;
+    }
+    num_windows_decoded++;
+
+    // Collect the pieces of the solution.
+    size_t num_cycles = 0;
+    cycle_obs_flips.clear();
+    cycle_parents.clear();
+    decoder.decode_sparse_detection_events_by_cycle(
+        window_detectors, [&](std::span<const node_offset_int> cycle, obsmask_int obs_flip) {
+            if (cycle_detectors.size() <= num_cycles) {
+                cycle_detectors.emplace_back();
+            }
+            auto &dets = cycle_detectors[num_cycles];
+            dets.clear();
+            for (auto n : cycle) {
+                dets.push_back(n >> 1);
+            }
+            cycle_obs_flips.push_back(obs_flip);
+            cycle_parents.push_back(num_cycles);
+            num_cycles++;
+        });
+
+    // Group cycles that share a detection event, since the detection event is only explained by them together.
+    auto find_root = [&](size_t c) {
+        while (cycle_parents[c] != c) {
+            cycle_parents[c] = cycle_parents[cycle_parents[c]];
+            c = cycle_parents[c];
+        }
+        return c;
+    };
+    for (size_t c = 0; c < num_cycles; c++) {
+        for (uint64_t d : cycle_detectors[c]) {
+            if (detector_cycles[d] == SIZE_MAX) {
+                detector_cycles[d] = c;
+            } else {
+                cycle_parents[find_root(c)] = find_root(detector_cycles[d]);
+            }
+        }
+    }
+    cycle_blocked.assign(num_cycles, 0);
+    for (size_t c = 0; c < num_cycles; c++) {
+        for (uint64_t d : cycle_detectors[c]) {
+            if (detector_times[d] >= commit_end) {
+                cycle_blocked[find_root(c)] = 1;
+            }
+        }
+    }
+
+    // Commit the groups that are entirely within the commit region.
+    committed_detectors.clear();
+    for (size_t c = 0; c < num_cycles; c++) {
+        for (uint64_t d : cycle_detectors[c]) {
+            detector_cycles[d] = SIZE_MAX;
+        }
+        if (!cycle_blocked[find_root(c)]) {
+            committed_obs_flip ^= cycle_obs_flips[c];
+            committed_detectors.insert(committed_detectors.end(), cycle_detectors[c].begin(), cycle_detectors[c].end());
+        }
+    }
+    std::sort(committed_detectors.begin(), committed_detectors.end());
+    std::erase_if(pending_detectors, [&](uint64_t d) {
+        return std::binary_search(committed_detectors.begin(), committed_detectors.end(), d);
+    });
+}
+
+obsmask_int SlidingWindowDecoder::finish() {
+    if (!pending_detectors.empty()) {
+        num_windows_decoded++;
+        committed_obs_flip ^= decoder.decode_sparse_detection_events(pending_detectors);
+    }
+    obsmask_int result = committed_obs_flip;
+    size_t num_windows = num_windows_decoded;
+    reset();
+    num_windows_decoded = num_windows;
+    return result;
+}
+
+obsmask_int SlidingWindowDecoder::decode_detection_events(std::span<const uint8_t> bit_packed_detection_events) {
+    reset();
+    detectors_by_time.clear();
+    for (size_t k = 0; k < bit_packed_detection_events.size(); k++) {
+        for (uint8_t b = bit_packed_detection_events[k], k2 = 0; b; b >>= 1, k2++) {
+            if (b & 1) {
+                detectors_by_time.push_back(k * 8 + k2);
+            }
+        }
+    }
+    add_detection_events(detectors_by_time);
+    std::stable_sort(pending_detectors.begin(), pending_detectors.end(), [&](uint64_t a, uint64_t b) {
+        return detector_times[a] < detector_times[b];
+    });
+    detectors_by_time.swap(pending_detectors);
+    pending_detectors.clear();
+
+    // Feed the detection events into the window as if they were arriving over time.
+    size_t next = 0;
+    for (double t = min_time + commit_duration + buffer_duration; t <= max_time; t += commit_duration) {
+        size_t start = next;
+        while (next < detectors_by_time.size() && detector_times[detectors_by_time[next]] < t) {
+            next++;
+        }
+        pending_detectors.insert(
+            pending_detectors.end(), detectors_by_time.begin() + start, detectors_by_time.begin() + next);
+        advance_to_time(t);
+    }
+    pending_detectors.insert(pending_detectors.end(), detectors_by_time.begin() + next, detectors_by_time.end());
+    return finish();
+}
@@ -0,0 +1,143 @@
+/*
+ * Copyright 2023 Google LLC
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+
+
+#ifndef _CHROMOBIUS_DECODE_SLIDING_WINDOW_DECODER_H
+#define _CHROMOBIUS_DECODE_SLIDING_WINDOW_DECODER_H
+
+#include "chromobius/decode/decoder.h"
+
+namespace chromobius {
+
+/// Decodes a shot incrementally, as its detection events arrive over time.
+///
+/// Detectors are ordered in time by their time coordinate (their 3rd
+/// coordinate). The decoder repeatedly decodes a window of detection events
+/// made up of a commit region followed by a buffer region. Each lifted piece
+/// of the window's solution (see Decoder::decode_sparse_detection_events_by_cycle)
+/// that only covers detection events before the end of the commit region is
+/// committed: its observable flips are added to the prediction and its
+/// detection events are discarded. (Pieces sharing a detection event are
+/// committed or dropped together.) The other pieces are dropped, and their
+/// detection events carry forward into the next window, which starts where
+/// the commit region ended.
+///
+/// This bounds the work done as each round arrives by the size of a window,
+/// instead of growing with the number of rounds in the experiment. Pieces that
+/// reach into the buffer region are re-decoded once more of the future is
+/// known, so when the buffer is at least as long as the code distance the
+/// predictions are close to those of decoding the whole shot at once.
+struct SlidingWindowDecoder {
+    Decoder decoder;
+    /// The time coordinate of each detector.
+    std::vector<double> detector_times;
+    /// How much time (in units of the time coordinate) each window commits.
+    double commit_duration;
+    /// How much time after the committed part of a window is decoded but not
+    /// committed.
+    double buffer_duration;
+    /// The earliest and latest detector time coordinates.
+    double min_time;
+    double max_time;
+
+    /// The number of windows decoded while predicting the current (or most
+    /// recent) shot.
+    size_t num_windows_decoded = 0;
+
+    /// Creates a sliding window decoder.
+    ///
+    /// Args:
+    ///     dem: The detector error model to configure the decoder with. Its
+    ///         detectors must be annotated as described in Decoder::from_dem,
+    ///         with the 3rd coordinate being time. It can't have more than 64
+    ///         observables: the pieces of a window's solution (see
+    ///         Decoder::CycleCallback) only report flips of the first 64
+    ///         observables, so pieces can't be committed separately for the
+    ///         observables in Decoder::extra_observable_chunks.
+    ///     options: Configuration options for the underlying decoder.
+    ///     commit_duration: How much time (in units of the time coordinate)
+    ///         each window commits. Must be positive.
+    ///     buffer_duration: How much time after the commit region each window
+    ///         includes without committing it. Must not be negative.
+    ///
+    /// Returns:
+    ///     The configured decoder, ready to decode.
+    ///
+    /// Raises:
+    ///     std::invalid_argument: The dem has more than 64 observables.
+    static SlidingWindowDecoder from_dem(
+        const stim::DetectorErrorModel &dem,
+        DecoderConfigOptions options,
+        double commit_duration,
+        double buffer_duration);
+
+    /// Adds detection events to the shot being decoded.
+    ///
+    /// Detection events can be added in any order, but a detection event must
+    /// be added before advance_to_time is called with a time after its
+    /// detector's time.
+    void add_detection_events(std::span<const uint64_t> detector_indices);
+
+    /// Declares that all detection events with a time coordinate before the
+    /// given time have been added, and decodes every window that is now
+    /// complete.
+    void advance_to_time(double time);
+
+    /// Decodes the remaining detection events of the shot, and returns the
+    /// predicted observable flips of the whole shot. Resets the decoder so
+    /// that it's ready for the next shot.
+    obsmask_int finish();
+
+    /// Predicts the observable flips of a complete shot by streaming its
+    /// detection events through the sliding window, one commit region at a
+    /// time.
+    ///
+    /// Any partially streamed shot is discarded first.
+    ///
+    /// Args:
+    ///     bit_packed_detection_events: The shot's detection events.
+    ///
+    /// Returns:
+    ///     A bit mask of the predicted observable flips.
+    obsmask_int decode_detection_events(std::span<const uint8_t> bit_packed_detection_events);
+
+   private:
+    /// Decodes the pending detection events before `window_end`, committing
+    /// pieces with all their detection events before `commit_end`.
+    void decode_window(double commit_end, double window_end);
+    /// Discards the shot being decoded.
+    void reset();
+
+    /// The start of the next window's commit region.
+    double window_start = 0;
+    /// Detection events that have been added but not committed.
+    std::vector<uint64_t> pending_detectors;
+    obsmask_int committed_obs_flip = 0;
+
+    /// Ephemeral workspaces.
+    std::vector<uint64_t> window_detectors;
+    std::vector<uint64_t> committed_detectors;
+    std::vector<uint64_t> detectors_by_time;
+    std::vector<std::vector<uint64_t>> cycle_detectors;
+    std::vector<obsmask_int> cycle_obs_flips;
+    std::vector<size_t> cycle_parents;
+    std::vector<uint8_t> cycle_blocked;
+    std::vector<size_t> detector_cycles;
+};
+
+}  // namespace chromobius
+
+#endif
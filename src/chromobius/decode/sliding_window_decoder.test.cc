@@ -0,0 +1,131 @@
+// Copyright 2023 Google LLC
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+
+#include "chromobius/decode/sliding_window_decoder.h"
+
+#include "gtest/gtest.h"
+
+#include "chromobius/test_util.test.h"
+
+using namespace chromobius;
+
+TEST(sliding_window_decoder, detector_times) {
+    auto decoder = SlidingWindowDecoder::from_dem(
+        stim::DetectorErrorModel(R"DEM(
+            error(0.1) D0 D1 L0
+            error(0.1) D0 D2
+            error(0.1) D1 D2
+            detector(0, 0, 0, 0) D0
+            shift_detectors(0, 0, 2) 1
+            detector(0, 0, 0, 1) D0
+            detector(0, 0, 1.5, 2) D1
+        )DEM"),
+        DecoderConfigOptions{},
+        1,
+        2);
+    ASSERT_EQ(decoder.detector_times, (std::vector<double>{0, 2, 3.5}));
+    ASSERT_EQ(decoder.min_time, 0);
+    ASSERT_EQ(decoder.max_time, 3.5);
+
+    ASSERT_THROW(
+        { SlidingWindowDecoder::from_dem(stim::DetectorErrorModel(), DecoderConfigOptions{}, 0, 1); },
+        std::invalid_argument);
+    ASSERT_THROW(
+        { SlidingWindowDecoder::from_dem(stim::DetectorErrorModel(), DecoderConfigOptions{}, 1, -1); },
+        std::invalid_argument);
+}
+
+TEST(sliding_window_decoder, streaming_matches_whole_shot) {
+    FILE *f = open_test_data_file("midout_color_code_d5_r10_p1000.stim");
+    stim::Circuit circuit = stim::Circuit::from_file(f);
+    fclose(f);
+    auto dem = stim::ErrorAnalyzer::circuit_to_detector_error_model(circuit, false, true, false, 0, false, false);
+    auto decoder = SlidingWindowDecoder::from_dem(dem, DecoderConfigOptions{}, 2, 5);
+    auto whole_decoder = Decoder::from_dem(dem, DecoderConfigOptions{});
+
+    size_t num_shots = 256;
+    std::mt19937_64 rng{0};
+    auto [dets, obs] = stim::sample_batch_detection_events<64>(circuit, num_shots, rng);
+    dets = dets.transposed();
+    obs = obs.transposed();
+    size_t num_disagreements = 0;
+    size_t num_window_mistakes = 0;
+    size_t num_whole_mistakes = 0;
+    size_t max_windows = 0;
+    for (size_t k = 0; k < num_shots; k++) {
+        std::span<const uint8_t> shot{dets[k].u8, dets[k].u8 + dets.num_minor_u8_padded()};
+        obsmask_int whole = whole_decoder.decode_detection_events(shot);
+        obsmask_int windowed = decoder.decode_detection_events(shot);
+        num_disagreements += whole != windowed;
+        num_whole_mistakes += whole != obs[k].u64[0];
+        num_window_mistakes += windowed != obs[k].u64[0];
+        max_windows = std::max(max_windows, decoder.num_windows_decoded);
+
+        // Streaming the detection events by hand gives the same result.
+        std::vector<uint64_t> fired;
+        dets[k].for_each_set_bit([&](size_t d) {
+            fired.push_back(d);
+        });
+        for (double t = decoder.min_time; t <= decoder.max_time + 1; t += 1) {
+            std::vector<uint64_t> round;
+            for (uint64_t d : fired) {
+                if (decoder.detector_times[d] >= t - 1 && decoder.detector_times[d] < t) {
+                    round.push_back(d);
+                }
+            }
+            decoder.add_detection_events(round);
+            decoder.advance_to_time(t);
+        }
+        ASSERT_EQ(decoder.finish(), windowed) << k;
+    }
+
+    EXPECT_GT(max_windows, 1);
+    EXPECT_LE(num_disagreements, num_shots / 20);
+    EXPECT_LE(num_window_mistakes, num_whole_mistakes + num_shots / 50);
+}
+
+TEST(sliding_window_decoder, big_buffer_gives_minimum_weight) {
+    FILE *f = open_test_data_file("phenom_color_code_d5_r5_p1000_with_ignored.stim");
+    stim::Circuit circuit = stim::Circuit::from_file(f);
+    fclose(f);
+    auto dem = stim::ErrorAnalyzer::circuit_to_detector_error_model(circuit, false, true, false, 0, false, false);
+    auto decoder = SlidingWindowDecoder::from_dem(dem, DecoderConfigOptions{}, 1, 1000);
+    auto whole_decoder = Decoder::from_dem(dem, DecoderConfigOptions{});
+
+    std::mt19937_64 rng{0};
+    auto [dets, obs] = stim::sample_batch_detection_events<64>(circuit, 128, rng);
+    dets = dets.transposed();
+    size_t num_disagreements = 0;
+    for (size_t k = 0; k < 128; k++) {
+        std::span<const uint8_t> shot{dets[k].u8, dets[k].u8 + dets.num_minor_u8_padded()};
+        num_disagreements += decoder.decode_detection_events(shot) != whole_decoder.decode_detection_events(shot);
+    }
+    // Only ties between equal weight matchings can be broken differently.
+    EXPECT_LE(num_disagreements, 2);
+}
+
+TEST(sliding_window_decoder, bad_detector) {
+    auto decoder = SlidingWindowDecoder::from_dem(
+        stim::DetectorErrorModel(R"DEM(
+            error(0.1) D0 D1 L0
+            detector(0, 0, 0, 0) D0
+            detector(0, 0, 0, 1) D1
+        )DEM"),
+        DecoderConfigOptions{},
+        1,
+        1);
+    std::vector<uint64_t> dets{2};
+    ASSERT_THROW({ decoder.add_detection_events(dets); }, std::invalid_argument);
+}
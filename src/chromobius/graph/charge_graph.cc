@@ -19,6 +19,7 @@
 #include <sstream>
 
 #include "chromobius/datatypes/xor_vec.h"
+#include "chromobius/graph/flip_sources.h"
 
 using namespace chromobius;
 
@@ -87,19 +88,25 @@ void ChargeGraph::add_edge(node_offset_int n1, node_offset_int n2, obsmask_int o
 }
 
 ChargeGraph ChargeGraph::from_atomic_errors(
-    const std::map<AtomicErrorKey, obsmask_int> &atomic_errors, size_t num_nodes) {
+    const std::map<AtomicErrorKey, obsmask_int> &atomic_errors, size_t num_nodes, FlipSources *out_sources) {
 
     // Create a charge graph of the correct size.
     ChargeGraph charge_graph;
     charge_graph.nodes.resize(num_nodes);
     for (size_t k = 0; k < num_nodes; k++) {
         charge_graph.nodes[k].neighbors[k] = obsmask_int{0};
+        if (out_sources != nullptr) {
+            out_sources->charge_graph_edges[SortedPair{(node_offset_int)k, (node_offset_int)k}] = {};
+        }
     }
 
     // Add all directly included edges into the charge graph.
     for (const auto &[err, obs_flip] : atomic_errors) {
         if (err.dets[2] == BOUNDARY_NODE) {
             charge_graph.add_edge(err.dets[0], err.dets[1], obs_flip);
+            if (out_sources != nullptr) {
+                out_sources->charge_graph_edges[SortedPair{err.dets[0], err.dets[1]}] = {err};
+            }
         }
     }
 
@@ -152,6 +159,9 @@ ChargeGraph ChargeGraph::from_atomic_errors(
 
                 // Add the composite graphlike error into the graph.
                 charge_graph.add_edge(a, b, atomic_errors.at(e1) ^ atomic_errors.at(e2));
+                if (out_sources != nullptr) {
+                    out_sources->charge_graph_edges[SortedPair{a, b}] = {e1, e2};
+                }
             }
         }
     }
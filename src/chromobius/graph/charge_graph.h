@@ -27,6 +27,7 @@
 namespace chromobius {
 
 struct ChargeGraphNode;
+struct FlipSources;
 
 /// Like the error graph, but hyperedges have been combined into normal edges.
 ///
@@ -39,7 +40,14 @@ struct ChargeGraphNode;
 struct ChargeGraph {
     std::vector<ChargeGraphNode> nodes;
 
-    static ChargeGraph from_atomic_errors(const std::map<AtomicErrorKey, obsmask_int> &atomic_errors, size_t num_nodes);
+    /// Builds the charge graph of some atomic errors.
+    ///
+    /// If out_sources isn't null, the atomic errors making up each edge's
+    /// observable flip are written into out_sources->charge_graph_edges.
+    static ChargeGraph from_atomic_errors(
+        const std::map<AtomicErrorKey, obsmask_int> &atomic_errors,
+        size_t num_nodes,
+        FlipSources *out_sources = nullptr);
 
     void add_edge(node_offset_int n1, node_offset_int n2, obsmask_int obs_flip);
     bool operator==(const ChargeGraph &other) const;
@@ -14,10 +14,16 @@
 
 #include "chromobius/graph/choose_rgb_reps.h"
 
+#include <algorithm>
+
+#include "chromobius/graph/flip_sources.h"
+
 using namespace chromobius;
 
 std::vector<RgbEdge> chromobius::choose_rgb_reps_from_atomic_errors(
-    const std::map<AtomicErrorKey, obsmask_int> &atomic_errors, std::span<const ColorBasis> node_colors) {
+    const std::map<AtomicErrorKey, obsmask_int> &atomic_errors,
+    std::span<const ColorBasis> node_colors,
+    FlipSources *out_sources) {
     std::vector<RgbEdge> result;
     RgbEdge empty{
         .red_node = BOUNDARY_NODE,
@@ -27,6 +33,9 @@ std::vector<RgbEdge> chromobius::choose_rgb_reps_from_atomic_errors(
         .charge_flip = Charge::NEUTRAL,
     };
     result.resize(node_colors.size(), empty);
+    if (out_sources != nullptr) {
+        out_sources->rgb_reps.assign(node_colors.size(), {});
+    }
 
     // Assign node representatives from the highest weight RGB edges they are part
     // of.
@@ -52,6 +61,9 @@ std::vector<RgbEdge> chromobius::choose_rgb_reps_from_atomic_errors(
         for (node_offset_int n : err.dets) {
             if (n != BOUNDARY_NODE && weight > result[n].weight()) {
                 result[n] = rep;
+                if (out_sources != nullptr) {
+                    out_sources->rgb_reps[n] = {err};
+                }
             }
         }
     }
@@ -77,6 +89,10 @@ std::vector<RgbEdge> chromobius::choose_rgb_reps_from_atomic_errors(
                 assert(r2->color_node(c1) == e.dets[1]);
                 r1->color_node(c1) = e.dets[0];
                 r1->obs_flip ^= obs_flip;
+                if (out_sources != nullptr) {
+                    out_sources->rgb_reps[e.dets[0]] = out_sources->rgb_reps[e.dets[1]];
+                    out_sources->rgb_reps[e.dets[0]].push_back(e);
+                }
             }
             if (w2 == 0 && w1 > 0) {
                 *r2 = *r1;
@@ -84,9 +100,33 @@ std::vector<RgbEdge> chromobius::choose_rgb_reps_from_atomic_errors(
                 assert(r2->color_node(c2) == e.dets[0]);
                 r2->color_node(c2) = e.dets[1];
                 r2->obs_flip ^= obs_flip;
+                if (out_sources != nullptr) {
+                    out_sources->rgb_reps[e.dets[1]] = out_sources->rgb_reps[e.dets[0]];
+                    out_sources->rgb_reps[e.dets[1]].push_back(e);
+                }
             }
         }
     }
 
     return result;
 }
+
+std::vector<float> chromobius::choose_rgb_rep_weights(
+    std::span<const RgbEdge> rgb_reps, const std::map<AtomicErrorKey, float> &atomic_error_weights) {
+    float fallback_weight = 0;
+    for (const auto &[err, weight] : atomic_error_weights) {
+        fallback_weight = std::max(fallback_weight, weight);
+    }
+
+    std::vector<float> result;
+    result.reserve(rgb_reps.size());
+    for (const auto &r : rgb_reps) {
+        if (r.weight() != 3) {
+            result.push_back(0);
+            continue;
+        }
+        auto f = atomic_error_weights.find(AtomicErrorKey{r.red_node, r.green_node, r.blue_node});
+        result.push_back(f == atomic_error_weights.end() ? fallback_weight : f->second);
+    }
+    return result;
+}
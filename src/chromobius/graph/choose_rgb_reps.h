@@ -24,8 +24,23 @@
 
 namespace chromobius {
 
+struct FlipSources;
+
+/// Picks, for each node, a nearby RGB error to use as the node's representative.
+///
+/// If out_sources isn't null, the atomic errors making up each representative's
+/// observable flip are written into out_sources->rgb_reps.
 std::vector<RgbEdge> choose_rgb_reps_from_atomic_errors(
-    const std::map<AtomicErrorKey, obsmask_int> &atomic_errors, std::span<const ColorBasis> node_colors);
+    const std::map<AtomicErrorKey, obsmask_int> &atomic_errors,
+    std::span<const ColorBasis> node_colors,
+    FlipSources *out_sources = nullptr);
+
+/// Returns the weight of each node's rgb representative error.
+///
+/// Nodes whose representative isn't an RGB error get a weight of 0. Representatives that don't appear in
+/// atomic_error_weights (e.g. ones combined from several errors) are given the largest weight in atomic_error_weights.
+std::vector<float> choose_rgb_rep_weights(
+    std::span<const RgbEdge> rgb_reps, const std::map<AtomicErrorKey, float> &atomic_error_weights);
 
 }  // namespace chromobius
 
@@ -41,3 +41,29 @@ TEST(choose_rgb_reps, choose_rgb_reps_from_atomic_errors) {
                 .red_node = 3, .green_node = BOUNDARY_NODE, .blue_node = 2, .obs_flip = 2, .charge_flip = Charge::G},
         }));
 }
+
+TEST(choose_rgb_reps, choose_rgb_rep_weights) {
+    std::vector<ColorBasis> node_colors{
+        ColorBasis{.color = R, .basis = X},
+        ColorBasis{.color = G, .basis = X},
+        ColorBasis{.color = B, .basis = X},
+        ColorBasis{.color = R, .basis = X},
+        ColorBasis{.color = G, .basis = X},
+        ColorBasis{.color = B, .basis = X},
+        ColorBasis{.color = R, .basis = Z},
+    };
+    std::map<AtomicErrorKey, obsmask_int> atomic_errors{
+        {AtomicErrorKey{0, 1, 2}, 0},
+        {AtomicErrorKey{3, 4, 5}, 0},
+        {AtomicErrorKey{6, BOUNDARY_NODE, BOUNDARY_NODE}, 0},
+    };
+    auto reps = choose_rgb_reps_from_atomic_errors(atomic_errors, node_colors);
+
+    // The second rep only appears as part of larger errors, so it gets the largest weight.
+    std::map<AtomicErrorKey, float> weights{
+        {AtomicErrorKey{0, 1, 2}, 2.5},
+        {AtomicErrorKey{2, 3, BOUNDARY_NODE}, 4},
+        {AtomicErrorKey{6, BOUNDARY_NODE, BOUNDARY_NODE}, 3},
+    };
+    ASSERT_EQ(choose_rgb_rep_weights(reps, weights), (std::vector<float>{2.5, 2.5, 2.5, 4, 4, 4, 0}));
+}
@@ -14,6 +14,8 @@
 
 #include "chromobius/graph/collect_atomic_errors.h"
 
+#include <cmath>
+
 using namespace chromobius;
 
 AtomicErrorKey chromobius::extract_atomic_errors_from_dem_error_instruction_dets(
@@ -113,3 +115,33 @@ std::map<AtomicErrorKey, obsmask_int> chromobius::collect_atomic_errors(
 
     return result;
 }
+
+std::map<AtomicErrorKey, float> chromobius::collect_atomic_error_weights(
+    const stim::DetectorErrorModel &dem, std::span<const ColorBasis> node_colors) {
+    obsmask_int obs_flip;
+    stim::SparseXorVec<node_offset_int> dets;
+    std::map<AtomicErrorKey, obsmask_int> unused_atomic_errors;
+    std::map<AtomicErrorKey, double> probabilities;
+
+    dem.iter_flatten_error_instructions([&](stim::DemInstruction instruction) {
+        double p = instruction.arg_data[0];
+        if (p == 0) {
+            return;
+        }
+        extract_obs_and_dets_from_error_instruction(instruction, &dets, &obs_flip, node_colors);
+        AtomicErrorKey key = extract_atomic_errors_from_dem_error_instruction_dets(
+            dets.sorted_items, obs_flip, node_colors, &unused_atomic_errors);
+        if (key.weight() == 0) {
+            return;
+        }
+        // Independent errors with the same symptoms combine into one error that happens when an odd number of them do.
+        double &q = probabilities[key];
+        q = q * (1 - p) + p * (1 - q);
+    });
+
+    std::map<AtomicErrorKey, float> result;
+    for (const auto &[key, p] : probabilities) {
+        result.emplace(key, (float)std::log((1 - p) / p));
+    }
+    return result;
+}
@@ -41,6 +41,22 @@ namespace chromobius {
 std::map<AtomicErrorKey, obsmask_int> collect_atomic_errors(
     const stim::DetectorErrorModel &dem, std::span<const ColorBasis> node_colors);
 
+/// Finds the weight of each atomic error in the dem.
+///
+/// An atomic error's weight is its log likelihood ratio ln((1-p)/p), where p is
+/// the combined probability of the dem errors with exactly the atomic error's
+/// symptoms. Atomic errors that only appear as parts of larger errors have no
+/// entry in the result.
+///
+/// Args:
+///     dem: The detector error model to read errors from.
+///     node_colors: The color/basis data of each detector in the dem.
+///
+/// Returns:
+///     A map from atomic error to weight.
+std::map<AtomicErrorKey, float> collect_atomic_error_weights(
+    const stim::DetectorErrorModel &dem, std::span<const ColorBasis> node_colors);
+
 /// Converts a stim::DemInstruction into a list of detection events and an obs mask.
 void extract_obs_and_dets_from_error_instruction(
     stim::DemInstruction instruction,
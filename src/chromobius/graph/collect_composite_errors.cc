@@ -14,7 +14,12 @@
 
 #include "chromobius/graph/collect_composite_errors.h"
 
+#include <algorithm>
+#include <array>
+#include <cmath>
+
 #include "chromobius/graph/collect_atomic_errors.h"
+#include "chromobius/graph/flip_sources.h"
 
 using namespace chromobius;
 
@@ -226,8 +231,10 @@ static void decompose_dets_into_atoms(
     std::vector<node_offset_int> *buf_z_detectors,
     const stim::DemInstruction &instruction_for_error_message,
     const stim::DetectorErrorModel *dem_for_error_message,
+    size_t error_index,
     std::vector<AtomicErrorKey> *out_atoms,
-    std::map<AtomicErrorKey, obsmask_int> *out_remnants) {
+    std::map<AtomicErrorKey, obsmask_int> *out_remnants,
+    FlipSources *out_sources) {
     // Split into X and Z parts.
     buf_x_detectors->clear();
     buf_z_detectors->clear();
@@ -252,6 +259,9 @@ static void decompose_dets_into_atoms(
                     obs_flip,
                     node_colors,
                     out_remnants);
+                if (out_sources != nullptr && removed.weight()) {
+                    out_sources->remnants.push_back({removed, error_index, *out_atoms});
+                }
             } else {
                 removed = decompose_single_basis_dets_into_atoms(*basis_dets, node_colors, atomic_errors);
             }
@@ -334,14 +344,169 @@ static void decompose_dets_into_atoms(
     }
 }
 
+namespace {
+
+/// Accumulates mobius errors, merging errors that have the same set of mobius edges.
+///
+/// Errors are stored in flat buffers (instead of one vector per error) because the mobius dem of a large circuit has
+/// hundreds of thousands of errors.
+struct MobiusErrorMerger {
+    /// The targets of each error, as given when the error was first added.
+    std::vector<stim::DemTarget> targets;
+    std::vector<size_t> target_offsets{0};
+    /// The sorted edges of each error, used to recognize errors with the same edges.
+    std::vector<uint64_t> edges;
+    std::vector<size_t> edge_offsets{0};
+    std::vector<double> probabilities;
+    /// The probability of each error before corner edge adjustments, which is what pruning is based on.
+    std::vector<double> source_probabilities;
+    /// An open addressing hash table of error indices (SIZE_MAX marks empty slots), and each error's hash.
+    std::vector<size_t> slots;
+    std::vector<uint64_t> hashes;
+
+    static uint64_t hash_edges(std::span<const uint64_t> sorted_edges) {
+        uint64_t h = sorted_edges.size();
+        for (uint64_t e : sorted_edges) {
+            h = (h ^ e) * 0x9E3779B97F4A7C15ULL;
+            h ^= h >> 29;
+        }
+        return h;
+    }
+
+    std::span<const uint64_t> edges_of(size_t index) const {
+        return {edges.data() + edge_offsets[index], edges.data() + edge_offsets[index + 1]};
+    }
+
+    std::span<const stim::DemTarget> targets_of(size_t index) const {
+        return {targets.data() + target_offsets[index], targets.data() + target_offsets[index + 1]};
+    }
+
+    void grow_slots() {
+        slots.assign(std::max(size_t{1024}, slots.size() * 2), SIZE_MAX);
+        size_t mask = slots.size() - 1;
+        for (size_t k = 0; k < hashes.size(); k++) {
+            size_t s = hashes[k] & mask;
+            while (slots[s] != SIZE_MAX) {
+                s = (s + 1) & mask;
+            }
+            slots[s] = k;
+        }
+    }
+
+    void add(
+        std::span<const stim::DemTarget> error_targets, std::span<uint64_t> error_edges, double p, double source_p) {
+        if (hashes.size() * 2 >= slots.size()) {
+            grow_slots();
+        }
+        std::sort(error_edges.begin(), error_edges.end());
+        uint64_t h = hash_edges(error_edges);
+        size_t mask = slots.size() - 1;
+        size_t s = h & mask;
+        for (; slots[s] != SIZE_MAX; s = (s + 1) & mask) {
+            size_t k = slots[s];
+            auto other = edges_of(k);
+            if (hashes[k] == h && std::equal(other.begin(), other.end(), error_edges.begin(), error_edges.end())) {
+                // The errors are independent, so the merged error happens when exactly one of them happens.
+                double &q = probabilities[k];
+                q = q * (1 - p) + p * (1 - q);
+                double &source_q = source_probabilities[k];
+                source_q = source_q * (1 - source_p) + source_p * (1 - source_q);
+                return;
+            }
+        }
+
+        slots[s] = probabilities.size();
+        hashes.push_back(h);
+        probabilities.push_back(p);
+        source_probabilities.push_back(source_p);
+        targets.insert(targets.end(), error_targets.begin(), error_targets.end());
+        target_offsets.push_back(targets.size());
+        edges.insert(edges.end(), error_edges.begin(), error_edges.end());
+        edge_offsets.push_back(edges.size());
+    }
+
+    /// Removes errors with a weight above the given maximum, and returns how many edges no longer appear in any error.
+    ///
+    /// Errors are weighed by their probability before corner edge adjustments, so that boundary edges at corners
+    /// aren't pruned just because their probability was squared.
+    ///
+    /// When folding, each edge of a removed error that still appears in a kept error has the removed error's
+    /// probability combined into a single-edge error for that edge (added if it doesn't exist). The matcher splits
+    /// errors into their edges and combines parallel edges, so this keeps the weights of the surviving edges the same.
+    size_t prune(double max_weight, bool fold) {
+        // weight = ln((1-p)/p) > max_weight is equivalent to p < 1/(1+e^max_weight).
+        double min_probability = 1 / (1 + std::exp(max_weight));
+        std::vector<uint64_t> kept_edges;
+        std::vector<uint64_t> pruned_edges;
+        for (size_t k = 0; k < probabilities.size(); k++) {
+            auto &dst = source_probabilities[k] < min_probability ? pruned_edges : kept_edges;
+            auto src = edges_of(k);
+            dst.insert(dst.end(), src.begin(), src.end());
+        }
+        if (pruned_edges.empty()) {
+            return 0;
+        }
+        std::sort(kept_edges.begin(), kept_edges.end());
+        kept_edges.erase(std::unique(kept_edges.begin(), kept_edges.end()), kept_edges.end());
+        std::sort(pruned_edges.begin(), pruned_edges.end());
+        pruned_edges.erase(std::unique(pruned_edges.begin(), pruned_edges.end()), pruned_edges.end());
+        size_t num_removed_edges = 0;
+        for (uint64_t e : pruned_edges) {
+            num_removed_edges += !std::binary_search(kept_edges.begin(), kept_edges.end(), e);
+        }
+
+        MobiusErrorMerger kept;
+        std::vector<uint64_t> edge_buf;
+        for (size_t k = 0; k < probabilities.size(); k++) {
+            if (source_probabilities[k] >= min_probability) {
+                auto src = edges_of(k);
+                edge_buf.assign(src.begin(), src.end());
+                kept.add(targets_of(k), edge_buf, probabilities[k], source_probabilities[k]);
+            }
+        }
+        if (fold) {
+            for (size_t k = 0; k < probabilities.size(); k++) {
+                if (source_probabilities[k] >= min_probability) {
+                    continue;
+                }
+                for (uint64_t e : edges_of(k)) {
+                    if (std::binary_search(kept_edges.begin(), kept_edges.end(), e)) {
+                        std::array<stim::DemTarget, 2> edge_targets{
+                            stim::DemTarget::relative_detector_id(e >> 32),
+                            stim::DemTarget::relative_detector_id(e & 0xFFFFFFFF),
+                        };
+                        edge_buf.assign(1, e);
+                        kept.add(edge_targets, edge_buf, probabilities[k], source_probabilities[k]);
+                    }
+                }
+            }
+        }
+        *this = std::move(kept);
+        return num_removed_edges;
+    }
+
+    void append_into(stim::DetectorErrorModel *out) const {
+        for (size_t k = 0; k < probabilities.size(); k++) {
+            out->append_error_instruction(
+                probabilities[k], {targets.data() + target_offsets[k], targets.data() + target_offsets[k + 1]}, "");
+        }
+    }
+};
+
+}  // namespace
+
 void chromobius::collect_composite_errors_and_remnants_into_mobius_dem(
     const stim::DetectorErrorModel &dem,
     std::span<const ColorBasis> node_colors,
     const std::map<AtomicErrorKey, obsmask_int> &atomic_errors,
     bool drop_mobius_errors_involving_remnant_errors,
     bool ignore_decomposition_failures,
+    double max_mobius_error_weight,
+    bool fold_pruned_mobius_errors,
     stim::DetectorErrorModel *out_mobius_dem,
-    std::map<AtomicErrorKey, obsmask_int> *out_remnants) {
+    std::map<AtomicErrorKey, obsmask_int> *out_remnants,
+    size_t *out_num_pruned_mobius_edges,
+    FlipSources *out_sources) {
 
     stim::SparseXorVec<node_offset_int> dets;
     std::vector<node_offset_int> x_buf;
@@ -349,6 +514,12 @@ void chromobius::collect_composite_errors_and_remnants_into_mobius_dem(
     std::vector<AtomicErrorKey> atoms_buf;
     std::vector<stim::DemTarget> composite_error_buffer;
 
+    // Many errors decompose into the same mobius edges. They're merged here, so that each set of edges is given to
+    // the matcher once. Merged errors are emitted in the order their edges first appeared.
+    MobiusErrorMerger merger;
+    std::vector<uint64_t> edge_buffer;
+
+    size_t error_index = 0;
     dem.iter_flatten_error_instructions([&](stim::DemInstruction instruction) {
         obsmask_int obs_flip;
         extract_obs_and_dets_from_error_instruction(instruction, &dets, &obs_flip, node_colors);
@@ -363,16 +534,23 @@ void chromobius::collect_composite_errors_and_remnants_into_mobius_dem(
             &z_buf,
             instruction,
             &dem,
+            error_index,
             &atoms_buf,
-            out_remnants);
+            out_remnants,
+            out_sources);
+        error_index++;
 
         if (drop_mobius_errors_involving_remnant_errors && !out_remnants->empty()) {
             atoms_buf.clear();
             out_remnants->clear();
+            if (out_sources != nullptr) {
+                out_sources->remnants.clear();
+            }
         }
 
         // Convert atomic errors into mobius detection events with decomposition suggestions.
         composite_error_buffer.clear();
+        edge_buffer.clear();
         bool has_corner_node = false;
         for (const auto &atom : atoms_buf) {
             has_corner_node |= atom.dets[1] == BOUNDARY_NODE;
@@ -380,20 +558,29 @@ void chromobius::collect_composite_errors_and_remnants_into_mobius_dem(
                 composite_error_buffer.push_back(stim::DemTarget::relative_detector_id(d1));
                 composite_error_buffer.push_back(stim::DemTarget::relative_detector_id(d2));
                 composite_error_buffer.push_back(stim::DemTarget::separator());
+                edge_buffer.push_back(((uint64_t)std::min(d1, d2) << 32) | std::max(d1, d2));
             });
         }
-
-        // Put the composite error into the mobius dem as an error instruction.
-        if (!composite_error_buffer.empty()) {
-            composite_error_buffer.pop_back();
-            double p = instruction.arg_data[0];
-            if (has_corner_node) {
-                // Corner nodes have edges to themselves that correspond to reaching the boundary in one subgraph
-                // and then bouncing back in another subgraph. Accounting for this correctly requires doubling the
-                // weight of the edge, which corresponds to squaring the probability.
-                p *= p;
-            }
-            out_mobius_dem->append_error_instruction(p, composite_error_buffer, "");
+        if (composite_error_buffer.empty()) {
+            return;
+        }
+        composite_error_buffer.pop_back();
+
+        double source_p = instruction.arg_data[0];
+        double p = source_p;
+        if (has_corner_node) {
+            // Corner nodes have edges to themselves that correspond to reaching the boundary in one subgraph
+            // and then bouncing back in another subgraph. Accounting for this correctly requires doubling the
+            // weight of the edge, which corresponds to squaring the probability.
+            p *= p;
         }
+
+        merger.add(composite_error_buffer, edge_buffer, p, source_p);
     });
+
+    *out_num_pruned_mobius_edges = 0;
+    if (max_mobius_error_weight != INFINITY) {
+        *out_num_pruned_mobius_edges = merger.prune(max_mobius_error_weight, fold_pruned_mobius_errors);
+    }
+    merger.append_into(out_mobius_dem);
 }
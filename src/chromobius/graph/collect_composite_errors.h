@@ -25,6 +25,8 @@
 
 namespace chromobius {
 
+struct FlipSources;
+
 /// Builds the mobius dem by decomposing errors from a dem into known atomic errors.
 ///
 /// Args:
@@ -34,19 +36,36 @@ namespace chromobius {
 ///     ignore_decomposition_failures: If set to True, then failing to decompose
 ///         an error into atomic errors causes the error to be discarded instead of
 ///         throwing an exception.
+///     max_mobius_error_weight: Mobius errors (after merging) with a weight
+///         ln((1-p)/p) larger than this are pruned. Set to INFINITY to keep
+///         all errors.
+///     fold_pruned_mobius_errors: When set, the probability of a pruned error
+///         is folded into the edges it shares with kept errors, instead of
+///         being discarded.
 ///     out_mobius_dem: Where to write the decomposed mobius error mechanisms.
+///         Errors that decompose into the same set of mobius edges are merged
+///         into one error mechanism, with the probability that an odd number
+///         of them occurred.
 ///     out_remnants: Some errors can't be perfectly decomposed into existing atomic
 ///         errors, but can be decomposed into an atomic error and a leftover part that
 ///         would be a valid atomic error. This is where the remnants that are used
 ///         get written.
+///     out_num_pruned_mobius_edges: Where to write the number of distinct mobius
+///         edges that were removed from the mobius dem by pruning.
+///     out_sources: Optional. If not null, how the observable flip of each
+///         remnant was computed is written into out_sources->remnants.
 void collect_composite_errors_and_remnants_into_mobius_dem(
     const stim::DetectorErrorModel &dem,
     std::span<const ColorBasis> node_colors,
     const std::map<AtomicErrorKey, obsmask_int> &atomic_errors,
     bool drop_mobius_errors_involving_remnant_errors,
     bool ignore_decomposition_failures,
+    double max_mobius_error_weight,
+    bool fold_pruned_mobius_errors,
     stim::DetectorErrorModel *out_mobius_dem,
-    std::map<AtomicErrorKey, obsmask_int> *out_remnants);
+    std::map<AtomicErrorKey, obsmask_int> *out_remnants,
+    size_t *out_num_pruned_mobius_edges,
+    FlipSources *out_sources = nullptr);
 
 }  // namespace chromobius
 
@@ -24,12 +24,20 @@ static void collect_nodes_from_dem_helper_process_detector_instruction(
     uint64_t det_offset,
     std::vector<double> *coord_buffer,
     std::span<ColorBasis> out_node_color,
-    stim::DetectorErrorModel *out_mobius_dem) {
+    stim::DetectorErrorModel *out_mobius_dem,
+    std::span<double> out_detector_times) {
     ColorBasis cb = detector_instruction_to_color_basis(instruction, coord_offsets);
+    double time = 0;
+    if (instruction.arg_data.size() > 2) {
+        time = instruction.arg_data[2] + (coord_offsets.size() > 2 ? coord_offsets[2] : 0);
+    }
 
     for (const auto &t : instruction.target_data) {
         auto n = t.raw_id() + det_offset;
         out_node_color[n] = cb;
+        if (!out_detector_times.empty()) {
+            out_detector_times[n] = time;
+        }
 
         if (out_mobius_dem != nullptr && !cb.ignored) {
             SubGraphCoord g0;
@@ -76,12 +84,19 @@ static void collect_nodes_from_dem_helper(
     std::vector<double> *coord_offsets,
     std::vector<double> *coord_buffer,
     std::span<ColorBasis> out_node_color,
-    stim::DetectorErrorModel *out_mobius_dem) {
+    stim::DetectorErrorModel *out_mobius_dem,
+    std::span<double> out_detector_times) {
     for (const auto &instruction : dem.instructions) {
         switch (instruction.type) {
             case stim::DemInstructionType::DEM_DETECTOR: {
                 collect_nodes_from_dem_helper_process_detector_instruction(
-                    instruction, *coord_offsets, *det_offset, coord_buffer, out_node_color, out_mobius_dem);
+                    instruction,
+                    *coord_offsets,
+                    *det_offset,
+                    coord_buffer,
+                    out_node_color,
+                    out_mobius_dem,
+                    out_detector_times);
                 break;
             }
             case stim::DemInstructionType::DEM_SHIFT_DETECTORS: {
@@ -101,7 +116,13 @@ static void collect_nodes_from_dem_helper(
                 auto reps = instruction.repeat_block_rep_count();
                 for (uint64_t k = 0; k < reps; k++) {
                     collect_nodes_from_dem_helper(
-                        block, det_offset, coord_offsets, coord_buffer, out_node_color, out_mobius_dem);
+                        block,
+                        det_offset,
+                        coord_offsets,
+                        coord_buffer,
+                        out_node_color,
+                        out_mobius_dem,
+                        out_detector_times);
                 }
                 break;
             }
@@ -118,7 +139,9 @@ static void collect_nodes_from_dem_helper(
 }
 
 std::vector<ColorBasis> chromobius::collect_nodes_from_dem(
-    const stim::DetectorErrorModel &dem, stim::DetectorErrorModel *out_mobius_dem) {
+    const stim::DetectorErrorModel &dem,
+    stim::DetectorErrorModel *out_mobius_dem,
+    std::vector<double> *out_detector_times) {
     uint64_t det_offset = 0;
     std::vector<double> coord_offsets;
     std::vector<double> coord_buffer;
@@ -126,6 +149,74 @@ std::vector<ColorBasis> chromobius::collect_nodes_from_dem(
 
     uint64_t num_detectors = dem.count_detectors();
     result.resize(num_detectors);
-    collect_nodes_from_dem_helper(dem, &det_offset, &coord_offsets, &coord_buffer, result, out_mobius_dem);
+    std::span<double> detector_times;
+    if (out_detector_times != nullptr) {
+        out_detector_times->clear();
+        out_detector_times->resize(num_detectors, 0);
+        detector_times = *out_detector_times;
+    }
+    collect_nodes_from_dem_helper(
+        dem, &det_offset, &coord_offsets, &coord_buffer, result, out_mobius_dem, detector_times);
+    return result;
+}
+
+stim::DetectorErrorModel chromobius::remove_ignored_detectors_from_dem(
+    const stim::DetectorErrorModel &dem,
+    std::span<const ColorBasis> detector_colors,
+    std::vector<node_offset_int> *out_detector_to_node,
+    std::vector<node_offset_int> *out_node_to_detector) {
+    out_detector_to_node->clear();
+    out_node_to_detector->clear();
+    for (size_t d = 0; d < detector_colors.size(); d++) {
+        if (detector_colors[d].ignored) {
+            out_detector_to_node->push_back(IGNORED_NODE);
+        } else {
+            out_detector_to_node->push_back((node_offset_int)out_node_to_detector->size());
+            out_node_to_detector->push_back((node_offset_int)d);
+        }
+    }
+    auto node_target = [&](stim::DemTarget t) {
+        return stim::DemTarget::relative_detector_id((*out_detector_to_node)[t.raw_id()]);
+    };
+
+    stim::DetectorErrorModel result;
+    std::vector<stim::DemTarget> targets;
+    for (const auto &instruction : dem.flattened().instructions) {
+        switch (instruction.type) {
+            case stim::DemInstructionType::DEM_ERROR:
+                targets.clear();
+                for (const auto &t : instruction.target_data) {
+                    if (t.is_separator()) {
+                        // Drop separators left dangling by removed detectors.
+                        if (!targets.empty() && !targets.back().is_separator()) {
+                            targets.push_back(t);
+                        }
+                    } else if (!t.is_relative_detector_id()) {
+                        targets.push_back(t);
+                    } else if (!detector_colors[t.raw_id()].ignored) {
+                        targets.push_back(node_target(t));
+                    }
+                }
+                if (!targets.empty() && targets.back().is_separator()) {
+                    targets.pop_back();
+                }
+                if (!targets.empty()) {
+                    result.append_error_instruction(instruction.arg_data[0], targets, instruction.tag);
+                }
+                break;
+            case stim::DemInstructionType::DEM_DETECTOR:
+                for (const auto &t : instruction.target_data) {
+                    if (!detector_colors[t.raw_id()].ignored) {
+                        result.append_detector_instruction(instruction.arg_data, node_target(t), instruction.tag);
+                    }
+                }
+                break;
+            case stim::DemInstructionType::DEM_LOGICAL_OBSERVABLE:
+                result.append_dem_instruction(instruction);
+                break;
+            default:
+                throw std::invalid_argument("Unrecognized instruction type: " + instruction.str());
+        }
+    }
     return result;
 }
@@ -34,11 +34,39 @@ namespace chromobius {
 ///     dem: The detector error model to read detector data from.
 ///     out_mobius_dem: Optional. If not set to null, transformed coordinate
 ///         data for the mobius dem's detectors is appended to this dem.
+///     out_detector_times: Optional. If not set to null, this is overwritten
+///         with the time coordinate (the 3rd coordinate, after shifts) of each
+///         detector, indexed by detector id. Detectors with fewer than 3
+///         coordinates get a time of 0.
 ///
 /// Returns:
 ///     A vector containing the color and basis data, indexed by detector id.
 std::vector<ColorBasis> collect_nodes_from_dem(
-    const stim::DetectorErrorModel &dem, stim::DetectorErrorModel *out_mobius_dem);
+    const stim::DetectorErrorModel &dem,
+    stim::DetectorErrorModel *out_mobius_dem,
+    std::vector<double> *out_detector_times = nullptr);
+
+/// Removes ignored detectors from a dem, renumbering the remaining detectors.
+///
+/// The remaining detectors keep their relative order, so the renumbered
+/// detectors form a dense range of node indices. Ignored detectors are removed
+/// from the dem's errors, and their detector instructions are dropped.
+///
+/// Args:
+///     dem: The detector error model to remove ignored detectors from.
+///     detector_colors: The color/basis data of each detector in the dem, as
+///         returned by collect_nodes_from_dem.
+///     out_detector_to_node: Overwritten with the node index of each detector,
+///         or IGNORED_NODE for ignored detectors.
+///     out_node_to_detector: Overwritten with the detector index of each node.
+///
+/// Returns:
+///     A flattened copy of the dem with the ignored detectors removed.
+stim::DetectorErrorModel remove_ignored_detectors_from_dem(
+    const stim::DetectorErrorModel &dem,
+    std::span<const ColorBasis> detector_colors,
+    std::vector<node_offset_int> *out_detector_to_node,
+    std::vector<node_offset_int> *out_node_to_detector);
 
 }  // namespace chromobius
 
@@ -0,0 +1,55 @@
+// Copyright 2023 Google LLC
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+
+#include "chromobius/graph/collect_nodes.h"
+
+#include "gtest/gtest.h"
+
+using namespace chromobius;
+
+TEST(collect_nodes, remove_ignored_detectors_from_dem) {
+    stim::DetectorErrorModel dem(R"DEM(
+        error(0.125) D0 D1 ^ D2 D3 L0
+        error(0.25) D2 ^ D1
+        error(0.25) D2 L1
+        error(0.25) D2
+        detector(0, 0, 0, 0) D0
+        detector(0, 0, 0, 1) D1
+        detector(0, 0, 0, -1) D2
+        repeat 2 {
+            detector(1, 0, 0, 2) D3
+            shift_detectors(0, 0, 1) 2
+        }
+        logical_observable L2
+    )DEM");
+    auto colors = collect_nodes_from_dem(dem, nullptr);
+    ASSERT_EQ(colors.size(), 6);
+
+    std::vector<node_offset_int> detector_to_node;
+    std::vector<node_offset_int> node_to_detector;
+    auto result = remove_ignored_detectors_from_dem(dem, colors, &detector_to_node, &node_to_detector);
+    ASSERT_EQ(detector_to_node, (std::vector<node_offset_int>{0, 1, IGNORED_NODE, 2, 3, 4}));
+    ASSERT_EQ(node_to_detector, (std::vector<node_offset_int>{0, 1, 3, 4, 5}));
+    ASSERT_EQ(result, stim::DetectorErrorModel(R"DEM(
+        error(0.125) D0 D1 ^ D2 L0
+        error(0.25) D1
+        error(0.25) L1
+        detector(0, 0, 0, 0) D0
+        detector(0, 0, 0, 1) D1
+        detector(1, 0, 0, 2) D2
+        detector(1, 0, 1, 2) D4
+        logical_observable L2
+    )DEM")) << result;
+}
@@ -14,21 +14,60 @@
 
 #include "chromobius/graph/drag_graph.h"
 
+#include <algorithm>
+#include <cstring>
 #include <optional>
 #include <set>
 #include <sstream>
 
+#include "chromobius/graph/flip_sources.h"
+
+#if defined(__linux__) || defined(__APPLE__)
+#include <sys/mman.h>
+#endif
+
 using namespace chromobius;
 
 /// Per-node state during a breadth first search,
 struct BfsSearcher {
     uint64_t next_seen_tag;
     std::vector<uint64_t> node_seen_tags;
+    /// The node each node was reached from, during the current search.
+    std::vector<node_offset_int> node_parents;
     std::vector<std::pair<node_offset_int, obsmask_int>> cur_cost_stack;
     std::vector<std::pair<node_offset_int, obsmask_int>> next_cost_stack;
+    /// When not null, the sources of the charge graph's edges. Used to record the sources of found paths.
+    const FlipSources *sources;
+    /// The atomic errors making up the observable flip of the last found path (when sources isn't null).
+    std::vector<AtomicErrorKey> path_sources;
 
     BfsSearcher() = delete;
-    BfsSearcher(size_t num_nodes) : next_seen_tag(1), node_seen_tags(num_nodes), cur_cost_stack(), next_cost_stack() {
+    BfsSearcher(size_t num_nodes, const FlipSources *sources)
+        : next_seen_tag(1),
+          node_seen_tags(num_nodes),
+          node_parents(num_nodes),
+          cur_cost_stack(),
+          next_cost_stack(),
+          sources(sources),
+          path_sources() {
+    }
+
+    void append_edge_sources(node_offset_int n1, node_offset_int n2) {
+        const auto &edge_sources = sources->charge_graph_edges.at(SortedPair{n1, n2});
+        path_sources.insert(path_sources.end(), edge_sources.begin(), edge_sources.end());
+    }
+
+    /// Records the sources of the path that reached dst from n.
+    void record_path_sources(node_offset_int src, node_offset_int n, node_offset_int dst) {
+        if (sources == nullptr) {
+            return;
+        }
+        path_sources.clear();
+        append_edge_sources(n, dst);
+        while (n != src) {
+            append_edge_sources(n, node_parents[n]);
+            n = node_parents[n];
+        }
     }
 
     /// Searches for a short path between node1 and node2 within the charge graph.
@@ -57,11 +96,13 @@ struct BfsSearcher {
 
         // Trivial case: same node.
         if (src == dst) {
+            path_sources.clear();
             return 0;
         }
 
         // Trivial case: neighbor.
         if (graph.nodes[src].neighbors.contains(dst)) {
+            record_path_sources(src, src, dst);
             return graph.nodes[src].neighbors.at(dst);
         }
 
@@ -87,6 +128,7 @@ struct BfsSearcher {
             for (const auto [neighbor, edge_obs_flip] : graph.nodes[n].neighbors) {
                 obsmask_int new_path_flip = path_obs_flip ^ edge_obs_flip;
                 if (neighbor == dst) {
+                    record_path_sources(src, n, dst);
                     return new_path_flip;
                 }
                 if (neighbor == BOUNDARY_NODE) {
@@ -98,6 +140,7 @@ struct BfsSearcher {
                     continue;
                 }
                 node_seen_tags[neighbor] = tag;
+                node_parents[neighbor] = n;
                 next_cost_stack.push_back({neighbor, new_path_flip});
             }
         }
@@ -108,20 +151,49 @@ DragGraph DragGraph::from_charge_graph_paths_for_sub_edges_of_atomic_errors(
     const ChargeGraph &charge_graph,
     const std::map<AtomicErrorKey, obsmask_int> &atomic_errors,
     std::span<const RgbEdge> rgb_reps,
-    std::span<const ColorBasis> node_colors) {
+    std::span<const ColorBasis> node_colors,
+    std::span<const float> rgb_rep_weights,
+    FlipSources *sources) {
 
     constexpr size_t max_cost = 2;
 
     std::set<SortedPair> decomposed_edges;
-    BfsSearcher searcher(node_colors.size());
+    BfsSearcher searcher(node_colors.size(), sources);
     DragGraph drag_graph;
 
-    auto add_edge = [&](node_offset_int n1, node_offset_int n2, Charge c1, Charge c2, obsmask_int flip) {
-        drag_graph.mmm[ChargedEdge{.n1=n1, .n2=n2, .c1=c1, .c2=c2}] = flip;
-        drag_graph.mmm[ChargedEdge{.n1=n2, .n2=n1, .c1=c2, .c2=c1}] = flip;
+    // When recording sources, the atomic errors making up the observable flip of the next added edge.
+    std::vector<AtomicErrorKey> flip_sources;
+    auto set_flip_sources = [&](std::initializer_list<std::span<const AtomicErrorKey>> parts) {
+        if (sources != nullptr) {
+            flip_sources.clear();
+            for (auto part : parts) {
+                flip_sources.insert(flip_sources.end(), part.begin(), part.end());
+            }
+        }
+    };
+
+    auto rep_weight = [&](node_offset_int n) -> float {
+        return rgb_rep_weights.empty() ? 0 : rgb_rep_weights[n];
+    };
+    auto add_edge = [&](node_offset_int n1, node_offset_int n2, Charge c1, Charge c2, obsmask_int flip,
+                        float lifting_weight = 0) {
+        for (auto e : {ChargedEdge{.n1=n1, .n2=n2, .c1=c1, .c2=c2}, ChargedEdge{.n1=n2, .n2=n1, .c1=c2, .c2=c1}}) {
+            drag_graph.mmm[e] = flip;
+            if (sources != nullptr) {
+                sources->drag_graph[e] = flip_sources;
+            }
+            if (lifting_weight != 0) {
+                drag_graph.lifting_weights[e] = lifting_weight;
+            } else {
+                drag_graph.lifting_weights.erase(e);
+            }
+        }
     };
 
-    auto add_boundary_dumping_edge = [&](node_offset_int a, node_offset_int b, obsmask_int ab_obs_flip) {
+    auto add_boundary_dumping_edge = [&](node_offset_int a,
+                                         node_offset_int b,
+                                         const AtomicErrorKey &ab_err,
+                                         obsmask_int ab_obs_flip) {
         if (rgb_reps[a].weight() != 3) {
             return;
         }
@@ -132,9 +204,13 @@ DragGraph DragGraph::from_charge_graph_paths_for_sub_edges_of_atomic_errors(
             return;
         }
         auto r1_flip = searcher.find_shortest_path_obs_flip(charge_graph, rgb_reps[a].color_node(ca), a, max_cost);
+        std::vector<AtomicErrorKey> r1_sources = searcher.path_sources;
         auto r2_flip = searcher.find_shortest_path_obs_flip(charge_graph, rgb_reps[a].color_node(cb), b, max_cost);
         if (r1_flip.has_value() && r2_flip.has_value()) {
-            add_edge(a, b, c, Charge::NEUTRAL, *r1_flip ^ *r2_flip ^ rgb_reps[a].obs_flip ^ ab_obs_flip);
+            if (sources != nullptr) {
+                set_flip_sources({r1_sources, searcher.path_sources, sources->rgb_reps[a], {&ab_err, 1}});
+            }
+            add_edge(a, b, c, Charge::NEUTRAL, *r1_flip ^ *r2_flip ^ rgb_reps[a].obs_flip ^ ab_obs_flip, rep_weight(a));
         }
     };
 
@@ -153,18 +229,24 @@ DragGraph DragGraph::from_charge_graph_paths_for_sub_edges_of_atomic_errors(
             Charge cb = node_colors[b].color;
             obsmask_int p = charge_graph.nodes[a].neighbors.at(b);
             // The boundary error turns charge on one node into charge on the other node.
+            if (sources != nullptr) {
+                set_flip_sources({sources->charge_graph_edges.at(SortedPair{a, b})});
+            }
             add_edge(a, b, ca, cb, p);
+            set_flip_sources({});
             add_edge(a, b, Charge::NEUTRAL, Charge::NEUTRAL, 0);
             // The boundary error can also be used to dump the other type of charge, if it's nearby.
-            add_boundary_dumping_edge(a, b, err_obs_flip);
-            add_boundary_dumping_edge(b, a, err_obs_flip);
+            add_boundary_dumping_edge(a, b, err, err_obs_flip);
+            add_boundary_dumping_edge(b, a, err, err_obs_flip);
             decomposed_edges.insert(SortedPair{a, b});
         } else if (w == 1) {
             auto n = err.dets[0];
             Charge c = node_colors[n].color;
 
             // Applying the corner error dumps (or restores) the node's charge.
+            set_flip_sources({{&err, 1}});
             add_edge(n, n, c, Charge::NEUTRAL, err_obs_flip);
+            set_flip_sources({});
             add_edge(n, n, Charge::NEUTRAL, Charge::NEUTRAL, 0);
 
             // The corner error, plus the node's rep error, will flip between the other two nearby charges.
@@ -173,7 +255,10 @@ DragGraph DragGraph::from_charge_graph_paths_for_sub_edges_of_atomic_errors(
                 auto f = r.obs_flip ^ err_obs_flip;
                 Charge c1 = next_non_neutral_charge(c);
                 Charge c2 = next_non_neutral_charge(c1);
-                add_edge(n, n, c1, c2, f);
+                if (sources != nullptr) {
+                    set_flip_sources({sources->rgb_reps[n], {&err, 1}});
+                }
+                add_edge(n, n, c1, c2, f, rep_weight(n));
             }
         }
     }
@@ -191,19 +276,115 @@ DragGraph DragGraph::from_charge_graph_paths_for_sub_edges_of_atomic_errors(
                 // Solve for how to drag charge type c from near n1 to near n2.
                 auto res = searcher.find_shortest_path_obs_flip(charge_graph, r1, r2, max_cost);
                 if (res.has_value()) {
+                    set_flip_sources({searcher.path_sources});
                     add_edge(n1, n2, c, c, *res);
                 }
             }
         }
         // Can drag neutral charge around by doing nothing.
+        set_flip_sources({});
         add_edge(n1, n2, Charge::NEUTRAL, Charge::NEUTRAL, 0);
     }
 
     return drag_graph;
 }
 
+/// Copies data onto freshly mapped pages, and then makes the pages read-only.
+static std::shared_ptr<const void> copy_into_read_only_pages(const void *data, size_t num_bytes) {
+#if defined(__linux__) || defined(__APPLE__)
+    // Mapping at least one byte keeps the result non-null for empty data.
+    size_t mapped_bytes = std::max(num_bytes, (size_t)1);
+    void *pages = mmap(nullptr, mapped_bytes, PROT_READ | PROT_WRITE, MAP_PRIVATE | MAP_ANONYMOUS, -1, 0);
+    if (pages == MAP_FAILED) {
+        throw std::bad_alloc();
+    }
+    memcpy(pages, data, num_bytes);
+    mprotect(pages, mapped_bytes, PROT_READ);
+    return std::shared_ptr<const void>(pages, [mapped_bytes](const void *p) {
+        munmap(const_cast<void *>(p), mapped_bytes);
+    });
+#else
+    std::shared_ptr<uint8_t[]> copy(new uint8_t[std::max(num_bytes, (size_t)1)]);
+    memcpy(copy.get(), data, num_bytes);
+    return std::shared_ptr<const void>(copy, copy.get());
+#endif
+}
+
+void DragGraph::freeze() {
+    if (is_frozen()) {
+        return;
+    }
+    std::vector<DragGraphEntry> sorted = entries();
+    frozen_owner = copy_into_read_only_pages(sorted.data(), sorted.size() * sizeof(DragGraphEntry));
+    frozen_entries = {(const DragGraphEntry *)frozen_owner.get(), sorted.size()};
+    mmm = {};
+    lifting_weights = {};
+}
+
+bool DragGraph::is_frozen() const {
+    return frozen_owner != nullptr;
+}
+
+/// Returns the entry of a frozen drag graph for an edge, or nullptr if the edge isn't in the drag graph.
+static const DragGraphEntry *find_frozen_entry(std::span<const DragGraphEntry> entries, const ChargedEdge &edge) {
+    auto f = std::lower_bound(
+        entries.begin(), entries.end(), edge, [](const DragGraphEntry &e, const ChargedEdge &key) {
+            return e.edge < key;
+        });
+    return f == entries.end() || !(f->edge == edge) ? nullptr : &*f;
+}
+
+const obsmask_int *DragGraph::find(const ChargedEdge &edge) const {
+    if (!is_frozen()) {
+        auto f = mmm.find(edge);
+        return f == mmm.end() ? nullptr : &f->second;
+    }
+    const DragGraphEntry *e = find_frozen_entry(frozen_entries, edge);
+    return e == nullptr ? nullptr : &e->obs_flip;
+}
+
+const obsmask_int *DragGraph::find(const ChargedEdge &edge, float *lifting_weight_out) const {
+    if (!is_frozen()) {
+        const obsmask_int *result = find(edge);
+        // Only drags that change the type of charge apply rgb representative errors.
+        if (result != nullptr && edge.c1 != edge.c2 && !lifting_weights.empty()) {
+            auto w = lifting_weights.find(edge);
+            if (w != lifting_weights.end()) {
+                *lifting_weight_out += w->second;
+            }
+        }
+        return result;
+    }
+    const DragGraphEntry *e = find_frozen_entry(frozen_entries, edge);
+    if (e == nullptr) {
+        return nullptr;
+    }
+    *lifting_weight_out += e->lifting_weight;
+    return &e->obs_flip;
+}
+
+size_t DragGraph::size() const {
+    return is_frozen() ? frozen_entries.size() : mmm.size();
+}
+
+std::vector<DragGraphEntry> DragGraph::entries() const {
+    if (is_frozen()) {
+        return {frozen_entries.begin(), frozen_entries.end()};
+    }
+    std::vector<DragGraphEntry> result;
+    result.reserve(mmm.size());
+    for (const auto &[k, v] : mmm) {
+        auto w = lifting_weights.find(k);
+        result.push_back({k, w == lifting_weights.end() ? 0 : w->second, v});
+    }
+    return result;
+}
+
 bool DragGraph::operator==(const DragGraph &other) const {
-    return mmm == other.mmm;
+    if (!is_frozen() && !other.is_frozen()) {
+        return mmm == other.mmm && lifting_weights == other.lifting_weights;
+    }
+    return entries() == other.entries();
 }
 bool DragGraph::operator!=(const DragGraph &other) const {
     return !(*this == other);
@@ -215,8 +396,13 @@ std::string DragGraph::str() const {
 }
 std::ostream &chromobius::operator<<(std::ostream &out, const DragGraph &val) {
     out << "DragGraph{.mmm={\n";
-    for (const auto &[k, v] : val.mmm) {
-        out << "    " << k.c1 << "@" << k.n1 << ":" << k.c2 << "@" << k.n2 << " = " << v << "\n";
+    for (const auto &e : val.entries()) {
+        const auto &k = e.edge;
+        out << "    " << k.c1 << "@" << k.n1 << ":" << k.c2 << "@" << k.n2 << " = " << e.obs_flip;
+        if (e.lifting_weight != 0) {
+            out << " (lifting weight " << e.lifting_weight << ")";
+        }
+        out << "\n";
     }
     out << "}}";
     return out;
@@ -17,6 +17,8 @@
 #ifndef _CHROMOBIUS_DRAG_GRAPH_H
 #define _CHROMOBIUS_DRAG_GRAPH_H
 
+#include <memory>
+
 #include "chromobius/datatypes/color_basis.h"
 #include "chromobius/graph/charge_graph.h"
 
@@ -24,6 +26,7 @@ namespace chromobius {
 
 struct DragNode;
 struct DragChange;
+struct FlipSources;
 
 struct SortedPair {
     node_offset_int a;
@@ -63,6 +66,19 @@ struct ChargedEdge {
     }
 };
 
+/// An entry of a frozen drag graph.
+struct DragGraphEntry {
+    ChargedEdge edge;
+    /// The weight of the rgb representative error used by the drag (see
+    /// `DragGraph::lifting_weights`), or 0. Stored before obs_flip, where it
+    /// fits into the padding after edge.
+    float lifting_weight;
+    obsmask_int obs_flip;
+    inline bool operator==(const DragGraphEntry &other) const {
+        return edge == other.edge && lifting_weight == other.lifting_weight && obs_flip == other.obs_flip;
+    }
+};
+
 /// The drag graph stores information on how to drag charge from node to node.
 ///
 /// When dragging charge around, the charge is always kept near the current
@@ -76,12 +92,49 @@ struct ChargedEdge {
 /// being T itself).
 struct DragGraph {
     std::map<ChargedEdge, obsmask_int> mmm;
+    /// For drags that apply an rgb representative error (to convert between
+    /// charge colors, or to dump charge into the boundary), the weight of that
+    /// error. Only filled in when the drag graph is built with rgb rep weights.
+    /// Empty when the drag graph has been frozen.
+    std::map<ChargedEdge, float> lifting_weights;
+    /// When the drag graph has been frozen (see `freeze`), this holds its
+    /// entries sorted by edge and mmm is empty.
+    std::span<const DragGraphEntry> frozen_entries;
+    /// Owns the read-only memory holding frozen_entries. Shared by copies of
+    /// the drag graph. Null unless the drag graph has been frozen.
+    std::shared_ptr<const void> frozen_owner;
+
+    /// Moves the entries of mmm into a sorted array in read-only memory.
+    ///
+    /// The array is placed on pages of its own, which are never written after
+    /// freezing. Copies of the frozen drag graph (e.g. in cloned decoders)
+    /// share the array instead of copying it, and processes forked after
+    /// freezing keep sharing its pages instead of copying them on write.
+    void freeze();
+    bool is_frozen() const;
+    /// Returns the observable flip of an edge, or nullptr if the edge isn't in
+    /// the drag graph.
+    const obsmask_int *find(const ChargedEdge &edge) const;
+    /// Like `find`, but also adds the edge's lifting weight (if it has one) into
+    /// *lifting_weight_out when the edge is found.
+    const obsmask_int *find(const ChargedEdge &edge, float *lifting_weight_out) const;
+    size_t size() const;
+    /// Returns the entries of the drag graph, sorted by edge.
+    std::vector<DragGraphEntry> entries() const;
 
+    /// Solves for how to drag charge between nearby nodes.
+    ///
+    /// If sources isn't null, the atomic errors making up each entry's
+    /// observable flip are written into sources->drag_graph. This requires the
+    /// sources of the charge graph and rgb reps to have been recorded into
+    /// sources when they were built.
     static DragGraph from_charge_graph_paths_for_sub_edges_of_atomic_errors(
         const ChargeGraph &charge_graph,
         const std::map<AtomicErrorKey, obsmask_int> &atomic_errors,
         std::span<const RgbEdge> rgb_reps,
-        std::span<const ColorBasis> node_colors);
+        std::span<const ColorBasis> node_colors,
+        std::span<const float> rgb_rep_weights = {},
+        FlipSources *sources = nullptr);
 
     bool operator==(const DragGraph &other) const;
     bool operator!=(const DragGraph &other) const;
@@ -17,3 +17,56 @@
 #include "gtest/gtest.h"
 
 using namespace chromobius;
+
+TEST(drag_graph, freeze) {
+    DragGraph graph;
+    ChargedEdge e1{.n1 = 0, .n2 = 1, .c1 = Charge::R, .c2 = Charge::G};
+    ChargedEdge e2{.n1 = 1, .n2 = 0, .c1 = Charge::G, .c2 = Charge::R};
+    ChargedEdge e3{.n1 = 2, .n2 = 5, .c1 = Charge::B, .c2 = Charge::NEUTRAL};
+    graph.mmm[e3] = 5;
+    graph.mmm[e2] = 3;
+    graph.mmm[e1] = 3;
+    graph.lifting_weights[e1] = 1.5;
+    graph.lifting_weights[e2] = 1.5;
+    DragGraph original = graph;
+    ASSERT_FALSE(graph.is_frozen());
+    ASSERT_EQ(*graph.find(e3), 5);
+    float w = 0;
+    ASSERT_EQ(*graph.find(e1, &w), 3);
+    ASSERT_EQ(w, 1.5);
+
+    graph.freeze();
+    ASSERT_TRUE(graph.is_frozen());
+    ASSERT_TRUE(graph.mmm.empty());
+    ASSERT_TRUE(graph.lifting_weights.empty());
+    ASSERT_EQ(graph.size(), 3);
+    ASSERT_EQ(graph, original);
+    ASSERT_EQ(graph.str(), original.str());
+    ASSERT_EQ(
+        graph.entries(),
+        (std::vector<DragGraphEntry>{
+            {e1, 1.5, 3},
+            {e2, 1.5, 3},
+            {e3, 0, 5},
+        }));
+    ASSERT_EQ(*graph.find(e1), 3);
+    ASSERT_EQ(*graph.find(e3), 5);
+    w = 0;
+    ASSERT_EQ(*graph.find(e2, &w), 3);
+    ASSERT_EQ(*graph.find(e3, &w), 5);
+    ASSERT_EQ(w, 1.5);
+    ASSERT_EQ(graph.find(ChargedEdge{.n1 = 2, .n2 = 5, .c1 = Charge::B, .c2 = Charge::R}), nullptr);
+    ASSERT_EQ(graph.find(ChargedEdge{.n1 = 9, .n2 = 9, .c1 = Charge::R, .c2 = Charge::R}), nullptr);
+
+    DragGraph copy = graph;
+    ASSERT_EQ(copy.frozen_entries.data(), graph.frozen_entries.data());
+    copy.freeze();
+    ASSERT_EQ(copy.frozen_entries.data(), graph.frozen_entries.data());
+
+    DragGraph empty;
+    empty.freeze();
+    ASSERT_TRUE(empty.is_frozen());
+    ASSERT_EQ(empty.size(), 0);
+    ASSERT_EQ(empty.find(e1), nullptr);
+    ASSERT_EQ(empty, DragGraph{});
+}
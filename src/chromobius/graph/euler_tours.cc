@@ -18,60 +18,92 @@
 
 using namespace chromobius;
 
-void EulerTourGraph::add_edge(node_offset_int a, node_offset_int b) {
-    uint16_t na = (uint16_t)nodes[a].neighbors.size();
-    uint16_t nb = (uint16_t)nodes[b].neighbors.size();
-    nodes[a].neighbors.push_back(EulerTourNeighbor{
-        .node = b,
-        .back_index = nb,
-    });
-    nodes[b].neighbors.push_back(EulerTourNeighbor{
-        .node = a,
-        .back_index = na,
-    });
-}
+void EulerTourGraph::set_edges(
+    std::span<const int64_t> interleaved_edge_list, std::span<const uint64_t> interleaved_edge_list_2) {
+    // Discard anything left behind by a previous use that was interrupted by an exception.
+    clear_touched_nodes();
 
-size_t EulerTourNode::look_next_neighbor() {
-    while (true) {
-        if (next_neighbor >= neighbors.size()) {
-            return SIZE_MAX;
+    // Count the degree of each node (in neighbors_end), noting which nodes are involved.
+    auto count = [&](node_offset_int n) {
+        auto &node = nodes[n];
+        if (node.neighbors_end == 0) {
+            touched_nodes.push_back(n);
         }
-        if (neighbors[next_neighbor].node == BOUNDARY_NODE) {
-            next_neighbor++;
-            continue;
-        }
-        return next_neighbor;
+        node.neighbors_end++;
+    };
+    for (int64_t n : interleaved_edge_list) {
+        assert(n != -1);
+        count((node_offset_int)n);
+    }
+    for (uint64_t n : interleaved_edge_list_2) {
+        count((node_offset_int)n);
+    }
+
+    // Give each node a contiguous range of the arena, leaving neighbors_end at the start of the range for filling.
+    uint32_t offset = 0;
+    for (node_offset_int n : touched_nodes) {
+        auto &node = nodes[n];
+        uint32_t degree = node.neighbors_end;
+        node.neighbors_begin = offset;
+        node.neighbors_end = offset;
+        node.next_neighbor = offset;
+        offset += degree;
+    }
+    neighbors.resize(offset);
+
+    // Fill in the neighbors, linking each entry to the entry going back the other way.
+    auto place = [&](node_offset_int a, node_offset_int b) {
+        uint32_t ka = nodes[a].neighbors_end++;
+        uint32_t kb = nodes[b].neighbors_end++;
+        neighbors[ka] = EulerTourNeighbor{.node = b, .back_index = kb};
+        neighbors[kb] = EulerTourNeighbor{.node = a, .back_index = ka};
+    };
+    for (size_t k = 0; k < interleaved_edge_list.size(); k += 2) {
+        place((node_offset_int)interleaved_edge_list[k], (node_offset_int)interleaved_edge_list[k + 1]);
+    }
+    for (size_t k = 0; k < interleaved_edge_list_2.size(); k += 2) {
+        place((node_offset_int)interleaved_edge_list_2[k], (node_offset_int)interleaved_edge_list_2[k + 1]);
     }
 }
-std::ostream &chromobius::operator<<(std::ostream &out, const EulerTourNode &val) {
-    out << "EulerTourNode{.next_neighbor=" << val.next_neighbor << ", .neighbors={";
-    for (auto &e : val.neighbors) {
-        out << e.node << ",";
+
+void EulerTourGraph::clear_touched_nodes() {
+    for (node_offset_int n : touched_nodes) {
+        nodes[n] = EulerTourNode{.neighbors_begin = 0, .neighbors_end = 0, .next_neighbor = 0};
     }
-    out << "}}";
+    touched_nodes.clear();
+    neighbors.clear();
+    cycle_buf.clear();
+    cycle_buf2.clear();
+}
+
+std::ostream &chromobius::operator<<(std::ostream &out, const EulerTourNode &val) {
+    out << "EulerTourNode{.neighbors_begin=" << val.neighbors_begin;
+    out << ", .neighbors_end=" << val.neighbors_end;
+    out << ", .next_neighbor=" << val.next_neighbor << "}";
     return out;
 }
 
 void EulerTourGraph::hard_reset() {
     for (auto &n : nodes) {
-        n.neighbors.clear();
-        n.next_neighbor = 0;
+        n = EulerTourNode{.neighbors_begin = 0, .neighbors_end = 0, .next_neighbor = 0};
     }
+    neighbors.clear();
+    touched_nodes.clear();
     cycle_buf.clear();
     cycle_buf2.clear();
 }
 
 void EulerTourGraph::extend_cycle_depth_first() {
     while (true) {
-        auto &n = nodes[cycle_buf.back()];
-        size_t neighbor_k = n.look_next_neighbor();
+        node_offset_int n = cycle_buf.back();
+        size_t neighbor_k = look_next_neighbor(n);
         if (neighbor_k == SIZE_MAX) {
             return;
         }
-        n.next_neighbor++;
-        auto &neighbor = n.neighbors[neighbor_k];
+        nodes[n].next_neighbor++;
+        const auto &neighbor = neighbors[neighbor_k];
         cycle_buf.push_back(neighbor.node);
-        nodes[neighbor.node].neighbors[neighbor.back_index].node = BOUNDARY_NODE;
+        neighbors[neighbor.back_index].node = BOUNDARY_NODE;
     }
 }
 
@@ -83,7 +115,7 @@ bool EulerTourGraph::rotate_cycle_to_end_with_unfinished_node() {
     cycle_buf.pop_back();
 
     size_t cycle_k = 1;
-    for (; cycle_k < cycle_buf.size() && nodes[cycle_buf[cycle_k]].look_next_neighbor() == SIZE_MAX; cycle_k++) {
+    for (; cycle_k < cycle_buf.size() && look_next_neighbor(cycle_buf[cycle_k]) == SIZE_MAX; cycle_k++) {
     }
     if (cycle_k < cycle_buf.size()) {
         cycle_buf2.insert(cycle_buf2.end(), cycle_buf.begin() + cycle_k, cycle_buf.end());
@@ -108,8 +140,13 @@ std::ostream &chromobius::operator<<(std::ostream &out, const EulerTourGraph &va
     out << "}\n";
     out << "    .nodes.size()=" << val.nodes.size() << "\n";
     for (size_t k = 0; k < val.nodes.size(); k++) {
-        if (!val.nodes[k].neighbors.empty()) {
-            out << "    .nodes[" << k << "]=" << val.nodes[k] << "\n";
+        const auto &node = val.nodes[k];
+        if (node.neighbors_end > node.neighbors_begin) {
+            out << "    .nodes[" << k << "]=" << node << " neighbors={";
+            for (size_t j = node.neighbors_begin; j < node.neighbors_end; j++) {
+                out << val.neighbors[j].node << ",";
+            }
+            out << "}\n";
         }
     }
     out << "}";
@@ -33,19 +33,19 @@ struct EulerTourGraph;
 
 struct EulerTourNeighbor {
     node_offset_int node;
-    uint16_t back_index;
+    /// The index (into the graph's neighbor arena) of the entry going back the other way.
+    uint32_t back_index;
 };
 
 struct EulerTourNode {
-    /// The list of neighbors of this node.
+    /// The neighbors of this node are the entries [neighbors_begin, neighbors_end) of the graph's neighbor arena.
     /// Entries with .node set to BOUNDARY_NODE are voided and should be ignored.
-    std::vector<EulerTourNeighbor> neighbors;
-    /// Tracks the neighbors that have been looked at.
-    size_t next_neighbor;
-
-    /// Advances `next_neighbor` to the next uncleared neighbor and returns it.
-    /// If `next_neighbor` is past the end of the list, returns SIZE_MAX.
-    size_t look_next_neighbor();
+    ///
+    /// Between uses, every node has neighbors_begin == neighbors_end == next_neighbor == 0.
+    uint32_t neighbors_begin;
+    uint32_t neighbors_end;
+    /// Tracks the neighbors that have been looked at (an index into the graph's neighbor arena).
+    uint32_t next_neighbor;
 };
 std::ostream &operator<<(std::ostream &out, const EulerTourNode &val);
 
@@ -53,13 +53,30 @@ struct EulerTourGraph;
 std::ostream &operator<<(std::ostream &out, const EulerTourGraph &val);
 struct EulerTourGraph {
     std::vector<EulerTourNode> nodes;
+    /// The neighbors of all the nodes, with each node's neighbors stored contiguously.
+    std::vector<EulerTourNeighbor> neighbors;
+    /// The nodes that have neighbors, in the order they were first seen.
+    std::vector<node_offset_int> touched_nodes;
     std::vector<node_offset_int> cycle_buf;
     std::vector<node_offset_int> cycle_buf2;
 
-    inline EulerTourGraph(size_t num_nodes) : nodes(num_nodes, {.neighbors = {}, .next_neighbor = 0}) {
+    inline EulerTourGraph(size_t num_nodes)
+        : nodes(num_nodes, {.neighbors_begin = 0, .neighbors_end = 0, .next_neighbor = 0}) {
     }
 
-    void add_edge(node_offset_int a, node_offset_int b);
+    /// Stores the edges into the neighbor arena.
+    ///
+    /// Each node's neighbors are placed with a counting sort over the edge endpoints, so building the graph doesn't
+    /// allocate per node. Each node lists its neighbors in the order their edges were given.
+    ///
+    /// Args:
+    ///     interleaved_edge_list: Edges stored as (interleaved_edge_list[2*k], interleaved_edge_list[2*k+1]).
+    ///     interleaved_edge_list_2: More edges, in the same format.
+    void set_edges(std::span<const int64_t> interleaved_edge_list, std::span<const uint64_t> interleaved_edge_list_2);
+
+    /// Removes the edges added by set_edges (and any partial cycle), in time proportional to the number of nodes that
+    /// had edges.
+    void clear_touched_nodes();
 
     // Deletes all edges and buffer contents.
     //
@@ -68,12 +85,24 @@ struct EulerTourGraph {
     void hard_reset();
 
    private:
+    /// Advances the node's `next_neighbor` to its next uncleared neighbor and returns it.
+    /// If it's past the end of the node's neighbors, returns SIZE_MAX.
+    inline size_t look_next_neighbor(node_offset_int n) {
+        auto &node = nodes[n];
+        while (node.next_neighbor < node.neighbors_end) {
+            if (neighbors[node.next_neighbor].node != BOUNDARY_NODE) {
+                return node.next_neighbor;
+            }
+            node.next_neighbor++;
+        }
+        return SIZE_MAX;
+    }
     void extend_cycle_depth_first();
     bool rotate_cycle_to_end_with_unfinished_node();
 
     template <typename CALLBACK>
     inline void burn_component_at(node_offset_int n, const CALLBACK &callback) {
-        if (nodes[n].look_next_neighbor() == SIZE_MAX) {
+        if (look_next_neighbor(n) == SIZE_MAX) {
             return;
         }
         cycle_buf.push_back(n);
@@ -91,24 +120,17 @@ struct EulerTourGraph {
         std::span<const int64_t> interleaved_edge_list,
         std::span<const uint64_t> mobius_dets,
         const CALLBACK &callback) {
-        const auto &ee = interleaved_edge_list;
-        assert(ee.size() % 2 == 0);
-        for (size_t k = 0; k < ee.size(); k += 2) {
-            assert(ee[k] != -1);
-            assert(ee[k + 1] != -1);
-            add_edge(ee[k], ee[k + 1]);
-        }
-        for (size_t k = 0; k < mobius_dets.size(); k += 2) {
-            add_edge(mobius_dets[k], mobius_dets[k + 1]);
+        assert(interleaved_edge_list.size() % 2 == 0);
+        set_edges(interleaved_edge_list, mobius_dets);
+        for (size_t k = 0; k < touched_nodes.size(); k++) {
+            burn_component_at(touched_nodes[k], callback);
         }
-        for (auto n : interleaved_edge_list) {
-            burn_component_at(n, callback);
-        }
-        for (auto n : interleaved_edge_list) {
-            assert(nodes[n].next_neighbor == nodes[n].neighbors.size());
-            nodes[n].next_neighbor = 0;
-            nodes[n].neighbors.clear();
+#ifndef NDEBUG
+        for (node_offset_int n : touched_nodes) {
+            assert(nodes[n].next_neighbor == nodes[n].neighbors_end);
         }
+#endif
+        clear_touched_nodes();
     }
 };
 
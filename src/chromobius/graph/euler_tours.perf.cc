@@ -55,3 +55,61 @@ BENCHMARK(solve_euler_tours_n10000) {
         std::cerr << "data dependence";
     }
 }
+
+BENCHMARK(solve_euler_tours_n1000000_large_shot) {
+    std::mt19937_64 rng{0};
+    std::vector<int64_t> edges;
+    for (size_t k = 0; k < 100000; k++) {
+        node_offset_int a;
+        node_offset_int b;
+        node_offset_int c;
+        do {
+            a = rng() % 999999 + 1;
+            b = rng() % 999999 + 1;
+            c = rng() % 999999 + 1;
+        } while (a == b || b == c || a == c);
+        edges.push_back(a);
+        edges.push_back(b);
+        edges.push_back(b);
+        edges.push_back(c);
+        edges.push_back(a);
+        edges.push_back(c);
+    }
+    std::shuffle(edges.begin(), edges.end(), rng);
+    EulerTourGraph g(1000000);
+
+    size_t n = 0;
+    benchmark_go([&]() {
+        g.iter_euler_tours_of_interleaved_edge_list(edges, {}, [&](std::span<const node_offset_int> cycle) {
+            n += cycle.size();
+        });
+    })
+        .goal_millis(50)
+        .show_rate("edges", edges.size());
+    if (n == 1) {
+        std::cerr << "data dependence";
+    }
+}
+
+BENCHMARK(solve_euler_tours_high_degree_hub) {
+    // Many small cycles passing through one shared node.
+    std::vector<int64_t> edges;
+    for (int64_t k = 0; k < 50000; k++) {
+        int64_t a = 2 * k + 1;
+        int64_t b = 2 * k + 2;
+        edges.insert(edges.end(), {0, a, a, b, b, 0});
+    }
+    EulerTourGraph g(100001);
+
+    size_t n = 0;
+    benchmark_go([&]() {
+        g.iter_euler_tours_of_interleaved_edge_list(edges, {}, [&](std::span<const node_offset_int> cycle) {
+            n += cycle.size();
+        });
+    })
+        .goal_millis(5)
+        .show_rate("edges", edges.size());
+    if (n == 1) {
+        std::cerr << "data dependence";
+    }
+}
@@ -100,3 +100,45 @@ TEST(euler_tours, euler_tours_of_edge_list) {
             {3, 2, 5, 2, 1, 2, 3, 4},
         }));
 }
+
+TEST(euler_tours, high_degree_node) {
+    // Triangles sharing node 0, giving node 0 more neighbors than fit in 16 bits.
+    size_t num_triangles = 40000;
+    EulerTourGraph g(num_triangles * 2 + 1);
+    std::vector<int64_t> interleaved_edges;
+    for (size_t k = 0; k < num_triangles; k++) {
+        int64_t a = 2 * k + 1;
+        int64_t b = 2 * k + 2;
+        interleaved_edges.insert(interleaved_edges.end(), {0, a, a, b, b, 0});
+    }
+
+    size_t num_cycles = 0;
+    size_t total_length = 0;
+    g.iter_euler_tours_of_interleaved_edge_list(interleaved_edges, {}, [&](std::span<const node_offset_int> cycle) {
+        num_cycles++;
+        total_length += cycle.size();
+    });
+    ASSERT_EQ(num_cycles, 1);
+    ASSERT_EQ(total_length, num_triangles * 3);
+    ASSERT_TRUE(g.touched_nodes.empty());
+    ASSERT_TRUE(g.neighbors.empty());
+}
+
+TEST(euler_tours, recovers_after_exception_in_callback) {
+    EulerTourGraph g(10);
+    std::vector<int64_t> edges{1, 2, 2, 1, 4, 5, 5, 4};
+    ASSERT_THROW(
+        {
+            g.iter_euler_tours_of_interleaved_edge_list(edges, {}, [&](std::span<const node_offset_int> cycle) {
+                throw std::invalid_argument("test");
+            });
+        },
+        std::invalid_argument);
+
+    std::vector<std::vector<node_offset_int>> result;
+    std::vector<int64_t> edges2{3, 4, 4, 3};
+    g.iter_euler_tours_of_interleaved_edge_list(edges2, {}, [&](std::span<const node_offset_int> cycle) {
+        result.push_back({cycle.begin(), cycle.end()});
+    });
+    ASSERT_EQ(result, (std::vector<std::vector<node_offset_int>>{{3, 4}}));
+}
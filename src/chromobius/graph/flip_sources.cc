@@ -0,0 +1,63 @@
+/*
+ * Copyright 2023 Google LLC
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+
+#include "chromobius/graph/flip_sources.h"
+
+using namespace chromobius;
+
+obsmask_int chromobius::xor_of_obs_flips(
+    std::span<const AtomicErrorKey> errors, const std::map<AtomicErrorKey, obsmask_int> &atomic_errors) {
+    obsmask_int result = 0;
+    for (const auto &e : errors) {
+        result ^= atomic_errors.at(e);
+    }
+    return result;
+}
+
+void FlipSources::add_relabelled_remnants(
+    std::span<const obsmask_int> error_obs_flips, std::map<AtomicErrorKey, obsmask_int> *atomic_errors) const {
+    // Replay the remnants in the order they were found, so that a remnant overwritten by a later one is still seen
+    // with its old flip by the errors decomposed in between (as happened while decomposing).
+    std::map<AtomicErrorKey, obsmask_int> relabelled;
+    for (const auto &r : remnants) {
+        obsmask_int obs_flip = error_obs_flips[r.error_index];
+        for (const auto &e : r.earlier_atoms) {
+            auto f = atomic_errors->find(e);
+            obs_flip ^= f != atomic_errors->end() ? f->second : relabelled.at(e);
+        }
+        relabelled[r.remnant] = obs_flip;
+    }
+    for (const auto &e : relabelled) {
+        atomic_errors->emplace(e);
+    }
+}
+
+std::vector<RgbEdge> FlipSources::relabelled_rgb_reps(
+    std::span<const RgbEdge> rgb_reps, const std::map<AtomicErrorKey, obsmask_int> &atomic_errors) const {
+    std::vector<RgbEdge> result(rgb_reps.begin(), rgb_reps.end());
+    for (size_t n = 0; n < result.size(); n++) {
+        result[n].obs_flip = xor_of_obs_flips(this->rgb_reps[n], atomic_errors);
+    }
+    return result;
+}
+
+DragGraph FlipSources::relabelled_drag_graph(const std::map<AtomicErrorKey, obsmask_int> &atomic_errors) const {
+    DragGraph result;
+    for (const auto &[edge, sources] : drag_graph) {
+        result.mmm.emplace_hint(result.mmm.end(), edge, xor_of_obs_flips(sources, atomic_errors));
+    }
+    return result;
+}
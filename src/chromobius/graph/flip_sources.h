@@ -0,0 +1,89 @@
+/*
+ * Copyright 2023 Google LLC
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+
+#ifndef _CHROMOBIUS_FLIP_SOURCES_H
+#define _CHROMOBIUS_FLIP_SOURCES_H
+
+#include <map>
+#include <span>
+#include <vector>
+
+#include "chromobius/datatypes/atomic_error.h"
+#include "chromobius/datatypes/rgb_edge.h"
+#include "chromobius/graph/drag_graph.h"
+
+namespace chromobius {
+
+/// Describes how the observable flip of a remnant error was computed, when it
+/// was split out of an error that couldn't be fully decomposed.
+struct RemnantSource {
+    AtomicErrorKey remnant;
+    /// The index of the error the remnant was split out of, counting the
+    /// flattened error instructions of the dem.
+    size_t error_index;
+    /// The atomic errors (or remnants) split out of the error before the
+    /// remnant. The remnant's observable flip is the error's observable flip
+    /// xored with theirs.
+    std::vector<AtomicErrorKey> earlier_atoms;
+};
+
+/// Records which atomic errors the observable flips computed while configuring
+/// a decoder are made of.
+///
+/// None of the decisions made while configuring a decoder depend on which
+/// observables errors flip, so every computed observable flip is the xor of the
+/// observable flips of some atomic errors. Recording which ones allows the
+/// configuration to be relabelled with other observables (e.g. observables past
+/// the first 64) by xoring their flips, instead of configuring again.
+struct FlipSources {
+    /// The remnant errors found while decomposing errors, in the order they
+    /// were found.
+    std::vector<RemnantSource> remnants;
+    /// The atomic errors making up the observable flip of each node's rgb
+    /// representative.
+    std::vector<std::vector<AtomicErrorKey>> rgb_reps;
+    /// The atomic errors making up the observable flip of each charge graph
+    /// edge.
+    std::map<SortedPair, std::vector<AtomicErrorKey>> charge_graph_edges;
+    /// The atomic errors making up the observable flip of each drag graph
+    /// entry.
+    std::map<ChargedEdge, std::vector<AtomicErrorKey>> drag_graph;
+
+    /// Adds relabelled remnant errors into relabelled atomic errors.
+    ///
+    /// Args:
+    ///     error_obs_flips: The relabelled observable flip of each error of the
+    ///         dem, indexed like RemnantSource::error_index.
+    ///     atomic_errors: The relabelled atomic errors (without remnants).
+    ///         Remnants that aren't already atomic errors are added into it.
+    void add_relabelled_remnants(
+        std::span<const obsmask_int> error_obs_flips, std::map<AtomicErrorKey, obsmask_int> *atomic_errors) const;
+    /// Returns rgb representatives with the same nodes as the recorded ones, and
+    /// observable flips relabelled using the given atomic errors.
+    std::vector<RgbEdge> relabelled_rgb_reps(
+        std::span<const RgbEdge> rgb_reps, const std::map<AtomicErrorKey, obsmask_int> &atomic_errors) const;
+    /// Returns a drag graph with the same entries as the recorded one, and
+    /// observable flips relabelled using the given atomic errors.
+    DragGraph relabelled_drag_graph(const std::map<AtomicErrorKey, obsmask_int> &atomic_errors) const;
+};
+
+/// Returns the xor of the observable flips of the given atomic errors.
+obsmask_int xor_of_obs_flips(
+    std::span<const AtomicErrorKey> errors, const std::map<AtomicErrorKey, obsmask_int> &atomic_errors);
+
+}  // namespace chromobius
+
+#endif
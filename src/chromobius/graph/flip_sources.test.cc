@@ -0,0 +1,127 @@
+// Copyright 2023 Google LLC
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "chromobius/graph/flip_sources.h"
+
+#include <random>
+
+#include "chromobius/datatypes/stim_integration.h"
+#include "chromobius/graph/choose_rgb_reps.h"
+#include "chromobius/graph/collect_composite_errors.h"
+#include "chromobius/graph/collect_nodes.h"
+#include "chromobius/test_util.test.h"
+#include "gtest/gtest.h"
+
+using namespace chromobius;
+
+/// Returns the dem, with each error flipping random observables instead of its own.
+static stim::DetectorErrorModel with_random_observables(const stim::DetectorErrorModel &dem, std::mt19937_64 &rng) {
+    stim::DetectorErrorModel result;
+    std::vector<stim::DemTarget> targets;
+    dem.iter_flatten_error_instructions([&](const stim::DemInstruction &instruction) {
+        targets.clear();
+        for (const auto &t : instruction.target_data) {
+            if (!t.is_observable_id()) {
+                targets.push_back(t);
+            }
+        }
+        uint64_t obs = rng();
+        for (size_t k = 0; k < 64; k++) {
+            if ((obs >> k) & 1) {
+                targets.push_back(stim::DemTarget::observable_id(k));
+            }
+        }
+        result.append_error_instruction(instruction.arg_data[0], targets, "");
+    });
+    return result;
+}
+
+/// Configures the lifting data of a dem, the same way the decoder does.
+static std::map<AtomicErrorKey, obsmask_int> configure(
+    const stim::DetectorErrorModel &dem,
+    std::span<const ColorBasis> node_colors,
+    std::vector<RgbEdge> *out_rgb_reps,
+    DragGraph *out_drag_graph,
+    FlipSources *out_sources) {
+    auto atomic_errors = collect_atomic_errors(dem, node_colors);
+    stim::DetectorErrorModel mobius_dem;
+    std::map<AtomicErrorKey, obsmask_int> remnants;
+    size_t num_pruned;
+    collect_composite_errors_and_remnants_into_mobius_dem(
+        dem,
+        node_colors,
+        atomic_errors,
+        false,
+        false,
+        INFINITY,
+        false,
+        &mobius_dem,
+        &remnants,
+        &num_pruned,
+        out_sources);
+    for (const auto &e : remnants) {
+        atomic_errors.emplace(e);
+    }
+    *out_rgb_reps = choose_rgb_reps_from_atomic_errors(atomic_errors, node_colors, out_sources);
+    auto charge_graph = ChargeGraph::from_atomic_errors(atomic_errors, node_colors.size(), out_sources);
+    *out_drag_graph = DragGraph::from_charge_graph_paths_for_sub_edges_of_atomic_errors(
+        charge_graph, atomic_errors, *out_rgb_reps, node_colors, {}, out_sources);
+    return atomic_errors;
+}
+
+TEST(flip_sources, relabelling_matches_configuring_again) {
+    for (const char *name : {
+             "midout_color_code_d5_r10_p1000.stim",
+             "phenom_color_code_d5_r5_p1000.stim",
+             "color2surface_d5_transit_p100.stim",
+         }) {
+        FILE *f = open_test_data_file(name);
+        stim::Circuit circuit = stim::Circuit::from_file(f);
+        fclose(f);
+        auto dem = stim::ErrorAnalyzer::circuit_to_detector_error_model(circuit, false, true, false, 0, false, false);
+        auto node_colors = collect_nodes_from_dem(dem, nullptr);
+        std::mt19937_64 rng{0};
+        auto dem1 = with_random_observables(dem, rng);
+        auto dem2 = with_random_observables(dem, rng);
+
+        FlipSources sources;
+        std::vector<RgbEdge> rgb_reps1;
+        DragGraph drag_graph1;
+        auto atomic_errors1 = configure(dem1, node_colors, &rgb_reps1, &drag_graph1, &sources);
+        ASSERT_EQ(sources.drag_graph.size(), drag_graph1.mmm.size()) << name;
+        ASSERT_EQ(sources.relabelled_rgb_reps(rgb_reps1, atomic_errors1), rgb_reps1) << name;
+        ASSERT_EQ(sources.relabelled_drag_graph(atomic_errors1).mmm, drag_graph1.mmm) << name;
+
+        std::vector<RgbEdge> rgb_reps2;
+        DragGraph drag_graph2;
+        auto atomic_errors2 = configure(dem2, node_colors, &rgb_reps2, &drag_graph2, nullptr);
+        ASSERT_NE(rgb_reps1, rgb_reps2) << name;
+
+        // Relabel the atomic errors the way the decoder does.
+        std::map<AtomicErrorKey, obsmask_int> relabelled;
+        std::vector<obsmask_int> error_obs_flips;
+        stim::SparseXorVec<node_offset_int> dets;
+        dem2.iter_flatten_error_instructions([&](const stim::DemInstruction &instruction) {
+            obsmask_int obs_flip;
+            extract_obs_and_dets_from_error_instruction(instruction, &dets, &obs_flip, node_colors);
+            extract_atomic_errors_from_dem_error_instruction_dets(
+                dets.sorted_items, obs_flip, node_colors, &relabelled);
+            error_obs_flips.push_back(obs_flip);
+        });
+        sources.add_relabelled_remnants(error_obs_flips, &relabelled);
+        ASSERT_EQ(relabelled, atomic_errors2) << name;
+        ASSERT_EQ(sources.relabelled_rgb_reps(rgb_reps1, relabelled), rgb_reps2) << name;
+        ASSERT_EQ(sources.relabelled_drag_graph(relabelled).mmm, drag_graph2.mmm) << name;
+    }
+}
@@ -0,0 +1,75 @@
+// Copyright 2023 Google LLC
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+
+#include "chromobius/graph/split_mobius_dem.h"
+
+using namespace chromobius;
+
+void chromobius::split_mobius_dem_by_basis(
+    const stim::DetectorErrorModel &mobius_dem,
+    std::span<const ColorBasis> node_colors,
+    std::vector<node_offset_int> *out_detector_to_local,
+    std::array<std::vector<node_offset_int>, 2> *out_local_to_detector,
+    std::array<stim::DetectorErrorModel, 2> *out_basis_mobius_dems) {
+    out_detector_to_local->clear();
+    for (auto &e : *out_local_to_detector) {
+        e.clear();
+    }
+    for (auto &e : *out_basis_mobius_dems) {
+        e.clear();
+    }
+
+    for (size_t d = 0; d < node_colors.size(); d++) {
+        auto &part = (*out_local_to_detector)[node_colors[d].basis == Basis::Z];
+        out_detector_to_local->push_back((node_offset_int)part.size());
+        part.push_back((node_offset_int)d);
+    }
+
+    std::array<std::vector<stim::DemTarget>, 2> targets;
+    mobius_dem.iter_flatten_error_instructions([&](const stim::DemInstruction &instruction) {
+        targets[0].clear();
+        targets[1].clear();
+        for (size_t k = 0; k + 1 < instruction.target_data.size(); k += 3) {
+            uint64_t m1 = instruction.target_data[k].raw_id();
+            uint64_t m2 = instruction.target_data[k + 1].raw_id();
+            bool b1 = node_colors[m1 >> 1].basis == Basis::Z;
+            bool b2 = node_colors[m2 >> 1].basis == Basis::Z;
+            if (b1 != b2) {
+                throw std::invalid_argument(
+                    "Can't split the mobius dem by basis, because an error connects detectors from different bases: " +
+                    instruction.str());
+            }
+            auto &t = targets[b1];
+            t.push_back(stim::DemTarget::relative_detector_id(((uint64_t)(*out_detector_to_local)[m1 >> 1] << 1) | (m1 & 1)));
+            t.push_back(stim::DemTarget::relative_detector_id(((uint64_t)(*out_detector_to_local)[m2 >> 1] << 1) | (m2 & 1)));
+            t.push_back(stim::DemTarget::separator());
+        }
+        for (size_t b = 0; b < 2; b++) {
+            if (!targets[b].empty()) {
+                targets[b].pop_back();
+                (*out_basis_mobius_dems)[b].append_error_instruction(instruction.arg_data[0], targets[b], "");
+            }
+        }
+    });
+
+    for (size_t b = 0; b < 2; b++) {
+        auto n = (*out_local_to_detector)[b].size() * 2;
+        auto &dem = (*out_basis_mobius_dems)[b];
+        if (n > 0 && dem.count_detectors() < n) {
+            // Ensure the number of detectors in the mobius dem is exactly correct.
+            dem.append_detector_instruction({}, stim::DemTarget::relative_detector_id(n - 1), "");
+        }
+    }
+}
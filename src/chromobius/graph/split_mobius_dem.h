@@ -0,0 +1,59 @@
+/*
+ * Copyright 2023 Google LLC
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+
+#ifndef _CHROMOBIUS_SPLIT_MOBIUS_DEM_H
+#define _CHROMOBIUS_SPLIT_MOBIUS_DEM_H
+
+#include <array>
+#include <span>
+
+#include "chromobius/datatypes/atomic_error.h"
+#include "chromobius/datatypes/color_basis.h"
+#include "stim.h"
+
+namespace chromobius {
+
+/// Splits a mobius dem into an X basis part and a Z basis part.
+///
+/// Each part only contains the mobius detectors of its basis, renumbered to be
+/// contiguous. A detector d of the original dem is the local detector
+/// out_detector_to_local[d] of the part with index (basis == Z), and its two
+/// mobius nodes d*2+0 and d*2+1 become local mobius nodes l*2+0 and l*2+1.
+/// Detectors without a known basis are put into the X part.
+///
+/// Args:
+///     mobius_dem: The mobius dem to split. Every error must be made up of
+///         pairs of mobius nodes from the same basis.
+///     node_colors: The color and basis of each detector of the original dem.
+///     out_detector_to_local: Overwritten with the local index of each detector
+///         of the original dem, within the part for its basis.
+///     out_local_to_detector: Overwritten with, for each part, the detector of
+///         the original dem corresponding to each local detector.
+///     out_basis_mobius_dems: Overwritten with the mobius dem of each part.
+///
+/// Raises:
+///     std::invalid_argument: An error in the mobius dem connects detectors
+///         from different bases.
+void split_mobius_dem_by_basis(
+    const stim::DetectorErrorModel &mobius_dem,
+    std::span<const ColorBasis> node_colors,
+    std::vector<node_offset_int> *out_detector_to_local,
+    std::array<std::vector<node_offset_int>, 2> *out_local_to_detector,
+    std::array<stim::DetectorErrorModel, 2> *out_basis_mobius_dems);
+
+}  // namespace chromobius
+
+#endif
@@ -0,0 +1,65 @@
+// Copyright 2023 Google LLC
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+
+#include "chromobius/graph/split_mobius_dem.h"
+
+#include "gtest/gtest.h"
+
+using namespace chromobius;
+
+TEST(split_mobius_dem, split_mobius_dem_by_basis) {
+    std::vector<ColorBasis> node_colors{
+        ColorBasis{Charge::R, Basis::X},
+        ColorBasis{Charge::R, Basis::Z},
+        ColorBasis{Charge::G, Basis::X},
+        ColorBasis{Charge::G, Basis::Z},
+    };
+    std::vector<node_offset_int> detector_to_local;
+    std::array<std::vector<node_offset_int>, 2> local_to_detector;
+    std::array<stim::DetectorErrorModel, 2> parts;
+    split_mobius_dem_by_basis(
+        stim::DetectorErrorModel(R"DEM(
+            error(0.125) D0 D4
+            error(0.25) D1 D5 ^ D3 D7
+            error(0.375) D2 D6
+        )DEM"),
+        node_colors,
+        &detector_to_local,
+        &local_to_detector,
+        &parts);
+
+    ASSERT_EQ(detector_to_local, (std::vector<node_offset_int>{0, 0, 1, 1}));
+    ASSERT_EQ(local_to_detector[0], (std::vector<node_offset_int>{0, 2}));
+    ASSERT_EQ(local_to_detector[1], (std::vector<node_offset_int>{1, 3}));
+    ASSERT_EQ(parts[0], stim::DetectorErrorModel(R"DEM(
+        error(0.125) D0 D2
+        error(0.25) D1 D3
+    )DEM"));
+    ASSERT_EQ(parts[1], stim::DetectorErrorModel(R"DEM(
+        error(0.25) D1 D3
+        error(0.375) D0 D2
+    )DEM"));
+
+    ASSERT_THROW(
+        {
+            split_mobius_dem_by_basis(
+                stim::DetectorErrorModel("error(0.1) D0 D2"),
+                node_colors,
+                &detector_to_local,
+                &local_to_detector,
+                &parts);
+        },
+        std::invalid_argument);
+}
@@ -12,111 +12,1050 @@
 // See the License for the specific language governing permissions and
 // limitations under the License.
 
+#include "chromobius/commands/main_all.h"
+#include "chromobius/commands/serve_protocol.h"
+#include "chromobius/datatypes/stim_integration.h"
+#include "chromobius/decode/collect_errors.h"
 #include "chromobius/decode/decoder.h"
+#include "chromobius/decode/decoder_pool.h"
+#include "chromobius/decode/match_trace.h"
+#include "chromobius/decode/sliding_window_decoder.h"
 #include "chromobius/pybind/sinter_compat.pybind.h"
 
+#include <mutex>
 #include <pybind11/iostream.h>
 #include <pybind11/numpy.h>
 #include <pybind11/operators.h>
 #include <pybind11/pybind11.h>
+#include <pybind11/stl.h>
 
 #define str_literal(s) #s
 #define xstr_literal(s) str_literal(s)
 
+static stim::Circuit circuit_from_python(const pybind11::object &circuit) {
+    auto type_name = pybind11::str(circuit.get_type());
+    if (!type_name.contains("stim.") || !type_name.contains(".Circuit")) {
+        throw std::invalid_argument("circuit must be a stim.Circuit.");
+    }
+    auto circuit_str = pybind11::cast<std::string>(pybind11::str(circuit));
+    return stim::Circuit(circuit_str.c_str());
+}
+
+static pybind11::dict collect_errors(
+    const pybind11::object &circuit_obj,
+    uint64_t shots,
+    const pybind11::object &max_errors,
+    size_t num_threads,
+    const pybind11::object &seed) {
+    stim::Circuit circuit = circuit_from_python(circuit_obj);
+    uint64_t max_errors_value = max_errors.is_none() ? UINT64_MAX : pybind11::cast<uint64_t>(max_errors);
+    uint64_t seed_value;
+    if (seed.is_none()) {
+        std::random_device rd;
+        seed_value = ((uint64_t)rd() << 32) ^ (uint64_t)rd();
+    } else {
+        seed_value = pybind11::cast<uint64_t>(seed);
+    }
+
+    chromobius::CollectedErrorStats stats;
+    {
+        pybind11::gil_scoped_release release;
+        auto dem = stim::ErrorAnalyzer::circuit_to_detector_error_model(circuit, false, true, false, 0, false, false);
+        auto decoder = chromobius::Decoder::from_dem(dem, chromobius::DecoderConfigOptions{});
+        stats = chromobius::collect_errors(circuit, decoder, shots, max_errors_value, num_threads, seed_value);
+    }
+
+    pybind11::dict result;
+    result["shots"] = stats.shots;
+    result["errors"] = stats.errors;
+    result["discards"] = 0;
+    result["seconds"] = stats.seconds;
+    return result;
+}
+
+template <typename T>
+static pybind11::array_t<T> vector_to_numpy(const std::vector<T> &values, const pybind11::tuple &shape) {
+    auto numpy = pybind11::module::import("numpy");
+    pybind11::array_t<T> result = numpy.attr("empty")(shape, pybind11::dtype::of<T>());
+    if (!values.empty()) {
+        memcpy(result.mutable_data(), values.data(), values.size() * sizeof(T));
+    }
+    return result;
+}
+
+template <typename T>
+static pybind11::array_t<T> vector_to_numpy(const std::vector<T> &values) {
+    return vector_to_numpy(values, pybind11::make_tuple(values.size()));
+}
+
+static pybind11::dict read_match_trace(const pybind11::object &path) {
+    auto path_str = pybind11::cast<std::string>(pybind11::str(path));
+    chromobius::MatchTrace trace;
+    {
+        pybind11::gil_scoped_release release;
+        FILE *f = fopen(path_str.c_str(), "rb");
+        if (f == nullptr) {
+            throw std::invalid_argument("Failed to open '" + path_str + "' for reading a match trace.");
+        }
+        try {
+            trace = chromobius::read_match_trace(f);
+        } catch (...) {
+            fclose(f);
+            throw;
+        }
+        fclose(f);
+    }
+
+    size_t num_records = trace.num_records();
+    pybind11::dict result;
+    result["num_detectors"] = trace.num_detectors;
+    result["num_observables"] = trace.num_observables;
+    result["shot"] = vector_to_numpy(trace.shots);
+    result["weight"] = vector_to_numpy(trace.weights);
+    result["status"] = vector_to_numpy(trace.statuses);
+    result["obs_flips"] =
+        vector_to_numpy(trace.obs_flips, pybind11::make_tuple(num_records, (trace.num_observables + 7) / 8));
+    result["dets"] = vector_to_numpy(trace.dets);
+    result["det_offsets"] = vector_to_numpy(trace.det_offsets);
+    result["edges"] = vector_to_numpy(trace.edges, pybind11::make_tuple(trace.edges.size() / 2, 2));
+    result["edge_offsets"] = vector_to_numpy(trace.edge_offsets);
+    result["cycle_nodes"] = vector_to_numpy(trace.cycle_nodes);
+    result["cycle_offsets"] = vector_to_numpy(trace.cycle_offsets);
+    result["cycle_obs_flips"] = vector_to_numpy(trace.cycle_obs_flips);
+    result["shot_cycle_offsets"] = vector_to_numpy(trace.shot_cycle_offsets);
+    return result;
+}
+
+/// Makes a numpy structured dtype from (name, format, offset) fields.
+static pybind11::object struct_dtype(
+    std::initializer_list<std::tuple<const char *, const char *, size_t>> fields, size_t itemsize) {
+    pybind11::list names;
+    pybind11::list formats;
+    pybind11::list offsets;
+    for (const auto &[name, format, offset] : fields) {
+        names.append(name);
+        formats.append(format);
+        offsets.append(offset);
+    }
+    pybind11::dict spec;
+    spec["names"] = names;
+    spec["formats"] = formats;
+    spec["offsets"] = offsets;
+    spec["itemsize"] = itemsize;
+    return pybind11::module::import("numpy").attr("dtype")(spec);
+}
+
+/// Returns a read-only numpy array viewing data owned by `owner` (which the array keeps alive).
+static pybind11::array read_only_view(
+    const pybind11::object &dtype, size_t length, size_t stride, const void *data, const pybind11::object &owner) {
+    pybind11::array result(
+        pybind11::cast<pybind11::dtype>(dtype),
+        std::vector<pybind11::ssize_t>{(pybind11::ssize_t)length},
+        std::vector<pybind11::ssize_t>{(pybind11::ssize_t)stride},
+        data,
+        owner);
+    result.attr("setflags")(pybind11::arg("write") = false);
+    return result;
+}
+
+template <typename T>
+static pybind11::array rows_to_numpy(const std::vector<T> &rows, const pybind11::object &dtype) {
+    pybind11::array result = pybind11::module::import("numpy").attr("empty")(rows.size(), dtype);
+    if (!rows.empty()) {
+        memcpy(result.mutable_data(), rows.data(), rows.size() * sizeof(T));
+    }
+    return result;
+}
+
+struct ChargeGraphEdgeRow {
+    chromobius::node_offset_int n1;
+    chromobius::node_offset_int n2;
+    chromobius::obsmask_int obs_flip;
+};
+
+struct DragGraphRow {
+    chromobius::node_offset_int n1;
+    chromobius::node_offset_int n2;
+    uint8_t c1;
+    uint8_t c2;
+    chromobius::obsmask_int obs_flip;
+};
+
+static pybind11::dict decoder_graph_arrays(const pybind11::object &owner, const chromobius::Decoder &decoder) {
+    auto numpy = pybind11::module::import("numpy");
+    size_t num_nodes = decoder.node_colors.size();
+    pybind11::dict result;
+
+    if (decoder.node_to_detector.empty()) {
+        result["node_detector"] = numpy.attr("arange")(num_nodes, pybind11::arg("dtype") = numpy.attr("uint32"));
+    } else {
+        result["node_detector"] = read_only_view(
+            numpy.attr("dtype")("uint32"),
+            num_nodes,
+            sizeof(chromobius::node_offset_int),
+            decoder.node_to_detector.data(),
+            owner);
+    }
+
+    std::vector<uint8_t> colors;
+    std::vector<uint8_t> bases;
+    colors.reserve(num_nodes);
+    bases.reserve(num_nodes);
+    for (const auto &cb : decoder.node_colors) {
+        colors.push_back((uint8_t)cb.color);
+        bases.push_back((uint8_t)cb.basis);
+    }
+    result["node_color"] = vector_to_numpy(colors);
+    result["node_basis"] = vector_to_numpy(bases);
+
+    result["rgb_reps"] = read_only_view(
+        struct_dtype(
+            {
+                {"red_node", "u4", offsetof(chromobius::RgbEdge, red_node)},
+                {"green_node", "u4", offsetof(chromobius::RgbEdge, green_node)},
+                {"blue_node", "u4", offsetof(chromobius::RgbEdge, blue_node)},
+                {"obs_flip", "u8", offsetof(chromobius::RgbEdge, obs_flip)},
+                {"charge_flip", "u1", offsetof(chromobius::RgbEdge, charge_flip)},
+            },
+            sizeof(chromobius::RgbEdge)),
+        decoder.rgb_reps.size(),
+        sizeof(chromobius::RgbEdge),
+        decoder.rgb_reps.data(),
+        owner);
+
+    // Each charge graph edge is stored at both of its nodes, so it's emitted from its smaller node.
+    std::vector<ChargeGraphEdgeRow> charge_edges;
+    for (size_t n = 0; n < decoder.charge_graph.nodes.size(); n++) {
+        size_t start = charge_edges.size();
+        for (const auto &[other, obs_flip] : decoder.charge_graph.nodes[n].neighbors) {
+            if (n < other) {
+                charge_edges.push_back({(chromobius::node_offset_int)n, other, obs_flip});
+            }
+        }
+        std::sort(charge_edges.begin() + start, charge_edges.end(), [](const auto &a, const auto &b) {
+            return a.n2 < b.n2;
+        });
+    }
+    result["charge_graph"] = rows_to_numpy(
+        charge_edges,
+        struct_dtype(
+            {
+                {"n1", "u4", offsetof(ChargeGraphEdgeRow, n1)},
+                {"n2", "u4", offsetof(ChargeGraphEdgeRow, n2)},
+                {"obs_flip", "u8", offsetof(ChargeGraphEdgeRow, obs_flip)},
+            },
+            sizeof(ChargeGraphEdgeRow)));
+
+    std::vector<DragGraphRow> drag_rows;
+    std::vector<chromobius::DragGraphEntry> drag_entries = decoder.drag_graph.entries();
+    drag_rows.reserve(drag_entries.size());
+    for (const auto &[key, lifting_weight, obs_flip] : drag_entries) {
+        drag_rows.push_back({key.n1, key.n2, (uint8_t)key.c1, (uint8_t)key.c2, obs_flip});
+    }
+    result["drag_graph"] = rows_to_numpy(
+        drag_rows,
+        struct_dtype(
+            {
+                {"n1", "u4", offsetof(DragGraphRow, n1)},
+                {"n2", "u4", offsetof(DragGraphRow, n2)},
+                {"c1", "u1", offsetof(DragGraphRow, c1)},
+                {"c2", "u1", offsetof(DragGraphRow, c2)},
+                {"obs_flip", "u8", offsetof(DragGraphRow, obs_flip)},
+            },
+            sizeof(DragGraphRow)));
+
+    return result;
+}
+
+static stim::DetectorErrorModel dem_from_python(const pybind11::object &dem) {
+    auto type_name = pybind11::str(dem.get_type());
+    if (!type_name.contains("stim.") || !type_name.contains(".DetectorErrorModel")) {
+        throw std::invalid_argument("dem must be a stim.DetectorErrorModel.");
+    }
+    auto dem_str = pybind11::cast<std::string>(pybind11::str(dem));
+    return stim::DetectorErrorModel(dem_str.c_str());
+}
+
+/// Converts the keyword arguments of compile_decoder_for_dem into decoder options.
+static chromobius::DecoderConfigOptions decoder_options_from_python(
+    bool split_bases,
+    bool decode_bases_concurrently,
+    const pybind11::object &max_detection_events,
+    const pybind11::object &shot_time_budget_seconds,
+    const pybind11::object &max_mobius_error_weight,
+    bool fold_pruned_mobius_errors,
+    bool slim,
+    bool compact,
+    bool include_lifting_weight,
+    size_t cluster_threads) {
+    return chromobius::DecoderConfigOptions{
+        .split_bases = split_bases,
+        .decode_bases_concurrently = decode_bases_concurrently,
+        .max_detection_events =
+            max_detection_events.is_none() ? SIZE_MAX : pybind11::cast<size_t>(max_detection_events),
+        .shot_time_budget_seconds =
+            shot_time_budget_seconds.is_none() ? INFINITY : pybind11::cast<double>(shot_time_budget_seconds),
+        .max_mobius_error_weight =
+            max_mobius_error_weight.is_none() ? INFINITY : pybind11::cast<double>(max_mobius_error_weight),
+        .fold_pruned_mobius_errors = fold_pruned_mobius_errors,
+        .slim = slim,
+        .compact = compact,
+        .include_lifting_weight = include_lifting_weight,
+        .cluster_threads = cluster_threads,
+    };
+}
+
+static pybind11::object profile_configuration(
+    const pybind11::object &dem,
+    bool split_bases,
+    bool decode_bases_concurrently,
+    const pybind11::object &max_detection_events,
+    const pybind11::object &shot_time_budget_seconds,
+    const pybind11::object &max_mobius_error_weight,
+    bool fold_pruned_mobius_errors,
+    bool slim,
+    bool compact,
+    bool include_lifting_weight,
+    size_t cluster_threads) {
+    stim::DetectorErrorModel converted_dem = dem_from_python(dem);
+    chromobius::ConfigurationProfile profile;
+    auto options = decoder_options_from_python(
+        split_bases,
+        decode_bases_concurrently,
+        max_detection_events,
+        shot_time_budget_seconds,
+        max_mobius_error_weight,
+        fold_pruned_mobius_errors,
+        slim,
+        compact,
+        include_lifting_weight,
+        cluster_threads);
+    options.profile = &profile;
+    {
+        pybind11::gil_scoped_release release;
+        chromobius::Decoder::from_dem(converted_dem, options);
+    }
+    return pybind11::module::import("json").attr("loads")(profile.to_json());
+}
+
+typedef pybind11::array_t<uint64_t, pybind11::array::c_style | pybind11::array::forcecast> index_array;
+
+static void pack_unpacked_shot(const uint8_t *unpacked, size_t stride, size_t num_bits, uint8_t *out) {
+    size_t num_bytes = (num_bits + 7) / 8;
+    memset(out, 0, num_bytes);
+    for (size_t k = 0; k < num_bits; k++) {
+        out[k >> 3] |= (uint8_t)(unpacked[k * stride] != 0) << (k & 7);
+    }
+}
+
+/// Detection event data validated (while holding the GIL) and ready to be decoded (without holding the GIL).
+struct DetsBatch {
+    pybind11::array dets;
+    pybind11::array_t<uint8_t> result_buf;
+    pybind11::array_t<float> weight_buf;
+    pybind11::array_t<uint8_t> status_buf;
+
+    const uint8_t *dets_ptr;
+    uint8_t *result_ptr;
+    float *weight_ptr;
+    uint8_t *status_ptr;
+    size_t num_shots;
+    size_t shot_stride;
+    size_t det_stride;
+    bool unpacked;
+};
+
+static void decode_dets_batch(
+    chromobius::Decoder &decoder, const DetsBatch &batch, size_t num_detectors, size_t num_observable_bytes) {
+    // Shots are handed to the decoder in chunks, so that its batch workspaces stay small.
+    constexpr size_t CHUNK_SIZE = 256;
+    size_t num_detector_bytes = (num_detectors + 7) / 8;
+    std::vector<uint8_t> packed_shots(batch.unpacked ? num_detector_bytes * CHUNK_SIZE : 0);
+    std::vector<chromobius::obsmask_int> predictions(CHUNK_SIZE);
+    std::vector<chromobius::DecodeStatus> statuses(CHUNK_SIZE);
+    uint8_t *result_ptr = batch.result_ptr;
+    for (size_t chunk_start = 0; chunk_start < batch.num_shots; chunk_start += CHUNK_SIZE) {
+        size_t chunk_size = std::min(CHUNK_SIZE, batch.num_shots - chunk_start);
+        const uint8_t *data = batch.dets_ptr + batch.shot_stride * chunk_start;
+        size_t stride = batch.shot_stride;
+        if (batch.unpacked) {
+            for (size_t shot = 0; shot < chunk_size; shot++) {
+                pack_unpacked_shot(
+                    data + batch.shot_stride * shot,
+                    batch.det_stride,
+                    num_detectors,
+                    packed_shots.data() + num_detector_bytes * shot);
+            }
+            data = packed_shots.data();
+            stride = num_detector_bytes;
+        }
+        if (!decoder.extra_observable_chunks.empty()) {
+            // Observables past the first 64 are predicted into the decoder's extra_obs_flips, one shot at a time.
+            for (size_t shot = 0; shot < chunk_size; shot++) {
+                const uint8_t *shot_data = data + stride * shot;
+                chromobius::obsmask_int prediction = decoder.decode_detection_events(
+                    {shot_data, shot_data + num_detector_bytes},
+                    batch.weight_ptr == nullptr ? nullptr : batch.weight_ptr + chunk_start + shot);
+                decoder.write_obs_flips_bit_packed(prediction, {result_ptr, num_observable_bytes});
+                result_ptr += num_observable_bytes;
+                if (batch.status_ptr != nullptr) {
+                    batch.status_ptr[chunk_start + shot] = (uint8_t)decoder.last_decode_status;
+                }
+            }
+            continue;
+        }
+        decoder.decode_detection_events_batch(
+            {data, data + stride * (chunk_size - 1) + num_detector_bytes},
+            stride,
+            {predictions.data(), chunk_size},
+            batch.weight_ptr == nullptr ? nullptr : batch.weight_ptr + chunk_start,
+            statuses.data());
+        for (size_t shot = 0; shot < chunk_size; shot++) {
+            for (size_t k = 0; k < num_observable_bytes; k++) {
+                *result_ptr++ = (predictions[shot] >> (8*k)) & 0xFF;
+            }
+            if (batch.status_ptr != nullptr) {
+                batch.status_ptr[chunk_start + shot] = (uint8_t)statuses[shot];
+            }
+        }
+    }
+}
+
+static void set_future_exception(const pybind11::object &future, std::exception_ptr failure) {
+    try {
+        std::rethrow_exception(failure);
+    } catch (const std::invalid_argument &ex) {
+        future.attr("set_exception")(pybind11::reinterpret_borrow<pybind11::object>(PyExc_ValueError)(ex.what()));
+    } catch (const std::exception &ex) {
+        future.attr("set_exception")(pybind11::reinterpret_borrow<pybind11::object>(PyExc_RuntimeError)(ex.what()));
+    } catch (...) {
+        future.attr("set_exception")(pybind11::reinterpret_borrow<pybind11::object>(PyExc_RuntimeError)("Decoding failed."));
+    }
+}
+
+/// Drops a python reference on the main thread, instead of on the calling worker pool thread.
+///
+/// If the reference is the last one to a CompiledDecoder, dropping it destroys the decoder's worker pool, which joins
+/// the pool's threads. That can't be done from one of those threads.
+static void release_on_main_thread(pybind11::object obj) {
+    auto *held = new pybind11::object(std::move(obj));
+    int failed = Py_AddPendingCall(
+        [](void *arg) -> int {
+            delete (pybind11::object *)arg;
+            return 0;
+        },
+        held);
+    if (failed) {
+        // Leaking the reference is better than destroying the pool from one of its own threads.
+        held->release();
+        delete held;
+    }
+}
+
+struct DecoderPoolDeleter {
+    void operator()(chromobius::DecoderPool *pool) const {
+        // Workers need the GIL to complete their futures, so it can't be held while waiting for them.
+        pybind11::gil_scoped_release release;
+        delete pool;
+    }
+};
+
 struct CompiledDecoder {
     chromobius::Decoder decoder;
     uint64_t num_detectors;
     uint64_t num_detector_bytes;
+    uint64_t num_observables;
     uint64_t num_observable_bytes;
+    /// Guards the decoder's workspace, since decoding happens without holding the GIL.
+    std::unique_ptr<std::mutex> decoder_mutex = std::make_unique<std::mutex>();
+    /// Worker threads used by predict_future and predict_async. Created when first needed.
+    std::unique_ptr<chromobius::DecoderPool, DecoderPoolDeleter> worker_pool;
 
-    static CompiledDecoder from_dem(const pybind11::object &dem) {
-        auto type_name = pybind11::str(dem.get_type());
-        if (!type_name.contains("stim.") || !type_name.contains(".DetectorErrorModel")) {
-            throw std::invalid_argument("dem must be a stim.DetectorErrorModel.");
-        }
-        auto dem_str = pybind11::cast<std::string>(pybind11::str(dem));
-        stim::DetectorErrorModel converted_dem = stim::DetectorErrorModel(dem_str.c_str());
-        auto decoder = chromobius::Decoder::from_dem(converted_dem, chromobius::DecoderConfigOptions{});
-        auto num_dets = converted_dem.count_detectors();
+    static CompiledDecoder from_dem(
+        const pybind11::object &dem,
+        bool split_bases = false,
+        bool decode_bases_concurrently = false,
+        const pybind11::object &max_detection_events = pybind11::none(),
+        const pybind11::object &shot_time_budget_seconds = pybind11::none(),
+        const pybind11::object &max_mobius_error_weight = pybind11::none(),
+        bool fold_pruned_mobius_errors = false,
+        bool slim = false,
+        bool compact = false,
+        bool include_lifting_weight = false,
+        size_t cluster_threads = 0) {
+        stim::DetectorErrorModel converted_dem = dem_from_python(dem);
+        auto decoder = chromobius::Decoder::from_dem(
+            converted_dem,
+            decoder_options_from_python(
+                split_bases,
+                decode_bases_concurrently,
+                max_detection_events,
+                shot_time_budget_seconds,
+                max_mobius_error_weight,
+                fold_pruned_mobius_errors,
+                slim,
+                compact,
+                include_lifting_weight,
+                cluster_threads));
+        return from_configured_decoder(std::move(decoder), converted_dem);
+    }
+
+    static CompiledDecoder from_circuit(
+        const pybind11::object &circuit,
+        bool split_bases = false,
+        bool decode_bases_concurrently = false,
+        const pybind11::object &max_detection_events = pybind11::none(),
+        const pybind11::object &shot_time_budget_seconds = pybind11::none(),
+        const pybind11::object &max_mobius_error_weight = pybind11::none(),
+        bool fold_pruned_mobius_errors = false,
+        bool slim = false,
+        bool compact = false,
+        bool include_lifting_weight = false,
+        size_t cluster_threads = 0) {
+        stim::Circuit converted_circuit = circuit_from_python(circuit);
+        auto options = decoder_options_from_python(
+            split_bases,
+            decode_bases_concurrently,
+            max_detection_events,
+            shot_time_budget_seconds,
+            max_mobius_error_weight,
+            fold_pruned_mobius_errors,
+            slim,
+            compact,
+            include_lifting_weight,
+            cluster_threads);
+        // The dem stays native, so it's never printed into text and parsed back like the ones given to from_dem.
+        pybind11::gil_scoped_release release;
+        stim::DetectorErrorModel dem = chromobius::circuit_to_decoding_dem(converted_circuit);
+        auto decoder = chromobius::Decoder::from_dem(dem, options);
+        return from_configured_decoder(std::move(decoder), dem);
+    }
+
+    static CompiledDecoder from_configured_decoder(chromobius::Decoder &&decoder, const stim::DetectorErrorModel &dem) {
+        auto num_dets = dem.count_detectors();
+        auto num_obs = dem.count_observables();
         return CompiledDecoder{
             .decoder = std::move(decoder),
             .num_detectors = num_dets,
             .num_detector_bytes = (num_dets + 7) / 8,
-            .num_observable_bytes = (converted_dem.count_observables() + 7) / 8,
+            .num_observables = num_obs,
+            .num_observable_bytes = (num_obs + 7) / 8,
         };
     }
 
-    pybind11::object predict_obs_flips_from_dets_bit_packed(const pybind11::object &dets_obj, bool include_weight) {
-        if (!pybind11::isinstance<pybind11::array_t<uint8_t>>(dets_obj)) {
-            throw std::invalid_argument("Expected bit packed detection event data, but dets.dtype wasn't np.uint8.");
+    DetsBatch prepare_dets_batch(
+        const pybind11::object &dets_obj, bool include_weight, bool include_status = false) const {
+        // Unpacked data is accepted, and bit packed one shot at a time while decoding.
+        DetsBatch batch;
+        batch.unpacked = pybind11::isinstance<pybind11::array_t<bool>>(dets_obj);
+        if (!batch.unpacked && !pybind11::isinstance<pybind11::array_t<uint8_t>>(dets_obj)) {
+            throw std::invalid_argument(
+                "Expected bit packed detection event data (dets.dtype == np.uint8) or unpacked detection event data "
+                "(dets.dtype == np.bool_), but dets.dtype was neither.");
         }
 
-        const pybind11::array_t<uint8_t> &dets = pybind11::cast<pybind11::array_t<uint8_t>>(dets_obj);
-        size_t num_shots;
-        size_t shot_stride;
+        batch.dets = pybind11::cast<pybind11::array>(dets_obj);
+        const pybind11::array &dets = batch.dets;
         size_t det_shape;
         auto numpy = pybind11::module::import("numpy");
-        pybind11::array_t<uint8_t> result_buf;
-        pybind11::array_t<float> weight_buf;
         if (dets.ndim() == 2) {
-            num_shots = dets.shape(0);
-            shot_stride = dets.strides(0);
+            batch.num_shots = dets.shape(0);
+            batch.shot_stride = dets.strides(0);
             det_shape = dets.shape(1);
-            result_buf = numpy.attr("empty")(pybind11::make_tuple(num_shots, num_observable_bytes), numpy.attr("uint8"));
+            batch.det_stride = dets.strides(1);
+            batch.result_buf = numpy.attr("empty")(pybind11::make_tuple(batch.num_shots, num_observable_bytes), numpy.attr("uint8"));
             if (include_weight) {
-                weight_buf = numpy.attr("empty")(pybind11::make_tuple(num_shots), numpy.attr("float32"));
+                batch.weight_buf = numpy.attr("empty")(pybind11::make_tuple(batch.num_shots), numpy.attr("float32"));
+            }
+            if (include_status) {
+                batch.status_buf = numpy.attr("empty")(pybind11::make_tuple(batch.num_shots), numpy.attr("uint8"));
             }
-            if (dets.strides(1) != 1) {
+            if (!batch.unpacked && dets.strides(1) != 1) {
                 std::stringstream ss;
                 ss << "Bit packed shot data must be contiguous in memory, but dets.stride[1] wasn't equal to 1.\n";
                 ss << "It was " << dets.strides(1) << ".";
                 throw std::invalid_argument(ss.str());
             }
         } else if (dets.ndim() == 1) {
-            num_shots = 1;
-            shot_stride = 0;
+            batch.num_shots = 1;
+            batch.shot_stride = 0;
             det_shape = dets.shape(0);
-            result_buf = numpy.attr("empty")(pybind11::make_tuple(num_observable_bytes), numpy.attr("uint8"));
+            batch.det_stride = dets.strides(0);
+            batch.result_buf = numpy.attr("empty")(pybind11::make_tuple(num_observable_bytes), numpy.attr("uint8"));
             if (include_weight) {
-                weight_buf = numpy.attr("empty")(pybind11::make_tuple(), numpy.attr("float32"));
+                batch.weight_buf = numpy.attr("empty")(pybind11::make_tuple(), numpy.attr("float32"));
+            }
+            if (include_status) {
+                batch.status_buf = numpy.attr("empty")(pybind11::make_tuple(), numpy.attr("uint8"));
             }
         } else {
             throw std::invalid_argument("dets.shape not in [1, 2]");
         }
 
-        if (det_shape != num_detector_bytes) {
+        if (batch.unpacked && det_shape != num_detectors) {
+            std::stringstream ss;
+            ss << "Expected dets.shape[-1]=" << det_shape;
+            ss << " == num_detectors=" << num_detectors;
+            ss << " because dets.dtype==np.bool_ indicating unpacked shots.";
+            throw std::invalid_argument(ss.str());
+        }
+        if (!batch.unpacked && det_shape != num_detector_bytes) {
             std::stringstream ss;
-            ss << "Expected dets.shape[1]=" << dets.shape(1);
+            ss << "Expected dets.shape[-1]=" << det_shape;
             ss << " == num_detector_bytes=" << num_detector_bytes;
-            ss << " because dets.shape == 2 and dets.dtype==np.uint8 indicating bit packed shots.";
+            ss << " because dets.dtype==np.uint8 indicating bit packed shots.";
             throw std::invalid_argument(ss.str());
         }
 
-        uint8_t *result_ptr = result_buf.mutable_data();
-        float *weight_ptr = nullptr;
-        if (include_weight) {
-            weight_ptr = weight_buf.mutable_data();
+        batch.dets_ptr = (const uint8_t *)dets.data();
+        batch.result_ptr = batch.result_buf.mutable_data();
+        batch.weight_ptr = include_weight ? batch.weight_buf.mutable_data() : nullptr;
+        batch.status_ptr = include_status ? batch.status_buf.mutable_data() : nullptr;
+        return batch;
+    }
+
+    pybind11::object predict_obs_flips_from_dets_bit_packed(
+        const pybind11::object &dets_obj, bool include_weight, bool include_status = false) {
+        DetsBatch batch = prepare_dets_batch(dets_obj, include_weight, include_status);
+        {
+            pybind11::gil_scoped_release release;
+            std::lock_guard<std::mutex> lock(*decoder_mutex);
+            decode_dets_batch(decoder, batch, num_detectors, num_observable_bytes);
+        }
+
+        if (include_status) {
+            return pybind11::make_tuple(batch.result_buf, batch.status_buf);
+        } else if (include_weight) {
+            return pybind11::make_tuple(batch.result_buf, batch.weight_buf);
+        } else {
+            return batch.result_buf;
+        }
+    }
+
+    chromobius::DecoderPool &ensure_worker_pool() {
+        if (worker_pool == nullptr) {
+            size_t num_threads = std::max(1u, std::thread::hardware_concurrency());
+            configure_worker_pool(num_threads, num_threads * 2);
+        }
+        return *worker_pool;
+    }
+
+    void configure_worker_pool(size_t num_threads, size_t max_queued_batches) {
+        if (num_threads == 0) {
+            throw std::invalid_argument("num_threads == 0");
+        }
+        if (max_queued_batches == 0) {
+            throw std::invalid_argument("max_queued_batches == 0");
+        }
+        // The old pool finishes its batches before the new pool is created.
+        worker_pool.reset();
+        worker_pool.reset(new chromobius::DecoderPool(decoder, num_threads, max_queued_batches));
+    }
+
+    void set_match_trace(std::shared_ptr<chromobius::MatchTraceWriter> trace) {
+        {
+            pybind11::gil_scoped_release release;
+            std::lock_guard<std::mutex> lock(*decoder_mutex);
+            decoder.match_trace = std::move(trace);
+        }
+        // The workers have their own copies of the decoder, so they're replaced by copies using the new trace.
+        if (worker_pool != nullptr) {
+            configure_worker_pool(worker_pool->num_threads(), worker_pool->max_queued_tasks());
+        }
+    }
+
+    void start_match_trace(const pybind11::object &path, uint64_t sample_every) {
+        set_match_trace(chromobius::MatchTraceWriter::open(
+            pybind11::cast<std::string>(pybind11::str(path)), num_detectors, num_observables, sample_every));
+    }
+
+    void stop_match_trace() {
+        set_match_trace(nullptr);
+    }
+
+    /// Makes a worker pool task that decodes a batch and completes a concurrent.futures.Future with the result.
+    chromobius::DecoderPool::Task make_predict_task(
+        std::shared_ptr<DetsBatch> batch, std::shared_ptr<pybind11::object> future) const {
+        return [batch, future, num_detectors = num_detectors, num_observable_bytes = num_observable_bytes](
+                   chromobius::Decoder &worker_decoder) {
+            // Python objects must only be touched while holding the GIL, so they are released explicitly.
+            auto release_python_objects = [&]() {
+                *future = pybind11::object();
+                batch->dets = pybind11::array();
+                batch->result_buf = pybind11::array_t<uint8_t>();
+                batch->weight_buf = pybind11::array_t<float>();
+                batch->status_buf = pybind11::array_t<uint8_t>();
+            };
+            {
+                pybind11::gil_scoped_acquire acquire;
+                if (!pybind11::cast<bool>(future->attr("set_running_or_notify_cancel")())) {
+                    release_python_objects();
+                    return;
+                }
+            }
+
+            std::exception_ptr failure;
+            try {
+                decode_dets_batch(worker_decoder, *batch, num_detectors, num_observable_bytes);
+            } catch (...) {
+                failure = std::current_exception();
+            }
+
+            pybind11::gil_scoped_acquire acquire;
+            try {
+                if (failure) {
+                    set_future_exception(*future, failure);
+                } else {
+                    future->attr("set_result")(batch->result_buf);
+                }
+            } catch (pybind11::error_already_set &ex) {
+                ex.discard_as_unraisable("chromobius.CompiledDecoder.predict_future");
+            }
+            release_python_objects();
+        };
+    }
+
+    pybind11::object predict_future(const pybind11::object &dets_obj) {
+        auto batch = std::make_shared<DetsBatch>(prepare_dets_batch(dets_obj, false));
+        auto future =
+            std::make_shared<pybind11::object>(pybind11::module::import("concurrent.futures").attr("Future")());
+        pybind11::object result = *future;
+        auto &pool = ensure_worker_pool();
+        chromobius::DecoderPool::Task task = make_predict_task(batch, future);
+        {
+            // Blocks while the queue is full, which is what provides back-pressure.
+            pybind11::gil_scoped_release release;
+            pool.submit(std::move(task));
+        }
+        return result;
+    }
+
+    /// Submits a predict_async task to the worker pool without blocking the event loop.
+    ///
+    /// When the pool's queue is full, the submission is retried on the event loop after a worker takes a task from
+    /// the queue. Batches whose future is cancelled while waiting are dropped. The python reference to the decoder
+    /// keeps the decoder (and its pool) alive while a submission is waiting. The retry runs on a worker thread, so it
+    /// hands that reference to the main thread to drop (see release_on_main_thread).
+    static void submit_without_blocking(
+        pybind11::object self_obj,
+        std::shared_ptr<chromobius::DecoderPool::Task> task,
+        pybind11::object loop,
+        pybind11::object future) {
+        if (pybind11::cast<bool>(future.attr("cancelled")())) {
+            return;
+        }
+        auto &pool = pybind11::cast<CompiledDecoder &>(self_obj).ensure_worker_pool();
+        // The callback runs on a worker thread, so it takes the GIL and explicitly drops its python references.
+        auto retry = [self_obj, task, loop, future]() mutable {
+            pybind11::gil_scoped_acquire acquire;
+            try {
+                loop.attr("call_soon_threadsafe")(pybind11::cpp_function([self_obj, task, loop, future]() {
+                    submit_without_blocking(self_obj, task, loop, future);
+                }));
+            } catch (pybind11::error_already_set &ex) {
+                // E.g. the event loop was closed while the batch was waiting.
+                ex.discard_as_unraisable("chromobius.CompiledDecoder.predict_async");
+            }
+            release_on_main_thread(std::move(self_obj));
+            loop = pybind11::object();
+            future = pybind11::object();
+            task.reset();
+        };
+        pool.try_submit(*task, std::move(retry));
+    }
+
+    static pybind11::object predict_async(const pybind11::object &self_obj, const pybind11::object &dets_obj) {
+        auto asyncio = pybind11::module::import("asyncio");
+        auto loop = asyncio.attr("get_running_loop")();
+        auto &self = pybind11::cast<CompiledDecoder &>(self_obj);
+        auto batch = std::make_shared<DetsBatch>(self.prepare_dets_batch(dets_obj, false));
+        auto future =
+            std::make_shared<pybind11::object>(pybind11::module::import("concurrent.futures").attr("Future")());
+        pybind11::object result = *future;
+        auto task = std::make_shared<chromobius::DecoderPool::Task>(self.make_predict_task(batch, future));
+        submit_without_blocking(self_obj, task, loop, result);
+        return asyncio.attr("wrap_future")(result, pybind11::arg("loop") = loop);
+    }
+
+    pybind11::array_t<uint64_t> predict_obs_flips_from_dets_ptb64(const pybind11::object &dets_obj) {
+        if (!pybind11::isinstance<pybind11::array_t<uint64_t>>(dets_obj)) {
+            throw std::invalid_argument("Expected ptb64 detection event data, but dets.dtype wasn't np.uint64.");
+        }
+        const pybind11::array_t<uint64_t> &dets = pybind11::cast<pybind11::array_t<uint64_t>>(dets_obj);
+        if (dets.ndim() != 2 || (size_t)dets.shape(1) != num_detectors) {
+            std::stringstream ss;
+            ss << "Expected dets.shape == (num_shots / 64, num_detectors=" << num_detectors << ")";
+            ss << " because dets.dtype == np.uint64 indicating ptb64 shots.";
+            throw std::invalid_argument(ss.str());
+        }
+        size_t num_groups = dets.shape(0);
+
+        auto numpy = pybind11::module::import("numpy");
+        pybind11::array_t<uint64_t> result_buf =
+            numpy.attr("zeros")(pybind11::make_tuple(num_groups, num_observables), numpy.attr("uint64"));
+        uint64_t *result_ptr = result_buf.mutable_data();
+        {
+            const uint8_t *dets_ptr = (const uint8_t *)dets.data();
+            size_t group_stride = dets.strides(0);
+            size_t det_stride = dets.strides(1);
+            pybind11::gil_scoped_release release;
+            std::lock_guard<std::mutex> lock(*decoder_mutex);
+
+            // Transpose 64x64 blocks of bits, turning 64 interleaved shots into 64 bit packed shots.
+            size_t num_det_words = (num_detectors + 63) / 64;
+            std::vector<uint64_t> shots(64 * num_det_words);
+            uint64_t block[64];
+            // One block of 64 predictions per group of 64 observables.
+            size_t num_obs_words = (num_observables + 63) / 64;
+            std::vector<uint64_t> obs_blocks(64 * num_obs_words);
+            for (size_t g = 0; g < num_groups; g++) {
+                const uint8_t *group_ptr = dets_ptr + g * group_stride;
+                for (size_t w = 0; w < num_det_words; w++) {
+                    for (size_t b = 0; b < 64; b++) {
+                        size_t d = w * 64 + b;
+                        block[b] = d < num_detectors ? *(const uint64_t *)(group_ptr + d * det_stride) : 0;
+                    }
+                    stim::inplace_transpose_64x64(block, 1);
+                    for (size_t s = 0; s < 64; s++) {
+                        shots[s * num_det_words + w] = block[s];
+                    }
+                }
+                for (size_t s = 0; s < 64; s++) {
+                    const uint8_t *data = (const uint8_t *)(shots.data() + s * num_det_words);
+                    obs_blocks[s] = decoder.decode_detection_events({data, data + num_detector_bytes});
+                    for (size_t w = 1; w < num_obs_words; w++) {
+                        obs_blocks[w * 64 + s] = decoder.extra_obs_flips[w - 1];
+                    }
+                }
+                for (size_t w = 0; w < num_obs_words; w++) {
+                    stim::inplace_transpose_64x64(obs_blocks.data() + w * 64, 1);
+                }
+                for (size_t k = 0; k < num_observables; k++) {
+                    *result_ptr++ = obs_blocks[k];
+                }
+            }
         }
+        return result_buf;
+    }
+
+    pybind11::array_t<uint8_t> predict_obs_flips_from_sparse_dets(const index_array &indices, const index_array &offsets) {
+        if (indices.ndim() != 1) {
+            throw std::invalid_argument("indices.shape != (num_detection_events,)");
+        }
+        if (offsets.ndim() != 1 || offsets.shape(0) == 0) {
+            throw std::invalid_argument("offsets.shape != (num_shots + 1,)");
+        }
+        size_t num_shots = offsets.shape(0) - 1;
+        const uint64_t *indices_ptr = indices.data();
+        const uint64_t *offsets_ptr = offsets.data();
         for (size_t shot = 0; shot < num_shots; shot++) {
-            const uint8_t *data = dets.data() + shot_stride * shot;
-            chromobius::obsmask_int prediction =
-                decoder.decode_detection_events({data, data + num_detector_bytes}, weight_ptr);
-            for (size_t k = 0; k < num_observable_bytes; k++) {
-                *result_ptr++ = (prediction >> (8*k)) & 0xFF;
+            if (offsets_ptr[shot] > offsets_ptr[shot + 1]) {
+                std::stringstream ss;
+                ss << "offsets must be non-decreasing, but offsets[" << shot << "]=" << offsets_ptr[shot];
+                ss << " > offsets[" << (shot + 1) << "]=" << offsets_ptr[shot + 1] << ".";
+                throw std::invalid_argument(ss.str());
             }
-            if (weight_ptr != nullptr) {
-                weight_ptr++;
+        }
+        if (offsets_ptr[num_shots] > (uint64_t)indices.shape(0)) {
+            std::stringstream ss;
+            ss << "offsets[-1]=" << offsets_ptr[num_shots] << " > len(indices)=" << indices.shape(0) << ".";
+            throw std::invalid_argument(ss.str());
+        }
+
+        auto numpy = pybind11::module::import("numpy");
+        pybind11::array_t<uint8_t> result_buf =
+            numpy.attr("empty")(pybind11::make_tuple(num_shots, num_observable_bytes), numpy.attr("uint8"));
+        uint8_t *result_ptr = result_buf.mutable_data();
+        {
+            pybind11::gil_scoped_release release;
+            std::lock_guard<std::mutex> lock(*decoder_mutex);
+            for (size_t shot = 0; shot < num_shots; shot++) {
+                chromobius::obsmask_int prediction = decoder.decode_sparse_detection_events(
+                    {indices_ptr + offsets_ptr[shot], indices_ptr + offsets_ptr[shot + 1]});
+                decoder.write_obs_flips_bit_packed(prediction, {result_ptr, num_observable_bytes});
+                result_ptr += num_observable_bytes;
             }
         }
+        return result_buf;
+    }
+};
+
+struct CompiledSlidingWindowDecoder {
+    chromobius::SlidingWindowDecoder decoder;
+    uint64_t num_detectors;
+    uint64_t num_detector_bytes;
+    uint64_t num_observables;
+    uint64_t num_observable_bytes;
+
+    static CompiledSlidingWindowDecoder from_dem(
+        const pybind11::object &dem, double commit_duration, double buffer_duration) {
+        stim::DetectorErrorModel converted_dem = dem_from_python(dem);
+        auto num_dets = converted_dem.count_detectors();
+        return CompiledSlidingWindowDecoder{
+            .decoder = chromobius::SlidingWindowDecoder::from_dem(
+                converted_dem, chromobius::DecoderConfigOptions{}, commit_duration, buffer_duration),
+            .num_detectors = num_dets,
+            .num_detector_bytes = (num_dets + 7) / 8,
+            .num_observables = converted_dem.count_observables(),
+            .num_observable_bytes = (converted_dem.count_observables() + 7) / 8,
+        };
+    }
+
+    pybind11::array_t<uint8_t> obs_flip_to_numpy(chromobius::obsmask_int obs_flip) const {
+        auto numpy = pybind11::module::import("numpy");
+        pybind11::array_t<uint8_t> result =
+            numpy.attr("empty")(pybind11::make_tuple(num_observable_bytes), numpy.attr("uint8"));
+        uint8_t *result_ptr = result.mutable_data();
+        for (size_t k = 0; k < num_observable_bytes; k++) {
+            result_ptr[k] = (obs_flip >> (8*k)) & 0xFF;
+        }
+        return result;
+    }
 
-        if (include_weight) {
-            return pybind11::make_tuple(result_buf, weight_buf);
-        } else {
-            return result_buf;
+    void add_detection_events(const index_array &detectors) {
+        if (detectors.ndim() != 1) {
+            throw std::invalid_argument("detectors.shape != (num_detection_events,)");
+        }
+        decoder.add_detection_events({detectors.data(), detectors.data() + detectors.shape(0)});
+    }
+
+    void advance_to_time(double time) {
+        pybind11::gil_scoped_release release;
+        decoder.advance_to_time(time);
+    }
+
+    pybind11::array_t<uint8_t> finish() {
+        chromobius::obsmask_int obs_flip;
+        {
+            pybind11::gil_scoped_release release;
+            obs_flip = decoder.finish();
+        }
+        return obs_flip_to_numpy(obs_flip);
+    }
+
+    pybind11::array_t<uint8_t> predict_obs_flips_from_dets_bit_packed(
+        const pybind11::array_t<uint8_t, pybind11::array::c_style | pybind11::array::forcecast> &dets) {
+        if ((dets.ndim() != 1 && dets.ndim() != 2) || (uint64_t)dets.shape(dets.ndim() - 1) != num_detector_bytes) {
+            std::stringstream ss;
+            ss << "Expected dets.shape == (num_shots, num_detector_bytes=" << num_detector_bytes << ")";
+            ss << " or dets.shape == (num_detector_bytes=" << num_detector_bytes << ",).";
+            throw std::invalid_argument(ss.str());
+        }
+
+        size_t num_shots = dets.ndim() == 2 ? dets.shape(0) : 1;
+        auto numpy = pybind11::module::import("numpy");
+        pybind11::array_t<uint8_t> result_buf = numpy.attr("empty")(
+            dets.ndim() == 2 ? pybind11::make_tuple(num_shots, num_observable_bytes)
+                             : pybind11::make_tuple(num_observable_bytes),
+            numpy.attr("uint8"));
+        uint8_t *result_ptr = result_buf.mutable_data();
+        const uint8_t *dets_ptr = dets.data();
+        {
+            pybind11::gil_scoped_release release;
+            for (size_t shot = 0; shot < num_shots; shot++) {
+                const uint8_t *data = dets_ptr + shot * num_detector_bytes;
+                chromobius::obsmask_int prediction = decoder.decode_detection_events({data, data + num_detector_bytes});
+                for (size_t k = 0; k < num_observable_bytes; k++) {
+                    *result_ptr++ = (prediction >> (8*k)) & 0xFF;
+                }
+            }
+        }
+        return result_buf;
+    }
+};
+
+struct DecodeServerClient {
+    std::unique_ptr<chromobius::ServeClient> client;
+    std::unique_ptr<std::mutex> client_mutex;
+
+    static DecodeServerClient connect(const pybind11::object &socket_path, const pybind11::object &port) {
+        if (socket_path.is_none() == port.is_none()) {
+            throw std::invalid_argument("Must specify exactly one of socket_path or port.");
+        }
+        std::string path = socket_path.is_none() ? "" : pybind11::cast<std::string>(pybind11::str(socket_path));
+        uint16_t port_value = port.is_none() ? 0 : pybind11::cast<uint16_t>(port);
+        pybind11::gil_scoped_release release;
+        auto c = path.empty() ? chromobius::ServeClient::connect_tcp(port_value)
+                              : chromobius::ServeClient::connect_unix(path);
+        return DecodeServerClient{
+            std::make_unique<chromobius::ServeClient>(std::move(c)),
+            std::make_unique<std::mutex>(),
+        };
+    }
+
+    chromobius::ServeClient &open_client() {
+        if (client->fd < 0) {
+            throw std::invalid_argument("The client is closed.");
+        }
+        return *client;
+    }
+
+    pybind11::object predict_obs_flips_from_dets_bit_packed(const pybind11::object &dets_obj) {
+        auto &c = open_client();
+        size_t num_detector_bytes = (c.num_detectors + 7) / 8;
+        size_t num_observable_bytes = (c.num_observables + 7) / 8;
+        auto dets = pybind11::array_t<uint8_t, pybind11::array::c_style | pybind11::array::forcecast>::ensure(dets_obj);
+        if (!dets || (dets.ndim() != 1 && dets.ndim() != 2) ||
+            (size_t)dets.shape(dets.ndim() - 1) != num_detector_bytes) {
+            std::stringstream ss;
+            ss << "Expected dets to be a bit packed uint8 numpy array with shape (num_shots, " << num_detector_bytes
+               << ") or (" << num_detector_bytes << ",).";
+            throw std::invalid_argument(ss.str());
+        }
+        size_t num_shots = dets.ndim() == 1 ? 1 : dets.shape(0);
+        std::span<const uint8_t> data{dets.data(), num_shots * num_detector_bytes};
+
+        std::vector<uint8_t> predictions;
+        {
+            pybind11::gil_scoped_release release;
+            std::lock_guard<std::mutex> lock(*client_mutex);
+            predictions = c.predict_obs_flips_from_dets_bit_packed(data);
+        }
+
+        pybind11::array_t<uint8_t> result(
+            dets.ndim() == 1 ? std::vector<pybind11::ssize_t>{(pybind11::ssize_t)num_observable_bytes}
+                             : std::vector<pybind11::ssize_t>{
+                                   (pybind11::ssize_t)num_shots, (pybind11::ssize_t)num_observable_bytes});
+        if (!predictions.empty()) {
+            memcpy(result.mutable_data(), predictions.data(), predictions.size());
+        }
+        return result;
+    }
+
+    pybind11::object stats() {
+        auto &c = open_client();
+        std::string json;
+        {
+            pybind11::gil_scoped_release release;
+            std::lock_guard<std::mutex> lock(*client_mutex);
+            json = c.stats();
         }
+        return pybind11::module::import("json").attr("loads")(json);
+    }
+
+    void shutdown_server() {
+        auto &c = open_client();
+        pybind11::gil_scoped_release release;
+        std::lock_guard<std::mutex> lock(*client_mutex);
+        c.shutdown_server();
+    }
+
+    void close() {
+        std::lock_guard<std::mutex> lock(*client_mutex);
+        client->close();
     }
 };
 
+static int chromobius_main(const std::vector<std::string> &command_line_args) {
+    std::vector<const char *> argv;
+    argv.push_back("chromobius.main");
+    for (const auto &arg : command_line_args) {
+        argv.push_back(arg.c_str());
+    }
+    pybind11::gil_scoped_release release;
+    return chromobius::main((int)argv.size(), argv.data());
+}
+
 PYBIND11_MODULE(chromobius, m) {
     m.attr("__version__") = xstr_literal(CHROMOBIUS_VERSION_INFO);
     m.doc() = R"pbdoc(
@@ -166,13 +1105,13 @@ PYBIND11_MODULE(chromobius, m) {
                     shots to decode, with the first axis being the shot axis and the second
                     axis being the detection event byte axis).
 
-                    The array's dtype must be np.uint8. If you have an array of dtype
-                    np.bool_, you have data that's not bit packed. You can pack it by
-                    using `np.packbits(array, bitorder='little')`. But ideally you
-                    should attempt to never have unpacked data in the first place,
-                    since it's 8x larger which can be a large performance loss. For
-                    example, stim's sampler methods all have a `bit_packed=True` argument
-                    that cause them to return bit packed data.
+                    The array's dtype should be np.uint8. Unpacked data (an array with
+                    dtype np.bool_ whose last axis is the detector axis) is also
+                    accepted, and is bit packed one shot at a time while decoding. But
+                    ideally you should attempt to never have unpacked data in the first
+                    place, since it's 8x larger which can be a large performance loss.
+                    For example, stim's sampler methods all have a `bit_packed=True`
+                    argument that cause them to return bit packed data.
 
             Returns:
                 A bit packed numpy array of observable flip data. The array will have
@@ -243,8 +1182,11 @@ PYBIND11_MODULE(chromobius, m) {
             @signature def predict_weighted_obs_flips_from_dets_bit_packed(dets: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
             Predicts observable flips and weights from detection events.
 
-            The returned weight comes directly from the underlying call to pymatching, not
-            accounting for the lifting process.
+            By default, the returned weight is the weight of the matcher's solution (as
+            reported by pymatching), not accounting for the lifting process. Decoders
+            compiled with `include_lifting_weight=True` also add the weights of the
+            errors that the lifting process inserted to convert between charge colors,
+            so the weight covers the whole predicted correction.
 
             Args:
                 dets: A bit packed numpy array of detection event data. The array can either
@@ -252,13 +1194,13 @@ PYBIND11_MODULE(chromobius, m) {
                     shots to decode, with the first axis being the shot axis and the second
                     axis being the detection event byte axis).
 
-                    The array's dtype must be np.uint8. If you have an array of dtype
-                    np.bool_, you have data that's not bit packed. You can pack it by
-                    using `np.packbits(array, bitorder='little')`. But ideally you
-                    should attempt to never have unpacked data in the first place,
-                    since it's 8x larger which can be a large performance loss. For
-                    example, stim's sampler methods all have a `bit_packed=True` argument
-                    that cause them to return bit packed data.
+                    The array's dtype should be np.uint8. Unpacked data (an array with
+                    dtype np.bool_ whose last axis is the detector axis) is also
+                    accepted, and is bit packed one shot at a time while decoding. But
+                    ideally you should attempt to never have unpacked data in the first
+                    place, since it's 8x larger which can be a large performance loss.
+                    For example, stim's sampler methods all have a `bit_packed=True`
+                    argument that cause them to return bit packed data.
 
             Returns:
                 A tuple (obs, weights).
@@ -320,49 +1262,1379 @@ PYBIND11_MODULE(chromobius, m) {
         )DOC")
             .data());
 
-    m.def(
-        "compile_decoder_for_dem",
-        &CompiledDecoder::from_dem,
-        pybind11::arg("dem"),
+    compiled_decoder.def(
+        "predict_obs_flips_with_status_from_dets_bit_packed",
+        [](CompiledDecoder &self, const pybind11::object &dets_obj) -> pybind11::object {
+            return self.predict_obs_flips_from_dets_bit_packed(dets_obj, false, true);
+        },
+        pybind11::arg("dets"),
         stim::clean_doc_string(R"DOC(
-            @signature def compile_decoder_for_dem(dem: stim.DetectorErrorModel) -> chromobius.CompiledDecoder:
-            Compiles a decoder for a stim detector error model.
+            @signature def predict_obs_flips_with_status_from_dets_bit_packed(dets: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+            Predicts observable flips, and whether each shot was decoded.
+
+            Shots can go undecoded when the decoder was compiled with a
+            `max_detection_events` or `shot_time_budget_seconds` limit.
 
             Args:
-                dem: A stim detector error model. The detector error model must satisfy:
-                    1. Basis+Color annotations. Every detector that appears in an error
-                        must specify coordinate data including a fourth coordinate. The 4th
-                        coordinate indicates the basis and color of the detector with the
-                        convention:
-                            0 = Red X
-                            1 = Green X
-                            2 = Blue X
-                            3 = Red Z
-                            4 = Green Z
-                            5 = Blue Z
-                            -1 = Ignore this Detector
-                    2. Rainbow triplets. Bulk errors with three symptoms in one basis should
-                        have one symptom of each color. Errors with three symptoms that
-                        repeat a color will cause an exception unless they can be decomposed
-                        into other basic errors.
-                    3. Movable excitations. It needs to be possible to combine bulk errors
-                        to form simpler errors with one or two symptoms that can be used to
-                        move or destroy excitations. If bulk errors don't have this
-                        property, decoding will fail when attempting to lift a solution
-                        from the matcher requires dragging an excitation along a path but
-                        there's no way to move the excitation along that path.
-                    4. Matchable-avoids-color. In parts of the dem that correspond to a
-                        matchable code, at least one of the colors must be avoided.
-                        Otherwise the matcher may be given a problem that can be solved
-                        locally, but when lifting it needs to be solved non-locally.
+                dets: A bit packed numpy array of detection event data, in the
+                    same format as for `predict_obs_flips_from_dets_bit_packed`.
 
             Returns:
-                A decoder object that can be used to predict observable flips from
-                detection event samples.
+                A tuple (obs, status).
+                Obs is a bit packed numpy array of observable flip data, in the
+                same format as for `predict_obs_flips_from_dets_bit_packed`.
+                Status is a numpy array (or scalar, for 1D dets) of np.uint8
+                with one entry per shot:
+                    0 = Decoded.
+                    1 = Not decoded, due to having more than
+                        `max_detection_events` detection events.
+                    2 = Not decoded, due to being estimated to take longer
+                        than `shot_time_budget_seconds`.
+                    3 = Decoded, but finished after `shot_time_budget_seconds`
+                        ran out. The prediction is kept.
+                Shots that weren't decoded predict no observable flips.
 
             Example:
                 >>> import stim
                 >>> import chromobius
+                >>> import numpy as np
+
+                >>> repetition_color_code = stim.Circuit('''
+                ...     X_ERROR(0.1) 0 1 2 3 4 5 6 7
+                ...     MPP Z0*Z1*Z2 Z1*Z2*Z3 Z2*Z3*Z4 Z3*Z4*Z5 Z4*Z5*Z6 Z5*Z6*Z7
+                ...     DETECTOR(0, 0, 0, 2) rec[-6]
+                ...     DETECTOR(1, 0, 0, 0) rec[-5]
+                ...     DETECTOR(2, 0, 0, 1) rec[-4]
+                ...     DETECTOR(3, 0, 0, 2) rec[-3]
+                ...     DETECTOR(4, 0, 0, 0) rec[-2]
+                ...     DETECTOR(5, 0, 0, 1) rec[-1]
+                ...     M 0
+                ...     OBSERVABLE_INCLUDE(0) rec[-1]
+                ... ''')
+                >>> dem = repetition_color_code.detector_error_model()
+                >>> decoder = chromobius.compile_decoder_for_dem(
+                ...     dem,
+                ...     max_detection_events=3,
+                ... )
+
+                >>> dets = np.array([[0b000001], [0b111111]], dtype=np.uint8)
+                >>> predict = decoder.predict_obs_flips_with_status_from_dets_bit_packed
+                >>> obs, status = predict(dets)
+                >>> obs
+                array([[1],
+                       [0]], dtype=uint8)
+                >>> status
+                array([0, 1], dtype=uint8)
+        )DOC")
+            .data());
+
+    compiled_decoder.def(
+        "memory_usage",
+        [](const CompiledDecoder &self) -> pybind11::dict {
+            chromobius::DecoderMemoryUsage usage = self.decoder.memory_usage();
+            pybind11::dict result;
+            result["node_tables"] = usage.node_tables;
+            result["atomic_errors"] = usage.atomic_errors;
+            result["mobius_dem"] = usage.mobius_dem;
+            result["charge_graph"] = usage.charge_graph;
+            result["rgb_reps"] = usage.rgb_reps;
+            result["drag_graph"] = usage.drag_graph;
+            result["workspace"] = usage.workspace;
+            result["total"] = usage.total();
+            return result;
+        },
+        stim::clean_doc_string(R"DOC(
+            @signature def memory_usage(self) -> dict[str, int]:
+            Estimates the memory held by the parts of the decoder.
+
+            Memory held by the underlying matcher isn't included.
+
+            Returns:
+                A dictionary mapping each part of the decoder ('node_tables',
+                'atomic_errors', 'mobius_dem', 'charge_graph', 'rgb_reps',
+                'drag_graph', 'workspace') to the approximate number of bytes
+                of memory it's using, plus a 'total' entry.
+
+            Examples:
+                >>> import stim
+                >>> import chromobius
+                >>> dem = stim.Circuit('''
+                ...     X_ERROR(0.1) 0 1 2 3 4 5 6 7
+                ...     MPP Z0*Z1*Z2 Z1*Z2*Z3 Z2*Z3*Z4 Z3*Z4*Z5 Z4*Z5*Z6 Z5*Z6*Z7
+                ...     DETECTOR(0, 0, 0, 2) rec[-6]
+                ...     DETECTOR(1, 0, 0, 0) rec[-5]
+                ...     DETECTOR(2, 0, 0, 1) rec[-4]
+                ...     DETECTOR(3, 0, 0, 2) rec[-3]
+                ...     DETECTOR(4, 0, 0, 0) rec[-2]
+                ...     DETECTOR(5, 0, 0, 1) rec[-1]
+                ...     M 0
+                ...     OBSERVABLE_INCLUDE(0) rec[-1]
+                ... ''').detector_error_model()
+
+                >>> full = chromobius.compile_decoder_for_dem(dem)
+                >>> slim = chromobius.compile_decoder_for_dem(dem, slim=True)
+                >>> full.memory_usage()['atomic_errors'] > 0
+                True
+                >>> slim.memory_usage()['atomic_errors']
+                0
+                >>> slim.memory_usage()['total'] < full.memory_usage()['total']
+                True
+        )DOC")
+            .data());
+
+    compiled_decoder.def(
+        "graph_arrays",
+        [](const pybind11::object &self) -> pybind11::dict {
+            return decoder_graph_arrays(self, pybind11::cast<const CompiledDecoder &>(self).decoder);
+        },
+        stim::clean_doc_string(R"DOC(
+            @signature def graph_arrays(self) -> dict[str, np.ndarray]:
+            Returns the decoder's internal graphs as numpy arrays.
+
+            The decoder refers to the detectors that aren't ignored as nodes,
+            numbered 0, 1, 2, ... in order of detector index. Node indices
+            refer to these nodes, and 2**32 - 1 refers to the boundary.
+
+            Arrays that view the decoder's memory directly (instead of copying
+            it) are read-only, and keep the decoder alive.
+
+            Colors are encoded as 1=red, 2=green, 3=blue (and charges use 0
+            for neutral). Bases are encoded as 1=X, 2=Z. Observable flips
+            cover the first 64 observables.
+
+            Returns:
+                A dictionary with these keys:
+                    'node_detector': uint32 array with the detector index of
+                        each node.
+                    'node_color', 'node_basis': uint8 arrays with the color
+                        and basis of each node.
+                    'rgb_reps': a read-only view of the representative error
+                        of each node, with fields 'red_node', 'green_node',
+                        'blue_node', 'obs_flip', and 'charge_flip'.
+                    'charge_graph': the edges of the charge graph (each edge
+                        listed once), with fields 'n1', 'n2', and 'obs_flip'.
+                        Empty for decoders compiled with `slim=True`.
+                    'drag_graph': the entries of the drag graph, with fields
+                        'n1', 'c1', 'n2', 'c2' and 'obs_flip'. Each entry
+                        says which observables are flipped by moving charge
+                        c1 at node n1 to charge c2 at node n2.
+
+            Examples:
+                >>> import stim
+                >>> import chromobius
+                >>> dem = stim.Circuit('''
+                ...     X_ERROR(0.1) 0 1 2 3 4 5 6 7
+                ...     MPP Z0*Z1*Z2 Z1*Z2*Z3 Z2*Z3*Z4 Z3*Z4*Z5 Z4*Z5*Z6 Z5*Z6*Z7
+                ...     DETECTOR(0, 0, 0, 2) rec[-6]
+                ...     DETECTOR(1, 0, 0, 0) rec[-5]
+                ...     DETECTOR(2, 0, 0, 1) rec[-4]
+                ...     DETECTOR(3, 0, 0, 2) rec[-3]
+                ...     DETECTOR(4, 0, 0, 0) rec[-2]
+                ...     DETECTOR(5, 0, 0, 1) rec[-1]
+                ...     M 0
+                ...     OBSERVABLE_INCLUDE(0) rec[-1]
+                ... ''').detector_error_model()
+                >>> decoder = chromobius.compile_decoder_for_dem(dem)
+                >>> arrays = decoder.graph_arrays()
+
+                >>> arrays['node_color']
+                array([3, 1, 2, 3, 1, 2], dtype=uint8)
+                >>> int(arrays['rgb_reps'][0]['blue_node'])
+                0
+                >>> arrays['rgb_reps'].flags.writeable
+                False
+                >>> arrays['charge_graph'][:3]['n2']
+                array([         1,          3, 4294967295], dtype=uint32)
+        )DOC")
+            .data());
+
+    compiled_decoder.def(
+        "mobius_dem",
+        [](const CompiledDecoder &self) -> pybind11::object {
+            std::string text;
+            {
+                pybind11::gil_scoped_release release;
+                std::stringstream ss;
+                ss << self.decoder.mobius_dem;
+                text = ss.str();
+            }
+            return pybind11::module::import("stim").attr("DetectorErrorModel")(text);
+        },
+        stim::clean_doc_string(R"DOC(
+            @signature def mobius_dem(self) -> stim.DetectorErrorModel:
+            Returns the matching problem the decoder gives to its matcher.
+
+            The mobius dem has two detectors for each node of the decoder (see
+            `CompiledDecoder.graph_arrays`): detectors 2n and 2n+1 are the
+            copies of node n in the two matching subgraphs that include the
+            node's color (each subgraph leaves out one color).
+
+            Decoders compiled with `slim=True` only keep one error per edge of
+            the mobius dem. Decoders compiled with `split_bases=True` give each
+            basis's part of the mobius dem to a separate matcher.
+
+            Examples:
+                >>> import stim
+                >>> import chromobius
+                >>> dem = stim.Circuit('''
+                ...     X_ERROR(0.1) 0 1 2 3 4 5 6 7
+                ...     MPP Z0*Z1*Z2 Z1*Z2*Z3 Z2*Z3*Z4 Z3*Z4*Z5 Z4*Z5*Z6 Z5*Z6*Z7
+                ...     DETECTOR(0, 0, 0, 2) rec[-6]
+                ...     DETECTOR(1, 0, 0, 0) rec[-5]
+                ...     DETECTOR(2, 0, 0, 1) rec[-4]
+                ...     DETECTOR(3, 0, 0, 2) rec[-3]
+                ...     DETECTOR(4, 0, 0, 0) rec[-2]
+                ...     DETECTOR(5, 0, 0, 1) rec[-1]
+                ...     M 0
+                ...     OBSERVABLE_INCLUDE(0) rec[-1]
+                ... ''').detector_error_model()
+                >>> decoder = chromobius.compile_decoder_for_dem(dem)
+                >>> mobius_dem = decoder.mobius_dem()
+                >>> mobius_dem.num_detectors
+                12
+                >>> mobius_dem.num_errors > 0
+                True
+        )DOC")
+            .data());
+
+    compiled_decoder.def_property_readonly(
+        "num_pruned_mobius_edges",
+        [](const CompiledDecoder &self) -> size_t {
+            return self.decoder.num_pruned_mobius_edges;
+        },
+        stim::clean_doc_string(R"DOC(
+            The number of matching graph edges removed by pruning.
+
+            Edges are pruned when they only appear in errors with a weight
+            above the `max_mobius_error_weight` the decoder was compiled with.
+
+            Examples:
+                >>> import stim
+                >>> import chromobius
+                >>> dem = stim.Circuit('''
+                ...     X_ERROR(0.1) 1 2 3 4 5 6
+                ...     X_ERROR(0.000001) 0 7
+                ...     MPP Z0*Z1*Z2 Z1*Z2*Z3 Z2*Z3*Z4 Z3*Z4*Z5 Z4*Z5*Z6 Z5*Z6*Z7
+                ...     DETECTOR(0, 0, 0, 2) rec[-6]
+                ...     DETECTOR(1, 0, 0, 0) rec[-5]
+                ...     DETECTOR(2, 0, 0, 1) rec[-4]
+                ...     DETECTOR(3, 0, 0, 2) rec[-3]
+                ...     DETECTOR(4, 0, 0, 0) rec[-2]
+                ...     DETECTOR(5, 0, 0, 1) rec[-1]
+                ...     M 0
+                ...     OBSERVABLE_INCLUDE(0) rec[-1]
+                ... ''').detector_error_model()
+
+                >>> decoder = chromobius.compile_decoder_for_dem(dem)
+                >>> decoder.num_pruned_mobius_edges
+                0
+
+                >>> decoder = chromobius.compile_decoder_for_dem(
+                ...     dem,
+                ...     max_mobius_error_weight=10,
+                ... )
+                >>> decoder.num_pruned_mobius_edges
+                2
+        )DOC")
+            .data());
+
+    compiled_decoder.def(
+        "start_match_trace",
+        &CompiledDecoder::start_match_trace,
+        pybind11::arg("path"),
+        pybind11::kw_only(),
+        pybind11::arg("sample_every") = 1,
+        stim::clean_doc_string(R"DOC(
+            @signature def start_match_trace(path: Union[str, pathlib.Path], *, sample_every: int = 1) -> None:
+            Starts recording what the decoder does into a binary trace file.
+
+            For each traced shot, the trace records the detection events, the
+            pairs of mobius nodes matched by the matcher, the euler cycles that
+            were lifted (with the observables flipped by each cycle), and the
+            predicted observable flips. Use `chromobius.read_match_trace` to load
+            the trace into numpy arrays.
+
+            Shots that aren't traced only pay for counting the shot, so sampling
+            a small fraction of the shots has little effect on decoding speed.
+
+            Starting a trace replaces any trace that was already being written.
+            Shots decoded by `predict_future` and `predict_async` are also traced
+            (the worker pool finishes its queued batches, and is then restarted).
+
+            Args:
+                path: Where to write the trace. The file is overwritten.
+                sample_every: Defaults to 1. Only every sample_every'th shot
+                    (starting with the first) is traced.
+
+            Example:
+                >>> import pathlib
+                >>> import tempfile
+                >>> import stim
+                >>> import chromobius
+                >>> import numpy as np
+
+                >>> repetition_color_code = stim.Circuit('''
+                ...     X_ERROR(0.1) 0 1 2 3 4 5 6 7
+                ...     MPP Z0*Z1*Z2 Z1*Z2*Z3 Z2*Z3*Z4 Z3*Z4*Z5 Z4*Z5*Z6 Z5*Z6*Z7
+                ...     DETECTOR(0, 0, 0, 2) rec[-6]
+                ...     DETECTOR(1, 0, 0, 0) rec[-5]
+                ...     DETECTOR(2, 0, 0, 1) rec[-4]
+                ...     DETECTOR(3, 0, 0, 2) rec[-3]
+                ...     DETECTOR(4, 0, 0, 0) rec[-2]
+                ...     DETECTOR(5, 0, 0, 1) rec[-1]
+                ...     M 0
+                ...     OBSERVABLE_INCLUDE(0) rec[-1]
+                ... ''')
+                >>> sampler = repetition_color_code.compile_detector_sampler()
+                >>> dets, _ = sampler.sample(
+                ...     shots=100,
+                ...     separate_observables=True,
+                ...     bit_packed=True,
+                ... )
+                >>> decoder = chromobius.compile_decoder_for_dem(
+                ...     repetition_color_code.detector_error_model()
+                ... )
+
+                >>> with tempfile.TemporaryDirectory() as d:
+                ...     path = pathlib.Path(d) / 'trace.bin'
+                ...     decoder.start_match_trace(path, sample_every=10)
+                ...     obs = decoder.predict_obs_flips_from_dets_bit_packed(dets)
+                ...     decoder.stop_match_trace()
+                ...     trace = chromobius.read_match_trace(path)
+                >>> trace['shot']
+                array([ 0, 10, 20, 30, 40, 50, 60, 70, 80, 90], dtype=uint64)
+                >>> np.array_equal(trace['obs_flips'], obs[::10])
+                True
+        )DOC")
+            .data());
+
+    compiled_decoder.def(
+        "stop_match_trace",
+        &CompiledDecoder::stop_match_trace,
+        stim::clean_doc_string(R"DOC(
+            Stops recording the decoder's trace, and closes the trace file.
+
+            Does nothing if no trace is being recorded. See `start_match_trace`.
+        )DOC")
+            .data());
+
+    compiled_decoder.def(
+        "predict_future",
+        &CompiledDecoder::predict_future,
+        pybind11::arg("dets"),
+        stim::clean_doc_string(R"DOC(
+            @signature def predict_future(dets: np.ndarray) -> concurrent.futures.Future:
+            Starts predicting observable flips in the background.
+
+            The batch of shots is queued for the decoder's persistent pool of C++
+            worker threads (see `configure_worker_pool`), and decoded without holding
+            the GIL. If the queue is full, this method blocks (without holding the
+            GIL) until there is room, so producers can't get arbitrarily far ahead of
+            the workers.
+
+            Calling `cancel()` on the returned future succeeds if the batch hasn't
+            started decoding yet, in which case it is skipped.
+
+            The dets array must not be modified until the future is done.
+
+            Args:
+                dets: Detection event data, in the same formats accepted by
+                    `predict_obs_flips_from_dets_bit_packed`.
+
+            Returns:
+                A `concurrent.futures.Future` whose result is the bit packed array that
+                `predict_obs_flips_from_dets_bit_packed` would have returned. If
+                decoding fails, the future's exception is set instead.
+
+            Example:
+                >>> import stim
+                >>> import chromobius
+                >>> import numpy as np
+
+                >>> repetition_color_code = stim.Circuit('''
+                ...     X_ERROR(0.1) 0 1 2 3 4 5 6 7
+                ...     MPP Z0*Z1*Z2 Z1*Z2*Z3 Z2*Z3*Z4 Z3*Z4*Z5 Z4*Z5*Z6 Z5*Z6*Z7
+                ...     DETECTOR(0, 0, 0, 2) rec[-6]
+                ...     DETECTOR(1, 0, 0, 0) rec[-5]
+                ...     DETECTOR(2, 0, 0, 1) rec[-4]
+                ...     DETECTOR(3, 0, 0, 2) rec[-3]
+                ...     DETECTOR(4, 0, 0, 0) rec[-2]
+                ...     DETECTOR(5, 0, 0, 1) rec[-1]
+                ...     M 0
+                ...     OBSERVABLE_INCLUDE(0) rec[-1]
+                ... ''')
+                >>> dem = repetition_color_code.detector_error_model()
+                >>> decoder = chromobius.compile_decoder_for_dem(dem)
+                >>> sampler = repetition_color_code.compile_detector_sampler()
+                >>> dets, actual_obs_flips = sampler.sample(
+                ...     shots=1024,
+                ...     separate_observables=True,
+                ...     bit_packed=True,
+                ... )
+
+                >>> future = decoder.predict_future(dets)
+                >>> predicted_obs_flips = future.result()
+                >>> np.array_equal(
+                ...     predicted_obs_flips,
+                ...     decoder.predict_obs_flips_from_dets_bit_packed(dets),
+                ... )
+                True
+        )DOC")
+            .data());
+
+    compiled_decoder.def(
+        "predict_async",
+        &CompiledDecoder::predict_async,
+        pybind11::arg("dets"),
+        stim::clean_doc_string(R"DOC(
+            @signature def predict_async(dets: np.ndarray) -> asyncio.Future:
+            Predicts observable flips without blocking the running asyncio event loop.
+
+            Like `predict_future`, but returns an asyncio future belonging to the
+            running event loop. The decoding happens on the decoder's C++ worker
+            threads without holding the GIL, so the event loop keeps running while
+            the batch is decoded. Cancelling the returned future cancels the batch if
+            it hasn't started decoding yet.
+
+            This method never blocks. When the worker pool's queue is full, the batch
+            waits (without blocking the event loop) and is queued from the event loop
+            once a worker frees up space. Back-pressure comes from awaiting the
+            returned future, so producers should bound how many predictions they
+            have in flight.
+
+            Must be called while an asyncio event loop is running (e.g. from within a
+            coroutine).
+
+            Args:
+                dets: Detection event data, in the same formats accepted by
+                    `predict_obs_flips_from_dets_bit_packed`.
+
+            Returns:
+                An awaitable `asyncio.Future` whose result is the bit packed array that
+                `predict_obs_flips_from_dets_bit_packed` would have returned.
+
+            Example:
+                >>> import asyncio
+                >>> import stim
+                >>> import chromobius
+                >>> import numpy as np
+
+                >>> repetition_color_code = stim.Circuit('''
+                ...     X_ERROR(0.1) 0 1 2 3 4 5 6 7
+                ...     MPP Z0*Z1*Z2 Z1*Z2*Z3 Z2*Z3*Z4 Z3*Z4*Z5 Z4*Z5*Z6 Z5*Z6*Z7
+                ...     DETECTOR(0, 0, 0, 2) rec[-6]
+                ...     DETECTOR(1, 0, 0, 0) rec[-5]
+                ...     DETECTOR(2, 0, 0, 1) rec[-4]
+                ...     DETECTOR(3, 0, 0, 2) rec[-3]
+                ...     DETECTOR(4, 0, 0, 0) rec[-2]
+                ...     DETECTOR(5, 0, 0, 1) rec[-1]
+                ...     M 0
+                ...     OBSERVABLE_INCLUDE(0) rec[-1]
+                ... ''')
+                >>> dem = repetition_color_code.detector_error_model()
+                >>> decoder = chromobius.compile_decoder_for_dem(dem)
+                >>> sampler = repetition_color_code.compile_detector_sampler()
+                >>> dets, actual_obs_flips = sampler.sample(
+                ...     shots=1024,
+                ...     separate_observables=True,
+                ...     bit_packed=True,
+                ... )
+
+                >>> async def decode_in_two_halves():
+                ...     return await asyncio.gather(
+                ...         decoder.predict_async(dets[:512]),
+                ...         decoder.predict_async(dets[512:]),
+                ...     )
+                >>> first_half, second_half = asyncio.run(decode_in_two_halves())
+                >>> np.array_equal(
+                ...     np.concatenate([first_half, second_half]),
+                ...     decoder.predict_obs_flips_from_dets_bit_packed(dets),
+                ... )
+                True
+        )DOC")
+            .data());
+
+    compiled_decoder.def(
+        "configure_worker_pool",
+        &CompiledDecoder::configure_worker_pool,
+        pybind11::kw_only(),
+        pybind11::arg("num_threads"),
+        pybind11::arg("max_queued_batches"),
+        stim::clean_doc_string(R"DOC(
+            @signature def configure_worker_pool(*, num_threads: int, max_queued_batches: int) -> None:
+            Sets up the worker threads used by `predict_future` and `predict_async`.
+
+            If this method isn't called, a pool is created when first needed with one
+            thread per CPU and room for two queued batches per thread.
+
+            Reconfiguring waits for all previously submitted batches to finish.
+
+            Args:
+                num_threads: The number of worker threads. Each worker owns its own
+                    copy of the decoder's matcher and workspace.
+                max_queued_batches: The maximum number of batches that can be waiting
+                    for a worker. When the queue is full, `predict_future` blocks
+                    until there is room, and `predict_async` batches wait on the
+                    event loop until there is room.
+
+            Example:
+                >>> import stim
+                >>> import chromobius
+                >>> import numpy as np
+
+                >>> repetition_color_code = stim.Circuit('''
+                ...     X_ERROR(0.1) 0 1 2 3 4 5 6 7
+                ...     MPP Z0*Z1*Z2 Z1*Z2*Z3 Z2*Z3*Z4 Z3*Z4*Z5 Z4*Z5*Z6 Z5*Z6*Z7
+                ...     DETECTOR(0, 0, 0, 2) rec[-6]
+                ...     DETECTOR(1, 0, 0, 0) rec[-5]
+                ...     DETECTOR(2, 0, 0, 1) rec[-4]
+                ...     DETECTOR(3, 0, 0, 2) rec[-3]
+                ...     DETECTOR(4, 0, 0, 0) rec[-2]
+                ...     DETECTOR(5, 0, 0, 1) rec[-1]
+                ...     M 0
+                ...     OBSERVABLE_INCLUDE(0) rec[-1]
+                ... ''')
+                >>> dem = repetition_color_code.detector_error_model()
+                >>> decoder = chromobius.compile_decoder_for_dem(dem)
+                >>> sampler = repetition_color_code.compile_detector_sampler()
+                >>> dets, actual_obs_flips = sampler.sample(
+                ...     shots=1024,
+                ...     separate_observables=True,
+                ...     bit_packed=True,
+                ... )
+
+                >>> decoder.configure_worker_pool(num_threads=2, max_queued_batches=4)
+                >>> futures = [
+                ...     decoder.predict_future(dets[k:k+128])
+                ...     for k in range(0, 1024, 128)
+                ... ]
+                >>> predictions = np.concatenate([f.result() for f in futures])
+                >>> predictions.shape
+                (1024, 1)
+        )DOC")
+            .data());
+
+    compiled_decoder.def(
+        "predict_obs_flips_from_dets_ptb64",
+        &CompiledDecoder::predict_obs_flips_from_dets_ptb64,
+        pybind11::arg("dets"),
+        stim::clean_doc_string(R"DOC(
+            @signature def predict_obs_flips_from_dets_ptb64(dets: np.ndarray) -> np.ndarray:
+            Predicts observable flips from detection events in stim's ptb64 layout.
+
+            In the ptb64 layout shots are grouped into blocks of 64, and each 64 bit
+            word stores one detector's value for all 64 shots in the block. This is
+            the layout written by stim when using `format='ptb64'`, so data from a
+            ptb64 file can be loaded with
+            `np.fromfile(path, dtype=np.uint64).reshape(-1, num_detectors)`.
+
+            The shots are transposed in 64x64 bit blocks inside the decoder, so there
+            is no need to convert the data in python first. The GIL is released while
+            decoding.
+
+            Args:
+                dets: A numpy array with dtype np.uint64 and shape
+                    (num_shots / 64, num_detectors). Bit s of dets[g, d] is the value
+                    of detector d in shot g*64 + s.
+
+            Returns:
+                A numpy array of observable flip data, also in ptb64 layout:
+                    shape = (num_shots / 64, num_obs)
+                    dtype = np.uint64
+
+                To determine if the observable with index k was flipped in shot s, compute:
+                    `bool((result[s // 64, k] >> (s % 64)) & 1)`
+
+            Example:
+                >>> import stim
+                >>> import chromobius
+                >>> import numpy as np
+
+                >>> repetition_color_code = stim.Circuit('''
+                ...     X_ERROR(0.1) 0 1 2 3 4 5 6 7
+                ...     MPP Z0*Z1*Z2 Z1*Z2*Z3 Z2*Z3*Z4 Z3*Z4*Z5 Z4*Z5*Z6 Z5*Z6*Z7
+                ...     DETECTOR(0, 0, 0, 2) rec[-6]
+                ...     DETECTOR(1, 0, 0, 0) rec[-5]
+                ...     DETECTOR(2, 0, 0, 1) rec[-4]
+                ...     DETECTOR(3, 0, 0, 2) rec[-3]
+                ...     DETECTOR(4, 0, 0, 0) rec[-2]
+                ...     DETECTOR(5, 0, 0, 1) rec[-1]
+                ...     M 0
+                ...     OBSERVABLE_INCLUDE(0) rec[-1]
+                ... ''')
+                >>> dem = repetition_color_code.detector_error_model()
+                >>> decoder = chromobius.compile_decoder_for_dem(dem)
+
+                >>> # 128 shots. Shot 3 has a detection event at D0.
+                >>> dets = np.zeros(shape=(2, 6), dtype=np.uint64)
+                >>> dets[0, 0] = 1 << 3
+                >>> obs = decoder.predict_obs_flips_from_dets_ptb64(dets)
+                >>> obs.shape
+                (2, 1)
+                >>> int(obs[0, 0]) == 1 << 3
+                True
+        )DOC")
+            .data());
+
+    compiled_decoder.def(
+        "predict_obs_flips_from_sparse_dets",
+        &CompiledDecoder::predict_obs_flips_from_sparse_dets,
+        pybind11::arg("indices"),
+        pybind11::arg("offsets"),
+        stim::clean_doc_string(R"DOC(
+            @signature def predict_obs_flips_from_sparse_dets(indices: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+            Predicts observable flips from sparse detection event data.
+
+            The detection events are given in a compressed sparse row (CSR) style
+            format: the detectors that fired in shot k are
+            `indices[offsets[k]:offsets[k+1]]`. This avoids ever materializing
+            dense detection event data, and is faster than
+            `predict_obs_flips_from_dets_bit_packed` when detection events are rare.
+
+            The GIL is released while decoding.
+
+            Args:
+                indices: A 1-dimensional array of detector indices. The detectors
+                    that fired in each shot are stored contiguously, one shot after
+                    another. Within a shot the order doesn't matter, but each
+                    detector may appear at most once.
+                offsets: A 1-dimensional array with one more entry than there are
+                    shots. Shot k's detection events are in
+                    `indices[offsets[k]:offsets[k+1]]`. Must be non-decreasing.
+
+            Returns:
+                A bit packed numpy array of observable flip data with:
+                    shape = (len(offsets) - 1, math.ceil(num_obs / 8))
+                    dtype = np.uint8
+
+                To determine if the observable with index k was flipped in shot s, compute:
+                    `bool((result[s, k // 8] >> (k % 8)) & 1)`
+
+            Example:
+                >>> import stim
+                >>> import chromobius
+                >>> import numpy as np
+
+                >>> repetition_color_code = stim.Circuit('''
+                ...     X_ERROR(0.1) 0 1 2 3 4 5 6 7
+                ...     MPP Z0*Z1*Z2 Z1*Z2*Z3 Z2*Z3*Z4 Z3*Z4*Z5 Z4*Z5*Z6 Z5*Z6*Z7
+                ...     DETECTOR(0, 0, 0, 2) rec[-6]
+                ...     DETECTOR(1, 0, 0, 0) rec[-5]
+                ...     DETECTOR(2, 0, 0, 1) rec[-4]
+                ...     DETECTOR(3, 0, 0, 2) rec[-3]
+                ...     DETECTOR(4, 0, 0, 0) rec[-2]
+                ...     DETECTOR(5, 0, 0, 1) rec[-1]
+                ...     M 0
+                ...     OBSERVABLE_INCLUDE(0) rec[-1]
+                ... ''')
+                >>> dem = repetition_color_code.detector_error_model()
+                >>> decoder = chromobius.compile_decoder_for_dem(dem)
+
+                >>> # Shot 0 has no detection events.
+                >>> # Shot 1 has a detection event at D0.
+                >>> # Shot 2 has a detection event at D5.
+                >>> indices = np.array([0, 5], dtype=np.uint64)
+                >>> offsets = np.array([0, 0, 1, 2], dtype=np.uint64)
+                >>> decoder.predict_obs_flips_from_sparse_dets(indices, offsets)
+                array([[0],
+                       [1],
+                       [0]], dtype=uint8)
+        )DOC")
+            .data());
+
+    m.def(
+        "compile_decoder_for_dem",
+        &CompiledDecoder::from_dem,
+        pybind11::arg("dem"),
+        pybind11::kw_only(),
+        pybind11::arg("split_bases") = false,
+        pybind11::arg("decode_bases_concurrently") = false,
+        pybind11::arg("max_detection_events") = pybind11::none(),
+        pybind11::arg("shot_time_budget_seconds") = pybind11::none(),
+        pybind11::arg("max_mobius_error_weight") = pybind11::none(),
+        pybind11::arg("fold_pruned_mobius_errors") = false,
+        pybind11::arg("slim") = false,
+        pybind11::arg("compact") = false,
+        pybind11::arg("include_lifting_weight") = false,
+        pybind11::arg("cluster_threads") = 0,
+        stim::clean_doc_string(R"DOC(
+            @signature def compile_decoder_for_dem(dem: stim.DetectorErrorModel, *, split_bases: bool = False, decode_bases_concurrently: bool = False, max_detection_events: Optional[int] = None, shot_time_budget_seconds: Optional[float] = None, max_mobius_error_weight: Optional[float] = None, fold_pruned_mobius_errors: bool = False, slim: bool = False, compact: bool = False, include_lifting_weight: bool = False, cluster_threads: int = 0) -> chromobius.CompiledDecoder:
+            Compiles a decoder for a stim detector error model.
+
+            The dem may have any number of observables. Observables past the first
+            64 are handled by lifting each shot's matching once per group of 64
+            observables, which adds a little to the time spent decoding each shot.
+
+            Args:
+                dem: A stim detector error model. The detector error model must satisfy:
+                    1. Basis+Color annotations. Every detector that appears in an error
+                        must specify coordinate data including a fourth coordinate. The 4th
+                        coordinate indicates the basis and color of the detector with the
+                        convention:
+                            0 = Red X
+                            1 = Green X
+                            2 = Blue X
+                            3 = Red Z
+                            4 = Green Z
+                            5 = Blue Z
+                            -1 = Ignore this Detector
+                    2. Rainbow triplets. Bulk errors with three symptoms in one basis should
+                        have one symptom of each color. Errors with three symptoms that
+                        repeat a color will cause an exception unless they can be decomposed
+                        into other basic errors.
+                    3. Movable excitations. It needs to be possible to combine bulk errors
+                        to form simpler errors with one or two symptoms that can be used to
+                        move or destroy excitations. If bulk errors don't have this
+                        property, decoding will fail when attempting to lift a solution
+                        from the matcher requires dragging an excitation along a path but
+                        there's no way to move the excitation along that path.
+                    4. Matchable-avoids-color. In parts of the dem that correspond to a
+                        matchable code, at least one of the colors must be avoided.
+                        Otherwise the matcher may be given a problem that can be solved
+                        locally, but when lifting it needs to be solved non-locally.
+                split_bases: Defaults to False. When set, the X basis and Z basis
+                    parts of the matching problem get separate matchers and are
+                    solved independently, using smaller working sets. Requires
+                    that every error decomposes into a purely X part and a purely
+                    Z part (e.g. a Y error in a CSS color code).
+                decode_bases_concurrently: Defaults to False. When set (along
+                    with split_bases), shots with detection events in both bases
+                    decode their X part on a helper thread while the calling
+                    thread decodes the Z part. This only pays for itself when
+                    individual shots take a long time to decode.
+                max_detection_events: Defaults to None (no limit). Shots with
+                    more detection events than this aren't decoded. They
+                    predict no observable flips, and are reported as status 1
+                    by `predict_obs_flips_with_status_from_dets_bit_packed`.
+                shot_time_budget_seconds: Defaults to None (no limit). The
+                    matcher can't be interrupted, so the budget is enforced
+                    before matching, using a running estimate of the decoding
+                    time per detection event learned from earlier shots.
+                    Shots estimated to take longer than this aren't decoded.
+                    They predict no observable flips, and are reported as
+                    status 2 by
+                    `predict_obs_flips_with_status_from_dets_bit_packed`.
+                    Shots that are decoded but finish late keep their
+                    prediction, and are reported as status 3. The estimate
+                    starts at zero, so early or unusually hard shots can still
+                    overrun the budget.
+                max_mobius_error_weight: Defaults to None (no pruning). Errors
+                    in the matching problem with a weight ln((1-p)/p) above
+                    this are pruned, shrinking the matching graph. The number
+                    of matching graph edges that were removed is reported by
+                    `CompiledDecoder.num_pruned_mobius_edges`. Pruning too
+                    aggressively can disconnect the matching graph, causing
+                    decoding to fail.
+                fold_pruned_mobius_errors: Defaults to False. When set, the
+                    probability of each pruned error is folded into the edges
+                    it shares with kept errors, instead of being discarded.
+                slim: Defaults to False. When set, data that's only needed
+                    while compiling the decoder is freed afterwards, reducing
+                    the decoder's memory footprint without changing its
+                    predictions. Useful when many decoders are kept alive at
+                    once. See `CompiledDecoder.memory_usage`.
+                compact: Defaults to False. Implies `slim`. When set, the
+                    lookup tables used to lift the matcher's solutions are
+                    moved into sorted arrays on read-only memory pages.
+                    Clones of the decoder (e.g. the worker threads used by
+                    `CompiledDecoder.predict_future`) share the arrays, and so
+                    do worker processes forked after compiling the decoder,
+                    because the pages are never written and so are never
+                    copied on write. Predictions are unchanged.
+                include_lifting_weight: Defaults to False. When set, the weights
+                    returned by `predict_weighted_obs_flips_from_dets_bit_packed`
+                    include the cost of lifting the matcher's solution. Lifting
+                    applies rgb representative errors (errors with one symptom of
+                    each color) to convert between charge colors, and each one it
+                    applies adds its weight ln((1-p)/p) to the shot's weight. The
+                    weights are accumulated while lifting, so reporting them
+                    costs nothing extra per shot. Predictions are unchanged.
+                cluster_threads: Defaults to 0. When at least 2, each shot is
+                    split into clusters of detection events that can be matched
+                    independently, and the clusters are matched in parallel by
+                    this many threads. The predictions have the same weight as
+                    matching the whole shot at once (ties between equally likely
+                    predictions may be broken differently). This lowers the
+                    latency of shots from large patches with sparse detection
+                    events, when there are spare cores. Shots whose clusters
+                    percolate are matched whole, and the shots after them skip
+                    clustering, so dense shots cost about the same as without
+                    clustering. On one thread clustering is only extra work, so
+                    values below 2 disable it. Can't be combined with
+                    max_detection_events or shot_time_budget_seconds.
+
+            Returns:
+                A decoder object that can be used to predict observable flips from
+                detection event samples.
+
+            Example:
+                >>> import stim
+                >>> import chromobius
+
+                >>> dem = stim.Circuit('''
+                ...     X_ERROR(0.1) 0 1 2 3 4 5 6 7
+                ...     MPP Z0*Z1*Z2 Z1*Z2*Z3 Z2*Z3*Z4 Z3*Z4*Z5
+                ...     DETECTOR(0, 0, 0, 1) rec[-4]
+                ...     DETECTOR(1, 0, 0, 2) rec[-3]
+                ...     DETECTOR(2, 0, 0, 0) rec[-2]
+                ...     DETECTOR(3, 0, 0, 1) rec[-1]
+                ...     M 0
+                ...     OBSERVABLE_INCLUDE(0) rec[-1]
+                ... ''').detector_error_model()
+
+                >>> decoder = chromobius.compile_decoder_for_dem(dem)
+        )DOC")
+            .data());
+
+    m.def(
+        "compile_decoder_for_circuit",
+        &CompiledDecoder::from_circuit,
+        pybind11::arg("circuit"),
+        pybind11::kw_only(),
+        pybind11::arg("split_bases") = false,
+        pybind11::arg("decode_bases_concurrently") = false,
+        pybind11::arg("max_detection_events") = pybind11::none(),
+        pybind11::arg("shot_time_budget_seconds") = pybind11::none(),
+        pybind11::arg("max_mobius_error_weight") = pybind11::none(),
+        pybind11::arg("fold_pruned_mobius_errors") = false,
+        pybind11::arg("slim") = false,
+        pybind11::arg("compact") = false,
+        pybind11::arg("include_lifting_weight") = false,
+        pybind11::arg("cluster_threads") = 0,
+        stim::clean_doc_string(R"DOC(
+            @signature def compile_decoder_for_circuit(circuit: stim.Circuit, *, split_bases: bool = False, decode_bases_concurrently: bool = False, max_detection_events: Optional[int] = None, shot_time_budget_seconds: Optional[float] = None, max_mobius_error_weight: Optional[float] = None, fold_pruned_mobius_errors: bool = False, slim: bool = False, compact: bool = False, include_lifting_weight: bool = False, cluster_threads: int = 0) -> chromobius.CompiledDecoder:
+            Compiles a decoder for a stim circuit.
+
+            Error analysis and decoder configuration happen in one native call,
+            without holding the GIL. Loops in the circuit are folded during error
+            analysis, and the detector error model is never converted into a
+            python object. This is much faster than calling
+            `circuit.detector_error_model()` followed by
+            `chromobius.compile_decoder_for_dem` for circuits with many rounds.
+
+            The resulting decoder is the same as the one produced by
+            `chromobius.compile_decoder_for_dem(circuit.detector_error_model(
+            approximate_disjoint_errors=True))`.
+
+            Args:
+                circuit: A stim circuit. The circuit's detectors must be
+                    annotated with their basis and color, using the 4th
+                    coordinate convention described in
+                    `chromobius.compile_decoder_for_dem`.
+                split_bases: See `chromobius.compile_decoder_for_dem`.
+                decode_bases_concurrently: See
+                    `chromobius.compile_decoder_for_dem`.
+                max_detection_events: See `chromobius.compile_decoder_for_dem`.
+                shot_time_budget_seconds: See
+                    `chromobius.compile_decoder_for_dem`.
+                max_mobius_error_weight: See
+                    `chromobius.compile_decoder_for_dem`.
+                fold_pruned_mobius_errors: See
+                    `chromobius.compile_decoder_for_dem`.
+                slim: See `chromobius.compile_decoder_for_dem`.
+                compact: See `chromobius.compile_decoder_for_dem`.
+                include_lifting_weight: See `chromobius.compile_decoder_for_dem`.
+                cluster_threads: See `chromobius.compile_decoder_for_dem`.
+
+            Returns:
+                A decoder object that can be used to predict observable flips from
+                detection event samples.
+
+            Example:
+                >>> import numpy as np
+                >>> import stim
+                >>> import chromobius
+
+                >>> circuit = stim.Circuit('''
+                ...     X_ERROR(0.1) 0 1 2 3 4 5 6 7
+                ...     MPP Z0*Z1*Z2 Z1*Z2*Z3 Z2*Z3*Z4 Z3*Z4*Z5
+                ...     DETECTOR(0, 0, 0, 1) rec[-4]
+                ...     DETECTOR(1, 0, 0, 2) rec[-3]
+                ...     DETECTOR(2, 0, 0, 0) rec[-2]
+                ...     DETECTOR(3, 0, 0, 1) rec[-1]
+                ...     M 0
+                ...     OBSERVABLE_INCLUDE(0) rec[-1]
+                ... ''')
+
+                >>> decoder = chromobius.compile_decoder_for_circuit(circuit)
+                >>> decoder.predict_obs_flips_from_dets_bit_packed(
+                ...     np.array([[0b0001]], dtype=np.uint8),
+                ... )
+                array([[1]], dtype=uint8)
+        )DOC")
+            .data());
+
+    auto sliding_window_decoder = pybind11::class_<CompiledSlidingWindowDecoder>(
+        m,
+        "SlidingWindowDecoder",
+        stim::clean_doc_string(R"DOC(
+            A chromobius decoder that decodes shots in overlapping windows of time.
+
+            Detectors are ordered in time using their third coordinate. Each window
+            covers a commit region followed by a buffer region. Pieces of the
+            window's solution that only involve detection events from the commit
+            region are committed, and the rest are decoded again as part of the
+            next window. Detection events can be streamed in as they are measured,
+            so the work done per round doesn't grow with the length of the
+            experiment.
+
+            Example:
+                >>> import chromobius
+                >>> import numpy as np
+                >>> import stim
+
+                >>> circuit = stim.Circuit('''
+                ...     MPP Z0*Z1*Z2 Z1*Z2*Z3 Z2*Z3*Z4 Z3*Z4*Z5 Z4*Z5*Z6 Z5*Z6*Z7
+                ...     REPEAT 20 {
+                ...         X_ERROR(0.01) 0 1 2 3 4 5 6 7
+                ...         MPP Z0*Z1*Z2 Z1*Z2*Z3 Z2*Z3*Z4 Z3*Z4*Z5 Z4*Z5*Z6 Z5*Z6*Z7
+                ...         DETECTOR(0, 0, 0, 2) rec[-6] rec[-12]
+                ...         DETECTOR(1, 0, 0, 0) rec[-5] rec[-11]
+                ...         DETECTOR(2, 0, 0, 1) rec[-4] rec[-10]
+                ...         DETECTOR(3, 0, 0, 2) rec[-3] rec[-9]
+                ...         DETECTOR(4, 0, 0, 0) rec[-2] rec[-8]
+                ...         DETECTOR(5, 0, 0, 1) rec[-1] rec[-7]
+                ...         SHIFT_COORDS(0, 0, 1)
+                ...     }
+                ...     M 0
+                ...     OBSERVABLE_INCLUDE(0) rec[-1]
+                ... ''')
+                >>> decoder = chromobius.SlidingWindowDecoder.from_dem(
+                ...     circuit.detector_error_model(),
+                ...     commit_duration=2,
+                ...     buffer_duration=4,
+                ... )
+
+                >>> dets, obs = circuit.compile_detector_sampler().sample(
+                ...     shots=100,
+                ...     separate_observables=True,
+                ...     bit_packed=True,
+                ... )
+                >>> predictions = decoder.predict_obs_flips_from_dets_bit_packed(dets)
+                >>> assert np.count_nonzero(predictions != obs) < 10
+        )DOC")
+            .data());
+
+    sliding_window_decoder.def_static(
+        "from_dem",
+        &CompiledSlidingWindowDecoder::from_dem,
+        pybind11::arg("dem"),
+        pybind11::kw_only(),
+        pybind11::arg("commit_duration"),
+        pybind11::arg("buffer_duration"),
+        stim::clean_doc_string(R"DOC(
+            @signature def from_dem(dem: stim.DetectorErrorModel, *, commit_duration: float, buffer_duration: float) -> chromobius.SlidingWindowDecoder:
+            Compiles a sliding window decoder for a stim detector error model.
+
+            Args:
+                dem: A stim detector error model, meeting the requirements
+                    described in `chromobius.compile_decoder_for_dem`. The third
+                    coordinate of each detector is used as its time. Unlike
+                    `chromobius.compile_decoder_for_dem`, the dem can't have more
+                    than 64 observables, because committed pieces of a window's
+                    solution only track the first 64 observables.
+                commit_duration: How much time (in units of the time coordinate)
+                    each window commits. Must be positive.
+                buffer_duration: How much time after the commit region is
+                    included in each window without being committed. Longer
+                    buffers give predictions closer to decoding the whole shot
+                    at once (a buffer at least as long as the code distance is
+                    typical), at the cost of more work per window.
+
+            Returns:
+                The configured decoder.
+
+            Raises:
+                ValueError: The dem has more than 64 observables.
+        )DOC")
+            .data());
+
+    sliding_window_decoder.def_property_readonly(
+        "commit_duration",
+        [](const CompiledSlidingWindowDecoder &self) -> double {
+            return self.decoder.commit_duration;
+        },
+        "How much time (in units of the time coordinate) each window commits.");
+
+    sliding_window_decoder.def_property_readonly(
+        "buffer_duration",
+        [](const CompiledSlidingWindowDecoder &self) -> double {
+            return self.decoder.buffer_duration;
+        },
+        "How much time after each commit region is decoded but not committed.");
+
+    sliding_window_decoder.def_property_readonly(
+        "num_windows_decoded",
+        [](const CompiledSlidingWindowDecoder &self) -> size_t {
+            return self.decoder.num_windows_decoded;
+        },
+        "The number of windows decoded for the current (or most recent) shot.");
+
+    sliding_window_decoder.def(
+        "add_detection_events",
+        &CompiledSlidingWindowDecoder::add_detection_events,
+        pybind11::arg("detectors"),
+        stim::clean_doc_string(R"DOC(
+            @signature def add_detection_events(self, detectors: np.ndarray) -> None:
+            Adds detection events to the shot being streamed.
+
+            Detection events can be added in any order, but must be added
+            before `advance_to_time` is called with a time after their time
+            coordinate.
+
+            Args:
+                detectors: A 1D array of the indices of detectors that fired.
+        )DOC")
+            .data());
+
+    sliding_window_decoder.def(
+        "advance_to_time",
+        &CompiledSlidingWindowDecoder::advance_to_time,
+        pybind11::arg("time"),
+        stim::clean_doc_string(R"DOC(
+            @signature def advance_to_time(self, time: float) -> None:
+            Decodes every window that's complete as of the given time.
+
+            Args:
+                time: All detection events with a time coordinate before this
+                    time have been added.
+        )DOC")
+            .data());
+
+    sliding_window_decoder.def(
+        "finish",
+        &CompiledSlidingWindowDecoder::finish,
+        stim::clean_doc_string(R"DOC(
+            @signature def finish(self) -> np.ndarray:
+            Decodes the rest of the streamed shot and returns its prediction.
+
+            The decoder is then ready to stream the next shot.
+
+            Returns:
+                A bit packed uint8 numpy array of the predicted observable
+                flips, with shape (ceil(num_observables / 8),).
+
+            Example:
+                >>> import chromobius
+                >>> import numpy as np
+                >>> import stim
+
+                >>> dem = stim.DetectorErrorModel('''
+                ...     error(0.1) D0 L0
+                ...     error(0.1) D0 D1
+                ...     error(0.1) D1 D2
+                ...     detector(0, 0, 0, 0) D0
+                ...     detector(0, 0, 1, 0) D1
+                ...     detector(0, 0, 2, 0) D2
+                ... ''')
+                >>> decoder = chromobius.SlidingWindowDecoder.from_dem(
+                ...     dem,
+                ...     commit_duration=1,
+                ...     buffer_duration=1,
+                ... )
+                >>> decoder.add_detection_events(np.array([0], dtype=np.uint64))
+                >>> decoder.advance_to_time(1)
+                >>> decoder.finish()
+                array([1], dtype=uint8)
+        )DOC")
+            .data());
+
+    sliding_window_decoder.def(
+        "predict_obs_flips_from_dets_bit_packed",
+        &CompiledSlidingWindowDecoder::predict_obs_flips_from_dets_bit_packed,
+        pybind11::arg("dets"),
+        stim::clean_doc_string(R"DOC(
+            @signature def predict_obs_flips_from_dets_bit_packed(self, dets: np.ndarray) -> np.ndarray:
+            Predicts observable flips by streaming whole shots through windows.
+
+            Args:
+                dets: A bit packed uint8 numpy array of detection event data, with
+                    shape (num_shots, ceil(num_detectors / 8)) or, for a single
+                    shot, shape (ceil(num_detectors / 8),).
+
+            Returns:
+                A bit packed uint8 numpy array of observable flip predictions, with
+                shape (num_shots, ceil(num_observables / 8)) or, for a single
+                shot, shape (ceil(num_observables / 8),).
+        )DOC")
+            .data());
+
+    m.def(
+        "collect_errors",
+        &collect_errors,
+        pybind11::arg("circuit"),
+        pybind11::kw_only(),
+        pybind11::arg("shots"),
+        pybind11::arg("max_errors") = pybind11::none(),
+        pybind11::arg("num_threads") = 1,
+        pybind11::arg("seed") = pybind11::none(),
+        stim::clean_doc_string(R"DOC(
+            @signature def collect_errors(circuit: stim.Circuit, *, shots: int, max_errors: Optional[int] = None, num_threads: int = 1, seed: Optional[int] = None) -> dict[str, Any]:
+            Samples a circuit and decodes the samples, counting decoding failures.
+
+            The circuit's detector sampler and the decoder are compiled once. Batches of
+            shots are then sampled and decoded by worker threads, entirely in C++ and
+            without holding the GIL. This is much faster than sampling with stim in
+            python and passing the samples into a `chromobius.CompiledDecoder`.
+
+            Args:
+                circuit: The noisy stim circuit to sample. Its detectors must have
+                    basis+color annotations (see `chromobius.compile_decoder_for_dem`).
+                shots: The maximum number of shots to take.
+                max_errors: Defaults to None (unlimited). Sampling stops early once
+                    this many errors have been seen. Batches that are already being
+                    worked on are finished, so the final error count can slightly
+                    exceed this value.
+                num_threads: Defaults to 1. The number of worker threads to use.
+                seed: Defaults to None (seed from system entropy). Makes the sampling
+                    deterministic. The results also depend on num_threads when
+                    max_errors causes sampling to stop early.
+
+            Returns:
+                A dictionary with the keys 'shots', 'errors', 'discards', and
+                'seconds'. The values match the meaning of the fields of
+                `sinter.AnonTaskStats`, so the result can be passed into it via
+                `sinter.AnonTaskStats(**result)`. The 'seconds' value is the total
+                thread time spent sampling and decoding.
+
+            Example:
+                >>> import stim
+                >>> import chromobius
+
+                >>> repetition_color_code = stim.Circuit('''
+                ...     X_ERROR(0.1) 0 1 2 3 4 5 6 7
+                ...     MPP Z0*Z1*Z2 Z1*Z2*Z3 Z2*Z3*Z4 Z3*Z4*Z5 Z4*Z5*Z6 Z5*Z6*Z7
+                ...     DETECTOR(0, 0, 0, 2) rec[-6]
+                ...     DETECTOR(1, 0, 0, 0) rec[-5]
+                ...     DETECTOR(2, 0, 0, 1) rec[-4]
+                ...     DETECTOR(3, 0, 0, 2) rec[-3]
+                ...     DETECTOR(4, 0, 0, 0) rec[-2]
+                ...     DETECTOR(5, 0, 0, 1) rec[-1]
+                ...     M 0
+                ...     OBSERVABLE_INCLUDE(0) rec[-1]
+                ... ''')
+
+                >>> result = chromobius.collect_errors(
+                ...     repetition_color_code,
+                ...     shots=4096,
+                ...     num_threads=2,
+                ... )
+                >>> result['shots']
+                4096
+                >>> result['errors'] < 4096 / 5
+                True
+        )DOC")
+            .data());
+
+    m.def(
+        "profile_configuration",
+        &profile_configuration,
+        pybind11::arg("dem"),
+        pybind11::kw_only(),
+        pybind11::arg("split_bases") = false,
+        pybind11::arg("decode_bases_concurrently") = false,
+        pybind11::arg("max_detection_events") = pybind11::none(),
+        pybind11::arg("shot_time_budget_seconds") = pybind11::none(),
+        pybind11::arg("max_mobius_error_weight") = pybind11::none(),
+        pybind11::arg("fold_pruned_mobius_errors") = false,
+        pybind11::arg("slim") = false,
+        pybind11::arg("compact") = false,
+        pybind11::arg("include_lifting_weight") = false,
+        pybind11::arg("cluster_threads") = 0,
+        stim::clean_doc_string(R"DOC(
+            @signature def profile_configuration(dem: stim.DetectorErrorModel, *, split_bases: bool = False, decode_bases_concurrently: bool = False, max_detection_events: Optional[int] = None, shot_time_budget_seconds: Optional[float] = None, max_mobius_error_weight: Optional[float] = None, fold_pruned_mobius_errors: bool = False, slim: bool = False, compact: bool = False, include_lifting_weight: bool = False, cluster_threads: int = 0) -> dict[str, Any]:
+            Measures how long each stage of configuring a decoder takes.
+
+            Configures a decoder for the given dem (with the same arguments as
+            `chromobius.compile_decoder_for_dem`), and reports the time spent in
+            each stage of configuration along with the number of objects (atomic
+            errors, mobius edges, drag graph entries, ...) that were produced.
+            The same report is printed by `chromobius describe_decoder --profile`.
+
+            Memory is reported using the process's peak resident memory, which
+            only grows when a stage uses more memory than any earlier point in
+            the process. It's 0 on platforms where it isn't available.
+
+            Returns:
+                A JSON-compatible dictionary with these keys:
+                    'stages': A list of dictionaries, in the order the stages
+                        ran, with the keys 'name', 'seconds', 'peak_rss_bytes',
+                        and 'peak_rss_growth_bytes'.
+                    'total_seconds': The total time spent in the stages.
+                    'counts': A dictionary mapping names like
+                        'num_atomic_errors' to object counts.
+
+            Example:
+                >>> import stim
+                >>> import chromobius
+                >>> dem = stim.Circuit('''
+                ...     X_ERROR(0.1) 0 1 2 3 4 5 6 7
+                ...     MPP Z0*Z1*Z2 Z1*Z2*Z3 Z2*Z3*Z4 Z3*Z4*Z5 Z4*Z5*Z6 Z5*Z6*Z7
+                ...     DETECTOR(0, 0, 0, 2) rec[-6]
+                ...     DETECTOR(1, 0, 0, 0) rec[-5]
+                ...     DETECTOR(2, 0, 0, 1) rec[-4]
+                ...     DETECTOR(3, 0, 0, 2) rec[-3]
+                ...     DETECTOR(4, 0, 0, 0) rec[-2]
+                ...     DETECTOR(5, 0, 0, 1) rec[-1]
+                ...     M 0
+                ...     OBSERVABLE_INCLUDE(0) rec[-1]
+                ... ''').detector_error_model()
+
+                >>> profile = chromobius.profile_configuration(dem)
+                >>> [stage['name'] for stage in profile['stages']][:3]
+                ['collect_nodes', 'collect_atomic_errors', 'decompose_composite_errors']
+                >>> profile['counts']['num_detectors']
+                6
+                >>> profile['total_seconds'] >= 0
+                True
+        )DOC")
+            .data());
+
+    m.def(
+        "read_match_trace",
+        &read_match_trace,
+        pybind11::arg("path"),
+        stim::clean_doc_string(R"DOC(
+            @signature def read_match_trace(path: Union[str, pathlib.Path]) -> dict[str, Any]:
+            Loads a trace written by `chromobius.CompiledDecoder.start_match_trace`.
+
+            Mobius nodes are identified by detector: mobius node 2*d+k (for k in
+            [0, 1]) is one of the two mobius nodes of detector d.
+
+            Variable length data is concatenated across records, with offset
+            arrays marking where each record's data starts. For example, the
+            detection events of record k are
+            `trace['dets'][trace['det_offsets'][k]:trace['det_offsets'][k + 1]]`.
+
+            Args:
+                path: The trace file to read.
+
+            Returns:
+                A dictionary with these keys:
+                    'num_detectors', 'num_observables': ints describing the dem
+                        of the decoder that wrote the trace.
+                    'shot': uint64 array with the index of each record's shot.
+                    'weight': float32 array with the weight of each record's
+                        matching.
+                    'status': uint8 array with each record's decode status (0 =
+                        decoded, 1 = too many detection events, 2 = over time
+                        budget, 3 = decoded late).
+                    'obs_flips': uint8 array of shape (num_records,
+                        ceil(num_observables / 8)) with each record's bit
+                        packed prediction.
+                    'dets', 'det_offsets': the detectors that fired.
+                    'edges', 'edge_offsets': int64 array of shape (num_edges, 2)
+                        holding the mobius nodes matched together (-1 is the
+                        boundary), and where each record's edges start.
+                    'cycle_nodes', 'cycle_offsets': the mobius nodes of each
+                        lifted euler cycle, and where each cycle starts.
+                    'cycle_obs_flips': uint64 array with the flips of the first
+                        64 observables produced by lifting each cycle.
+                    'shot_cycle_offsets': where each record's cycles start.
+
+            Example:
+                >>> import pathlib
+                >>> import tempfile
+                >>> import stim
+                >>> import chromobius
+                >>> import numpy as np
+
+                >>> repetition_color_code = stim.Circuit('''
+                ...     X_ERROR(0.1) 0 1 2 3 4 5 6 7
+                ...     MPP Z0*Z1*Z2 Z1*Z2*Z3 Z2*Z3*Z4 Z3*Z4*Z5 Z4*Z5*Z6 Z5*Z6*Z7
+                ...     DETECTOR(0, 0, 0, 2) rec[-6]
+                ...     DETECTOR(1, 0, 0, 0) rec[-5]
+                ...     DETECTOR(2, 0, 0, 1) rec[-4]
+                ...     DETECTOR(3, 0, 0, 2) rec[-3]
+                ...     DETECTOR(4, 0, 0, 0) rec[-2]
+                ...     DETECTOR(5, 0, 0, 1) rec[-1]
+                ...     M 0
+                ...     OBSERVABLE_INCLUDE(0) rec[-1]
+                ... ''')
+                >>> decoder = chromobius.compile_decoder_for_dem(
+                ...     repetition_color_code.detector_error_model()
+                ... )
+
+                >>> with tempfile.TemporaryDirectory() as d:
+                ...     path = pathlib.Path(d) / 'trace.bin'
+                ...     decoder.start_match_trace(path)
+                ...     _ = decoder.predict_obs_flips_from_dets_bit_packed(
+                ...         np.array([[0b101000]], dtype=np.uint8)
+                ...     )
+                ...     decoder.stop_match_trace()
+                ...     trace = chromobius.read_match_trace(path)
+                >>> trace['dets']
+                array([3, 5], dtype=uint32)
+                >>> len(trace['edges']) > 0
+                True
+                >>> int(trace['cycle_obs_flips'][0])
+                0
+        )DOC")
+            .data());
+
+    m.def(
+        "main",
+        &chromobius_main,
+        pybind11::kw_only(),
+        pybind11::arg("command_line_args"),
+        stim::clean_doc_string(R"DOC(
+            @signature def main(*, command_line_args: list[str]) -> int:
+            Runs the command line tool version of chromobius on the given arguments.
+
+            The GIL is released while the command runs, so long running commands
+            such as `serve` can be run on a background thread.
+
+            Args:
+                command_line_args: The arguments to pass to the command line tool,
+                    starting with the name of the command (e.g. 'predict').
+
+            Returns:
+                An exit code (0 means success, not zero means failure).
+
+            Example:
+                >>> import chromobius
+                >>> import tempfile
+                >>> with tempfile.TemporaryDirectory() as d:
+                ...     with open(f'{d}/in.dem', 'w') as f:
+                ...         print('error(0.1) D0 L0', file=f)
+                ...         print('detector(0, 0, 0, 0) D0', file=f)
+                ...     with open(f'{d}/in.01', 'w') as f:
+                ...         print('0', file=f)
+                ...         print('1', file=f)
+                ...     return_code = chromobius.main(command_line_args=[
+                ...         'predict',
+                ...         '--dem', f'{d}/in.dem',
+                ...         '--in', f'{d}/in.01',
+                ...         '--in_format', '01',
+                ...         '--out', f'{d}/out.01',
+                ...     ])
+                ...     assert return_code == 0
+                ...     with open(f'{d}/out.01') as f:
+                ...         print(f.read(), end='')
+                0
+                1
+        )DOC")
+            .data());
+
+    auto decode_server_client = pybind11::class_<DecodeServerClient>(
+        m,
+        "DecodeServerClient",
+        stim::clean_doc_string(R"DOC(
+            A connection to a decoder being run by `chromobius serve`.
+
+            `chromobius serve` keeps a compiled decoder loaded in a long lived process
+            and decodes requests sent to it over a unix domain socket or a localhost
+            TCP port. Requests from all connected clients are decoded concurrently by
+            the server's worker threads.
+
+            Example:
+                >>> import chromobius
+                >>> import numpy as np
+                >>> import os
+                >>> import stim
+                >>> import tempfile
+                >>> import threading
+                >>> import time
 
                 >>> dem = stim.Circuit('''
                 ...     X_ERROR(0.1) 0 1 2 3 4 5 6 7
@@ -375,7 +2647,143 @@ PYBIND11_MODULE(chromobius, m) {
                 ...     OBSERVABLE_INCLUDE(0) rec[-1]
                 ... ''').detector_error_model()
 
-                >>> decoder = chromobius.compile_decoder_for_dem(dem)
+                >>> with tempfile.TemporaryDirectory() as d:
+                ...     dem.to_file(f'{d}/model.dem')
+                ...     server = threading.Thread(target=chromobius.main, kwargs={
+                ...         'command_line_args': [
+                ...             'serve',
+                ...             '--dem', f'{d}/model.dem',
+                ...             '--socket', f'{d}/decoder.sock',
+                ...             '--out', os.devnull,
+                ...         ],
+                ...     })
+                ...     server.start()
+                ...     while not os.path.exists(f'{d}/decoder.sock'):
+                ...         time.sleep(0.01)
+                ...     with chromobius.DecodeServerClient(
+                ...         socket_path=f'{d}/decoder.sock',
+                ...     ) as client:
+                ...         dets = np.array([[0], [1]], dtype=np.uint8)
+                ...         obs = client.predict_obs_flips_from_dets_bit_packed(dets)
+                ...         client.shutdown_server()
+                ...     server.join()
+                >>> obs
+                array([[0],
+                       [1]], dtype=uint8)
+        )DOC")
+            .data());
+
+    decode_server_client.def(
+        pybind11::init(&DecodeServerClient::connect),
+        pybind11::kw_only(),
+        pybind11::arg("socket_path") = pybind11::none(),
+        pybind11::arg("port") = pybind11::none(),
+        stim::clean_doc_string(R"DOC(
+            @signature def __init__(self, *, socket_path: Optional[str | pathlib.Path] = None, port: Optional[int] = None) -> None:
+            Connects to a running `chromobius serve` process.
+
+            Args:
+                socket_path: The unix domain socket the server is listening on
+                    (its `--socket` argument).
+                port: The localhost TCP port the server is listening on (its
+                    `--port` argument). Exactly one of socket_path and port must
+                    be specified.
+        )DOC")
+            .data());
+
+    decode_server_client.def_property_readonly(
+        "num_detectors",
+        [](const DecodeServerClient &self) -> uint64_t {
+            return self.client->num_detectors;
+        },
+        "The number of detectors in the server's detector error model.");
+
+    decode_server_client.def_property_readonly(
+        "num_observables",
+        [](const DecodeServerClient &self) -> uint64_t {
+            return self.client->num_observables;
+        },
+        "The number of observables in the server's detector error model.");
+
+    decode_server_client.def(
+        "predict_obs_flips_from_dets_bit_packed",
+        &DecodeServerClient::predict_obs_flips_from_dets_bit_packed,
+        pybind11::arg("dets"),
+        stim::clean_doc_string(R"DOC(
+            @signature def predict_obs_flips_from_dets_bit_packed(self, dets: np.ndarray) -> np.ndarray:
+            Sends detection events to the server and returns its predictions.
+
+            The GIL is released while waiting for the server to respond.
+
+            Args:
+                dets: A bit packed uint8 numpy array of detection event data, with
+                    shape (num_shots, ceil(num_detectors / 8)) or, for a single
+                    shot, shape (ceil(num_detectors / 8),).
+
+            Returns:
+                A bit packed uint8 numpy array of observable flip predictions, with
+                shape (num_shots, ceil(num_observables / 8)) or, for a single
+                shot, shape (ceil(num_observables / 8),).
+        )DOC")
+            .data());
+
+    decode_server_client.def(
+        "stats",
+        &DecodeServerClient::stats,
+        stim::clean_doc_string(R"DOC(
+            @signature def stats(self) -> dict[str, Any]:
+            Returns statistics about the requests the server has decoded.
+
+            Returns:
+                A dictionary with the keys 'requests', 'failed_requests', 'shots',
+                'batches', and 'latency_microseconds'. Requests that arrive while
+                the decoding threads are busy are decoded together, so 'batches'
+                counts the decoding passes that served them. The latency entry
+                is a dictionary with the keys 'count', 'mean', 'p50', 'p90',
+                'p99', and 'max', computed over recently decoded requests.
+                Latency is measured from the server receiving a request to it
+                sending the response.
+        )DOC")
+            .data());
+
+    decode_server_client.def(
+        "shutdown_server",
+        &DecodeServerClient::shutdown_server,
+        stim::clean_doc_string(R"DOC(
+            @signature def shutdown_server(self) -> None:
+            Tells the server to finish outstanding requests and exit.
+        )DOC")
+            .data());
+
+    decode_server_client.def(
+        "close",
+        &DecodeServerClient::close,
+        stim::clean_doc_string(R"DOC(
+            @signature def close(self) -> None:
+            Closes the connection to the server.
+        )DOC")
+            .data());
+
+    decode_server_client.def(
+        "__enter__",
+        [](DecodeServerClient &self) -> DecodeServerClient & {
+            return self;
+        },
+        pybind11::return_value_policy::reference,
+        stim::clean_doc_string(R"DOC(
+            @signature def __enter__(self) -> chromobius.DecodeServerClient:
+            Returns the client, so that it's closed when the with block exits.
+        )DOC")
+            .data());
+
+    decode_server_client.def(
+        "__exit__",
+        [](DecodeServerClient &self, const pybind11::object &, const pybind11::object &, const pybind11::object &) {
+            self.close();
+        },
+        stim::clean_doc_string(R"DOC(
+            @signature def __exit__(self, exc_type: Any, exc_val: Any, exc_tb: Any) -> None:
+            Closes the connection to the server.
         )DOC")
             .data());
 
@@ -383,10 +2791,25 @@ PYBIND11_MODULE(chromobius, m) {
         "from_dem",
         &CompiledDecoder::from_dem,
         pybind11::arg("dem"),
+        pybind11::kw_only(),
+        pybind11::arg("split_bases") = false,
+        pybind11::arg("decode_bases_concurrently") = false,
+        pybind11::arg("max_detection_events") = pybind11::none(),
+        pybind11::arg("shot_time_budget_seconds") = pybind11::none(),
+        pybind11::arg("max_mobius_error_weight") = pybind11::none(),
+        pybind11::arg("fold_pruned_mobius_errors") = false,
+        pybind11::arg("slim") = false,
+        pybind11::arg("compact") = false,
+        pybind11::arg("include_lifting_weight") = false,
+        pybind11::arg("cluster_threads") = 0,
         stim::clean_doc_string(R"DOC(
-            @signature def from_dem(dem: stim.DetectorErrorModel) -> chromobius.CompiledDecoder:
+            @signature def from_dem(dem: stim.DetectorErrorModel, *, split_bases: bool = False, decode_bases_concurrently: bool = False, max_detection_events: Optional[int] = None, shot_time_budget_seconds: Optional[float] = None, max_mobius_error_weight: Optional[float] = None, fold_pruned_mobius_errors: bool = False, slim: bool = False, compact: bool = False, include_lifting_weight: bool = False, cluster_threads: int = 0) -> chromobius.CompiledDecoder:
             Compiles a decoder for a stim detector error model.
 
+            The dem may have any number of observables. Observables past the first
+            64 are handled by lifting each shot's matching once per group of 64
+            observables, which adds a little to the time spent decoding each shot.
+
             Args:
                 dem: A stim detector error model. The detector error model must satisfy:
                     1. Basis+Color annotations. Every detector that appears in an error
@@ -414,6 +2837,76 @@ PYBIND11_MODULE(chromobius, m) {
                         matchable code, at least one of the colors must be avoided.
                         Otherwise the matcher may be given a problem that can be solved
                         locally, but when lifting it needs to be solved non-locally.
+                split_bases: Defaults to False. When set, the X basis and Z basis
+                    parts of the matching problem get separate matchers and are
+                    solved independently, using smaller working sets. Requires
+                    that every error decomposes into a purely X part and a purely
+                    Z part (e.g. a Y error in a CSS color code).
+                decode_bases_concurrently: Defaults to False. When set (along
+                    with split_bases), shots with detection events in both bases
+                    decode their X part on a helper thread while the calling
+                    thread decodes the Z part. This only pays for itself when
+                    individual shots take a long time to decode.
+                max_detection_events: Defaults to None (no limit). Shots with
+                    more detection events than this aren't decoded. They
+                    predict no observable flips, and are reported as status 1
+                    by `predict_obs_flips_with_status_from_dets_bit_packed`.
+                shot_time_budget_seconds: Defaults to None (no limit). The
+                    matcher can't be interrupted, so the budget is enforced
+                    before matching, using a running estimate of the decoding
+                    time per detection event learned from earlier shots.
+                    Shots estimated to take longer than this aren't decoded.
+                    They predict no observable flips, and are reported as
+                    status 2 by
+                    `predict_obs_flips_with_status_from_dets_bit_packed`.
+                    Shots that are decoded but finish late keep their
+                    prediction, and are reported as status 3. The estimate
+                    starts at zero, so early or unusually hard shots can still
+                    overrun the budget.
+                max_mobius_error_weight: Defaults to None (no pruning). Errors
+                    in the matching problem with a weight ln((1-p)/p) above
+                    this are pruned, shrinking the matching graph. The number
+                    of matching graph edges that were removed is reported by
+                    `CompiledDecoder.num_pruned_mobius_edges`. Pruning too
+                    aggressively can disconnect the matching graph, causing
+                    decoding to fail.
+                fold_pruned_mobius_errors: Defaults to False. When set, the
+                    probability of each pruned error is folded into the edges
+                    it shares with kept errors, instead of being discarded.
+                slim: Defaults to False. When set, data that's only needed
+                    while compiling the decoder is freed afterwards, reducing
+                    the decoder's memory footprint without changing its
+                    predictions. Useful when many decoders are kept alive at
+                    once. See `CompiledDecoder.memory_usage`.
+                compact: Defaults to False. Implies `slim`. When set, the
+                    lookup tables used to lift the matcher's solutions are
+                    moved into sorted arrays on read-only memory pages.
+                    Clones of the decoder (e.g. the worker threads used by
+                    `CompiledDecoder.predict_future`) share the arrays, and so
+                    do worker processes forked after compiling the decoder,
+                    because the pages are never written and so are never
+                    copied on write. Predictions are unchanged.
+                include_lifting_weight: Defaults to False. When set, the weights
+                    returned by `predict_weighted_obs_flips_from_dets_bit_packed`
+                    include the cost of lifting the matcher's solution. Lifting
+                    applies rgb representative errors (errors with one symptom of
+                    each color) to convert between charge colors, and each one it
+                    applies adds its weight ln((1-p)/p) to the shot's weight. The
+                    weights are accumulated while lifting, so reporting them
+                    costs nothing extra per shot. Predictions are unchanged.
+                cluster_threads: Defaults to 0. When at least 2, each shot is
+                    split into clusters of detection events that can be matched
+                    independently, and the clusters are matched in parallel by
+                    this many threads. The predictions have the same weight as
+                    matching the whole shot at once (ties between equally likely
+                    predictions may be broken differently). This lowers the
+                    latency of shots from large patches with sparse detection
+                    events, when there are spare cores. Shots whose clusters
+                    percolate are matched whole, and the shots after them skip
+                    clustering, so dense shots cost about the same as without
+                    clustering. On one thread clustering is only extra work, so
+                    values below 2 disable it. Can't be combined with
+                    max_detection_events or shot_time_budget_seconds.
 
             Returns:
                 A decoder object that can be used to predict observable flips from
@@ -12,6 +12,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
+import json
+import os
+import pathlib
+import sys
+import threading
+import time
+
 import numpy as np
 import pytest
 import stim
@@ -79,3 +87,746 @@ def test_decoding():
 
 def test_empty():
     assert chromobius.compile_decoder_for_dem(stim.DetectorErrorModel()) is not None
+
+
+def test_collect_errors():
+    color_rep_code = stim.Circuit("""
+        X_ERROR(0.1) 0 1 2 3 4 5 6 7 8
+        M 0 1 2 3 4 5 6 7 8
+        DETECTOR(0, 0, 0, 0) rec[-9] rec[-8] rec[-7]
+        DETECTOR(1, 0, 0, 1) rec[-8] rec[-7] rec[-6]
+        DETECTOR(2, 0, 0, 2) rec[-7] rec[-6] rec[-5]
+        DETECTOR(3, 0, 0, 0) rec[-6] rec[-5] rec[-4]
+        DETECTOR(4, 0, 0, 1) rec[-5] rec[-4] rec[-3]
+        DETECTOR(5, 0, 0, 2) rec[-4] rec[-3] rec[-2]
+        DETECTOR(6, 0, 0, 0) rec[-3] rec[-2] rec[-1]
+        DETECTOR(7, 0, 0, 1) rec[-2] rec[-1]
+        OBSERVABLE_INCLUDE(0) rec[-1]
+    """)
+
+    result = chromobius.collect_errors(color_rep_code, shots=5000, num_threads=2, seed=5)
+    assert result.keys() == {'shots', 'errors', 'discards', 'seconds'}
+    assert result['shots'] == 5000
+    assert 0 < result['errors'] < 500
+    assert result['discards'] == 0
+    assert result['seconds'] > 0
+    assert result == {**chromobius.collect_errors(color_rep_code, shots=5000, num_threads=2, seed=5), 'seconds': result['seconds']}
+
+    result = chromobius.collect_errors(color_rep_code, shots=10**9, max_errors=20, num_threads=2)
+    assert 20 <= result['errors']
+    assert result['shots'] < 10**9
+
+    with pytest.raises(ValueError, match='must be a stim.Circuit'):
+        chromobius.collect_errors(object(), shots=10)
+
+
+def test_predict_obs_flips_from_sparse_dets():
+    color_rep_code = stim.Circuit("""
+        X_ERROR(0.1) 0 1 2 3 4 5 6 7 8
+        M 0 1 2 3 4 5 6 7 8
+        DETECTOR(0, 0, 0, 0) rec[-9] rec[-8] rec[-7]
+        DETECTOR(1, 0, 0, 1) rec[-8] rec[-7] rec[-6]
+        DETECTOR(2, 0, 0, 2) rec[-7] rec[-6] rec[-5]
+        DETECTOR(3, 0, 0, 0) rec[-6] rec[-5] rec[-4]
+        DETECTOR(4, 0, 0, 1) rec[-5] rec[-4] rec[-3]
+        DETECTOR(5, 0, 0, 2) rec[-4] rec[-3] rec[-2]
+        DETECTOR(6, 0, 0, 0) rec[-3] rec[-2] rec[-1]
+        DETECTOR(7, 0, 0, 1) rec[-2] rec[-1]
+        OBSERVABLE_INCLUDE(0) rec[-1]
+        OBSERVABLE_INCLUDE(1) rec[-5]
+    """)
+    decoder = chromobius.compile_decoder_for_dem(color_rep_code.detector_error_model())
+    dets = color_rep_code.compile_detector_sampler().sample(shots=1024)
+    indices = np.flatnonzero(dets) % dets.shape[1]
+    offsets = np.concatenate([[0], np.cumsum(np.count_nonzero(dets, axis=1))])
+
+    expected = decoder.predict_obs_flips_from_dets_bit_packed(np.packbits(dets, axis=1, bitorder='little'))
+    np.testing.assert_array_equal(decoder.predict_obs_flips_from_sparse_dets(indices, offsets), expected)
+    np.testing.assert_array_equal(
+        decoder.predict_obs_flips_from_sparse_dets(indices.astype(np.uint32), offsets.astype(np.int32)),
+        expected,
+    )
+    assert decoder.predict_obs_flips_from_sparse_dets([], [0]).shape == (0, 1)
+
+    with pytest.raises(ValueError, match='out of range'):
+        decoder.predict_obs_flips_from_sparse_dets([1, 8], [0, 2])
+    with pytest.raises(ValueError, match='more than once'):
+        decoder.predict_obs_flips_from_sparse_dets([1, 1], [0, 2])
+    with pytest.raises(ValueError, match='non-decreasing'):
+        decoder.predict_obs_flips_from_sparse_dets([1, 2], [0, 2, 1])
+    with pytest.raises(ValueError, match='len\\(indices\\)'):
+        decoder.predict_obs_flips_from_sparse_dets([1, 2], [0, 3])
+
+
+def test_predict_obs_flips_from_unpacked_and_ptb64_dets():
+    color_rep_code = stim.Circuit("""
+        X_ERROR(0.1) 0 1 2 3 4 5 6 7 8
+        M 0 1 2 3 4 5 6 7 8
+        DETECTOR(0, 0, 0, 0) rec[-9] rec[-8] rec[-7]
+        DETECTOR(1, 0, 0, 1) rec[-8] rec[-7] rec[-6]
+        DETECTOR(2, 0, 0, 2) rec[-7] rec[-6] rec[-5]
+        DETECTOR(3, 0, 0, 0) rec[-6] rec[-5] rec[-4]
+        DETECTOR(4, 0, 0, 1) rec[-5] rec[-4] rec[-3]
+        DETECTOR(5, 0, 0, 2) rec[-4] rec[-3] rec[-2]
+        DETECTOR(6, 0, 0, 0) rec[-3] rec[-2] rec[-1]
+        DETECTOR(7, 0, 0, 1) rec[-2] rec[-1]
+        OBSERVABLE_INCLUDE(0) rec[-1]
+        OBSERVABLE_INCLUDE(1) rec[-5]
+    """)
+    decoder = chromobius.compile_decoder_for_dem(color_rep_code.detector_error_model())
+    dets = color_rep_code.compile_detector_sampler().sample(shots=1024)
+    expected = decoder.predict_obs_flips_from_dets_bit_packed(np.packbits(dets, axis=1, bitorder='little'))
+
+    # Unpacked data.
+    np.testing.assert_array_equal(decoder.predict_obs_flips_from_dets_bit_packed(dets), expected)
+    np.testing.assert_array_equal(decoder.predict_obs_flips_from_dets_bit_packed(dets[5]), expected[5])
+    np.testing.assert_array_equal(decoder.predict_obs_flips_from_dets_bit_packed(dets[::3]), expected[::3])
+    obs, weights = decoder.predict_weighted_obs_flips_from_dets_bit_packed(dets)
+    np.testing.assert_array_equal(obs, expected)
+    assert weights.shape == (1024,)
+    with pytest.raises(ValueError, match='num_detectors=8'):
+        decoder.predict_obs_flips_from_dets_bit_packed(dets[:, :7])
+
+    # ptb64 data.
+    ptb64 = np.packbits(dets.reshape(16, 64, 8).transpose(0, 2, 1), axis=2, bitorder='little').view(np.uint64)
+    ptb64 = ptb64.reshape(16, 8)
+    obs_ptb64 = decoder.predict_obs_flips_from_dets_ptb64(ptb64)
+    assert obs_ptb64.shape == (16, 2)
+    assert obs_ptb64.dtype == np.uint64
+    unpacked_obs = np.unpackbits(expected, axis=1, count=2, bitorder='little')
+    expected_ptb64 = np.packbits(unpacked_obs.reshape(16, 64, 2).transpose(0, 2, 1), axis=2, bitorder='little')
+    np.testing.assert_array_equal(obs_ptb64, expected_ptb64.view(np.uint64).reshape(16, 2))
+    with pytest.raises(ValueError, match='ptb64'):
+        decoder.predict_obs_flips_from_dets_ptb64(ptb64[:, :7])
+
+
+def test_predict_future_and_async():
+    color_rep_code = stim.Circuit("""
+        X_ERROR(0.1) 0 1 2 3 4 5 6 7 8
+        M 0 1 2 3 4 5 6 7 8
+        DETECTOR(0, 0, 0, 0) rec[-9] rec[-8] rec[-7]
+        DETECTOR(1, 0, 0, 1) rec[-8] rec[-7] rec[-6]
+        DETECTOR(2, 0, 0, 2) rec[-7] rec[-6] rec[-5]
+        DETECTOR(3, 0, 0, 0) rec[-6] rec[-5] rec[-4]
+        DETECTOR(4, 0, 0, 1) rec[-5] rec[-4] rec[-3]
+        DETECTOR(5, 0, 0, 2) rec[-4] rec[-3] rec[-2]
+        DETECTOR(6, 0, 0, 0) rec[-3] rec[-2] rec[-1]
+        DETECTOR(7, 0, 0, 1) rec[-2] rec[-1]
+        OBSERVABLE_INCLUDE(0) rec[-1]
+    """)
+    decoder = chromobius.compile_decoder_for_dem(color_rep_code.detector_error_model())
+    dets = color_rep_code.compile_detector_sampler().sample(shots=4096, bit_packed=True)
+    expected = decoder.predict_obs_flips_from_dets_bit_packed(dets)
+
+    decoder.configure_worker_pool(num_threads=3, max_queued_batches=2)
+    futures = [decoder.predict_future(dets[k:k + 256]) for k in range(0, 4096, 256)]
+    np.testing.assert_array_equal(np.concatenate([f.result() for f in futures]), expected)
+
+    async def run():
+        results = await asyncio.gather(*[
+            decoder.predict_async(dets[k:k + 512])
+            for k in range(0, 4096, 512)
+        ])
+        return np.concatenate(results)
+    np.testing.assert_array_equal(asyncio.run(run()), expected)
+
+    # Errors are raised synchronously when the data is malformed.
+    with pytest.raises(ValueError, match='num_detector_bytes'):
+        decoder.predict_future(dets[:, :0])
+    with pytest.raises(RuntimeError):
+        decoder.predict_async(dets)
+
+    with pytest.raises(ValueError, match='num_threads'):
+        decoder.configure_worker_pool(num_threads=0, max_queued_batches=1)
+
+
+def _block_worker(decoder: chromobius.CompiledDecoder, dets: np.ndarray) -> threading.Event:
+    """Parks a single threaded worker pool's worker until the returned event is set.
+
+    The worker completes a batch, and then runs the batch's done callback,
+    which waits for the event. If the batch finished before the callback was
+    added, the callback runs on the calling thread instead; that attempt is
+    dropped and another batch is submitted.
+    """
+    caller = threading.current_thread()
+    release = threading.Event()
+    while True:
+        parked = threading.Event()
+        ran = threading.Event()
+
+        def park(_, parked=parked, ran=ran):
+            if threading.current_thread() is not caller:
+                parked.set()
+                ran.set()
+                release.wait()
+            else:
+                ran.set()
+
+        decoder.predict_future(dets).add_done_callback(park)
+        ran.wait()
+        if parked.is_set():
+            return release
+
+
+def test_predict_future_cancel():
+    circuit = stim.Circuit.from_file(pathlib.Path(__file__).parent.parent.parent.parent / 'test_data' / 'midout_color_code_d9_r36_p1000.stim')
+    decoder = chromobius.compile_decoder_for_dem(circuit.detector_error_model())
+    dets = circuit.compile_detector_sampler().sample(shots=256, bit_packed=True)
+    decoder.configure_worker_pool(num_threads=1, max_queued_batches=8)
+
+    release = _block_worker(decoder, dets[:1])
+    futures = [decoder.predict_future(dets) for _ in range(8)]
+    assert futures[-1].cancel()
+    assert futures[-1].cancelled()
+    release.set()
+    for f in futures[:-1]:
+        assert f.result().shape == (256, 1)
+
+
+def test_predict_async_does_not_block_event_loop():
+    circuit = stim.Circuit.from_file(pathlib.Path(__file__).parent.parent.parent.parent / 'test_data' / 'midout_color_code_d5_r10_p1000.stim')
+    decoder = chromobius.compile_decoder_for_dem(circuit.detector_error_model())
+    dets = circuit.compile_detector_sampler().sample(shots=64, bit_packed=True)
+    expected = decoder.predict_obs_flips_from_dets_bit_packed(dets)
+    decoder.configure_worker_pool(num_threads=1, max_queued_batches=1)
+    release = _block_worker(decoder, dets[:1])
+
+    async def run():
+        # The first batch fills the queue. The others would block a blocking submission.
+        futures = [decoder.predict_async(dets) for _ in range(4)]
+        await asyncio.sleep(0)
+        assert not any(f.done() for f in futures)
+        futures[2].cancel()
+        release.set()
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        assert isinstance(results[2], asyncio.CancelledError)
+        for k in [0, 1, 3]:
+            np.testing.assert_array_equal(results[k], expected)
+
+    asyncio.run(asyncio.wait_for(run(), timeout=60))
+
+
+def test_predict_async_decoder_dropped_while_waiting_on_closed_loop(monkeypatch: pytest.MonkeyPatch):
+    circuit = stim.Circuit.from_file(pathlib.Path(__file__).parent.parent.parent.parent / 'test_data' / 'midout_color_code_d5_r10_p1000.stim')
+    decoder = chromobius.compile_decoder_for_dem(circuit.detector_error_model())
+    dets = circuit.compile_detector_sampler().sample(shots=64, bit_packed=True)
+    decoder.configure_worker_pool(num_threads=1, max_queued_batches=1)
+    release = _block_worker(decoder, dets[:1])
+
+    async def submit():
+        # The first batch fills the queue, so the second one waits for a worker to take it.
+        return [decoder.predict_async(dets) for _ in range(2)]
+
+    loop = asyncio.new_event_loop()
+    futures = loop.run_until_complete(submit())
+    loop.close()
+    # Retrying on the closed loop fails. Pytest's hook would keep the failure (and the decoder it references) alive.
+    monkeypatch.setattr(sys, 'unraisablehook', lambda _: None)
+
+    # The waiting submission now holds the last reference to the decoder. When the worker takes the queued batch, it
+    # can't retry on the closed loop, and has to drop that reference without destroying the pool it's running on.
+    del decoder, futures
+    release.set()
+    for _ in range(100):
+        time.sleep(0.01)
+
+
+def test_decode_server_client(tmp_path: pathlib.Path):
+    circuit = stim.Circuit.from_file(
+        pathlib.Path(__file__).parent.parent.parent.parent
+        / 'test_data'
+        / 'midout_color_code_d5_r10_p1000.stim'
+    )
+    dem = circuit.detector_error_model()
+    dem.to_file(tmp_path / 'model.dem')
+    socket_path = tmp_path / 'decoder.sock'
+    stats_path = tmp_path / 'stats.json'
+
+    exit_codes = []
+    server = threading.Thread(target=lambda: exit_codes.append(chromobius.main(command_line_args=[
+        'serve',
+        '--dem', str(tmp_path / 'model.dem'),
+        '--socket', str(socket_path),
+        '--num_threads', '2',
+        '--out', str(stats_path),
+    ])))
+    server.start()
+    while not socket_path.exists():
+        time.sleep(0.01)
+
+    decoder = chromobius.compile_decoder_for_dem(dem)
+    dets, _ = circuit.compile_detector_sampler().sample(
+        shots=100,
+        separate_observables=True,
+        bit_packed=True,
+    )
+    expected = decoder.predict_obs_flips_from_dets_bit_packed(dets)
+    with chromobius.DecodeServerClient(socket_path=socket_path) as client:
+        assert client.num_detectors == dem.num_detectors
+        assert client.num_observables == dem.num_observables
+        np.testing.assert_array_equal(
+            client.predict_obs_flips_from_dets_bit_packed(dets),
+            expected,
+        )
+        np.testing.assert_array_equal(
+            client.predict_obs_flips_from_dets_bit_packed(dets[3]),
+            expected[3],
+        )
+        with pytest.raises(ValueError, match='shape'):
+            client.predict_obs_flips_from_dets_bit_packed(dets[:, :-1])
+        stats = client.stats()
+        assert stats['requests'] == 2
+        assert stats['shots'] == 101
+        assert stats['latency_microseconds']['count'] == 2
+        client.shutdown_server()
+
+    server.join()
+    assert exit_codes == [0]
+    assert json.loads(stats_path.read_text())['shots'] == 101
+    assert not socket_path.exists()
+
+
+def test_split_bases():
+    circuit = stim.Circuit.from_file(
+        pathlib.Path(__file__).parent.parent.parent.parent
+        / 'test_data'
+        / 'superdense_color_code_d5_r20_p1000.stim'
+    )
+    dem = circuit.detector_error_model()
+    dets, _ = circuit.compile_detector_sampler().sample(
+        shots=256,
+        separate_observables=True,
+        bit_packed=True,
+    )
+    expected = chromobius.compile_decoder_for_dem(dem).predict_obs_flips_from_dets_bit_packed(dets)
+    split = chromobius.compile_decoder_for_dem(dem, split_bases=True)
+    np.testing.assert_array_equal(split.predict_obs_flips_from_dets_bit_packed(dets), expected)
+    concurrent = chromobius.CompiledDecoder.from_dem(
+        dem,
+        split_bases=True,
+        decode_bases_concurrently=True,
+    )
+    np.testing.assert_array_equal(concurrent.predict_obs_flips_from_dets_bit_packed(dets), expected)
+
+
+def test_sliding_window_decoder():
+    circuit = stim.Circuit.from_file(
+        pathlib.Path(__file__).parent.parent.parent.parent
+        / 'test_data'
+        / 'midout_color_code_d5_r10_p1000.stim'
+    )
+    dem = circuit.detector_error_model()
+    dets, actual_obs = circuit.compile_detector_sampler().sample(
+        shots=256,
+        separate_observables=True,
+        bit_packed=True,
+    )
+    decoder = chromobius.SlidingWindowDecoder.from_dem(dem, commit_duration=2, buffer_duration=6)
+    assert decoder.commit_duration == 2
+    assert decoder.buffer_duration == 6
+    windowed = decoder.predict_obs_flips_from_dets_bit_packed(dets)
+    whole = chromobius.compile_decoder_for_dem(dem).predict_obs_flips_from_dets_bit_packed(dets)
+    assert windowed.shape == whole.shape
+    assert np.count_nonzero(np.any(windowed != whole, axis=1)) < 256 / 20
+    np.testing.assert_array_equal(decoder.predict_obs_flips_from_dets_bit_packed(dets[0]), windowed[0])
+
+    # Streaming one round at a time gives the same predictions.
+    times = np.array([coords[2] for _, coords in sorted(dem.get_detector_coordinates().items())])
+    unpacked = np.unpackbits(dets, axis=1, bitorder='little')[:, :dem.num_detectors]
+    for shot in range(8):
+        fired = np.flatnonzero(unpacked[shot]).astype(np.uint64)
+        for t in range(int(times.max()) + 2):
+            decoder.add_detection_events(fired[(times[fired] >= t - 1) & (times[fired] < t)])
+            decoder.advance_to_time(t)
+        np.testing.assert_array_equal(decoder.finish(), windowed[shot])
+
+    with pytest.raises(ValueError, match='commit_duration'):
+        chromobius.SlidingWindowDecoder.from_dem(dem, commit_duration=0, buffer_duration=6)
+
+
+def test_bounded_latency():
+    circuit = stim.Circuit.from_file(
+        pathlib.Path(__file__).parent.parent.parent.parent
+        / 'test_data'
+        / 'midout_color_code_d5_r10_p1000.stim'
+    )
+    dem = circuit.detector_error_model()
+    dets, _ = circuit.compile_detector_sampler().sample(
+        shots=256,
+        separate_observables=True,
+        bit_packed=True,
+    )
+    num_dets = np.unpackbits(dets, axis=1).sum(axis=1)
+    expected = chromobius.compile_decoder_for_dem(dem).predict_obs_flips_from_dets_bit_packed(dets)
+
+    capped = chromobius.compile_decoder_for_dem(dem, max_detection_events=6)
+    obs, status = capped.predict_obs_flips_with_status_from_dets_bit_packed(dets)
+    assert status.dtype == np.uint8
+    assert status.shape == (256,)
+    np.testing.assert_array_equal(status, np.where(num_dets > 6, 1, 0))
+    np.testing.assert_array_equal(obs[num_dets <= 6], expected[num_dets <= 6])
+    assert not np.any(obs[num_dets > 6])
+
+    obs, status = capped.predict_obs_flips_with_status_from_dets_bit_packed(dets[0])
+    assert status.shape == ()
+    assert status == (1 if num_dets[0] > 6 else 0)
+
+    rushed = chromobius.CompiledDecoder.from_dem(dem, shot_time_budget_seconds=1e-12)
+    obs, status = rushed.predict_obs_flips_with_status_from_dets_bit_packed(dets)
+    # Shots are decoded late until the decoder has learned they can't fit the
+    # budget, after which they are skipped.
+    assert np.all((status == 0) == (num_dets == 0))
+    assert np.all(np.isin(status, [0, 2, 3]))
+    assert np.any(status == 2)
+    assert np.any(status == 3)
+    np.testing.assert_array_equal(obs[status == 3], expected[status == 3])
+    assert not np.any(obs[status == 2])
+
+
+def test_max_mobius_error_weight():
+    circuit = stim.Circuit.from_file(
+        pathlib.Path(__file__).parent.parent.parent.parent
+        / 'test_data'
+        / 'midout_color_code_d5_r10_p1000.stim'
+    )
+    dem = circuit.detector_error_model()
+    dets, actual_obs = circuit.compile_detector_sampler(seed=5).sample(
+        shots=1024,
+        separate_observables=True,
+        bit_packed=True,
+    )
+
+    decoder = chromobius.compile_decoder_for_dem(dem)
+    assert decoder.num_pruned_mobius_edges == 0
+    obs = decoder.predict_obs_flips_from_dets_bit_packed(dets)
+    mistakes = np.count_nonzero(np.any(obs != actual_obs, axis=1))
+
+    for fold in [False, True]:
+        pruned = chromobius.compile_decoder_for_dem(
+            dem,
+            max_mobius_error_weight=8,
+            fold_pruned_mobius_errors=fold,
+        )
+        assert pruned.num_pruned_mobius_edges > 0
+        obs = pruned.predict_obs_flips_from_dets_bit_packed(dets)
+        pruned_mistakes = np.count_nonzero(np.any(obs != actual_obs, axis=1))
+        assert pruned_mistakes < mistakes * 2 + 10
+
+
+def test_slim_and_memory_usage():
+    circuit = stim.Circuit.from_file(
+        pathlib.Path(__file__).parent.parent.parent.parent
+        / 'test_data'
+        / 'midout_color_code_d5_r10_p1000.stim'
+    )
+    dem = circuit.detector_error_model()
+    dets, _ = circuit.compile_detector_sampler(seed=1).sample(
+        shots=256,
+        separate_observables=True,
+        bit_packed=True,
+    )
+
+    full = chromobius.compile_decoder_for_dem(dem)
+    slim = chromobius.CompiledDecoder.from_dem(dem, slim=True)
+    np.testing.assert_array_equal(
+        slim.predict_obs_flips_from_dets_bit_packed(dets),
+        full.predict_obs_flips_from_dets_bit_packed(dets),
+    )
+
+    full_usage = full.memory_usage()
+    slim_usage = slim.memory_usage()
+    assert set(full_usage.keys()) == {
+        'node_tables',
+        'atomic_errors',
+        'mobius_dem',
+        'charge_graph',
+        'rgb_reps',
+        'drag_graph',
+        'workspace',
+        'total',
+    }
+    assert full_usage['total'] == sum(v for k, v in full_usage.items() if k != 'total')
+    assert slim_usage['atomic_errors'] == 0
+    assert slim_usage['charge_graph'] == 0
+    assert slim_usage['mobius_dem'] < full_usage['mobius_dem']
+    assert slim_usage['total'] < full_usage['total']
+
+
+def test_more_than_64_observables():
+    circuit = stim.Circuit.from_file(
+        pathlib.Path(__file__).parent.parent.parent.parent
+        / 'test_data'
+        / 'midout_color_code_d5_r10_p1000.stim'
+    )
+    dem = circuit.detector_error_model()
+    wide_dem = stim.DetectorErrorModel(str(dem.flattened()).replace(' L0', ' L0 L70 L129'))
+    assert wide_dem.num_observables == 130
+    dets, _ = circuit.compile_detector_sampler(seed=2).sample(
+        shots=128,
+        separate_observables=True,
+        bit_packed=True,
+    )
+    expected = chromobius.compile_decoder_for_dem(dem).predict_obs_flips_from_dets_bit_packed(dets)
+    expected = np.unpackbits(expected, axis=1, count=1, bitorder='little')[:, 0]
+    assert np.any(expected)
+
+    for split_bases in [False, True]:
+        decoder = chromobius.compile_decoder_for_dem(wide_dem, split_bases=split_bases)
+        obs = decoder.predict_obs_flips_from_dets_bit_packed(dets)
+        assert obs.shape == (128, 17)
+        unpacked = np.unpackbits(obs, axis=1, count=130, bitorder='little')
+        for k in [0, 70, 129]:
+            np.testing.assert_array_equal(unpacked[:, k], expected)
+        assert np.count_nonzero(unpacked) == 3 * np.count_nonzero(expected)
+
+        obs_with_status, status = decoder.predict_obs_flips_with_status_from_dets_bit_packed(dets)
+        np.testing.assert_array_equal(obs_with_status, obs)
+        assert not np.any(status)
+
+        sparse = [np.flatnonzero(np.unpackbits(shot, bitorder='little')) for shot in dets]
+        offsets = np.cumsum([0] + [len(s) for s in sparse], dtype=np.uint64)
+        indices = np.concatenate(sparse).astype(np.uint64)
+        np.testing.assert_array_equal(decoder.predict_obs_flips_from_sparse_dets(indices, offsets), obs)
+
+        all_dets = np.unpackbits(dets, axis=1, count=dem.num_detectors, bitorder='little')
+        ptb64 = np.packbits(all_dets.reshape(2, 64, -1).transpose(0, 2, 1), axis=2, bitorder='little')
+        obs_ptb64 = decoder.predict_obs_flips_from_dets_ptb64(ptb64.view(np.uint64).reshape(2, -1))
+        assert obs_ptb64.shape == (2, 130)
+        expected_ptb64 = np.packbits(unpacked.reshape(2, 64, 130).transpose(0, 2, 1), axis=2, bitorder='little')
+        np.testing.assert_array_equal(obs_ptb64, expected_ptb64.view(np.uint64).reshape(2, 130))
+
+    wide_circuit = circuit.copy()
+    wide_circuit.append('OBSERVABLE_INCLUDE', [stim.target_rec(-1)], 129)
+    result = chromobius.collect_errors(wide_circuit, shots=256, seed=5)
+    assert result['shots'] == 256
+
+    with pytest.raises(ValueError, match='limited to 64 observables'):
+        chromobius.SlidingWindowDecoder.from_dem(wide_dem, commit_duration=1, buffer_duration=1)
+
+
+def test_match_trace(tmp_path: pathlib.Path):
+    circuit = stim.Circuit.from_file(
+        pathlib.Path(__file__).parent.parent.parent.parent
+        / 'test_data'
+        / 'midout_color_code_d5_r10_p1000.stim'
+    )
+    dem = circuit.detector_error_model()
+    dets, _ = circuit.compile_detector_sampler(seed=3).sample(
+        shots=200,
+        separate_observables=True,
+        bit_packed=True,
+    )
+    decoder = chromobius.compile_decoder_for_dem(dem)
+    expected = decoder.predict_obs_flips_from_dets_bit_packed(dets)
+
+    decoder.start_match_trace(tmp_path / 'trace.bin', sample_every=7)
+    np.testing.assert_array_equal(decoder.predict_obs_flips_from_dets_bit_packed(dets), expected)
+    decoder.stop_match_trace()
+    decoder.stop_match_trace()
+    trace = chromobius.read_match_trace(tmp_path / 'trace.bin')
+    assert trace['num_detectors'] == dem.num_detectors
+    assert trace['num_observables'] == 1
+    np.testing.assert_array_equal(trace['shot'], np.arange(0, 200, 7))
+    np.testing.assert_array_equal(trace['obs_flips'], expected[::7])
+    unpacked = np.unpackbits(dets[::7], axis=1, count=dem.num_detectors, bitorder='little')
+    offsets = trace['det_offsets']
+    for k, shot_dets in enumerate(unpacked):
+        np.testing.assert_array_equal(trace['dets'][offsets[k]:offsets[k + 1]], np.flatnonzero(shot_dets))
+    cycle_offsets = trace['shot_cycle_offsets']
+    for k in range(len(trace['shot'])):
+        cycle_flips = np.bitwise_xor.reduce(trace['cycle_obs_flips'][cycle_offsets[k]:cycle_offsets[k + 1]])
+        assert cycle_flips == expected[k * 7, 0]
+    assert trace['edges'].shape[1] == 2
+
+    # Shots decoded by the worker pool are also traced.
+    decoder.configure_worker_pool(num_threads=2, max_queued_batches=2)
+    decoder.start_match_trace(tmp_path / 'pool_trace.bin')
+    futures = [decoder.predict_future(dets[k:k + 50]) for k in range(0, 200, 50)]
+    np.testing.assert_array_equal(np.concatenate([f.result() for f in futures]), expected)
+    decoder.stop_match_trace()
+    trace = chromobius.read_match_trace(tmp_path / 'pool_trace.bin')
+    np.testing.assert_array_equal(np.sort(trace['shot']), np.arange(200))
+
+
+def test_graph_arrays_and_mobius_dem():
+    circuit = stim.Circuit.from_file(
+        pathlib.Path(__file__).parent.parent.parent.parent
+        / 'test_data'
+        / 'phenom_color_code_d5_r5_p1000_with_ignored.stim'
+    )
+    dem = circuit.detector_error_model()
+    decoder = chromobius.compile_decoder_for_dem(dem)
+    arrays = decoder.graph_arrays()
+
+    # Nodes are the detectors that aren't ignored.
+    ignored = set()
+    colors = {}
+    for instruction in dem.flattened():
+        if instruction.type == 'detector':
+            d = instruction.targets_copy()[0].val
+            c = instruction.args_copy()[3]
+            if c == -1:
+                ignored.add(d)
+            else:
+                colors[d] = c
+    expected_nodes = [d for d in range(dem.num_detectors) if d not in ignored]
+    np.testing.assert_array_equal(arrays['node_detector'], expected_nodes)
+    expected_colors = [colors[d] for d in expected_nodes]
+    np.testing.assert_array_equal(arrays['node_color'], [int(c) % 3 + 1 for c in expected_colors])
+    np.testing.assert_array_equal(arrays['node_basis'], [int(c) // 3 + 1 for c in expected_colors])
+
+    # Views of the decoder's memory keep working after the decoder is released.
+    rgb_reps = arrays['rgb_reps']
+    assert not rgb_reps.flags.writeable
+    assert len(rgb_reps) == len(expected_nodes)
+    del decoder, arrays
+    assert np.all((rgb_reps['charge_flip'] >= 0) & (rgb_reps['charge_flip'] <= 3))
+
+    decoder = chromobius.compile_decoder_for_dem(dem)
+    arrays = decoder.graph_arrays()
+    charge_graph = arrays['charge_graph']
+    assert len(charge_graph) > 0
+    assert np.all(charge_graph['n1'] < charge_graph['n2'])
+    assert len(arrays['drag_graph']) > 0
+    assert len(chromobius.compile_decoder_for_dem(dem, slim=True).graph_arrays()['charge_graph']) == 0
+
+    mobius_dem = decoder.mobius_dem()
+    assert isinstance(mobius_dem, stim.DetectorErrorModel)
+    assert mobius_dem.num_detectors == 2 * len(expected_nodes)
+    assert mobius_dem.num_errors > 0
+
+
+def test_profile_configuration():
+    circuit = stim.Circuit.from_file(
+        pathlib.Path(__file__).parent.parent.parent.parent
+        / 'test_data'
+        / 'midout_color_code_d5_r10_p1000.stim'
+    )
+    dem = circuit.detector_error_model()
+    profile = chromobius.profile_configuration(dem)
+    assert [stage['name'] for stage in profile['stages']] == [
+        'collect_nodes',
+        'collect_atomic_errors',
+        'decompose_composite_errors',
+        'choose_rgb_reps',
+        'charge_graph',
+        'drag_graph',
+        'extra_observable_chunks',
+        'slim',
+        'matcher',
+    ]
+    assert profile['total_seconds'] == pytest.approx(sum(stage['seconds'] for stage in profile['stages']))
+    counts = profile['counts']
+    assert counts['num_detectors'] == dem.num_detectors
+    assert counts['num_mobius_errors'] == chromobius.compile_decoder_for_dem(dem).mobius_dem().num_errors
+    assert counts['num_drag_graph_entries'] == len(chromobius.compile_decoder_for_dem(dem).graph_arrays()['drag_graph'])
+
+    pruned = chromobius.profile_configuration(dem, max_mobius_error_weight=5)
+    assert pruned['counts']['num_pruned_mobius_edges'] > 0
+
+
+def test_compile_decoder_for_circuit():
+    circuit = stim.Circuit.from_file(
+        pathlib.Path(__file__).parent.parent.parent.parent
+        / 'test_data'
+        / 'midout_color_code_d5_r10_p1000.stim'
+    )
+    decoder = chromobius.compile_decoder_for_circuit(circuit)
+    dem_decoder = chromobius.compile_decoder_for_dem(circuit.detector_error_model(approximate_disjoint_errors=True))
+    assert decoder.mobius_dem() == dem_decoder.mobius_dem()
+
+    dets, _ = circuit.compile_detector_sampler().sample(shots=256, separate_observables=True, bit_packed=True)
+    np.testing.assert_array_equal(
+        decoder.predict_obs_flips_from_dets_bit_packed(dets),
+        dem_decoder.predict_obs_flips_from_dets_bit_packed(dets),
+    )
+
+    slim = chromobius.compile_decoder_for_circuit(circuit, split_bases=True, slim=True)
+    np.testing.assert_array_equal(
+        slim.predict_obs_flips_from_dets_bit_packed(dets),
+        chromobius.compile_decoder_for_dem(circuit.detector_error_model(), split_bases=True)
+        .predict_obs_flips_from_dets_bit_packed(dets),
+    )
+
+    with pytest.raises(ValueError):
+        chromobius.compile_decoder_for_circuit(stim.Circuit('DETECTOR(0, 0, 0, 9)'))
+
+
+def test_compact():
+    circuit = stim.Circuit.from_file(
+        pathlib.Path(__file__).parent.parent.parent.parent
+        / 'test_data'
+        / 'midout_color_code_d5_r10_p1000.stim'
+    )
+    dem = circuit.detector_error_model()
+    full = chromobius.compile_decoder_for_dem(dem)
+    compact = chromobius.compile_decoder_for_dem(dem, compact=True)
+    assert compact.memory_usage()['atomic_errors'] == 0
+    assert compact.memory_usage()['drag_graph'] < full.memory_usage()['drag_graph']
+    assert len(compact.graph_arrays()['drag_graph']) == len(full.graph_arrays()['drag_graph'])
+
+    dets, _ = circuit.compile_detector_sampler().sample(shots=256, separate_observables=True, bit_packed=True)
+    expected = full.predict_obs_flips_from_dets_bit_packed(dets)
+    np.testing.assert_array_equal(compact.predict_obs_flips_from_dets_bit_packed(dets), expected)
+    np.testing.assert_array_equal(compact.predict_future(dets).result(), expected)
+
+    if hasattr(os, 'fork'):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                os.write(write_fd, compact.predict_obs_flips_from_dets_bit_packed(dets).tobytes())
+            finally:
+                os._exit(0)
+        os.close(write_fd)
+        with os.fdopen(read_fd, 'rb') as f:
+            child_predictions = f.read()
+        os.waitpid(pid, 0)
+        assert child_predictions == expected.tobytes()
+
+
+def test_include_lifting_weight():
+    circuit = stim.Circuit.from_file(
+        pathlib.Path(__file__).parent.parent.parent.parent
+        / 'test_data'
+        / 'midout_color_code_d5_r10_p1000.stim'
+    )
+    dem = circuit.detector_error_model()
+    plain = chromobius.compile_decoder_for_dem(dem)
+    weighted = chromobius.compile_decoder_for_dem(dem, include_lifting_weight=True)
+    weighted_from_circuit = chromobius.compile_decoder_for_circuit(circuit, include_lifting_weight=True)
+
+    dets, _ = circuit.compile_detector_sampler().sample(shots=256, separate_observables=True, bit_packed=True)
+    plain_obs, plain_weights = plain.predict_weighted_obs_flips_from_dets_bit_packed(dets)
+    obs, weights = weighted.predict_weighted_obs_flips_from_dets_bit_packed(dets)
+    np.testing.assert_array_equal(obs, plain_obs)
+    assert np.all(weights >= plain_weights)
+    assert np.any(weights > plain_weights)
+    np.testing.assert_allclose(
+        weighted_from_circuit.predict_weighted_obs_flips_from_dets_bit_packed(dets)[1],
+        weights,
+        rtol=1e-5,
+    )
+
+    single_obs, single_weight = weighted.predict_weighted_obs_flips_from_dets_bit_packed(dets[3])
+    np.testing.assert_array_equal(single_obs, obs[3])
+    assert single_weight == weights[3]
+
+
+def test_cluster_threads():
+    circuit = stim.Circuit.from_file(
+        pathlib.Path(__file__).parent.parent.parent.parent
+        / 'test_data'
+        / 'midout_color_code_d9_r36_p1000.stim'
+    )
+    dem = circuit.detector_error_model()
+    plain = chromobius.compile_decoder_for_dem(dem)
+    clustering = chromobius.compile_decoder_for_dem(dem, cluster_threads=2)
+
+    dets, _ = circuit.compile_detector_sampler().sample(shots=128, separate_observables=True, bit_packed=True)
+    _, plain_weights = plain.predict_weighted_obs_flips_from_dets_bit_packed(dets)
+    _, weights = clustering.predict_weighted_obs_flips_from_dets_bit_packed(dets)
+    np.testing.assert_allclose(weights, plain_weights, rtol=1e-3)
+
+    with pytest.raises(ValueError, match='cluster_threads'):
+        chromobius.compile_decoder_for_dem(dem, cluster_threads=2, max_detection_events=5)
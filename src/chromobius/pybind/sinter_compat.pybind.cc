@@ -15,17 +15,63 @@
 #include "chromobius.h"
 #include "chromobius/pybind/sinter_compat.pybind.h"
 
+#include <deque>
+#include <functional>
+#include <memory>
+#include <mutex>
 #include <pybind11/iostream.h>
 #include <pybind11/numpy.h>
 #include <pybind11/operators.h>
 #include <pybind11/pybind11.h>
 
+/// Predicts the observable flips of bit packed shots, writing bit packed predictions into `out`.
+static void predict_shots_bit_packed(
+    chromobius::Decoder &decoder,
+    const uint8_t *data,
+    size_t stride,
+    size_t num_shots,
+    size_t num_detector_bytes,
+    size_t num_observable_bytes,
+    std::vector<chromobius::obsmask_int> &result_buffer,
+    uint8_t *out) {
+    if (!decoder.extra_observable_chunks.empty()) {
+        // Observables past the first 64 are predicted into the decoder's extra_obs_flips, one shot at a time.
+        for (size_t shot = 0; shot < num_shots; shot++) {
+            auto prediction = decoder.decode_detection_events({data + stride * shot, num_detector_bytes});
+            decoder.write_obs_flips_bit_packed(prediction, {out + num_observable_bytes * shot, num_observable_bytes});
+        }
+        return;
+    }
+
+    // Predict the shots.
+    result_buffer.resize(num_shots);
+    if (num_shots > 0) {
+        decoder.decode_detection_events_batch(
+            {data, data + stride * (num_shots - 1) + num_detector_bytes}, stride, result_buffer);
+    }
+
+    // Write predictions into the output.
+    size_t offset = 0;
+    for (chromobius::obsmask_int obs : result_buffer) {
+        for (size_t k = 0; k < num_observable_bytes; k++) {
+            out[offset++] = obs & 255;
+            obs >>= 8;
+        }
+    }
+}
+
+/// Work isn't split into pieces smaller than this many shots, because each piece has a fixed overhead.
+constexpr size_t MIN_SHOTS_PER_TASK = 64;
+
 struct ChromobiusSinterCompiledDecoder {
     chromobius::Decoder decoder;
     uint64_t num_detectors;
     uint64_t num_detector_bytes;
+    uint64_t num_observables;
     uint64_t num_observable_bytes;
     std::vector<chromobius::obsmask_int> result_buffer;
+    /// Worker threads that batches of shots are split across. Null when decoding on the calling thread.
+    std::unique_ptr<chromobius::DecoderPool> worker_pool;
 
     pybind11::array_t<uint8_t> decode_shots_bit_packed(
         const pybind11::array_t<uint8_t> &bit_packed_detection_event_data) {
@@ -40,34 +86,72 @@ struct ChromobiusSinterCompiledDecoder {
         }
         size_t stride = bit_packed_detection_event_data.strides(0);
         size_t num_shots = bit_packed_detection_event_data.shape(0);
+        const uint8_t *data = bit_packed_detection_event_data.data();
 
-        // Predict each shot.
-        result_buffer.clear();
-        for (size_t shot = 0; shot < num_shots; shot++) {
-            const uint8_t *data = bit_packed_detection_event_data.data() + stride * shot;
+        std::unique_ptr<uint8_t[]> buffer(new uint8_t[num_observable_bytes * num_shots]);
+        {
+            pybind11::gil_scoped_release release;
+            predict_bit_packed(data, stride, num_shots, buffer.get());
+        }
+        return wrap_predictions(std::move(buffer), num_shots);
+    }
 
-            // Predict.
-            chromobius::obsmask_int prediction =
-                decoder.decode_detection_events({data, data + num_detector_bytes});
-            result_buffer.push_back(prediction);
+    /// Predicts the observable flips of bit packed shots, using the worker pool (if there is one).
+    void predict_bit_packed(const uint8_t *data, size_t stride, size_t num_shots, uint8_t *out) {
+        size_t num_tasks =
+            worker_pool == nullptr ? 1 : std::min(num_shots / MIN_SHOTS_PER_TASK, worker_pool->num_threads() * 4);
+        if (num_tasks <= 1) {
+            predict_shots_bit_packed(
+                decoder, data, stride, num_shots, num_detector_bytes, num_observable_bytes, result_buffer, out);
+        } else {
+            predict_shots_in_parallel(data, stride, num_shots, num_tasks, out);
         }
+    }
 
-        // Write predictions into output numpy array.
-        uint8_t *buffer = new uint8_t[num_observable_bytes * num_shots];
-        size_t offset = 0;
-        for (chromobius::obsmask_int obs : result_buffer) {
-            for (size_t k = 0; k < num_observable_bytes; k++) {
-                buffer[offset++] = obs & 255;
-                obs >>= 8;
-            }
+    /// Splits the shots into pieces, and predicts the pieces using the worker pool.
+    void predict_shots_in_parallel(
+        const uint8_t *data, size_t stride, size_t num_shots, size_t num_tasks, uint8_t *out) {
+        std::mutex error_mutex;
+        std::exception_ptr error;
+        size_t shots_per_task = (num_shots + num_tasks - 1) / num_tasks;
+        for (size_t start = 0; start < num_shots; start += shots_per_task) {
+            size_t n = std::min(shots_per_task, num_shots - start);
+            worker_pool->submit([&, start, n](chromobius::Decoder &worker_decoder) {
+                try {
+                    std::vector<chromobius::obsmask_int> task_buffer;
+                    predict_shots_bit_packed(
+                        worker_decoder,
+                        data + stride * start,
+                        stride,
+                        n,
+                        num_detector_bytes,
+                        num_observable_bytes,
+                        task_buffer,
+                        out + num_observable_bytes * start);
+                } catch (...) {
+                    std::lock_guard<std::mutex> lock(error_mutex);
+                    if (error == nullptr) {
+                        error = std::current_exception();
+                    }
+                }
+            });
+        }
+        worker_pool->wait_until_idle();
+        if (error != nullptr) {
+            std::rethrow_exception(error);
         }
-        pybind11::capsule free_when_done(buffer, [](void *f) {
+    }
+
+    /// Takes ownership of a buffer of bit packed predictions, returning it as a numpy array.
+    pybind11::array_t<uint8_t> wrap_predictions(std::unique_ptr<uint8_t[]> buffer, size_t num_shots) const {
+        uint8_t *data = buffer.get();
+        pybind11::capsule free_when_done(buffer.release(), [](void *f) {
             delete[] reinterpret_cast<uint8_t *>(f);
         });
         return pybind11::array_t<uint8_t>(
             {(pybind11::ssize_t)num_shots, (pybind11::ssize_t)num_observable_bytes},
             {(pybind11::ssize_t)num_observable_bytes, (pybind11::ssize_t)1},
-            buffer,
+            data,
             free_when_done);
     }
 };
@@ -78,11 +162,24 @@ enum SubDecoder : uint8_t {
 
 struct ChromobiusSinterDecoder {
     SubDecoder sub_decoder;
+    /// The number of threads each compiled decoder splits its batches across. 0 means one per core.
+    size_t num_threads = 1;
+    bool split_bases = false;
+    bool drop_mobius_errors_involving_remnant_errors = true;
+    bool ignore_decomposition_failures = false;
+    bool include_coords_in_mobius_dem = false;
+    double max_mobius_error_weight = INFINITY;
+
     ChromobiusSinterDecoder(SubDecoder sub_decoder) : sub_decoder(sub_decoder) {
     }
 
     bool operator==(const ChromobiusSinterDecoder &other) const {
-        return true;
+        return sub_decoder == other.sub_decoder && num_threads == other.num_threads &&
+               split_bases == other.split_bases &&
+               drop_mobius_errors_involving_remnant_errors == other.drop_mobius_errors_involving_remnant_errors &&
+               ignore_decomposition_failures == other.ignore_decomposition_failures &&
+               include_coords_in_mobius_dem == other.include_coords_in_mobius_dem &&
+               max_mobius_error_weight == other.max_mobius_error_weight;
     }
     bool operator!=(const ChromobiusSinterDecoder &other) const {
         return !(*this == other);
@@ -90,9 +187,48 @@ struct ChromobiusSinterDecoder {
 
     chromobius::DecoderConfigOptions get_options() const {
         chromobius::DecoderConfigOptions options;
+        options.drop_mobius_errors_involving_remnant_errors = drop_mobius_errors_involving_remnant_errors;
+        options.ignore_decomposition_failures = ignore_decomposition_failures;
+        options.include_coords_in_mobius_dem = include_coords_in_mobius_dem;
+        options.split_bases = split_bases;
+        options.max_mobius_error_weight = max_mobius_error_weight;
         return options;
     }
 
+    size_t resolved_num_threads() const {
+        return num_threads == 0 ? std::max(1u, std::thread::hardware_concurrency()) : num_threads;
+    }
+
+    pybind11::tuple get_state() const {
+        return pybind11::make_tuple(
+            (uint8_t)sub_decoder,
+            num_threads,
+            split_bases,
+            drop_mobius_errors_involving_remnant_errors,
+            ignore_decomposition_failures,
+            include_coords_in_mobius_dem,
+            max_mobius_error_weight);
+    }
+
+    static ChromobiusSinterDecoder from_state(const pybind11::object &state) {
+        // Older versions pickled only the sub decoder.
+        if (!pybind11::isinstance<pybind11::tuple>(state)) {
+            return ChromobiusSinterDecoder((SubDecoder)pybind11::cast<uint8_t>(state));
+        }
+        auto t = pybind11::cast<pybind11::tuple>(state);
+        if (t.size() != 7) {
+            throw std::invalid_argument("Unrecognized pickled chromobius sinter decoder state.");
+        }
+        ChromobiusSinterDecoder result((SubDecoder)pybind11::cast<uint8_t>(t[0]));
+        result.num_threads = pybind11::cast<size_t>(t[1]);
+        result.split_bases = pybind11::cast<bool>(t[2]);
+        result.drop_mobius_errors_involving_remnant_errors = pybind11::cast<bool>(t[3]);
+        result.ignore_decomposition_failures = pybind11::cast<bool>(t[4]);
+        result.include_coords_in_mobius_dem = pybind11::cast<bool>(t[5]);
+        result.max_mobius_error_weight = pybind11::cast<double>(t[6]);
+        return result;
+    }
+
     void decode_via_files(
         uint64_t num_shots,
         uint64_t num_dets,
@@ -100,52 +236,178 @@ struct ChromobiusSinterDecoder {
         const pybind11::object &dem_path,
         const pybind11::object &dets_b8_in_path,
         const pybind11::object &obs_predictions_b8_out_path,
-        const pybind11::object &tmp_dir) {
-        auto dem_path_str = pybind11::cast<std::string>(pybind11::str(dem_path));
-        auto dets_b8_in_path_str = pybind11::cast<std::string>(pybind11::str(dets_b8_in_path));
-        auto obs_predictions_b8_out_path_str = pybind11::cast<std::string>(pybind11::str(obs_predictions_b8_out_path));
+        const pybind11::object &tmp_dir) const;
 
-        FILE *f_dem = fopen(dem_path_str.c_str(), "r");
-        stim::DetectorErrorModel dem = stim::DetectorErrorModel::from_file(f_dem);
-        fclose(f_dem);
+    ChromobiusSinterCompiledDecoder compile_dem(const stim::DetectorErrorModel &dem) const {
+        auto decoder = chromobius::Decoder::from_dem(dem, get_options());
+        auto num_dets = dem.count_detectors();
+        auto num_obs = dem.count_observables();
+        ChromobiusSinterCompiledDecoder result{
+            .decoder = std::move(decoder),
+            .num_detectors = num_dets,
+            .num_detector_bytes = (num_dets + 7) / 8,
+            .num_observables = num_obs,
+            .num_observable_bytes = (num_obs + 7) / 8,
+            .result_buffer = {},
+            .worker_pool = nullptr,
+        };
+        size_t threads = resolved_num_threads();
+        if (threads > 1) {
+            result.worker_pool = std::make_unique<chromobius::DecoderPool>(result.decoder, threads, threads * 4);
+        }
+        return result;
+    }
+
+    ChromobiusSinterCompiledDecoder compile_decoder_for_dem(const pybind11::object &dem) const {
+        auto dem_str = pybind11::cast<std::string>(pybind11::str(dem));
+        return compile_dem(stim::DetectorErrorModel(dem_str.c_str()));
+    }
+};
 
-        stim::RaiiFile dets_in(dets_b8_in_path_str.c_str(), "rb");
-        stim::RaiiFile obs_out(obs_predictions_b8_out_path_str.c_str(), "wb");
+/// Decoders configured by decode_via_files, kept for the life of the process so that calls that are given the same
+/// dem (e.g. by sinter, once per batch of shots) don't have to parse it and configure a decoder again.
+///
+/// A cached decoder is reused when the contents of the dem file and the decoder options are the same. Sinter writes
+/// the dem to a fresh temporary file for each call, so entries are keyed on a hash of the dem's contents instead of
+/// its path. The file is always read, because its path, size, and modification time can't tell apart different dems
+/// written to the same path within the filesystem's timestamp granularity. Only the most recently used few decoders
+/// are kept.
+struct DemPathDecoderCache {
+    /// A cached decoder, and a lock guarding its workspace.
+    struct CachedDecoder {
+        std::mutex mut;
+        ChromobiusSinterCompiledDecoder decoder;
 
-        auto reader =
-            stim::MeasureRecordReader<stim::MAX_BITWORD_WIDTH>::make(dets_in.f, stim::SampleFormat::SAMPLE_FORMAT_B8, 0, num_dets, 0);
-        auto writer = stim::MeasureRecordWriter::make(obs_out.f, stim::SampleFormat::SAMPLE_FORMAT_B8);
+        explicit CachedDecoder(ChromobiusSinterCompiledDecoder decoder) : mut(), decoder(std::move(decoder)) {
+        }
+    };
+    struct Entry {
+        size_t dem_hash;
+        std::string dem_text;
+        ChromobiusSinterDecoder config;
+        std::shared_ptr<CachedDecoder> cached;
+    };
+    static constexpr size_t MAX_ENTRIES = 4;
 
-        auto decoder = chromobius::Decoder::from_dem(dem, get_options());
+    /// Guards the entries. Only held while looking up or inserting entries, not while configuring or decoding.
+    std::mutex mut;
+    std::deque<Entry> entries;
 
-        stim::SparseShot sparse_shot;
-        stim::simd_bits<stim::MAX_BITWORD_WIDTH> dets(num_dets);
-        for (size_t shot = 0; shot < num_shots; shot++) {
-            reader->start_and_read_entire_record(dets);
-            auto result = decoder.decode_detection_events({dets.u8, dets.u8 + dets.num_u8_padded()});
-            writer->begin_result_type('L');
-            for (size_t k = 0; k < num_obs; k++) {
-                writer->write_bit((result >> k) & 1);
+    /// Moves an entry to the back, so the least recently used entry is at the front, and returns its decoder.
+    std::shared_ptr<CachedDecoder> use_entry(size_t k) {
+        Entry used = std::move(entries[k]);
+        entries.erase(entries.begin() + k);
+        entries.push_back(std::move(used));
+        return entries.back().cached;
+    }
+
+    std::shared_ptr<CachedDecoder> get(const std::string &path, const ChromobiusSinterDecoder &config) {
+        std::string dem_text = read_dem_file(path);
+        size_t dem_hash = std::hash<std::string>{}(dem_text);
+        auto find_by_contents = [&]() -> std::shared_ptr<CachedDecoder> {
+            for (size_t k = 0; k < entries.size(); k++) {
+                Entry &e = entries[k];
+                if (e.dem_hash == dem_hash && e.config == config && e.dem_text == dem_text) {
+                    return use_entry(k);
+                }
+            }
+            return nullptr;
+        };
+        {
+            std::lock_guard<std::mutex> lock(mut);
+            if (auto cached = find_by_contents()) {
+                return cached;
             }
-            writer->write_end();
         }
+
+        // Configure the decoder without holding the lock, so calls using other cached decoders aren't blocked.
+        auto cached = std::make_shared<CachedDecoder>(config.compile_dem(stim::DetectorErrorModel(dem_text.c_str())));
+
+        std::lock_guard<std::mutex> lock(mut);
+        if (auto other = find_by_contents()) {
+            // Another call configured the same decoder in the meantime.
+            return other;
+        }
+        if (entries.size() >= MAX_ENTRIES) {
+            entries.pop_front();
+        }
+        entries.push_back(Entry{
+            .dem_hash = dem_hash,
+            .dem_text = std::move(dem_text),
+            .config = config,
+            .cached = cached,
+        });
+        return cached;
     }
 
-    ChromobiusSinterCompiledDecoder compile_decoder_for_dem(const pybind11::object &dem) {
-        auto dem_str = pybind11::cast<std::string>(pybind11::str(dem));
-        stim::DetectorErrorModel converted_dem = stim::DetectorErrorModel(dem_str.c_str());
-        auto decoder = chromobius::Decoder::from_dem(converted_dem, get_options());
-        auto num_dets = converted_dem.count_detectors();
-        return ChromobiusSinterCompiledDecoder{
-            .decoder = std::move(decoder),
-            .num_detectors = num_dets,
-            .num_detector_bytes = (num_dets + 7) / 8,
-            .num_observable_bytes = (converted_dem.count_observables() + 7) / 8,
-            .result_buffer = {},
-        };
+    static std::string read_dem_file(const std::string &path) {
+        FILE *f_dem = fopen(path.c_str(), "rb");
+        if (f_dem == nullptr) {
+            throw std::invalid_argument("Failed to open the dem file '" + path + "'.");
+        }
+        std::string result;
+        char buf[4096];
+        size_t n;
+        while ((n = fread(buf, 1, sizeof(buf), f_dem)) > 0) {
+            result.append(buf, n);
+        }
+        fclose(f_dem);
+        return result;
+    }
+
+    static DemPathDecoderCache &instance() {
+        // Intentionally never destroyed, so worker threads aren't being joined during interpreter shutdown.
+        static DemPathDecoderCache *cache = new DemPathDecoderCache();
+        return *cache;
     }
 };
 
+/// The number of shots read, decoded, and written at a time by decode_via_files.
+constexpr size_t DECODE_VIA_FILES_BLOCK_SHOTS = 4096;
+
+void ChromobiusSinterDecoder::decode_via_files(
+    uint64_t num_shots,
+    uint64_t num_dets,
+    uint64_t num_obs,
+    const pybind11::object &dem_path,
+    const pybind11::object &dets_b8_in_path,
+    const pybind11::object &obs_predictions_b8_out_path,
+    const pybind11::object &tmp_dir) const {
+    auto dem_path_str = pybind11::cast<std::string>(pybind11::str(dem_path));
+    auto dets_b8_in_path_str = pybind11::cast<std::string>(pybind11::str(dets_b8_in_path));
+    auto obs_predictions_b8_out_path_str = pybind11::cast<std::string>(pybind11::str(obs_predictions_b8_out_path));
+
+    pybind11::gil_scoped_release release;
+    auto cached = DemPathDecoderCache::instance().get(dem_path_str, *this);
+    std::lock_guard<std::mutex> lock(cached->mut);
+    ChromobiusSinterCompiledDecoder &compiled = cached->decoder;
+    if (compiled.num_detectors != num_dets || compiled.num_observables != num_obs) {
+        std::stringstream ss;
+        ss << "The dem has " << compiled.num_detectors << " detectors and " << compiled.num_observables;
+        ss << " observables, but num_dets=" << num_dets << " and num_obs=" << num_obs << ".";
+        throw std::invalid_argument(ss.str());
+    }
+
+    // In the b8 format, each shot is its bit packed data. So blocks of shots can be read and written directly.
+    stim::RaiiFile dets_in(dets_b8_in_path_str.c_str(), "rb");
+    stim::RaiiFile obs_out(obs_predictions_b8_out_path_str.c_str(), "wb");
+    size_t block_shots = std::min<uint64_t>(num_shots, DECODE_VIA_FILES_BLOCK_SHOTS);
+    std::vector<uint8_t> dets_block(block_shots * compiled.num_detector_bytes);
+    std::vector<uint8_t> obs_block(block_shots * compiled.num_observable_bytes);
+    for (uint64_t start = 0; start < num_shots; start += block_shots) {
+        size_t n = std::min<uint64_t>(block_shots, num_shots - start);
+        size_t num_det_bytes = n * compiled.num_detector_bytes;
+        if (fread(dets_block.data(), 1, num_det_bytes, dets_in.f) != num_det_bytes) {
+            throw std::invalid_argument("The detection event data ended before num_shots shots were read.");
+        }
+        compiled.predict_bit_packed(dets_block.data(), compiled.num_detector_bytes, n, obs_block.data());
+        size_t num_obs_bytes = n * compiled.num_observable_bytes;
+        if (fwrite(obs_block.data(), 1, num_obs_bytes, obs_out.f) != num_obs_bytes) {
+            throw std::invalid_argument("Failed to write the observable flip predictions.");
+        }
+    }
+}
+
 void chromobius::pybind_sinter_compat(pybind11::module &m) {
     auto sinter_decoder = pybind11::class_<ChromobiusSinterDecoder>(
         m,
@@ -165,20 +427,64 @@ void chromobius::pybind_sinter_compat(pybind11::module &m) {
 
     sinter_decoder.def(pybind11::pickle(
         [](const ChromobiusSinterDecoder &self) -> pybind11::object {
-            return pybind11::cast((uint8_t)self.sub_decoder);
+            return self.get_state();
         },
         [](const pybind11::object &obj) -> ChromobiusSinterDecoder {
-            return ChromobiusSinterDecoder((SubDecoder)pybind11::cast<uint8_t>(obj));
+            return ChromobiusSinterDecoder::from_state(obj);
         }));
     sinter_decoder.def(pybind11::self == pybind11::self);
     sinter_decoder.def(pybind11::self != pybind11::self);
 
     sinter_decoder.def(
-        pybind11::init([](uint8_t sub_decoder) -> ChromobiusSinterDecoder {
-            return ChromobiusSinterDecoder((SubDecoder)sub_decoder);
+        pybind11::init([](uint8_t sub_decoder,
+                          size_t num_threads,
+                          bool split_bases,
+                          bool drop_mobius_errors_involving_remnant_errors,
+                          bool ignore_decomposition_failures,
+                          bool include_coords_in_mobius_dem,
+                          const pybind11::object &max_mobius_error_weight) -> ChromobiusSinterDecoder {
+            ChromobiusSinterDecoder result((SubDecoder)sub_decoder);
+            result.num_threads = num_threads;
+            result.split_bases = split_bases;
+            result.drop_mobius_errors_involving_remnant_errors = drop_mobius_errors_involving_remnant_errors;
+            result.ignore_decomposition_failures = ignore_decomposition_failures;
+            result.include_coords_in_mobius_dem = include_coords_in_mobius_dem;
+            result.max_mobius_error_weight =
+                max_mobius_error_weight.is_none() ? INFINITY : pybind11::cast<double>(max_mobius_error_weight);
+            return result;
         }),
+        pybind11::arg("sub_decoder") = 0,
+        pybind11::kw_only(),
+        pybind11::arg("num_threads") = 1,
+        pybind11::arg("split_bases") = false,
+        pybind11::arg("drop_mobius_errors_involving_remnant_errors") = true,
+        pybind11::arg("ignore_decomposition_failures") = false,
+        pybind11::arg("include_coords_in_mobius_dem") = false,
+        pybind11::arg("max_mobius_error_weight") = pybind11::none(),
         stim::clean_doc_string(R"DOC(
+            @signature def __init__(self, sub_decoder: int = 0, *, num_threads: int = 1, split_bases: bool = False, drop_mobius_errors_involving_remnant_errors: bool = True, ignore_decomposition_failures: bool = False, include_coords_in_mobius_dem: bool = False, max_mobius_error_weight: Optional[float] = None) -> None:
             Creates a chromobius.ChromobiusSinterDecoder.
+
+            The options are kept when the decoder is pickled (e.g. when sinter
+            sends it to its worker processes).
+
+            Args:
+                sub_decoder: Defaults to 0 (pymatching). The matcher to use.
+                num_threads: Defaults to 1. The number of threads each compiled
+                    decoder splits its batches of shots across. Set to 0 to use
+                    one thread per core.
+                split_bases: Defaults to False. See
+                    `chromobius.compile_decoder_for_dem`.
+                drop_mobius_errors_involving_remnant_errors: Defaults to True.
+                    Whether errors that can only be decomposed by introducing
+                    remnant errors are dropped from the matching problem.
+                ignore_decomposition_failures: Defaults to False. Whether
+                    errors that can't be decomposed are dropped (instead of
+                    raising an exception).
+                include_coords_in_mobius_dem: Defaults to False. Whether the
+                    matching problem includes detector coordinates.
+                max_mobius_error_weight: Defaults to None. See
+                    `chromobius.compile_decoder_for_dem`.
         )DOC")
             .data());
 
@@ -195,6 +501,9 @@ void chromobius::pybind_sinter_compat(pybind11::module &m) {
         pybind11::arg("tmp_dir"),
         stim::clean_doc_string(R"DOC(
             Decodes data on disk, to disk.
+
+            The decoder configured for a dem is cached, and reused by later calls
+            given a dem file with the same contents (even at another path).
         )DOC")
             .data());
 
@@ -223,6 +532,9 @@ void chromobius::pybind_sinter_compat(pybind11::module &m) {
         []() -> pybind11::object {
             auto result = pybind11::dict();
             result["chromobius"] = ChromobiusSinterDecoder(SubDecoder::SUB_DECODER_PYMATCHING);
+            ChromobiusSinterDecoder multithreaded(SubDecoder::SUB_DECODER_PYMATCHING);
+            multithreaded.num_threads = 0;
+            result["chromobius-mt"] = multithreaded;
             return result;
         },
         stim::clean_doc_string(R"DOC(
@@ -230,12 +542,23 @@ void chromobius::pybind_sinter_compat(pybind11::module &m) {
             A dictionary describing chromobius to sinter.
 
             Giving the result of this function to the `custom_decoders` argument of
-            `sinter.collect` will tell sinter about the decoder 'chromobius'. On the
-            command line, the equivalent argument is
+            `sinter.collect` will tell sinter about the decoder 'chromobius' and its
+            variants. On the command line, the equivalent argument is
             `--custom_decoders 'chromobius:sinter_decoders'`.
 
+            The variants are:
+                'chromobius': The default configuration.
+                'chromobius-mt': Each sinter worker splits its batches of shots
+                    across one thread per core. Useful when there are fewer
+                    sinter tasks than cores, which would otherwise leave cores
+                    idle.
+
+            Custom variants can be made by creating instances of
+            `chromobius._ChromobiusSinterDecoder` with the desired options.
+
             Returns:
-                The dict `{'chromobius': <an object compatible with sinter.Decoder>}`.
+                A dict mapping decoder names to objects compatible with
+                sinter.Decoder.
         )DOC")
             .data());
 }
@@ -12,6 +12,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import concurrent.futures
+import os
+import pathlib
+import pickle
+
+import numpy as np
+import pytest
+import stim
+
 import chromobius
 
 
@@ -19,3 +28,183 @@ def test_sinter_obj_exists():
     decoder = chromobius.sinter_decoders()['chromobius']
     assert hasattr(decoder, 'compile_decoder_for_dem')
     assert hasattr(decoder, 'decode_via_files')
+
+
+def test_sinter_decoder_options_survive_pickling():
+    decoder = chromobius._ChromobiusSinterDecoder(
+        num_threads=3,
+        split_bases=True,
+        drop_mobius_errors_involving_remnant_errors=False,
+        ignore_decomposition_failures=True,
+        include_coords_in_mobius_dem=True,
+        max_mobius_error_weight=20,
+    )
+    copy = pickle.loads(pickle.dumps(decoder))
+    assert copy == decoder
+    assert copy != chromobius._ChromobiusSinterDecoder()
+    assert chromobius._ChromobiusSinterDecoder() == chromobius.sinter_decoders()['chromobius']
+    assert chromobius.sinter_decoders()['chromobius-mt'] != chromobius.sinter_decoders()['chromobius']
+
+
+def test_sinter_multithreaded_compiled_decoder_matches_single_threaded():
+    circuit = stim.Circuit.from_file(
+        pathlib.Path(__file__).parent.parent.parent.parent
+        / 'test_data'
+        / 'midout_color_code_d5_r10_p1000.stim'
+    )
+    dem = circuit.detector_error_model()
+    dets, _ = circuit.compile_detector_sampler(seed=5).sample(
+        shots=1000,
+        separate_observables=True,
+        bit_packed=True,
+    )
+    expected = chromobius.compile_decoder_for_dem(dem).predict_obs_flips_from_dets_bit_packed(dets)
+    for sinter_decoder in [
+        chromobius.sinter_decoders()['chromobius'],
+        chromobius.sinter_decoders()['chromobius-mt'],
+        chromobius._ChromobiusSinterDecoder(num_threads=3),
+    ]:
+        compiled = sinter_decoder.compile_decoder_for_dem(dem=dem)
+        actual = compiled.decode_shots_bit_packed(bit_packed_detection_event_data=dets)
+        np.testing.assert_array_equal(actual, expected)
+
+
+def test_sinter_collect_with_variants():
+    sinter = pytest.importorskip('sinter')
+    circuit = stim.Circuit.from_file(
+        pathlib.Path(__file__).parent.parent.parent.parent
+        / 'test_data'
+        / 'midout_color_code_d5_r10_p1000.stim'
+    )
+    stats = sinter.collect(
+        num_workers=1,
+        tasks=[sinter.Task(circuit=circuit)],
+        decoders=['chromobius', 'chromobius-mt'],
+        custom_decoders=chromobius.sinter_decoders(),
+        max_shots=200,
+    )
+    assert sorted(s.decoder for s in stats) == ['chromobius', 'chromobius-mt']
+    assert all(s.shots == 200 for s in stats)
+
+
+def test_decode_via_files(tmp_path: pathlib.Path):
+    circuit = stim.Circuit.from_file(
+        pathlib.Path(__file__).parent.parent.parent.parent
+        / 'test_data'
+        / 'midout_color_code_d5_r10_p1000.stim'
+    )
+    dem = circuit.detector_error_model()
+    wide_dem = stim.DetectorErrorModel(str(dem.flattened()).replace(' L0', ' L0 L70'))
+    dets, _ = circuit.compile_detector_sampler(seed=7).sample(
+        shots=5000,
+        separate_observables=True,
+        bit_packed=True,
+    )
+    dets.tofile(tmp_path / 'dets.b8')
+
+    for sinter_decoder in [
+        chromobius.sinter_decoders()['chromobius'],
+        chromobius._ChromobiusSinterDecoder(num_threads=2),
+    ]:
+        for model in [dem, wide_dem, dem]:
+            # Rewriting the dem file should be noticed, even though its path is the same.
+            model.to_file(tmp_path / 'model.dem')
+            expected = chromobius.compile_decoder_for_dem(model).predict_obs_flips_from_dets_bit_packed(dets)
+            for _ in range(2):
+                sinter_decoder.decode_via_files(
+                    num_shots=5000,
+                    num_dets=model.num_detectors,
+                    num_obs=model.num_observables,
+                    dem_path=tmp_path / 'model.dem',
+                    dets_b8_in_path=tmp_path / 'dets.b8',
+                    obs_predictions_b8_out_path=tmp_path / 'obs.b8',
+                    tmp_dir=tmp_path,
+                )
+                actual = np.fromfile(tmp_path / 'obs.b8', dtype=np.uint8).reshape(expected.shape)
+                np.testing.assert_array_equal(actual, expected)
+
+            # Like sinter, write the same dem to a fresh file.
+            fresh_path = tmp_path / f'fresh_{model.num_observables}.dem'
+            model.to_file(fresh_path)
+            sinter_decoder.decode_via_files(
+                num_shots=5000,
+                num_dets=model.num_detectors,
+                num_obs=model.num_observables,
+                dem_path=fresh_path,
+                dets_b8_in_path=tmp_path / 'dets.b8',
+                obs_predictions_b8_out_path=tmp_path / 'obs.b8',
+                tmp_dir=tmp_path,
+            )
+            actual = np.fromfile(tmp_path / 'obs.b8', dtype=np.uint8).reshape(expected.shape)
+            np.testing.assert_array_equal(actual, expected)
+
+    with pytest.raises(ValueError, match='ended before'):
+        chromobius.sinter_decoders()['chromobius'].decode_via_files(
+            num_shots=5001,
+            num_dets=dem.num_detectors,
+            num_obs=dem.num_observables,
+            dem_path=tmp_path / 'model.dem',
+            dets_b8_in_path=tmp_path / 'dets.b8',
+            obs_predictions_b8_out_path=tmp_path / 'obs.b8',
+            tmp_dir=tmp_path,
+        )
+
+    # A different dem of the same size, written to the same path with the same modification time, isn't mistaken
+    # for the cached one.
+    stat = os.stat(tmp_path / 'model.dem')
+    moved_text = (tmp_path / 'model.dem').read_text().replace(' L0', ' L1')
+    moved_dem = stim.DetectorErrorModel(moved_text)
+    (tmp_path / 'model.dem').write_text(moved_text)
+    assert os.stat(tmp_path / 'model.dem').st_size == stat.st_size
+    os.utime(tmp_path / 'model.dem', ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    expected = chromobius.compile_decoder_for_dem(moved_dem).predict_obs_flips_from_dets_bit_packed(dets)
+    sinter_decoder.decode_via_files(
+        num_shots=5000,
+        num_dets=moved_dem.num_detectors,
+        num_obs=moved_dem.num_observables,
+        dem_path=tmp_path / 'model.dem',
+        dets_b8_in_path=tmp_path / 'dets.b8',
+        obs_predictions_b8_out_path=tmp_path / 'obs.b8',
+        tmp_dir=tmp_path,
+    )
+    actual = np.fromfile(tmp_path / 'obs.b8', dtype=np.uint8).reshape(expected.shape)
+    np.testing.assert_array_equal(actual, expected)
+
+
+def test_decode_via_files_concurrently(tmp_path: pathlib.Path):
+    circuit = stim.Circuit.from_file(
+        pathlib.Path(__file__).parent.parent.parent.parent
+        / 'test_data'
+        / 'midout_color_code_d5_r10_p1000.stim'
+    )
+    dem = circuit.detector_error_model()
+    wide_dem = stim.DetectorErrorModel(str(dem.flattened()).replace(' L0', ' L0 L70'))
+    dets, _ = circuit.compile_detector_sampler(seed=7).sample(
+        shots=2000,
+        separate_observables=True,
+        bit_packed=True,
+    )
+    dets.tofile(tmp_path / 'dets.b8')
+    models = [dem, wide_dem]
+    for k, model in enumerate(models):
+        model.to_file(tmp_path / f'model_{k}.dem')
+
+    def decode(k: int) -> np.ndarray:
+        model = models[k % 2]
+        chromobius.sinter_decoders()['chromobius'].decode_via_files(
+            num_shots=2000,
+            num_dets=model.num_detectors,
+            num_obs=model.num_observables,
+            dem_path=tmp_path / f'model_{k % 2}.dem',
+            dets_b8_in_path=tmp_path / 'dets.b8',
+            obs_predictions_b8_out_path=tmp_path / f'obs_{k}.b8',
+            tmp_dir=tmp_path,
+        )
+        return np.fromfile(tmp_path / f'obs_{k}.b8', dtype=np.uint8)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(decode, range(8)))
+    for k, actual in enumerate(results):
+        model = models[k % 2]
+        expected = chromobius.compile_decoder_for_dem(model).predict_obs_flips_from_dets_bit_packed(dets)
+        np.testing.assert_array_equal(actual.reshape(expected.shape), expected)
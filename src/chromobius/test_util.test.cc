@@ -34,6 +34,39 @@ FILE *chromobius::open_test_data_file(const char *name) {
     throw std::invalid_argument("Failed to find test data file " + std::string(name));
 }
 
+void chromobius::assert_decoders_agree_on_sampled_shots(
+    const stim::Circuit &circuit,
+    Decoder &reference,
+    std::initializer_list<Decoder *> variants,
+    bool compare_weights,
+    const std::function<void(size_t k, std::span<const uint8_t> shot, obsmask_int expected, float expected_weight)>
+        &check_shot,
+    size_t num_shots) {
+    std::mt19937_64 rng{0};
+    auto [dets, obs] = stim::sample_batch_detection_events<64>(circuit, num_shots, rng);
+    dets = dets.transposed();
+
+    for (size_t k = 0; k < num_shots; k++) {
+        std::span<const uint8_t> shot{dets[k].u8, dets[k].u8 + dets.num_minor_u8_padded()};
+        float expected_weight = -1;
+        obsmask_int expected = reference.decode_detection_events(shot, &expected_weight);
+        for (size_t v = 0; v < variants.size(); v++) {
+            float weight = -1;
+            ASSERT_EQ(variants.begin()[v]->decode_detection_events(shot, &weight), expected)
+                << "variant " << v << " shot " << k;
+            if (compare_weights) {
+                ASSERT_EQ(weight, expected_weight) << "variant " << v << " shot " << k;
+            }
+        }
+        if (check_shot) {
+            check_shot(k, shot, expected, expected_weight);
+            if (::testing::Test::HasFatalFailure()) {
+                return;
+            }
+        }
+    }
+}
+
 static void init_path(RaiiTempNamedFile &self) {
     char tmp_stdin_filename[] = "/tmp/stim_test_named_file_XXXXXX";
     self.descriptor = mkstemp(tmp_stdin_filename);
@@ -18,12 +18,41 @@
 #define _CHROMOBIUS_TEST_UTIL_H
 
 #include <cstdio>
+#include <functional>
+#include <span>
 #include <string>
 
+#include "chromobius/decode/decoder.h"
+#include "stim.h"
+
 namespace chromobius {
 
 FILE *open_test_data_file(const char *name);
 
+/// Samples shots from a circuit, and asserts that each variant decoder predicts
+/// the same observable flips as the reference decoder for each shot.
+///
+/// Wrap calls in ASSERT_NO_FATAL_FAILURE, to stop the test on a mismatch.
+///
+/// Args:
+///     circuit: The circuit to sample detection events from.
+///     reference: The decoder making the expected predictions.
+///     variants: The decoders that should agree with the reference decoder.
+///     compare_weights: Whether the variants should also report the same
+///         weights as the reference decoder.
+///     check_shot: Optional extra check, called after each shot is decoded
+///         with the shot's index, bit packed detection events, and the
+///         reference decoder's prediction and weight.
+///     num_shots: The number of shots to sample.
+void assert_decoders_agree_on_sampled_shots(
+    const stim::Circuit &circuit,
+    Decoder &reference,
+    std::initializer_list<Decoder *> variants,
+    bool compare_weights = true,
+    const std::function<void(size_t k, std::span<const uint8_t> shot, obsmask_int expected, float expected_weight)>
+        &check_shot = {},
+    size_t num_shots = 256);
+
 struct RaiiTempNamedFile {
     int descriptor;
     std::string path;
@@ -20,8 +20,10 @@ def main():
 """Chromobius {version}: an implementation of the mobius color code decoder."""
 # (This a stubs file describing the classes and methods in stim.)
 from __future__ import annotations
-from typing import overload, TYPE_CHECKING, Any, Iterable
+from typing import overload, TYPE_CHECKING, Any, Iterable, Optional
 if TYPE_CHECKING:
+    import asyncio
+    import concurrent.futures
     import io
     import pathlib
     import numpy as np
@@ -8,7 +8,9 @@ from typing import Tuple
 
 keep = {
     "__add__",
+    "__enter__",
     "__eq__",
+    "__exit__",
     "__call__",
     "__ge__",
     "__getitem__",